@@ -0,0 +1,333 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+AnalyticsPanel.py
+角色卡库统计面板：在后台增量提取目录中各角色卡和世界书条目的指标，
+显示任意列的分位数和直方图、标签频率，以及某一列超过上限的角色卡。
+提取与查询见 library_analytics.py。
+"""
+
+import os
+from typing import Any, List, Optional
+
+from PySide6.QtWidgets import (
+    QDialog, QVBoxLayout, QHBoxLayout, QLabel, QProgressBar, QPushButton, QComboBox, QSpinBox,
+    QTabWidget, QTableWidget, QTableWidgetItem, QHeaderView, QAbstractItemView, QFileDialog, QWidget
+)
+from PySide6.QtCore import Qt, QObject, QThread, Signal
+
+from library_analytics import (
+    CARD_COLUMNS, ENTRY_COLUMNS, LibraryAnalytics, UpdateStats, column_title, open_analytics, store_path
+)
+
+# 分布页中可选的列（修改时间和条目所属的角色卡没有统计意义）
+HISTOGRAM_COLUMNS = [*CARD_COLUMNS[1:], *(f"entry.{name}" for name in ENTRY_COLUMNS[1:4])]
+# 超限页中可选的列，条目列表示“含有超过上限的条目”
+OVER_COLUMNS = ["greeting_tokens_max", "total_tokens", "constant_tokens", "book_tokens", "token_budget",
+                "entries", "entry.tokens", "entry.keys", *CARD_COLUMNS[2:10]]
+DEFAULT_BINS = 20
+MAX_TAGS = 500
+MAX_OVER_ROWS = 2000
+# 每提取这么多个文件更新一次进度
+PROGRESS_INTERVAL = 50
+BAR_WIDTH = 40
+
+
+class _UpdateWorker(QObject):
+    """在工作线程中增量提取并保存统计文件"""
+
+    progress = Signal(int, int)
+    finished = Signal(object)  # UpdateStats
+    failed = Signal(str)
+
+    def __init__(self, analytics: LibraryAnalytics, directory: str, store: str):
+        super().__init__()
+        self.analytics = analytics
+        self.directory = directory
+        self.store = store
+        self.cancelled = False
+
+    def _progress(self, done: int, total: int):
+        if done % PROGRESS_INTERVAL == 0 or done == total:
+            self.progress.emit(done, total)
+
+    def run(self):
+        try:
+            stats = self.analytics.update(self.directory, on_progress=self._progress,
+                                          should_stop=lambda: self.cancelled)
+            self.analytics.save(self.store)
+        except Exception as e:
+            self.failed.emit(str(e))
+            return
+        self.finished.emit(stats)
+
+
+class _NumberItem(QTableWidgetItem):
+    """按数值排序的单元格"""
+
+    def __init__(self, value: Any):
+        super().__init__()
+        self.setData(Qt.ItemDataRole.DisplayRole, value)
+
+
+def _table(headers: List[str]) -> QTableWidget:
+    table = QTableWidget(0, len(headers))
+    table.setHorizontalHeaderLabels(headers)
+    table.horizontalHeader().setSectionResizeMode(len(headers) - 1, QHeaderView.ResizeMode.Stretch)
+    table.setEditTriggers(QAbstractItemView.EditTrigger.NoEditTriggers)
+    table.setSelectionBehavior(QAbstractItemView.SelectionBehavior.SelectRows)
+    table.verticalHeader().setVisible(False)
+    return table
+
+
+class AnalyticsPanel(QDialog):
+    """角色卡库统计"""
+
+    # 双击超限列表中的角色卡，参数为文件路径
+    card_requested = Signal(str)
+
+    def __init__(self, cache_dir: str, parent: Optional[QWidget] = None):
+        super().__init__(parent)
+        self.setWindowTitle("角色卡库统计")
+        self.setMinimumSize(760, 560)
+        self.cache_dir = cache_dir
+        self.analytics = LibraryAnalytics()
+        self._thread: Optional[QThread] = None
+        self._worker: Optional[_UpdateWorker] = None
+        self.setup_ui()
+        self._set_running(False)
+
+    def setup_ui(self):
+        """设置UI"""
+        layout = QVBoxLayout(self)
+
+        top_layout = QHBoxLayout()
+        self.directory_label = QLabel("未选择目录")
+        top_layout.addWidget(self.directory_label, 1)
+        self.choose_btn = QPushButton("选择目录...")
+        self.choose_btn.clicked.connect(self.choose_directory)
+        top_layout.addWidget(self.choose_btn)
+        self.update_btn = QPushButton("更新")
+        self.update_btn.clicked.connect(self.start_update)
+        top_layout.addWidget(self.update_btn)
+        self.stop_btn = QPushButton("停止")
+        self.stop_btn.clicked.connect(self.stop)
+        top_layout.addWidget(self.stop_btn)
+        layout.addLayout(top_layout)
+
+        self.progress_bar = QProgressBar()
+        layout.addWidget(self.progress_bar)
+        self.summary_label = QLabel()
+        self.summary_label.setWordWrap(True)
+        layout.addWidget(self.summary_label)
+
+        self.tabs = QTabWidget()
+        layout.addWidget(self.tabs)
+
+        # 分布
+        histogram_page = QWidget()
+        histogram_layout = QVBoxLayout(histogram_page)
+        options_layout = QHBoxLayout()
+        self.histogram_combo = QComboBox()
+        for key in HISTOGRAM_COLUMNS:
+            self.histogram_combo.addItem(column_title(key), key)
+        self.histogram_combo.setCurrentIndex(HISTOGRAM_COLUMNS.index("total_tokens"))
+        self.histogram_combo.currentIndexChanged.connect(self.refresh_histogram)
+        options_layout.addWidget(self.histogram_combo)
+        options_layout.addWidget(QLabel("区间数:"))
+        self.bins_spin = QSpinBox()
+        self.bins_spin.setRange(2, 200)
+        self.bins_spin.setValue(DEFAULT_BINS)
+        self.bins_spin.valueChanged.connect(self.refresh_histogram)
+        options_layout.addWidget(self.bins_spin)
+        options_layout.addStretch()
+        histogram_layout.addLayout(options_layout)
+        self.quantile_label = QLabel()
+        histogram_layout.addWidget(self.quantile_label)
+        self.histogram_table = _table(["范围", "数量", "分布"])
+        histogram_layout.addWidget(self.histogram_table)
+        self.tabs.addTab(histogram_page, "分布")
+
+        # 标签
+        self.tag_table = _table(["角色卡数", "标签"])
+        self.tag_table.setSortingEnabled(True)
+        self.tabs.addTab(self.tag_table, "标签")
+
+        # 超限
+        over_page = QWidget()
+        over_layout = QVBoxLayout(over_page)
+        over_options = QHBoxLayout()
+        self.over_combo = QComboBox()
+        for key in OVER_COLUMNS:
+            self.over_combo.addItem(column_title(key), key)
+        self.over_combo.currentIndexChanged.connect(self.refresh_over)
+        over_options.addWidget(self.over_combo)
+        over_options.addWidget(QLabel("超过:"))
+        self.limit_spin = QSpinBox()
+        self.limit_spin.setRange(0, 10_000_000)
+        self.limit_spin.setSingleStep(100)
+        self.limit_spin.setValue(1500)
+        self.limit_spin.valueChanged.connect(self.refresh_over)
+        over_options.addWidget(self.limit_spin)
+        over_options.addStretch()
+        over_layout.addLayout(over_options)
+        self.over_label = QLabel()
+        over_layout.addWidget(self.over_label)
+        self.over_table = _table(["数值", "名称", "文件"])
+        self.over_table.setSortingEnabled(True)
+        self.over_table.itemDoubleClicked.connect(self.on_over_double_clicked)
+        over_layout.addWidget(self.over_table)
+        self.tabs.addTab(over_page, "超限")
+
+        button_layout = QHBoxLayout()
+        button_layout.addStretch()
+        close_btn = QPushButton("关闭")
+        close_btn.clicked.connect(self.close)
+        button_layout.addWidget(close_btn)
+        layout.addLayout(button_layout)
+
+    # ------------------------------------------------------------------
+    # 提取
+    # ------------------------------------------------------------------
+
+    def choose_directory(self):
+        directory = QFileDialog.getExistingDirectory(self, "选择角色卡库目录", self.analytics.directory)
+        if directory:
+            self.open_directory(directory)
+
+    def open_directory(self, directory: str):
+        """先显示上次保存的统计结果，再在后台更新变化的文件"""
+        directory = os.path.abspath(directory)
+        self.directory_label.setText(directory)
+        self.analytics = open_analytics(store_path(self.cache_dir, directory), directory)
+        self.refresh()
+        self.start_update()
+
+    def start_update(self):
+        directory = self.analytics.directory
+        if self._thread is not None or not directory:
+            return
+        if not os.path.isdir(directory):
+            self.summary_label.setText(f"目录不存在: {directory}")
+            return
+        self._set_running(True)
+        self.progress_bar.setRange(0, 0)
+        self._thread = QThread(self)
+        self._worker = _UpdateWorker(self.analytics, directory, store_path(self.cache_dir, directory))
+        self._worker.moveToThread(self._thread)
+        self._thread.started.connect(self._worker.run)
+        self._worker.progress.connect(self.on_progress)
+        self._worker.finished.connect(self.on_updated)
+        self._worker.failed.connect(self.show_error)
+        self._thread.start()
+
+    def on_progress(self, done: int, total: int):
+        self.progress_bar.setRange(0, total)
+        self.progress_bar.setValue(done)
+
+    def on_updated(self, stats: UpdateStats):
+        self._finish()
+        self.refresh()
+        status = "已停止" if stats.cancelled else "已更新"
+        text = f"{status}：重新提取 {stats.extracted} 个文件，沿用 {stats.reused} 个，移除 {stats.removed} 个"
+        if stats.errors:
+            text += f"，{stats.errors} 个文件无法读取"
+        self.summary_label.setText(self.summary_label.text() + "\n" + text)
+
+    def show_error(self, message: str):
+        self._finish()
+        self.summary_label.setText(f"统计失败: {message}")
+
+    def _finish(self):
+        if self._thread is not None:
+            self._thread.quit()
+            self._thread.wait()
+            self._thread = None
+            self._worker = None
+        self.progress_bar.setRange(0, 1)
+        self.progress_bar.setValue(1)
+        self._set_running(False)
+
+    def _set_running(self, running: bool):
+        self.choose_btn.setEnabled(not running)
+        self.update_btn.setEnabled(not running)
+        self.stop_btn.setEnabled(running)
+        # 提取完成前各列会被整体替换，暂不查询
+        self.tabs.setEnabled(not running)
+
+    def stop(self):
+        if self._worker is not None:
+            self._worker.cancelled = True
+
+    # ------------------------------------------------------------------
+    # 查询
+    # ------------------------------------------------------------------
+
+    def refresh(self):
+        summary = self.analytics.summary()
+        text = f"{summary['cards']} 张角色卡，{summary['entries']} 个世界书条目，{summary['tags']} 个标签"
+        if summary["errors"]:
+            text += f"，{summary['errors']} 个文件无法读取"
+        self.summary_label.setText(text)
+        self.refresh_histogram()
+        self.refresh_tags()
+        self.refresh_over()
+
+    def refresh_histogram(self):
+        key = self.histogram_combo.currentData()
+        analytics = self.analytics
+        median, p90, p99 = analytics.quantiles(key)
+        self.quantile_label.setText(f"中位数 {median:.0f}，P90 {p90:.0f}，P99 {p99:.0f}")
+        bins = analytics.histogram(key, self.bins_spin.value())
+        peak = max((item.count for item in bins), default=0)
+        self.histogram_table.setRowCount(len(bins))
+        for row, item in enumerate(bins):
+            self.histogram_table.setItem(row, 0, QTableWidgetItem(f"{item.low:.0f} - {item.high:.0f}"))
+            self.histogram_table.setItem(row, 1, _NumberItem(item.count))
+            bar = "█" * (round(item.count / peak * BAR_WIDTH) if peak else 0)
+            self.histogram_table.setItem(row, 2, QTableWidgetItem(bar))
+
+    def refresh_tags(self):
+        tags = self.analytics.tag_frequencies(MAX_TAGS)
+        self.tag_table.setSortingEnabled(False)
+        self.tag_table.setRowCount(len(tags))
+        for row, (tag, count) in enumerate(tags):
+            self.tag_table.setItem(row, 0, _NumberItem(count))
+            self.tag_table.setItem(row, 1, QTableWidgetItem(tag))
+        self.tag_table.setSortingEnabled(True)
+
+    def refresh_over(self):
+        key = self.over_combo.currentData()
+        analytics = self.analytics
+        limit = self.limit_spin.value()
+        rows = analytics.over(key, limit)
+        # 条目列显示每张卡中最大的条目值
+        values = analytics.column(key)
+        if key.startswith("entry."):
+            offsets = analytics.entry_offsets
+            shown = [max(values[offsets[row]:offsets[row + 1]]) for row in rows[:MAX_OVER_ROWS]]
+        else:
+            shown = [values[row] for row in rows[:MAX_OVER_ROWS]]
+        self.over_label.setText(f"{len(rows)} 张角色卡的{column_title(key)} 超过 {limit}"
+                                + (f"（只列出前 {MAX_OVER_ROWS} 张）" if len(rows) > MAX_OVER_ROWS else ""))
+        self.over_table.setSortingEnabled(False)
+        self.over_table.setRowCount(len(shown))
+        for table_row, (row, value) in enumerate(zip(rows, shown)):
+            self.over_table.setItem(table_row, 0, _NumberItem(int(value)))
+            self.over_table.setItem(table_row, 1, QTableWidgetItem(analytics.names[row]))
+            path_item = QTableWidgetItem(os.path.relpath(analytics.paths[row], analytics.directory))
+            path_item.setData(Qt.ItemDataRole.UserRole, analytics.paths[row])
+            self.over_table.setItem(table_row, 2, path_item)
+        self.over_table.setSortingEnabled(True)
+
+    def on_over_double_clicked(self, item: QTableWidgetItem):
+        path = self.over_table.item(item.row(), 2).data(Qt.ItemDataRole.UserRole)
+        if path:
+            self.card_requested.emit(path)
+
+    def closeEvent(self, event):
+        # 关闭时停止提取，已提取的结果在下次更新时沿用
+        self.stop()
+        self._finish()
+        super().closeEvent(event)
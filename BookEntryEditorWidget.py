@@ -10,21 +10,35 @@ from PySide6.QtWidgets import (
     QWidget, QVBoxLayout, QScrollArea, QGroupBox, QFormLayout,
     QLineEdit, QTextEdit, QSpinBox, QCheckBox, QComboBox, QLabel
 )
-from PySide6.QtCore import Qt
-from typing import Any, Dict, Optional
+from PySide6.QtCore import Qt, Signal
+from typing import Any, Dict, List, Optional, Tuple
 
 # 导入主应用中的自定义控件
 # 从共享UI控件模块导入
-from ui_widgets import MarkdownEditorWidget, TagListWidget
+from ui_widgets import MarkdownEditorWidget, TagListWidget, mark_field
+from JsonTreeWidget import JsonTreeWidget
+from field_binding import BindingGroup
+
+# 由上面的表单控件编辑的 extensions 键，其余的键显示在“其他扩展数据”树中
+FORM_EXTENSION_KEYS = (
+    "depth", "probability", "useProbability", "prevent_recursion", "delay_until_recursion",
+    "exclude_recursion", "role", "ignore_budget", "vectorized",
+    "match_persona_description", "match_character_description", "match_character_personality",
+    "match_character_depth_prompt", "match_scenario", "match_creator_notes",
+)
 
 
 class BookEntryEditorWidget(QWidget):
     """单个世界书条目的编辑器"""
 
+    # “其他扩展数据”树中的修改: (条目内的路径, 旧值, 新值)
+    extensions_edited = Signal(object, object, object)
+
     def __init__(self, parent: Optional[QWidget] = None):
         super().__init__(parent)
         self.entry_data: Dict[str, Any] = {}
         self.setup_ui()
+        self.setup_bindings()
 
     def setup_ui(self):
         """设置UI"""
@@ -85,6 +99,8 @@ class BookEntryEditorWidget(QWidget):
         self.role_combobox = QComboBox()
         self.role_combobox.addItems(["System", "User", "AI"]) # 0, 1, 2
         self.ignore_budget_checkbox = QCheckBox("忽略预算")
+        self.vectorized_checkbox = QCheckBox("向量检索 (Vectorized)")
+        self.vectorized_checkbox.setToolTip("按与最近聊天内容的相似度激活，可在提示词预览中查看效果")
 
         ext_layout.addRow("扫描深度 (Depth):", self.depth_spinbox)
         ext_layout.addRow("概率 (Probability):", self.probability_spinbox)
@@ -94,6 +110,7 @@ class BookEntryEditorWidget(QWidget):
         ext_layout.addRow(self.exclude_recursion_checkbox)
         ext_layout.addRow("角色 (Role):", self.role_combobox)
         ext_layout.addRow(self.ignore_budget_checkbox)
+        ext_layout.addRow(self.vectorized_checkbox)
 
         layout.addWidget(ext_group)
 
@@ -117,78 +134,104 @@ class BookEntryEditorWidget(QWidget):
 
         layout.addWidget(match_group)
 
+        # --- 其他扩展数据：第三方插件写入的任意 JSON ---
+        other_group = QGroupBox("其他扩展数据 (Extensions)")
+        other_layout = QVBoxLayout(other_group)
+        self.extensions_tree = JsonTreeWidget()
+        self.extensions_tree.model.value_edited.connect(
+            lambda path, old, new: self.extensions_edited.emit(("extensions",) + tuple(path), old, new))
+        other_layout.addWidget(self.extensions_tree)
+        layout.addWidget(other_group)
+
+    def setup_bindings(self):
+        """把表单控件绑定到条目字段：加载时只更新值有变化的控件，提交时只写回用户修改过的字段"""
+        self.bindings = BindingGroup()
+        bind = self.bindings.bind
+
+        def line_edit(path: Tuple[str, ...], widget: QLineEdit, default: str):
+            bind(path, widget.text, widget.setText, widget.textEdited, default, widget)
+
+        def spinbox(path: Tuple[str, ...], widget: QSpinBox, default: int):
+            bind(path, widget.value, widget.setValue, widget.valueChanged, default, widget)
+
+        def checkbox(path: Tuple[str, ...], widget: QCheckBox, default: bool):
+            bind(path, widget.isChecked, widget.setChecked, widget.toggled, default, widget)
+
+        def tag_list(path: Tuple[str, ...], widget: TagListWidget):
+            # 模型的重置信号不能屏蔽（视图依赖它），set_items 本身不会发出 rows_edited
+            bind(path, widget.get_items, widget.set_items, widget.model.rows_edited, [])
+
+        line_edit(("comment",), self.comment_edit, "")
+        bind(("content",), self.content_editor.toPlainText, self.content_editor.setPlainText,
+             self.content_editor.edit_text.text_edited, "", self.content_editor.edit_text)
+        tag_list(("keys",), self.keys_widget)
+        tag_list(("secondary_keys",), self.secondary_keys_widget)
+        spinbox(("insertion_order",), self.insertion_order_spinbox, 100)
+        bind(("position",), self.position_combobox.currentText, self.position_combobox.setCurrentText,
+             self.position_combobox.currentIndexChanged, "before_char", self.position_combobox)
+        checkbox(("enabled",), self.enabled_checkbox, True)
+        checkbox(("constant",), self.constant_checkbox, False)
+        checkbox(("selective",), self.selective_checkbox, True)
+        checkbox(("use_regex",), self.use_regex_checkbox, True)
+
+        spinbox(("extensions", "depth"), self.depth_spinbox, 4)
+        spinbox(("extensions", "probability"), self.probability_spinbox, 100)
+        checkbox(("extensions", "useProbability"), self.use_probability_checkbox, True)
+        checkbox(("extensions", "prevent_recursion"), self.prevent_recursion_checkbox, False)
+        checkbox(("extensions", "delay_until_recursion"), self.delay_until_recursion_checkbox, False)
+        checkbox(("extensions", "exclude_recursion"), self.exclude_recursion_checkbox, False)
+        bind(("extensions", "role"), self.role_combobox.currentIndex, self.role_combobox.setCurrentIndex,
+             self.role_combobox.currentIndexChanged, 0, self.role_combobox)
+        checkbox(("extensions", "ignore_budget"), self.ignore_budget_checkbox, False)
+        checkbox(("extensions", "vectorized"), self.vectorized_checkbox, False)
+
+        checkbox(("extensions", "match_persona_description"), self.match_persona_desc_checkbox, False)
+        checkbox(("extensions", "match_character_description"), self.match_char_desc_checkbox, False)
+        checkbox(("extensions", "match_character_personality"), self.match_char_pers_checkbox, False)
+        checkbox(("extensions", "match_character_depth_prompt"), self.match_char_depth_checkbox, False)
+        checkbox(("extensions", "match_scenario"), self.match_scenario_checkbox, False)
+        checkbox(("extensions", "match_creator_notes"), self.match_creator_notes_checkbox, False)
+
     def load_entry(self, entry_data: Dict[str, Any]):
-        """将条目数据加载到UI"""
+        """将条目数据加载到UI，未提交的修改被丢弃；只更新显示的值与条目不同的控件"""
         self.entry_data = entry_data
-        ext = self.entry_data.get("extensions", {})
-
-        # 加载基础设置
-        self.comment_edit.setText(self.entry_data.get("comment", ""))
-        self.content_editor.setPlainText(self.entry_data.get("content", ""))
-        self.keys_widget.items = self.entry_data.get("keys", []).copy()
-        self.keys_widget.load_items()
-        self.secondary_keys_widget.items = self.entry_data.get("secondary_keys", []).copy()
-        self.secondary_keys_widget.load_items()
-        self.insertion_order_spinbox.setValue(self.entry_data.get("insertion_order", 100))
-        self.position_combobox.setCurrentText(self.entry_data.get("position", "before_char"))
-        self.enabled_checkbox.setChecked(self.entry_data.get("enabled", True))
-        self.constant_checkbox.setChecked(self.entry_data.get("constant", False))
-        self.selective_checkbox.setChecked(self.entry_data.get("selective", True))
-        self.use_regex_checkbox.setChecked(self.entry_data.get("use_regex", True))
-
-        # 加载扩展设置
-        self.depth_spinbox.setValue(ext.get("depth", 4))
-        self.probability_spinbox.setValue(ext.get("probability", 100))
-        self.use_probability_checkbox.setChecked(ext.get("useProbability", True))
-        self.prevent_recursion_checkbox.setChecked(ext.get("prevent_recursion", False))
-        self.delay_until_recursion_checkbox.setChecked(ext.get("delay_until_recursion", False))
-        self.exclude_recursion_checkbox.setChecked(ext.get("exclude_recursion", False))
-        self.role_combobox.setCurrentIndex(ext.get("role", 0))
-        self.ignore_budget_checkbox.setChecked(ext.get("ignore_budget", False))
-
-        # 加载匹配设置
-        self.match_persona_desc_checkbox.setChecked(ext.get("match_persona_description", False))
-        self.match_char_desc_checkbox.setChecked(ext.get("match_character_description", False))
-        self.match_char_pers_checkbox.setChecked(ext.get("match_character_personality", False))
-        self.match_char_depth_checkbox.setChecked(ext.get("match_character_depth_prompt", False))
-        self.match_scenario_checkbox.setChecked(ext.get("match_scenario", False))
-        self.match_creator_notes_checkbox.setChecked(ext.get("match_creator_notes", False))
+        # 树直接修改条目的 extensions，没有时先建立
+        ext = self.entry_data.setdefault("extensions", {}) if self.entry_data else {}
+        if ext is not self.extensions_tree.model.root_value() or not self.entry_data:
+            self.refresh_extensions()
+        self.extensions_tree.setEnabled(bool(self.entry_data))
+        self.bindings.load(self.entry_data)
+
+    def refresh_extensions(self):
+        """重新显示“其他扩展数据”树（其中的值被树以外的操作修改后调用）"""
+        ext = self.entry_data.get("extensions", {}) if self.entry_data else {}
+        self.extensions_tree.set_root(ext, FORM_EXTENSION_KEYS)
+
+    def commit_changes(self) -> Dict[Tuple[str, ...], Tuple[Any, Any]]:
+        """把用户修改过的字段写回条目，返回 {字段路径: (旧值, 新值)}"""
+        return self.bindings.commit()
+
+    def field_widgets(self) -> Dict[str, QWidget]:
+        """条目字段名到编辑控件的映射（用于标出校验问题）"""
+        return {
+            "comment": self.comment_edit,
+            "content": self.content_editor.edit_text,
+            "keys": self.keys_widget.list_view,
+            "secondary_keys": self.secondary_keys_widget.list_view,
+            "insertion_order": self.insertion_order_spinbox,
+            "position": self.position_combobox,
+            "enabled": self.enabled_checkbox,
+            "constant": self.constant_checkbox,
+            "selective": self.selective_checkbox,
+            "use_regex": self.use_regex_checkbox,
+        }
+
+    def set_diagnostics(self, messages: Dict[str, List[str]], errors: Dict[str, bool]):
+        """在对应控件上标出校验问题: {字段名: [问题]}, {字段名: 是否含错误}"""
+        for key, widget in self.field_widgets().items():
+            mark_field(widget, messages.get(key, []), errors.get(key, False))
 
     def get_entry_data(self) -> Dict[str, Any]:
-        """从UI收集条目数据"""
-        if not self.entry_data:
-            return {}
-
-        # 收集基础设置
-        self.entry_data["comment"] = self.comment_edit.text()
-        self.entry_data["content"] = self.content_editor.toPlainText()
-        self.entry_data["keys"] = self.keys_widget.get_items()
-        self.entry_data["secondary_keys"] = self.secondary_keys_widget.get_items()
-        self.entry_data["insertion_order"] = self.insertion_order_spinbox.value()
-        self.entry_data["position"] = self.position_combobox.currentText()
-        self.entry_data["enabled"] = self.enabled_checkbox.isChecked()
-        self.entry_data["constant"] = self.constant_checkbox.isChecked()
-        self.entry_data["selective"] = self.selective_checkbox.isChecked()
-        self.entry_data["use_regex"] = self.use_regex_checkbox.isChecked()
-
-        # 收集扩展设置
-        ext = self.entry_data.get("extensions", {})
-        ext["depth"] = self.depth_spinbox.value()
-        ext["probability"] = self.probability_spinbox.value()
-        ext["useProbability"] = self.use_probability_checkbox.isChecked()
-        ext["prevent_recursion"] = self.prevent_recursion_checkbox.isChecked()
-        ext["delay_until_recursion"] = self.delay_until_recursion_checkbox.isChecked()
-        ext["exclude_recursion"] = self.exclude_recursion_checkbox.isChecked()
-        ext["role"] = self.role_combobox.currentIndex()
-        ext["ignore_budget"] = self.ignore_budget_checkbox.isChecked()
-
-        # 收集匹配设置
-        ext["match_persona_description"] = self.match_persona_desc_checkbox.isChecked()
-        ext["match_character_description"] = self.match_char_desc_checkbox.isChecked()
-        ext["match_character_personality"] = self.match_char_pers_checkbox.isChecked()
-        ext["match_character_depth_prompt"] = self.match_char_depth_checkbox.isChecked()
-        ext["match_scenario"] = self.match_scenario_checkbox.isChecked()
-        ext["match_creator_notes"] = self.match_creator_notes_checkbox.isChecked()
-        
-        self.entry_data["extensions"] = ext
-        return self.entry_data
\ No newline at end of file
+        """提交修改后的条目数据"""
+        self.commit_changes()
+        return self.entry_data
@@ -8,19 +8,87 @@ CharacterBookWidget.py
 
 from PySide6.QtWidgets import (
     QWidget, QVBoxLayout, QHBoxLayout, QListWidget, QListWidgetItem,
-    QPushButton, QSplitter, QLabel, QLineEdit, QGroupBox
+    QPushButton, QSplitter, QLabel, QLineEdit, QGroupBox, QCheckBox,
+    QTreeWidget, QTreeWidgetItem, QFileDialog, QMessageBox, QTabWidget
 )
-from PySide6.QtCore import Qt
-from typing import Any, Dict, List, Optional
+from PySide6.QtCore import Qt, Signal, QTimer, QSignalBlocker, QObject, QThread
+from PySide6.QtGui import QColor
+import os
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from BookEntryEditorWidget import FORM_EXTENSION_KEYS, BookEntryEditorWidget
+from LorebookTableWidget import LorebookTableWidget
+from card_validation import ENTRIES_PATH, ERROR, Diagnostic
+from ui_widgets import ERROR_COLOR, WARNING_COLOR
+from lorebook_analysis import LorebookAnalyzer
+from ChatReplayDialog import ChatReplayDialog
+from TriggerGraphDialog import TriggerGraphDialog
+from lorebook_graph import EntrySnapshots, TriggerGraph
+from macros import MacroContext
+from world_info import iter_world_entries, merge_world_into_book, write_world
+from field_binding import MISSING
+from lorebook_columns import write_column
+
+# 分析结果中最多显示的关键字重叠条数
+MAX_OVERLAP_ITEMS = 500
+
+
+class _GraphWorker(QObject):
+    """在工作线程中增量更新触发关系图（只读取界面线程复制的条目）"""
+
+    finished = Signal(object)  # GraphReport
+    failed = Signal(str)
+
+    def __init__(self, graph: TriggerGraph):
+        super().__init__()
+        self.graph = graph
+
+    def run(self, entries: list):
+        try:
+            self.graph.update(entries)
+            report = self.graph.report()
+        except Exception as e:
+            self.failed.emit(str(e))
+            return
+        self.finished.emit(report)
 
-from BookEntryEditorWidget import BookEntryEditorWidget
 
 class CharacterBookWidget(QWidget):
     """世界书管理界面"""
 
+    # 条目增删: (行号, 删除的条目, 插入的条目)
+    entries_spliced = Signal(int, list, list)
+    # 条目字段修改: (行号, {字段路径: (旧值, 新值)})
+    entry_edited = Signal(int, object)
+    # 多个条目同一字段的批量修改: (字段路径, 行号列表, 旧值列表, 新值列表)
+    column_edited = Signal(object, list, list, list)
+    # 批量操作的开始/结束，期间的修改在撤销时作为一步
+    batch_started = Signal(str)
+    batch_finished = Signal()
+    # 条目内容发生变化（包括撤销/重做），参数为行号
+    entry_changed = Signal(int)
+    # 把条目副本交给触发关系的工作线程
+    _graph_requested = Signal(object)
+
     def __init__(self, parent: Optional[QWidget] = None):
         super().__init__(parent)
         self.book_data: Dict[str, Any] = {}
+        # 编辑器中正在编辑的条目行号
+        self.editing_row = -1
+        self.analyzer = LorebookAnalyzer()
+        # 各条目的校验结果 {行号: [诊断]}
+        self.entry_diagnostics: Dict[int, List[Diagnostic]] = {}
+        # 回放聊天时展开宏使用的上下文，由主窗口随角色卡更新
+        self.macro_context: Optional[MacroContext] = None
+        # 条目触发关系，跨多次打开对话框增量维护；在工作线程中更新，更新期间界面线程不读取
+        self.trigger_graph = TriggerGraph()
+        self.trigger_dialog: Optional[TriggerGraphDialog] = None
+        self.graph_snapshots = EntrySnapshots()
+        self._graph_thread: Optional[QThread] = None
+        self._graph_worker: Optional[_GraphWorker] = None
+        self._graph_busy = False
+        # 更新期间又有修改，完成后再更新一次
+        self._graph_pending = False
         self.setup_ui()
 
     def setup_ui(self):
@@ -43,7 +111,8 @@ class CharacterBookWidget(QWidget):
         left_layout = QVBoxLayout(left_widget)
         
         self.entry_list = QListWidget()
-        self.entry_list.itemClicked.connect(self.on_entry_selected)
+        # 点击和方向键都会改变当前行
+        self.entry_list.currentRowChanged.connect(self.on_current_row_changed)
         left_layout.addWidget(self.entry_list)
 
         # 条目操作按钮
@@ -56,71 +125,461 @@ class CharacterBookWidget(QWidget):
         entry_button_layout.addWidget(remove_entry_btn)
         left_layout.addLayout(entry_button_layout)
 
+        # SillyTavern 世界书导入/导出
+        world_button_layout = QHBoxLayout()
+        import_world_btn = QPushButton("导入世界书...")
+        import_world_btn.clicked.connect(self.import_world_info)
+        export_world_btn = QPushButton("导出世界书...")
+        export_world_btn.clicked.connect(self.export_world_info)
+        world_button_layout.addWidget(import_world_btn)
+        world_button_layout.addWidget(export_world_btn)
+        replay_btn = QPushButton("回放聊天...")
+        replay_btn.setToolTip("用 SillyTavern 聊天记录 (.jsonl) 回放，统计各条目的激活情况")
+        replay_btn.clicked.connect(self.replay_chat)
+        world_button_layout.addWidget(replay_btn)
+        graph_btn = QPushButton("触发关系...")
+        graph_btn.setToolTip("开启递归扫描时条目内容触发其他条目的关系：相互触发、触发链和无法激活的条目")
+        graph_btn.clicked.connect(self.show_trigger_graph)
+        world_button_layout.addWidget(graph_btn)
+        left_layout.addLayout(world_button_layout)
+
+        # 冗余分析：近似重复内容与关键字重叠
+        analysis_group = QGroupBox("冗余分析")
+        analysis_layout = QVBoxLayout(analysis_group)
+        analysis_button_layout = QHBoxLayout()
+        analyze_btn = QPushButton("分析")
+        analyze_btn.clicked.connect(self.run_analysis)
+        self.auto_analysis_checkbox = QCheckBox("自动更新")
+        analysis_button_layout.addWidget(analyze_btn)
+        analysis_button_layout.addWidget(self.auto_analysis_checkbox)
+        analysis_layout.addLayout(analysis_button_layout)
+        self.analysis_tree = QTreeWidget()
+        self.analysis_tree.setHeaderHidden(True)
+        self.analysis_tree.itemClicked.connect(self.on_analysis_item_clicked)
+        analysis_layout.addWidget(self.analysis_tree)
+        left_layout.addWidget(analysis_group)
+
+        # 条目变化后延迟触发增量分析
+        self.analysis_timer = QTimer(self)
+        self.analysis_timer.setSingleShot(True)
+        self.analysis_timer.setInterval(500)
+        self.analysis_timer.timeout.connect(self.run_analysis)
+        self.entry_edited.connect(self.schedule_analysis)
+        self.column_edited.connect(self.schedule_analysis)
+        self.entries_spliced.connect(self.schedule_analysis)
+
+        # 触发关系对话框打开时，条目变化后延迟增量更新
+        self.graph_timer = QTimer(self)
+        self.graph_timer.setSingleShot(True)
+        self.graph_timer.setInterval(300)
+        self.graph_timer.timeout.connect(self.refresh_trigger_graph)
+        self.entry_edited.connect(self.schedule_trigger_graph)
+        self.column_edited.connect(self.schedule_trigger_graph)
+        self.entries_spliced.connect(self.schedule_trigger_graph)
+        self.entry_changed.connect(self.schedule_trigger_graph)
+
         splitter.addWidget(left_widget)
 
-        # 右侧：条目编辑器
+        # 右侧：条目编辑器和表格视图
+        self.right_tabs = QTabWidget()
         self.entry_editor = BookEntryEditorWidget()
-        splitter.addWidget(self.entry_editor)
+        self.entry_editor.extensions_edited.connect(self.on_extensions_edited)
+        self.right_tabs.addTab(self.entry_editor, "条目")
+        self.table_view = LorebookTableWidget()
+        self.table_view.column_assigned.connect(self.set_column)
+        self.table_view.entry_activated.connect(self.show_entry)
+        self.entry_changed.connect(self.table_view.refresh_row)
+        self.entries_spliced.connect(self.table_view.splice_entries)
+        self.right_tabs.addTab(self.table_view, "表格")
+        splitter.addWidget(self.right_tabs)
 
         splitter.setStretchFactor(0, 1)
         splitter.setStretchFactor(1, 3)
 
     def load_book(self, book_data: Optional[Dict[str, Any]]):
         """加载世界书数据"""
-        self.book_data = book_data or {"name": "", "entries": []}
+        self.book_data = book_data or {"name": "", "extensions": {}, "entries": []}
         self.name_edit.setText(self.book_data.get("name", ""))
+        self.entry_diagnostics = {}
+        self.table_view.set_entries(self.book_data.setdefault("entries", []))
+        # 分析结果中的行号属于之前加载的世界书
+        self.analysis_tree.clear()
         self.refresh_entry_list()
+        self.editing_row = -1
+        self.entry_editor.load_entry({})
+        self._mark_editor()
+        self.schedule_trigger_graph()
 
     def refresh_entry_list(self):
         """刷新条目列表"""
-        self.entry_list.clear()
-        for i, entry in enumerate(self.book_data.get("entries", [])):
-            comment = entry.get("comment", f"条目 {i+1}")
-            item = QListWidgetItem(comment)
-            self.entry_list.addItem(item)
-
-    def on_entry_selected(self, item: QListWidgetItem):
-        """当一个条目被选中时"""
+        # 重建列表引起的当前行变化不是用户选择
+        with QSignalBlocker(self.entry_list):
+            self.entry_list.clear()
+            for i, entry in enumerate(self.book_data.get("entries", [])):
+                item = QListWidgetItem(self._entry_title(entry, i))
+                self.entry_list.addItem(item)
+
+    def _entry_title(self, entry: Dict[str, Any], row: int) -> str:
+        return entry.get("comment", f"条目 {row + 1}")
+
+    def on_current_row_changed(self, row: int):
+        """列表的当前行变化时（点击或方向键）切换编辑的条目"""
+        if row == self.editing_row:
+            return
         # 保存当前正在编辑的条目
         self.save_current_entry()
-        
-        row = self.entry_list.row(item)
         if 0 <= row < len(self.book_data.get("entries", [])):
-            entry_data = self.book_data["entries"][row]
-            self.entry_editor.load_entry(entry_data)
+            self.load_entry_row(row)
+
+    def load_entry_row(self, row: int):
+        """将指定行的条目加载到编辑器"""
+        self.editing_row = row
+        self.entry_editor.load_entry(self.book_data["entries"][row])
+        self._mark_editor()
+        if self.trigger_dialog is not None and self.trigger_dialog.isVisible():
+            # 可能由点击对话框中的条目引起，等点击处理完再重建“当前条目”一栏
+            QTimer.singleShot(0, self._show_current_trigger)
+
+    def _show_current_trigger(self):
+        # 图正在更新时不读取，更新完成后会一并显示当前条目
+        if not self._graph_busy:
+            self.trigger_dialog.show_current(self.editing_row)
+
+    def _flatten_entry(self, entry: Dict[str, Any]) -> Dict[Tuple[str, ...], Any]:
+        """将条目展开为 {字段路径: 值}，extensions 展开一层；列表值做浅拷贝（整条更新时计算字段级差异）"""
+        flat: Dict[Tuple[str, ...], Any] = {}
+        for key, value in entry.items():
+            if key == "extensions" and isinstance(value, dict):
+                for ext_key, ext_value in value.items():
+                    flat[("extensions", ext_key)] = ext_value.copy() if isinstance(ext_value, list) else ext_value
+            else:
+                flat[(key,)] = value.copy() if isinstance(value, list) else value
+        return flat
 
     def save_current_entry(self):
         """保存当前在编辑器中的条目"""
-        current_row = self.entry_list.currentRow()
+        current_row = self.editing_row
         if 0 <= current_row < len(self.book_data.get("entries", [])):
-            updated_data = self.entry_editor.get_entry_data()
-            self.book_data["entries"][current_row] = updated_data
-            # 更新列表中的显示文本
-            item = self.entry_list.item(current_row)
-            if item:
-                item.setText(updated_data.get("comment", f"条目 {current_row + 1}"))
+            # 编辑器直接写入条目，只返回用户修改过且值确实变化的字段
+            changes = self.entry_editor.commit_changes()
+            if not changes:
+                return
+            self.entry_edited.emit(current_row, changes)
+            self.entry_changed.emit(current_row)
+            if ("comment",) in changes:
+                # 更新列表中的显示文本
+                item = self.entry_list.item(current_row)
+                if item:
+                    item.setText(self._entry_title(self.book_data["entries"][current_row], current_row))
+
+    def apply_entry_changes(self, row: int, values: Dict[Tuple[str, ...], Any]):
+        """将字段值写回指定条目（撤销/重做时使用），只在该条目正在编辑时刷新编辑器"""
+        entry = self.book_data["entries"][row]
+        for path, value in values.items():
+            target = entry
+            for key in path[:-1]:
+                # extensions 树中的修改路径可以深入到嵌套的对象和数组
+                target = target[key] if isinstance(target, list) else target.setdefault(key, {})
+            if value is MISSING:
+                target.pop(path[-1], None)
+            else:
+                target[path[-1]] = value.copy() if isinstance(value, (list, dict)) else value
+        item = self.entry_list.item(row)
+        if item:
+            item.setText(self._entry_title(entry, row))
+        if row == self.editing_row:
+            self._reload_editor(values)
+        self.entry_changed.emit(row)
+
+    def _reload_editor(self, paths: Iterable[Tuple[str, ...]]):
+        """正在编辑的条目被编辑器以外的操作修改后刷新编辑器（只有值变化了的控件会被重新写入）"""
+        self.entry_editor.load_entry(self.book_data["entries"][self.editing_row])
+        if any(len(path) > 1 and path[0] == "extensions" and path[1] not in FORM_EXTENSION_KEYS
+               for path in paths):
+            self.entry_editor.refresh_extensions()
+
+    def set_column(self, path: Tuple[str, ...], rows: List[int], values: List[Any]):
+        """把 values 写入各行条目的 path 字段，作为一次修改记录"""
+        self.save_current_entry()
+        entries = self.book_data.get("entries", [])
+        rows = [row for row in rows if 0 <= row < len(entries)]
+        if not rows:
+            return
+        old = write_column(entries, path, rows, values)
+        self._column_written(path, rows)
+        self.column_edited.emit(path, rows, old, list(values))
+
+    def apply_column_values(self, path: Tuple[str, ...], rows: List[int], values: List[Any]):
+        """将一列的值写回各条目（撤销/重做时使用）"""
+        write_column(self.book_data["entries"], path, rows, values)
+        self._column_written(path, rows)
+
+    def _column_written(self, path: Tuple[str, ...], rows: List[int]):
+        if path == ("comment",):
+            for row in rows:
+                item = self.entry_list.item(row)
+                if item:
+                    item.setText(self._entry_title(self.book_data["entries"][row], row))
+        if self.editing_row in rows:
+            self._reload_editor([path])
+        for row in rows:
+            self.entry_changed.emit(row)
+
+    def show_entry(self, row: int):
+        """在条目编辑器中打开指定行的条目"""
+        self.right_tabs.setCurrentWidget(self.entry_editor)
+        self.select_entry_row(row)
+
+    def on_extensions_edited(self, path: Tuple[Any, ...], old: Any, new: Any):
+        """条目编辑器的扩展数据树已直接修改了条目，记录这一处修改"""
+        row = self.editing_row
+        if not 0 <= row < len(self.book_data.get("entries", [])):
+            return
+        self.entry_edited.emit(row, {path: (old, new)})
+        self.entry_changed.emit(row)
+
+    def update_entry(self, row: int, new_entry: Dict[str, Any]):
+        """把指定条目更新为 new_entry（只写入有变化的字段，new_entry 中没有的字段被删除）"""
+        old_flat = self._flatten_entry(self.book_data["entries"][row])
+        new_flat = self._flatten_entry(new_entry)
+        changes = {
+            path: (old_flat.get(path, MISSING), value)
+            for path, value in new_flat.items()
+            if old_flat.get(path, MISSING) != value
+        }
+        changes.update({path: (value, MISSING) for path, value in old_flat.items() if path not in new_flat})
+        if changes:
+            self.apply_entry_changes(row, {path: new for path, (old, new) in changes.items()})
+            self.entry_edited.emit(row, changes)
+
+    def splice_entries(self, row: int, count: int, entries: List[Dict[str, Any]]):
+        """用 entries 替换从 row 开始的 count 个条目，只更新受影响的列表行"""
+        book_entries = self.book_data.setdefault("entries", [])
+        removed = book_entries[row:row + count]
+        book_entries[row:row + count] = entries
+        with QSignalBlocker(self.entry_list):
+            for _ in range(count):
+                self.entry_list.takeItem(row)
+            for offset, entry in enumerate(entries):
+                self.entry_list.insertItem(row + offset, self._entry_title(entry, row + offset))
+
+        # 修正正在编辑的行号
+        if row <= self.editing_row < row + count:
+            self.editing_row = -1
+            self.entry_editor.load_entry({})
+            self._mark_editor()
+        elif self.editing_row >= row + count:
+            self.editing_row += len(entries) - count
+        self.entries_spliced.emit(row, removed, list(entries))
 
     def add_entry(self):
         """添加一个新条目"""
         self.save_current_entry() # 保存上一个
         
         new_entry = self.get_default_entry()
-        if "entries" not in self.book_data:
-            self.book_data["entries"] = []
-        self.book_data["entries"].append(new_entry)
+        row = len(self.book_data.get("entries", []))
+        self.splice_entries(row, 0, [new_entry])
         
-        self.refresh_entry_list()
-        self.entry_list.setCurrentRow(len(self.book_data["entries"]) - 1)
-        self.entry_editor.load_entry(new_entry)
+        self.select_entry_row(row)
 
     def remove_entry(self):
         """删除选中的条目"""
         current_row = self.entry_list.currentRow()
         if 0 <= current_row < len(self.book_data.get("entries", [])):
-            del self.book_data["entries"][current_row]
-            self.refresh_entry_list()
-            # 清空编辑器
-            self.entry_editor.load_entry({})
+            self.save_current_entry()
+            self.splice_entries(current_row, 1, [])
+            # 接着编辑移到该位置的条目
+            self.select_entry_row(self.entry_list.currentRow())
+
+    def import_world_info(self):
+        """导入 SillyTavern 世界书文件，按 uid 与现有条目合并"""
+        file_path, _ = QFileDialog.getOpenFileName(
+            self, "导入 SillyTavern 世界书", "", "JSON files (*.json);;All files (*.*)"
+        )
+        if not file_path:
+            return
+        self.save_current_entry()
+        entries = self.book_data.setdefault("entries", [])
+        try:
+            with open(file_path, 'r', encoding='utf-8') as f:
+                updates, appended = merge_world_into_book(entries, iter_world_entries(f))
+        except Exception as e:
+            QMessageBox.warning(self, "错误", f"导入世界书失败: {str(e)}")
+            return
+
+        self.batch_started.emit("导入世界书")
+        for row, entry in updates:
+            self.update_entry(row, entry)
+        if appended:
+            self.splice_entries(len(entries), 0, appended)
+        self.batch_finished.emit()
+        if not self.name_edit.text():
+            self.name_edit.setText(os.path.splitext(os.path.basename(file_path))[0])
+        QMessageBox.information(self, "导入完成", f"更新 {len(updates)} 个条目，新增 {len(appended)} 个条目")
+
+    def export_world_info(self):
+        """将当前世界书导出为 SillyTavern 世界书文件"""
+        file_path, _ = QFileDialog.getSaveFileName(
+            self, "导出 SillyTavern 世界书", f"{self.name_edit.text() or 'world'}.json",
+            "JSON files (*.json);;All files (*.*)"
+        )
+        if not file_path:
+            return
+        try:
+            with open(file_path, 'w', encoding='utf-8') as f:
+                count = write_world(iter(self.get_book_data().get("entries", [])), f)
+        except Exception as e:
+            QMessageBox.warning(self, "错误", f"导出世界书失败: {str(e)}")
+            return
+        QMessageBox.information(self, "导出完成", f"已导出 {count} 个条目")
+
+    def replay_chat(self):
+        """用聊天记录回放当前世界书，在对话框中显示各条目的激活统计"""
+        file_path, _ = QFileDialog.getOpenFileName(
+            self, "选择 SillyTavern 聊天记录", "", "Chat files (*.jsonl);;All files (*.*)"
+        )
+        if not file_path:
+            return
+        dialog = ChatReplayDialog(self.get_book_data(), self.macro_context, file_path, self)
+        dialog.entry_requested.connect(self.select_entry_row)
+        dialog.setAttribute(Qt.WidgetAttribute.WA_DeleteOnClose)
+        dialog.show()
+
+    def set_entry_diagnostics(self, diagnostics: Dict[int, List[Diagnostic]]):
+        """在条目列表和条目编辑器中标出校验问题"""
+        previous, self.entry_diagnostics = self.entry_diagnostics, diagnostics
+        for row in set(previous) | set(diagnostics):
+            item = self.entry_list.item(row)
+            if item is None:
+                continue
+            row_diagnostics = diagnostics.get(row)
+            if row_diagnostics:
+                has_error = any(d.severity == ERROR for d in row_diagnostics)
+                item.setForeground(QColor(ERROR_COLOR if has_error else WARNING_COLOR))
+                item.setToolTip("\n".join(d.message for d in row_diagnostics))
+            else:
+                item.setData(Qt.ItemDataRole.ForegroundRole, None)
+                item.setToolTip("")
+        self._mark_editor()
+
+    def _mark_editor(self):
+        """在编辑器的字段上标出当前条目的校验问题"""
+        messages: Dict[str, List[str]] = {}
+        errors: Dict[str, bool] = {}
+        for diagnostic in self.entry_diagnostics.get(self.editing_row, []):
+            field_path = diagnostic.path[len(ENTRIES_PATH) + 1:]
+            if field_path:
+                messages.setdefault(field_path[0], []).append(diagnostic.message)
+                errors[field_path[0]] = errors.get(field_path[0], False) or diagnostic.severity == ERROR
+        self.entry_editor.set_diagnostics(messages, errors)
+
+    def select_entry_row(self, row: int):
+        """选中并加载指定行的条目"""
+        if 0 <= row < len(self.book_data.get("entries", [])):
+            self.entry_list.setCurrentRow(row)
+            # 列表的当前行没有变化时（如刚删除了正在编辑的条目）不会发出信号
+            self.on_current_row_changed(row)
+
+    def schedule_analysis(self, *args):
+        """条目变化后，若开启了自动更新则延迟重新分析"""
+        if self.auto_analysis_checkbox.isChecked():
+            self.analysis_timer.start()
+
+    def run_analysis(self):
+        """分析近似重复的条目内容和相互遮蔽的关键字，结果显示在侧栏"""
+        self.save_current_entry()
+        entries = self.book_data.get("entries", [])
+        result = self.analyzer.analyze(entries)
+
+        self.analysis_tree.clear()
+        duplicates_root = QTreeWidgetItem([f"近似重复内容 ({len(result.duplicate_clusters)} 组)"])
+        for number, rows in enumerate(result.duplicate_clusters, 1):
+            group_item = QTreeWidgetItem([f"组 {number}: {len(rows)} 个条目"])
+            for row in rows:
+                group_item.addChild(self._analysis_entry_item(entries, row))
+            duplicates_root.addChild(group_item)
+
+        overlaps_root = QTreeWidgetItem([f"关键字重叠 ({len(result.key_overlaps)})"])
+        kind_names = {"same": "相同", "prefix": "前缀", "substring": "子串"}
+        for overlap in result.key_overlaps[:MAX_OVERLAP_ITEMS]:
+            if overlap.kind == "same":
+                text = f"“{overlap.key}” 被 {len(overlap.rows)} 个条目同时使用"
+                rows = overlap.rows
+            else:
+                text = f"“{overlap.key}” 是 “{overlap.other_key}” 的{kind_names[overlap.kind]}"
+                rows = overlap.rows + [row for row in overlap.other_rows if row not in overlap.rows]
+            overlap_item = QTreeWidgetItem([text])
+            for row in rows:
+                overlap_item.addChild(self._analysis_entry_item(entries, row))
+            overlaps_root.addChild(overlap_item)
+
+        self.analysis_tree.addTopLevelItem(duplicates_root)
+        self.analysis_tree.addTopLevelItem(overlaps_root)
+        duplicates_root.setExpanded(True)
+
+    def show_trigger_graph(self):
+        """打开条目触发关系对话框"""
+        if self.trigger_dialog is None:
+            self.trigger_dialog = TriggerGraphDialog(self)
+            self.trigger_dialog.entry_requested.connect(self.select_entry_row)
+            self.trigger_dialog.refresh_requested.connect(self.refresh_trigger_graph)
+        self.refresh_trigger_graph()
+        self.trigger_dialog.show()
+        self.trigger_dialog.raise_()
+
+    def schedule_trigger_graph(self, *args):
+        if self.trigger_dialog is not None and self.trigger_dialog.isVisible():
+            self.graph_timer.start()
+
+    def refresh_trigger_graph(self):
+        """在后台把触发关系同步到当前条目（只重新扫描变化涉及的条目），完成后显示"""
+        if self._graph_busy:
+            self._graph_pending = True
+            return
+        self.save_current_entry()
+        if self._graph_thread is None:
+            self._graph_thread = QThread(self)
+            self._graph_worker = _GraphWorker(self.trigger_graph)
+            self._graph_worker.moveToThread(self._graph_thread)
+            self._graph_requested.connect(self._graph_worker.run)
+            self._graph_worker.finished.connect(self.on_trigger_graph_updated)
+            self._graph_worker.failed.connect(self.on_trigger_graph_failed)
+            self._graph_thread.start()
+        self._graph_busy = True
+        self.trigger_dialog.show_pending()
+        self._graph_requested.emit(self.graph_snapshots.take(self.book_data.get("entries", [])))
+
+    def on_trigger_graph_updated(self, report):
+        self._graph_busy = False
+        if self._graph_pending:
+            self._graph_pending = False
+            self.refresh_trigger_graph()
+            return
+        self.trigger_dialog.current_row = self.editing_row
+        self.trigger_dialog.show_graph(self.trigger_graph, report, bool(self.book_data.get("recursive_scanning")))
+
+    def on_trigger_graph_failed(self, message: str):
+        self._graph_busy = False
+        self._graph_pending = False
+        self.trigger_dialog.summary_label.setText(f"分析触发关系失败: {message}")
+
+    def shutdown(self):
+        """停止触发关系的工作线程"""
+        if self._graph_thread is not None:
+            self._graph_thread.quit()
+            self._graph_thread.wait()
+            self._graph_thread = None
+
+    def _analysis_entry_item(self, entries: List[Dict[str, Any]], row: int) -> QTreeWidgetItem:
+        item = QTreeWidgetItem([self._entry_title(entries[row], row)])
+        item.setData(0, Qt.ItemDataRole.UserRole, row)
+        return item
+
+    def on_analysis_item_clicked(self, item: QTreeWidgetItem, column: int):
+        """点击分析结果中的条目时跳转到该条目"""
+        row = item.data(0, Qt.ItemDataRole.UserRole)
+        if row is not None:
+            self.select_entry_row(row)
 
     def get_book_data(self) -> Dict[str, Any]:
         """获取完整的世界书数据"""
@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+ChatReplayDialog.py
+聊天记录回放对话框：在后台线程中回放 SillyTavern 聊天文件，显示各条目的激活统计
+"""
+
+import copy
+import os
+from typing import Any, Dict, List, Optional
+
+from PySide6.QtWidgets import (
+    QDialog, QVBoxLayout, QHBoxLayout, QLabel, QProgressBar, QPushButton,
+    QTableWidget, QTableWidgetItem, QHeaderView, QAbstractItemView, QWidget
+)
+from PySide6.QtCore import Qt, QObject, QThread, Signal
+
+from chat_replay import ChatReplay, ReplayReport, entry_title
+from macros import MacroContext
+
+
+class _ReplayWorker(QObject):
+    """在工作线程中回放聊天文件"""
+
+    progress = Signal(int)
+    finished = Signal(object)  # ReplayReport
+    failed = Signal(str)
+
+    def __init__(self, book: Dict[str, Any], context: Optional[MacroContext], path: str):
+        super().__init__()
+        self.book = book
+        self.context = context
+        self.path = path
+        self.cancelled = False
+
+    def run(self):
+        # 任何异常都要回报界面线程，否则对话框会一直停在“正在回放”
+        try:
+            with open(self.path, 'rb') as f:
+                report = ChatReplay(self.book, self.context).run(
+                    f, on_progress=self.progress.emit, should_stop=lambda: self.cancelled)
+        except OSError as e:
+            self.failed.emit(str(e))
+            return
+        except Exception as e:
+            self.failed.emit(f"聊天记录格式有误（{type(e).__name__}: {e}）")
+            return
+        self.finished.emit(report)
+
+
+class _NumberItem(QTableWidgetItem):
+    """按数值排序的单元格"""
+
+    def __init__(self, value: int):
+        super().__init__()
+        self.setData(Qt.ItemDataRole.DisplayRole, value)
+
+
+class ChatReplayDialog(QDialog):
+    """聊天回放结果"""
+
+    # 双击结果中的条目，参数为行号
+    entry_requested = Signal(int)
+
+    def __init__(self, book: Dict[str, Any], context: Optional[MacroContext], path: str,
+                 parent: Optional[QWidget] = None):
+        super().__init__(parent)
+        self.setWindowTitle(f"聊天回放 - {os.path.basename(path)}")
+        self.setMinimumSize(700, 500)
+        self.entries: List[Dict[str, Any]] = copy.deepcopy(book.get("entries", []))
+        replay_book = {
+            "entries": self.entries,
+            "scan_depth": book.get("scan_depth"),
+            "recursive_scanning": book.get("recursive_scanning"),
+        }
+        self.setup_ui(os.path.getsize(path) if os.path.exists(path) else 0)
+
+        self._thread = QThread(self)
+        self._worker = _ReplayWorker(replay_book, context, path)
+        self._worker.moveToThread(self._thread)
+        self._thread.started.connect(self._worker.run)
+        self._worker.progress.connect(self.progress_bar.setValue)
+        self._worker.finished.connect(self.show_report)
+        self._worker.failed.connect(self.show_error)
+        self._thread.start()
+
+    def setup_ui(self, file_size: int):
+        """设置UI"""
+        layout = QVBoxLayout(self)
+
+        self.progress_bar = QProgressBar()
+        self.progress_bar.setRange(0, max(file_size, 1))
+        layout.addWidget(self.progress_bar)
+
+        self.summary_label = QLabel("正在回放...")
+        self.summary_label.setWordWrap(True)
+        layout.addWidget(self.summary_label)
+
+        self.table = QTableWidget(0, 5)
+        self.table.setHorizontalHeaderLabels(["条目", "激活次数", "首次", "末次", "token"])
+        self.table.horizontalHeader().setSectionResizeMode(0, QHeaderView.ResizeMode.Stretch)
+        self.table.setEditTriggers(QAbstractItemView.EditTrigger.NoEditTriggers)
+        self.table.setSelectionBehavior(QAbstractItemView.SelectionBehavior.SelectRows)
+        self.table.itemDoubleClicked.connect(self.on_item_double_clicked)
+        layout.addWidget(self.table)
+
+        button_layout = QHBoxLayout()
+        button_layout.addStretch()
+        self.close_btn = QPushButton("停止")
+        self.close_btn.clicked.connect(self.reject)
+        button_layout.addWidget(self.close_btn)
+        layout.addLayout(button_layout)
+
+    def show_report(self, report: ReplayReport):
+        """显示回放统计；从未激活的条目排在最后"""
+        self._finish()
+        rate = report.turns / report.elapsed if report.elapsed else 0.0
+        status = "已停止" if report.cancelled else "完成"
+        self.summary_label.setText(
+            f"{status}：回放 {report.turns} 条消息（{rate:.0f} 条/秒），"
+            f"激活过 {len(report.stats)} / {len(self.entries)} 个条目，世界书共占用约 {report.tokens} token"
+            + (f"，跳过 {report.skipped} 行无法解析的记录" if report.skipped else "")
+        )
+        rows = [row for row, _ in report.sorted_stats()]
+        rows += [row for row in range(len(self.entries)) if row not in report.stats]
+        self.table.setSortingEnabled(False)
+        self.table.setRowCount(len(rows))
+        for table_row, row in enumerate(rows):
+            title = QTableWidgetItem(f"[{row + 1}] {entry_title(self.entries[row], row)}")
+            title.setData(Qt.ItemDataRole.UserRole, row)
+            self.table.setItem(table_row, 0, title)
+            stats = report.stats.get(row)
+            values = (stats.fires, stats.first_turn, stats.last_turn, stats.tokens) if stats else (0, 0, 0, 0)
+            for column, value in enumerate(values, 1):
+                self.table.setItem(table_row, column, _NumberItem(value))
+        self.table.setSortingEnabled(True)
+        self.table.sortItems(1, Qt.SortOrder.DescendingOrder)
+
+    def show_error(self, message: str):
+        self._finish()
+        self.summary_label.setText(f"回放失败: {message}")
+
+    def _finish(self):
+        self.progress_bar.setValue(self.progress_bar.maximum())
+        self.close_btn.setText("关闭")
+        self._thread.quit()
+
+    def on_item_double_clicked(self, item: QTableWidgetItem):
+        row = self.table.item(item.row(), 0).data(Qt.ItemDataRole.UserRole)
+        if row is not None:
+            self.entry_requested.emit(row)
+
+    def done(self, result: int):
+        # 关闭对话框时停止回放并等待工作线程退出
+        self._worker.cancelled = True
+        self._thread.quit()
+        self._thread.wait()
+        super().done(result)
@@ -0,0 +1,290 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+FindReplaceDialog.py
+查找和替换对话框：在当前角色卡或整个角色卡库中查找，先预览全部匹配再替换
+"""
+
+import os
+import re
+from typing import Any, Callable, Dict, List, Optional
+
+from PySide6.QtWidgets import (
+    QDialog, QVBoxLayout, QHBoxLayout, QGridLayout, QLabel, QLineEdit, QCheckBox, QComboBox,
+    QPushButton, QTreeWidget, QTreeWidgetItem, QMessageBox, QFileDialog, QWidget
+)
+from PySide6.QtCore import Qt, QObject, QThread, Signal
+
+from card_search import FileResult, SearchOptions, find_matches, iter_card_files, search_library
+from card_validation import format_path
+
+# 预览中最多列出的匹配数
+MAX_PREVIEW_MATCHES = 2000
+
+SCOPE_CARD = 0
+SCOPE_LIBRARY = 1
+
+
+class _LibraryWorker(QObject):
+    """在工作线程中驱动进程池处理角色卡库"""
+
+    result = Signal(object)  # FileResult
+    finished = Signal()
+    failed = Signal(str)
+
+    def __init__(self, files: List[str], options: SearchOptions, replace: bool):
+        super().__init__()
+        self.files = files
+        self.options = options
+        self.replace = replace
+        self.cancelled = False
+
+    def run(self):
+        try:
+            search_library(self.files, self.options, self.replace,
+                           on_result=self.result.emit, should_stop=lambda: self.cancelled)
+        except Exception as e:
+            self.failed.emit(str(e))
+            return
+        self.finished.emit()
+
+
+class FindReplaceDialog(QDialog):
+    """查找和替换"""
+
+    # 请求在当前角色卡中全部替换
+    replace_requested = Signal(object)  # SearchOptions
+    # 双击当前角色卡中的匹配，参数为字段路径
+    path_requested = Signal(tuple)
+
+    def __init__(self, card_provider: Callable[[], Dict[str, Any]],
+                 open_files: Callable[[], List[str]], parent: Optional[QWidget] = None):
+        super().__init__(parent)
+        self.setWindowTitle("查找和替换")
+        self.setMinimumSize(760, 520)
+        self.card_provider = card_provider
+        self.open_files = open_files
+        self._thread: Optional[QThread] = None
+        self._worker: Optional[_LibraryWorker] = None
+        self._total = 0
+        self.setup_ui()
+
+    def setup_ui(self):
+        """设置UI"""
+        layout = QVBoxLayout(self)
+
+        form = QGridLayout()
+        form.addWidget(QLabel("查找:"), 0, 0)
+        self.find_edit = QLineEdit()
+        self.find_edit.returnPressed.connect(self.find)
+        form.addWidget(self.find_edit, 0, 1)
+        form.addWidget(QLabel("替换为:"), 1, 0)
+        self.replace_edit = QLineEdit()
+        self.replace_edit.setPlaceholderText("正则模式下可用 \\1、\\g<name> 引用分组")
+        form.addWidget(self.replace_edit, 1, 1)
+        layout.addLayout(form)
+
+        options_layout = QHBoxLayout()
+        self.regex_check = QCheckBox("正则表达式")
+        self.case_check = QCheckBox("区分大小写")
+        self.case_check.setChecked(True)
+        self.word_check = QCheckBox("全词匹配")
+        options_layout.addWidget(self.regex_check)
+        options_layout.addWidget(self.case_check)
+        options_layout.addWidget(self.word_check)
+        options_layout.addStretch()
+        layout.addLayout(options_layout)
+
+        scope_layout = QHBoxLayout()
+        scope_layout.addWidget(QLabel("范围:"))
+        self.scope_combo = QComboBox()
+        self.scope_combo.addItems(["当前角色卡", "角色卡库目录"])
+        self.scope_combo.currentIndexChanged.connect(self.on_scope_changed)
+        scope_layout.addWidget(self.scope_combo)
+        self.directory_edit = QLineEdit()
+        self.directory_edit.setPlaceholderText("包含角色卡 JSON 的目录（含子目录）")
+        scope_layout.addWidget(self.directory_edit)
+        self.browse_btn = QPushButton("浏览...")
+        self.browse_btn.clicked.connect(self.browse_directory)
+        scope_layout.addWidget(self.browse_btn)
+        layout.addLayout(scope_layout)
+
+        self.summary_label = QLabel("")
+        self.summary_label.setWordWrap(True)
+        layout.addWidget(self.summary_label)
+
+        self.result_tree = QTreeWidget()
+        self.result_tree.setHeaderLabels(["位置", "匹配", "替换为"])
+        self.result_tree.setColumnWidth(0, 240)
+        self.result_tree.setColumnWidth(1, 340)
+        self.result_tree.itemDoubleClicked.connect(self.on_item_double_clicked)
+        layout.addWidget(self.result_tree)
+
+        button_layout = QHBoxLayout()
+        button_layout.addStretch()
+        self.find_btn = QPushButton("查找")
+        self.find_btn.clicked.connect(self.find)
+        self.replace_btn = QPushButton("全部替换")
+        self.replace_btn.clicked.connect(self.replace_all)
+        self.stop_btn = QPushButton("停止")
+        self.stop_btn.clicked.connect(self.stop)
+        close_btn = QPushButton("关闭")
+        close_btn.clicked.connect(self.close)
+        for button in (self.find_btn, self.replace_btn, self.stop_btn, close_btn):
+            button_layout.addWidget(button)
+        layout.addLayout(button_layout)
+
+        self.on_scope_changed(SCOPE_CARD)
+        self._set_running(False)
+
+    def options(self) -> SearchOptions:
+        return SearchOptions(self.find_edit.text(), self.replace_edit.text(), self.regex_check.isChecked(),
+                             self.case_check.isChecked(), self.word_check.isChecked())
+
+    def on_scope_changed(self, scope: int):
+        library = scope == SCOPE_LIBRARY
+        self.directory_edit.setEnabled(library)
+        self.browse_btn.setEnabled(library)
+        self.result_tree.clear()
+        self.summary_label.clear()
+
+    def browse_directory(self):
+        directory = QFileDialog.getExistingDirectory(self, "选择角色卡库目录", self.directory_edit.text())
+        if directory:
+            self.directory_edit.setText(directory)
+
+    def _valid_options(self) -> Optional[SearchOptions]:
+        """读取并检查查找参数，有误时提示并返回 None"""
+        options = self.options()
+        if not options.pattern:
+            QMessageBox.warning(self, "错误", "请输入查找内容")
+            return None
+        if options.regex:
+            try:
+                re.compile(options.pattern)
+            except re.error as e:
+                QMessageBox.warning(self, "错误", f"正则表达式无效: {e}")
+                return None
+        return options
+
+    def find(self):
+        """查找并预览全部匹配"""
+        options = self._valid_options()
+        if options is None:
+            return
+        if self.scope_combo.currentIndex() == SCOPE_LIBRARY:
+            self._run_library(options, replace=False)
+            return
+        self.result_tree.clear()
+        try:
+            count, matches = find_matches(self.card_provider(), options, MAX_PREVIEW_MATCHES)
+        except re.error as e:
+            QMessageBox.warning(self, "错误", f"替换文本无效: {e}")
+            return
+        for match in matches:
+            item = QTreeWidgetItem([format_path(match.path), match.context, match.replacement])
+            item.setData(0, Qt.ItemDataRole.UserRole, match.path)
+            self.result_tree.addTopLevelItem(item)
+        shown = f"（只列出前 {len(matches)} 处）" if len(matches) < count else ""
+        self.summary_label.setText(f"当前角色卡中共 {count} 处匹配{shown}")
+
+    def replace_all(self):
+        """全部替换：当前角色卡作为一步撤销，角色卡库直接写回文件"""
+        options = self._valid_options()
+        if options is None:
+            return
+        if self.scope_combo.currentIndex() == SCOPE_CARD:
+            self.replace_requested.emit(options)
+            self.find()
+            return
+        reply = QMessageBox.question(
+            self, "确认",
+            "将直接修改目录中的角色卡文件，且无法撤销。已在编辑器中打开的文件会被跳过。继续吗？",
+            QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No
+        )
+        if reply == QMessageBox.StandardButton.Yes:
+            self._run_library(options, replace=True)
+
+    def _run_library(self, options: SearchOptions, replace: bool):
+        directory = self.directory_edit.text()
+        if not os.path.isdir(directory):
+            QMessageBox.warning(self, "错误", "请选择角色卡库目录")
+            return
+        files = list(iter_card_files([directory]))
+        skipped = 0
+        if replace:
+            # 已打开的文件由编辑器保存，写回会与编辑器中的内容冲突
+            open_files = {os.path.normcase(os.path.abspath(path)) for path in self.open_files()}
+            kept = [path for path in files if os.path.normcase(os.path.abspath(path)) not in open_files]
+            skipped = len(files) - len(kept)
+            files = kept
+
+        self.result_tree.clear()
+        self._total = 0
+        self._files_done = 0
+        self._files_total = len(files)
+        self._replace = replace
+        self._skipped = skipped
+        self._set_running(True)
+        self._update_library_summary()
+
+        self._thread = QThread(self)
+        self._worker = _LibraryWorker(files, options, replace)
+        self._worker.moveToThread(self._thread)
+        self._thread.started.connect(self._worker.run)
+        self._worker.result.connect(self.add_file_result)
+        self._worker.finished.connect(self._finish)
+        self._worker.failed.connect(self.show_error)
+        self._thread.start()
+
+    def add_file_result(self, result: FileResult):
+        self._files_done += 1
+        if result.count or result.error:
+            item = QTreeWidgetItem([os.path.relpath(result.path, self.directory_edit.text()),
+                                    result.error or f"{result.count} 处匹配",
+                                    f"已替换 {result.replaced} 个字段" if result.replaced else ""])
+            for match in result.matches:
+                item.addChild(QTreeWidgetItem([format_path(match.path), match.context, match.replacement]))
+            self.result_tree.addTopLevelItem(item)
+        self._total += result.count
+        self._update_library_summary()
+
+    def _update_library_summary(self):
+        action = "替换" if self._replace else "查找"
+        text = f"{action}: 已处理 {self._files_done} / {self._files_total} 个文件，共 {self._total} 处匹配"
+        if self._skipped:
+            text += f"，跳过 {self._skipped} 个已打开的文件"
+        self.summary_label.setText(text)
+
+    def show_error(self, message: str):
+        self._finish()
+        self.summary_label.setText(f"处理失败: {message}")
+
+    def _finish(self):
+        if self._thread is not None:
+            self._thread.quit()
+            self._thread.wait()
+            self._thread = None
+            self._worker = None
+        self._set_running(False)
+
+    def _set_running(self, running: bool):
+        self.find_btn.setEnabled(not running)
+        self.replace_btn.setEnabled(not running)
+        self.stop_btn.setEnabled(running)
+
+    def stop(self):
+        if self._worker is not None:
+            self._worker.cancelled = True
+
+    def on_item_double_clicked(self, item: QTreeWidgetItem):
+        path = item.data(0, Qt.ItemDataRole.UserRole)
+        if path is not None:
+            self.path_requested.emit(tuple(path))
+
+    def done(self, result: int):
+        # 关闭对话框时停止处理并等待工作线程退出
+        self.stop()
+        self._finish()
+        super().done(result)
@@ -0,0 +1,442 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+JsonTreeWidget.py
+任意 JSON 数据（角色卡和世界书条目的 extensions）的树形编辑器。
+
+模型按需建立节点：展开某个节点时才为它的子项创建行，子项很多时分批加载，
+因此打开带有数 MB 扩展数据的角色卡不需要构建整棵树。节点只记住自己的路径，
+值总是从根数据按路径读取；修改直接写入原数据（只改动的那一处），
+并通过 value_edited(路径, 旧值, 新值) 通知撤销历史。增删、重命名键记录为所在容器的浅拷贝。
+"""
+
+import json
+from typing import Any, Collection, List, Optional, Tuple
+
+from PySide6.QtWidgets import (
+    QWidget, QVBoxLayout, QHBoxLayout, QTreeView, QPushButton, QMenu, QDialog,
+    QPlainTextEdit, QDialogButtonBox, QMessageBox, QHeaderView, QAbstractItemView
+)
+from PySide6.QtCore import Qt, QAbstractItemModel, QModelIndex, QPoint, Signal
+from PySide6.QtGui import QFont
+
+# 每次展开或滚动到底部时最多加载的子项数
+FETCH_BATCH = 500
+# 值列中字符串预览的长度；更长或多行的字符串通过“编辑...”对话框修改
+PREVIEW_CHARS = 200
+
+JsonPath = Tuple[Any, ...]
+
+_TYPE_NAMES = {dict: "对象", list: "数组", str: "字符串", bool: "布尔", int: "数字", float: "数字", type(None): "null"}
+
+
+class _Node:
+    """已展开的节点；只保存路径，不持有值"""
+
+    __slots__ = ("parent", "key", "row", "path", "children", "keys")
+
+    def __init__(self, parent: Optional["_Node"], key: Any, row: int):
+        self.parent = parent
+        self.key = key
+        self.row = row
+        self.path: JsonPath = (parent.path + (key,)) if parent is not None else ()
+        self.children: List[_Node] = []
+        # 对象的子键顺序，首次加载时记下
+        self.keys: Optional[List[Any]] = None
+
+
+def _is_container(value: Any) -> bool:
+    return isinstance(value, (dict, list))
+
+
+def _shallow_copy(value: Any) -> Any:
+    return value.copy() if _is_container(value) else value
+
+
+def _preview(value: Any) -> str:
+    if isinstance(value, dict):
+        return f"{{{len(value)} 项}}"
+    if isinstance(value, list):
+        return f"[{len(value)} 项]"
+    if isinstance(value, str):
+        text = value[:PREVIEW_CHARS].replace("\n", "⏎")
+        return text + ("…" if len(value) > PREVIEW_CHARS else "")
+    return json.dumps(value, ensure_ascii=False)
+
+
+def _inline_editable(value: Any) -> bool:
+    """能否直接在单元格中编辑（长文本和多行文本改用对话框）"""
+    if _is_container(value):
+        return False
+    return not isinstance(value, str) or (len(value) <= PREVIEW_CHARS and "\n" not in value)
+
+
+class JsonTreeModel(QAbstractItemModel):
+    """按需加载的 JSON 树模型，列为 键 / 值 / 类型"""
+
+    # 修改发生后发出 (路径, 旧值, 新值)；路径相对于根
+    value_edited = Signal(object, object, object)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._root_value: Any = {}
+        self._hidden: Collection[str] = ()
+        self._root = _Node(None, None, 0)
+
+    # ---------- 数据 ----------
+
+    def set_root(self, value: Any, hidden_keys: Collection[str] = ()):
+        """绑定要编辑的数据；hidden_keys 中的顶层键由其他控件编辑，不在树中显示"""
+        self.beginResetModel()
+        self._root_value = value
+        self._hidden = frozenset(hidden_keys)
+        self._root = _Node(None, None, 0)
+        self.endResetModel()
+
+    def root_value(self) -> Any:
+        return self._root_value
+
+    def value_at(self, path: JsonPath) -> Any:
+        value = self._root_value
+        for key in path:
+            value = value[key]
+        return value
+
+    def set_path(self, path: JsonPath, value: Any):
+        """把 path 处的值设为 value 的浅拷贝（撤销/重做时使用，不发出 value_edited）"""
+        if not path:
+            # 根对象被外部引用，原地替换内容
+            if isinstance(self._root_value, dict):
+                self._root_value.clear()
+                self._root_value.update(value)
+            else:
+                self._root_value[:] = value
+        else:
+            self.value_at(path[:-1])[path[-1]] = _shallow_copy(value)
+        node = self._find_node(path)
+        if node is not None:
+            self._refresh(node)
+
+    def replace_path(self, path: JsonPath, value: Any):
+        """从外部整体替换 path 处的值，并作为一次修改发出 value_edited"""
+        old = _shallow_copy(self.value_at(path))
+        self.set_path(path, value)
+        self.value_edited.emit(path, old, _shallow_copy(value))
+
+    def _node(self, index: QModelIndex) -> _Node:
+        return index.internalPointer() if index.isValid() else self._root
+
+    def _node_index(self, node: _Node, column: int = 0) -> QModelIndex:
+        return QModelIndex() if node is self._root else self.createIndex(node.row, column, node)
+
+    def _child_keys(self, node: _Node, value: Any) -> List[Any]:
+        if node.keys is None:
+            keys = list(value)
+            if node is self._root and self._hidden:
+                keys = [key for key in keys if key not in self._hidden]
+            node.keys = keys
+        return node.keys
+
+    def _child_count(self, node: _Node) -> int:
+        value = self.value_at(node.path)
+        if isinstance(value, dict):
+            return len(self._child_keys(node, value))
+        if isinstance(value, list):
+            return len(value)
+        return 0
+
+    def _find_node(self, path: JsonPath) -> Optional[_Node]:
+        """已加载的节点，未展开到该处时返回 None"""
+        node = self._root
+        for key in path:
+            node = next((child for child in node.children if child.key == key), None)
+            if node is None:
+                return None
+        return node
+
+    def _refresh(self, node: _Node):
+        """节点的值被整体替换或结构变化后，丢弃已加载的子行并重新加载第一批"""
+        index = self._node_index(node)
+        loaded = bool(node.children)
+        if node.children:
+            self.beginRemoveRows(index, 0, len(node.children) - 1)
+            node.children = []
+            self.endRemoveRows()
+        node.keys = None
+        if node is not self._root:
+            self.dataChanged.emit(index, self._node_index(node, 2))
+        if loaded or node is self._root:
+            self.fetchMore(index)
+
+    # ---------- QAbstractItemModel ----------
+
+    def index(self, row: int, column: int, parent: QModelIndex = QModelIndex()) -> QModelIndex:
+        node = self._node(parent)
+        if 0 <= row < len(node.children) and 0 <= column < 3:
+            return self.createIndex(row, column, node.children[row])
+        return QModelIndex()
+
+    def parent(self, index: QModelIndex) -> QModelIndex:
+        if not index.isValid():
+            return QModelIndex()
+        return self._node_index(index.internalPointer().parent)
+
+    def rowCount(self, parent: QModelIndex = QModelIndex()) -> int:
+        if parent.column() > 0:
+            return 0
+        return len(self._node(parent).children)
+
+    def columnCount(self, parent: QModelIndex = QModelIndex()) -> int:
+        return 3
+
+    def hasChildren(self, parent: QModelIndex = QModelIndex()) -> bool:
+        if parent.column() > 0:
+            return False
+        node = self._node(parent)
+        return bool(node.children) or self._child_count(node) > 0
+
+    def canFetchMore(self, parent: QModelIndex) -> bool:
+        node = self._node(parent)
+        return len(node.children) < self._child_count(node)
+
+    def fetchMore(self, parent: QModelIndex):
+        node = self._node(parent)
+        value = self.value_at(node.path)
+        total = self._child_count(node)
+        first = len(node.children)
+        last = min(first + FETCH_BATCH, total) - 1
+        if last < first:
+            return
+        keys = self._child_keys(node, value) if isinstance(value, dict) else None
+        self.beginInsertRows(parent, first, last)
+        for row in range(first, last + 1):
+            node.children.append(_Node(node, keys[row] if keys is not None else row, row))
+        self.endInsertRows()
+
+    def headerData(self, section: int, orientation: Qt.Orientation, role: int = Qt.ItemDataRole.DisplayRole) -> Any:
+        if orientation == Qt.Orientation.Horizontal and role == Qt.ItemDataRole.DisplayRole:
+            return ("键", "值", "类型")[section]
+        return None
+
+    def data(self, index: QModelIndex, role: int = Qt.ItemDataRole.DisplayRole) -> Any:
+        if not index.isValid():
+            return None
+        node = index.internalPointer()
+        try:
+            value = self.value_at(node.path)
+        except (KeyError, IndexError, TypeError):
+            return None
+        column = index.column()
+        if role == Qt.ItemDataRole.DisplayRole:
+            if column == 0:
+                return f"[{node.key}]" if isinstance(node.key, int) else str(node.key)
+            if column == 1:
+                return _preview(value)
+            return _TYPE_NAMES.get(type(value), type(value).__name__)
+        if role == Qt.ItemDataRole.EditRole:
+            if column == 0:
+                return str(node.key)
+            if column == 1:
+                return value if isinstance(value, str) else json.dumps(value, ensure_ascii=False)
+        if role == Qt.ItemDataRole.ToolTipRole and column == 1 and isinstance(value, str) and len(value) > PREVIEW_CHARS:
+            return value[:2000]
+        return None
+
+    def flags(self, index: QModelIndex) -> Qt.ItemFlag:
+        flags = super().flags(index)
+        if not index.isValid():
+            return flags
+        node = index.internalPointer()
+        if index.column() == 0 and isinstance(node.key, str):
+            flags |= Qt.ItemFlag.ItemIsEditable
+        elif index.column() == 1 and _inline_editable(self.value_at(node.path)):
+            flags |= Qt.ItemFlag.ItemIsEditable
+        return flags
+
+    def setData(self, index: QModelIndex, value: Any, role: int = Qt.ItemDataRole.EditRole) -> bool:
+        if role != Qt.ItemDataRole.EditRole or not index.isValid():
+            return False
+        node = index.internalPointer()
+        if index.column() == 0:
+            return self.rename(index, str(value).strip())
+        old = self.value_at(node.path)
+        if isinstance(old, str):
+            new = str(value)
+        else:
+            try:
+                new = json.loads(value)
+            except (TypeError, ValueError):
+                return False
+        return self.replace_value(index, new)
+
+    # ---------- 编辑 ----------
+
+    def replace_value(self, index: QModelIndex, new: Any) -> bool:
+        """把节点的值替换为 new（类型可以改变）"""
+        node = index.internalPointer()
+        old = self.value_at(node.path)
+        if type(old) is type(new) and old == new:
+            return True
+        self.value_at(node.path[:-1])[node.key] = new
+        self.value_edited.emit(node.path, old, new)
+        self._refresh(node)
+        return True
+
+    def _edit_container(self, node: _Node, edit) -> JsonPath:
+        """对容器做结构修改，并以修改前后的浅拷贝记录这一步"""
+        container = self.value_at(node.path)
+        old = _shallow_copy(container)
+        edit(container)
+        self.value_edited.emit(node.path, old, _shallow_copy(container))
+        self._refresh(node)
+        return node.path
+
+    def _key_taken(self, node: _Node, container: Any, key: str) -> bool:
+        return key in container or (node is self._root and key in self._hidden)
+
+    def rename(self, index: QModelIndex, new_key: str) -> bool:
+        """重命名对象中的键，保持键的顺序"""
+        node = index.internalPointer()
+        if new_key == node.key:
+            return True
+        parent = node.parent
+        container = self.value_at(parent.path)
+        if not new_key or not isinstance(container, dict) or self._key_taken(parent, container, new_key):
+            return False
+
+        def edit(target: dict):
+            items = [(new_key if key == node.key else key, value) for key, value in target.items()]
+            target.clear()
+            target.update(items)
+        self._edit_container(parent, edit)
+        return True
+
+    def add_child(self, index: QModelIndex) -> bool:
+        """在容器节点中添加一项（为对象时生成不重复的键）；index 不是容器时加到它所在的容器"""
+        node = self._node(index)
+        if not _is_container(self.value_at(node.path)):
+            node = node.parent
+        container = self.value_at(node.path)
+        if isinstance(container, dict):
+            key, number = "new_key", 1
+            while self._key_taken(node, container, key):
+                number += 1
+                key = f"new_key_{number}"
+            self._edit_container(node, lambda target: target.__setitem__(key, ""))
+        else:
+            self._edit_container(node, lambda target: target.append(""))
+        return True
+
+    def remove(self, index: QModelIndex) -> bool:
+        """删除节点"""
+        if not index.isValid():
+            return False
+        node = index.internalPointer()
+        self._edit_container(node.parent, lambda target: target.__delitem__(node.key))
+        return True
+
+
+class JsonTextDialog(QDialog):
+    """以文本编辑一个值：字符串直接编辑，其他类型编辑其 JSON"""
+
+    def __init__(self, value: Any, parent: Optional[QWidget] = None):
+        super().__init__(parent)
+        self.setWindowTitle("编辑值")
+        self.setMinimumSize(640, 480)
+        self.is_text = isinstance(value, str)
+        self.value = value
+        layout = QVBoxLayout(self)
+        self.editor = QPlainTextEdit()
+        self.editor.setFont(QFont("Consolas", 10))
+        self.editor.setPlainText(value if self.is_text else json.dumps(value, ensure_ascii=False, indent=2))
+        layout.addWidget(self.editor)
+        buttons = QDialogButtonBox(QDialogButtonBox.StandardButton.Ok | QDialogButtonBox.StandardButton.Cancel)
+        buttons.accepted.connect(self.accept)
+        buttons.rejected.connect(self.reject)
+        layout.addWidget(buttons)
+
+    def accept(self):
+        text = self.editor.toPlainText()
+        if self.is_text:
+            self.value = text
+        else:
+            try:
+                self.value = json.loads(text)
+            except ValueError as e:
+                QMessageBox.warning(self, "错误", f"JSON 格式错误: {e}")
+                return
+        super().accept()
+
+
+class JsonTreeWidget(QWidget):
+    """带按钮和右键菜单的 JSON 树编辑器"""
+
+    def __init__(self, parent: Optional[QWidget] = None):
+        super().__init__(parent)
+        self.model = JsonTreeModel(self)
+        # 上次调整列宽时根对象的键
+        self._root_keys: Optional[Tuple[Any, ...]] = None
+        self.setup_ui()
+
+    def setup_ui(self):
+        """设置UI"""
+        layout = QVBoxLayout(self)
+        layout.setContentsMargins(0, 0, 0, 0)
+
+        self.tree = QTreeView()
+        self.tree.setModel(self.model)
+        self.tree.setUniformRowHeights(True)
+        self.tree.setEditTriggers(QAbstractItemView.EditTrigger.DoubleClicked
+                                  | QAbstractItemView.EditTrigger.EditKeyPressed)
+        self.tree.header().setSectionResizeMode(1, QHeaderView.ResizeMode.Stretch)
+        self.tree.setContextMenuPolicy(Qt.ContextMenuPolicy.CustomContextMenu)
+        self.tree.customContextMenuRequested.connect(self.show_menu)
+        self.tree.doubleClicked.connect(self.on_double_clicked)
+        self.tree.setMinimumHeight(160)
+        layout.addWidget(self.tree)
+
+        button_layout = QHBoxLayout()
+        add_btn = QPushButton("添加")
+        add_btn.clicked.connect(lambda: self.model.add_child(self.tree.currentIndex()))
+        edit_btn = QPushButton("编辑...")
+        edit_btn.clicked.connect(lambda: self.edit_as_text(self.tree.currentIndex()))
+        remove_btn = QPushButton("删除")
+        remove_btn.clicked.connect(lambda: self.model.remove(self.tree.currentIndex()))
+        button_layout.addWidget(add_btn)
+        button_layout.addWidget(edit_btn)
+        button_layout.addWidget(remove_btn)
+        button_layout.addStretch()
+        layout.addLayout(button_layout)
+
+    def set_root(self, value: Any, hidden_keys: Collection[str] = ()):
+        self.model.set_root(value, hidden_keys)
+        # 换成键相同的对象（如同一世界书中的各个条目）时沿用原来的列宽
+        keys = tuple(value) if isinstance(value, dict) else None
+        if keys is None or keys != self._root_keys:
+            self._root_keys = keys
+            self.tree.resizeColumnToContents(0)
+
+    def show_menu(self, position: QPoint):
+        index = self.tree.indexAt(position)
+        menu = QMenu(self)
+        menu.addAction("添加", lambda: self.model.add_child(index))
+        if index.isValid():
+            menu.addAction("编辑...", lambda: self.edit_as_text(index))
+            menu.addAction("删除", lambda: self.model.remove(index))
+        menu.exec(self.tree.viewport().mapToGlobal(position))
+
+    def on_double_clicked(self, index: QModelIndex):
+        # 长文本和容器不能在单元格中编辑，双击值列时打开对话框
+        if index.column() == 1 and not (self.model.flags(index) & Qt.ItemFlag.ItemIsEditable):
+            self.edit_as_text(index)
+
+    def edit_as_text(self, index: QModelIndex):
+        """在对话框中编辑节点的值"""
+        if not index.isValid():
+            return
+        index = index.siblingAtColumn(0)
+        node = index.internalPointer()
+        dialog = JsonTextDialog(self.model.value_at(node.path), self)
+        if dialog.exec() == QDialog.DialogCode.Accepted:
+            self.model.replace_value(index, dialog.value)
@@ -0,0 +1,454 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+LibraryBrowser.py
+角色卡库浏览器：以网格显示目录中各角色卡的头像和名称，双击打开。
+
+界面线程只做查表和绘制:
+- 目录扫描和从磁盘缓存读取缩略图在后台线程中进行；
+- 未缓存的文件交给进程池哈希、读取名称并生成缩略图；
+- 只为正在显示的格子请求缩略图（后请求的先处理，快速滚动时优先显示停下来的位置），
+  空闲时在后台依次处理其余文件，第一遍之后滚动只需从磁盘缓存读取。
+"""
+
+import multiprocessing
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Set
+
+from PySide6.QtWidgets import (
+    QDialog, QVBoxLayout, QHBoxLayout, QLabel, QLineEdit, QPushButton, QListView,
+    QFileDialog, QStyle, QWidget
+)
+from PySide6.QtCore import (
+    Qt, QAbstractListModel, QModelIndex, QObject, QSize, QSortFilterProxyModel, QThread, Signal
+)
+from PySide6.QtGui import QImage, QPixmap
+
+from card_thumbnails import (
+    DEFAULT_CACHE_BYTES, THUMBNAIL_SIZE, LibraryFile, ThumbnailIndex, ThumbnailResult,
+    evict_thumbnails, make_thumbnail, scan_library, thumbnail_path,
+)
+
+# 内存中保留的缩略图数
+MEMORY_THUMBNAILS = 1000
+# 等待从磁盘读取的缩略图数上限，超出时丢弃最早的请求（它们多半已经滚出视野）
+MAX_PENDING_LOADS = 256
+# 每个工作进程同时排队的文件数
+JOBS_PER_WORKER = 2
+# 每处理这么多文件保存一次索引
+INDEX_SAVE_INTERVAL = 500
+# 网格中每格的大小
+CELL_SIZE = QSize(THUMBNAIL_SIZE + 24, THUMBNAIL_SIZE + 44)
+
+
+class _LoaderWorker(QObject):
+    """后台线程：扫描目录、读取缓存中的缩略图、清理缓存"""
+
+    scanned = Signal(str, list)         # 目录, [LibraryFile]
+    loaded = Signal(str, QImage)        # 角色卡路径, 缩略图
+    load_failed = Signal(str)
+    evicted = Signal(int, list)         # 缓存剩余大小, 删除的哈希
+    _wake = Signal()
+
+    def __init__(self):
+        super().__init__()
+        self._lock = threading.Lock()
+        # 角色卡路径 -> 缩略图路径，按请求顺序排列
+        self._requests: "OrderedDict[str, str]" = OrderedDict()
+        self._wake.connect(self._drain)
+
+    def request(self, path: str, thumbnail: str) -> List[str]:
+        """请求读取缩略图（在界面线程调用），返回因队列已满被丢弃的请求"""
+        dropped = []
+        with self._lock:
+            self._requests[path] = thumbnail
+            self._requests.move_to_end(path)
+            while len(self._requests) > MAX_PENDING_LOADS:
+                dropped.append(self._requests.popitem(last=False)[0])
+        self._wake.emit()
+        return dropped
+
+    def clear(self) -> List[str]:
+        """丢弃全部尚未处理的请求并返回它们"""
+        with self._lock:
+            dropped = list(self._requests)
+            self._requests.clear()
+        return dropped
+
+    def _drain(self):
+        while True:
+            with self._lock:
+                if not self._requests:
+                    return
+                path, thumbnail = self._requests.popitem(last=True)
+            image = QImage(thumbnail)
+            if image.isNull():
+                self.load_failed.emit(path)
+                continue
+            try:
+                os.utime(thumbnail)  # 记录最近使用时间，清理时参考
+            except OSError:
+                pass
+            self.loaded.emit(path, image)
+
+    def scan(self, directory: str):
+        self.scanned.emit(directory, scan_library(directory))
+
+    def evict(self, cache_dir: str, max_bytes: int):
+        total, removed = evict_thumbnails(cache_dir, max_bytes)
+        self.evicted.emit(total, removed)
+
+
+class _FutureBridge(QObject):
+    """把进程池的完成回调（在池的管理线程中）转到界面线程"""
+    done = Signal(object)  # Future
+
+
+class LibraryModel(QAbstractListModel):
+    """角色卡库中的文件；缩略图由 requester 按需请求，不在模型中加载"""
+
+    def __init__(self, placeholder: QPixmap, parent: Optional[QObject] = None):
+        super().__init__(parent)
+        self.files: List[LibraryFile] = []
+        self.rows: Dict[str, int] = {}
+        self.names: Dict[str, str] = {}
+        self.placeholder = placeholder
+        # 最近使用的缩略图
+        self.pixmaps: "OrderedDict[str, QPixmap]" = OrderedDict()
+        self.requester: Optional[Callable[[int], None]] = None
+
+    def set_files(self, files: List[LibraryFile], names: Dict[str, str]):
+        self.beginResetModel()
+        self.files = files
+        self.rows = {file.path: row for row, file in enumerate(files)}
+        self.names = names
+        self.pixmaps.clear()
+        self.endResetModel()
+
+    def rowCount(self, parent: QModelIndex = QModelIndex()) -> int:
+        return 0 if parent.isValid() else len(self.files)
+
+    def data(self, index: QModelIndex, role: int = Qt.ItemDataRole.DisplayRole) -> Any:
+        if not index.isValid():
+            return None
+        file = self.files[index.row()]
+        if role == Qt.ItemDataRole.DisplayRole:
+            return self.names.get(file.path) or os.path.splitext(os.path.basename(file.path))[0]
+        if role == Qt.ItemDataRole.DecorationRole:
+            pixmap = self.pixmaps.get(file.path)
+            if pixmap is not None:
+                self.pixmaps.move_to_end(file.path)
+                return pixmap
+            # 只有视野中的格子会被绘制，在这里请求正好做到按需加载
+            if self.requester is not None:
+                self.requester(index.row())
+            return self.placeholder
+        if role == Qt.ItemDataRole.ToolTipRole:
+            return file.path
+        if role == Qt.ItemDataRole.UserRole:
+            return file.path
+        return None
+
+    def _changed(self, path: str, roles: List[int]):
+        row = self.rows.get(path)
+        if row is not None:
+            index = self.index(row)
+            self.dataChanged.emit(index, index, roles)
+
+    def set_name(self, path: str, name: str):
+        if name and self.names.get(path) != name:
+            self.names[path] = name
+            self._changed(path, [Qt.ItemDataRole.DisplayRole])
+
+    def set_pixmap(self, path: str, pixmap: QPixmap):
+        if path not in self.rows:
+            return
+        self.pixmaps[path] = pixmap
+        self.pixmaps.move_to_end(path)
+        while len(self.pixmaps) > MEMORY_THUMBNAILS:
+            self.pixmaps.popitem(last=False)
+        self._changed(path, [Qt.ItemDataRole.DecorationRole])
+
+
+class LibraryBrowser(QDialog):
+    """角色卡库网格浏览"""
+
+    # 双击打开角色卡，参数为文件路径
+    card_requested = Signal(str)
+    _scan_requested = Signal(str)
+    _evict_requested = Signal(str, int)
+
+    def __init__(self, cache_dir: str, max_cache_bytes: int = DEFAULT_CACHE_BYTES,
+                 parent: Optional[QWidget] = None):
+        super().__init__(parent)
+        self.setWindowTitle("角色卡库")
+        self.resize(900, 650)
+        self.cache_dir = cache_dir
+        self.max_cache_bytes = max_cache_bytes
+        self.index = ThumbnailIndex(cache_dir)
+        self.directory = ""
+        # 已发出读取或生成请求、尚未完成的文件
+        self._requested: Set[str] = set()
+        # 等待生成缩略图的文件（后进先出）
+        self._decode_stack: List[LibraryFile] = []
+        # 已提交给进程池、尚未处理结果的任务
+        self._futures: Set[Future] = set()
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._workers = max(1, (os.cpu_count() or 2) - 1)
+        # 空闲时预先处理的下一个行号
+        self._prefetch_row = 0
+        self._processed = 0
+        # 缓存目录的大小，清理完成前未知
+        self._cache_bytes: Optional[int] = None
+        self._evicting = False
+
+        placeholder_icon = self.style().standardIcon(QStyle.StandardPixmap.SP_FileIcon)
+        self.model = LibraryModel(placeholder_icon.pixmap(THUMBNAIL_SIZE // 2), self)
+        self.model.requester = self.request_thumbnail
+        self.setup_ui()
+
+        self._thread = QThread(self)
+        self._loader = _LoaderWorker()
+        self._loader.moveToThread(self._thread)
+        self._loader.scanned.connect(self.on_scanned)
+        self._loader.loaded.connect(self.on_thumbnail_loaded)
+        self._loader.load_failed.connect(self.on_thumbnail_missing)
+        self._loader.evicted.connect(self.on_evicted)
+        self._scan_requested.connect(self._loader.scan)
+        self._evict_requested.connect(self._loader.evict)
+        self._bridge = _FutureBridge()
+        self._bridge.done.connect(self.on_decoded)
+        self._thread.start()
+        # 启动时统计（必要时清理）缓存大小
+        self._request_eviction()
+
+    def setup_ui(self):
+        """设置UI"""
+        layout = QVBoxLayout(self)
+
+        top_layout = QHBoxLayout()
+        self.directory_label = QLabel("未选择目录")
+        top_layout.addWidget(self.directory_label, 1)
+        choose_btn = QPushButton("选择目录...")
+        choose_btn.clicked.connect(self.choose_directory)
+        top_layout.addWidget(choose_btn)
+        self.filter_edit = QLineEdit()
+        self.filter_edit.setPlaceholderText("按名称筛选")
+        self.filter_edit.setClearButtonEnabled(True)
+        top_layout.addWidget(self.filter_edit)
+        layout.addLayout(top_layout)
+
+        self.proxy = QSortFilterProxyModel(self)
+        self.proxy.setSourceModel(self.model)
+        self.proxy.setFilterCaseSensitivity(Qt.CaseSensitivity.CaseInsensitive)
+        self.filter_edit.textChanged.connect(self.proxy.setFilterFixedString)
+
+        self.view = QListView()
+        self.view.setViewMode(QListView.ViewMode.IconMode)
+        self.view.setResizeMode(QListView.ResizeMode.Adjust)
+        self.view.setMovement(QListView.Movement.Static)
+        # 所有格子大小相同，布局时不必逐项询问
+        self.view.setUniformItemSizes(True)
+        self.view.setLayoutMode(QListView.LayoutMode.Batched)
+        self.view.setIconSize(QSize(THUMBNAIL_SIZE, THUMBNAIL_SIZE))
+        self.view.setGridSize(CELL_SIZE)
+        self.view.setWordWrap(True)
+        self.view.setModel(self.proxy)
+        self.view.doubleClicked.connect(self.on_double_clicked)
+        layout.addWidget(self.view)
+
+        bottom_layout = QHBoxLayout()
+        self.status_label = QLabel()
+        bottom_layout.addWidget(self.status_label, 1)
+        open_btn = QPushButton("打开")
+        open_btn.clicked.connect(lambda: self.on_double_clicked(self.view.currentIndex()))
+        bottom_layout.addWidget(open_btn)
+        close_btn = QPushButton("关闭")
+        close_btn.clicked.connect(self.close)
+        bottom_layout.addWidget(close_btn)
+        layout.addLayout(bottom_layout)
+
+    # ------------------------------------------------------------------
+    # 目录
+    # ------------------------------------------------------------------
+
+    def choose_directory(self):
+        directory = QFileDialog.getExistingDirectory(self, "选择角色卡目录", self.directory)
+        if directory:
+            self.open_directory(directory)
+
+    def open_directory(self, directory: str):
+        """在后台扫描目录，完成后显示"""
+        self.directory = os.path.abspath(directory)
+        self.directory_label.setText(self.directory)
+        self.status_label.setText("正在扫描目录...")
+        self._scan_requested.emit(self.directory)
+
+    def on_scanned(self, directory: str, files: List[LibraryFile]):
+        if directory != self.directory:
+            return
+        # 换目录时丢弃排队的请求，已提交给进程池的任务完成后照常记录
+        for path in self._loader.clear():
+            self._requested.discard(path)
+        for file in self._decode_stack:
+            self._requested.discard(file.path)
+        self._decode_stack.clear()
+        self._prefetch_row = 0
+        names = {}
+        for file in files:
+            cached = self.index.lookup(file)
+            if cached is not None and cached[1]:
+                names[file.path] = cached[1]
+        self.model.set_files(files, names)
+        self._update_status()
+        self._pump()
+
+    # ------------------------------------------------------------------
+    # 缩略图
+    # ------------------------------------------------------------------
+
+    def request_thumbnail(self, row: int):
+        """格子被绘制时调用：缓存命中则在后台线程读取，否则交给进程池生成"""
+        file = self.model.files[row]
+        if file.path in self._requested:
+            return
+        cached = self.index.lookup(file)
+        if cached is not None:
+            digest, _, has_thumbnail = cached
+            if has_thumbnail:
+                self._requested.add(file.path)
+                for dropped in self._loader.request(file.path, thumbnail_path(self.cache_dir, digest)):
+                    self._requested.discard(dropped)
+            return
+        self._requested.add(file.path)
+        self._decode_stack.append(file)
+        self._pump()
+
+    def _pump(self):
+        """让进程池保持忙碌：优先处理可见格子的请求，空闲时依次处理其余文件"""
+        limit = self._workers * JOBS_PER_WORKER
+        files = self.model.files
+        while len(self._futures) < limit:
+            if self._decode_stack:
+                file = self._decode_stack.pop()
+            else:
+                file = None
+                while self._prefetch_row < len(files):
+                    candidate = files[self._prefetch_row]
+                    self._prefetch_row += 1
+                    if candidate.path not in self._requested and self.index.lookup(candidate) is None:
+                        self._requested.add(candidate.path)
+                        file = candidate
+                        break
+                if file is None:
+                    return
+            if self._executor is None:
+                # 编辑器中有其他线程在运行，用 spawn 启动工作进程比 fork 安全
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self._workers, mp_context=multiprocessing.get_context("spawn"))
+            future = self._executor.submit(make_thumbnail, file, self.cache_dir, THUMBNAIL_SIZE)
+            self._futures.add(future)
+            future.add_done_callback(self._bridge.done.emit)
+
+    def on_decoded(self, future: Future):
+        # 关闭对话框时放弃的任务不再处理
+        if future not in self._futures:
+            return
+        self._futures.discard(future)
+        if future.cancelled():
+            return
+        try:
+            result: ThumbnailResult = future.result()
+        except Exception as e:
+            self.status_label.setText(f"生成缩略图失败: {e}")
+            return
+        path = result.file.path
+        if result.digest:
+            self.index.record(result)
+        self.model.set_name(path, result.name)
+        if result.thumbnail and path in self.model.rows:
+            for dropped in self._loader.request(path, result.thumbnail):
+                self._requested.discard(dropped)
+        else:
+            self._requested.discard(path)
+        self._processed += 1
+        if self._processed % INDEX_SAVE_INTERVAL == 0:
+            self._save_index()
+        if self._cache_bytes is not None:
+            self._cache_bytes += result.thumbnail_bytes
+            if self._cache_bytes > self.max_cache_bytes:
+                self._request_eviction()
+        self._update_status()
+        self._pump()
+
+    def on_thumbnail_loaded(self, path: str, image: QImage):
+        self._requested.discard(path)
+        self.model.set_pixmap(path, QPixmap.fromImage(image))
+
+    def on_thumbnail_missing(self, path: str):
+        """缓存中的缩略图已被删除：重新生成"""
+        self._requested.discard(path)
+        self.index.entries.pop(path, None)
+        row = self.model.rows.get(path)
+        if row is not None:
+            self.request_thumbnail(row)
+
+    def _request_eviction(self):
+        if not self._evicting:
+            self._evicting = True
+            self._evict_requested.emit(self.cache_dir, self.max_cache_bytes)
+
+    def on_evicted(self, total: int, removed: List[str]):
+        self._evicting = False
+        self._cache_bytes = total
+        self.index.forget_digests(removed)
+
+    def _update_status(self):
+        files = self.model.files
+        pending = len(self._decode_stack) + len(self._futures)
+        text = f"{len(files)} 个角色卡"
+        if pending:
+            text += f"，正在生成缩略图（已处理 {self._processed}）"
+        self.status_label.setText(text)
+
+    def _save_index(self):
+        try:
+            self.index.save()
+        except OSError as e:
+            self.status_label.setText(f"无法保存缩略图索引: {e}")
+
+    # ------------------------------------------------------------------
+
+    def on_double_clicked(self, index: QModelIndex):
+        if index.isValid():
+            self.card_requested.emit(index.data(Qt.ItemDataRole.UserRole))
+
+    def shutdown(self):
+        """停止进程池和后台线程，保存索引"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+        self._loader.clear()
+        self._thread.quit()
+        self._thread.wait()
+        self._save_index()
+
+    def closeEvent(self, event):
+        # 关闭时停止生成，下次打开时从索引继续
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+        self._decode_stack.clear()
+        self._futures.clear()
+        self._requested.clear()
+        self._save_index()
+        super().closeEvent(event)
+
+    def showEvent(self, event):
+        super().showEvent(event)
+        # 重新打开时继续处理其余文件
+        self._pump()
@@ -0,0 +1,314 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+LorebookTableWidget.py
+世界书的表格视图：每个条目一行，每个常用字段和扩展键一列。
+
+视图只请求可见的单元格，值取自 lorebook_columns.ColumnStore 的按列缓存；
+支持按列排序、筛选表达式和多选，选中多行时修改一个单元格或使用下方的批量修改，
+会把同一个值写入所有选中的条目，并作为一步撤销。
+"""
+
+from typing import Any, Dict, List, Optional, Set
+
+from PySide6.QtCore import Qt, QAbstractTableModel, QModelIndex, QTimer, Signal
+from PySide6.QtWidgets import (
+    QWidget, QVBoxLayout, QHBoxLayout, QLabel, QLineEdit, QComboBox, QPushButton,
+    QTableView, QAbstractItemView, QMessageBox
+)
+
+from lorebook_columns import BOOL, INT, Column, ColumnStore, format_value, parse_value
+from ui_widgets import ERROR_COLOR
+
+
+class LorebookTableModel(QAbstractTableModel):
+    """条目表格模型，行为筛选和排序后的条目"""
+
+    # 单元格被编辑: (表格行, 列, 新值)，由表格决定写入哪些条目
+    cell_edited = Signal(int, int, object)
+
+    def __init__(self, parent: Optional[QWidget] = None):
+        super().__init__(parent)
+        self.store = ColumnStore()
+        self._flags: List[Qt.ItemFlag] = []
+        # 表格行 -> 条目行号
+        self.order: List[int] = []
+        self.filter_expression = ""
+        self.sort_column = -1
+        self.sort_descending = False
+
+    def set_entries(self, entries: List[Dict[str, Any]]):
+        """换用另一组条目"""
+        self.beginResetModel()
+        self.store.reset(entries)
+        self._flags = [self._column_flags(column) for column in self.store.columns]
+        self.sort_column = -1
+        self._rebuild_order()
+        self.endResetModel()
+
+    def column(self, index: int) -> Column:
+        return self.store.columns[index]
+
+    def rowCount(self, parent: QModelIndex = QModelIndex()) -> int:
+        return 0 if parent.isValid() else len(self.order)
+
+    def columnCount(self, parent: QModelIndex = QModelIndex()) -> int:
+        return 0 if parent.isValid() else len(self.store.columns)
+
+    def headerData(self, section: int, orientation: Qt.Orientation, role: int = Qt.ItemDataRole.DisplayRole) -> Any:
+        if role != Qt.ItemDataRole.DisplayRole:
+            return None
+        if orientation == Qt.Orientation.Horizontal:
+            return self.store.columns[section].title
+        return str(self.order[section] + 1)
+
+    def data(self, index: QModelIndex, role: int = Qt.ItemDataRole.DisplayRole) -> Any:
+        if not index.isValid():
+            return None
+        column = self.store.columns[index.column()]
+        value = self.store.array(column.key)[self.order[index.row()]]
+        if column.kind == BOOL:
+            if role == Qt.ItemDataRole.CheckStateRole:
+                return Qt.CheckState.Checked if value else Qt.CheckState.Unchecked
+            return None
+        if role in (Qt.ItemDataRole.DisplayRole, Qt.ItemDataRole.EditRole):
+            return format_value(column, value)
+        if role == Qt.ItemDataRole.TextAlignmentRole and column.kind == INT:
+            return int(Qt.AlignmentFlag.AlignRight | Qt.AlignmentFlag.AlignVCenter)
+        return None
+
+    def flags(self, index: QModelIndex) -> Qt.ItemFlag:
+        return self._flags[index.column()]
+
+    def _column_flags(self, column: Column) -> Qt.ItemFlag:
+        flags = Qt.ItemFlag.ItemIsEnabled | Qt.ItemFlag.ItemIsSelectable
+        if column.editable:
+            flags |= Qt.ItemFlag.ItemIsUserCheckable if column.kind == BOOL else Qt.ItemFlag.ItemIsEditable
+        return flags
+
+    def setData(self, index: QModelIndex, value: Any, role: int = Qt.ItemDataRole.EditRole) -> bool:
+        column = self.store.columns[index.column()]
+        if column.kind == BOOL and role == Qt.ItemDataRole.CheckStateRole:
+            new_value = Qt.CheckState(value) == Qt.CheckState.Checked
+        elif role == Qt.ItemDataRole.EditRole:
+            try:
+                new_value = parse_value(column, value)
+            except ValueError:
+                return False
+        else:
+            return False
+        # 条目由世界书界面修改，完成后通过 refresh_rows 更新表格
+        self.cell_edited.emit(index.row(), index.column(), new_value)
+        return True
+
+    def sort(self, column: int, order: Qt.SortOrder = Qt.SortOrder.AscendingOrder):
+        self.layoutAboutToBeChanged.emit()
+        self.sort_column = column
+        self.sort_descending = order == Qt.SortOrder.DescendingOrder
+        self._rebuild_order()
+        self.layoutChanged.emit()
+
+    def set_filter(self, expression: str):
+        """按筛选表达式过滤，表达式无效时抛出 ValueError 并保持原来的结果"""
+        rows = self.store.filter_rows(expression)
+        self.beginResetModel()
+        self.filter_expression = expression
+        self._rebuild_order(rows)
+        self.endResetModel()
+
+    def _rebuild_order(self, rows: Optional[List[int]] = None):
+        if rows is None:
+            try:
+                rows = self.store.filter_rows(self.filter_expression)
+            except ValueError:
+                rows = list(range(len(self.store)))
+        if 0 <= self.sort_column < len(self.store.columns):
+            rows = self.store.sort_rows(rows, self.store.columns[self.sort_column].key, self.sort_descending)
+        self.order = rows
+
+    def refresh_rows(self, rows: Set[int]):
+        """条目被修改后更新这些行的显示（不重新排序和筛选，行保持原位）"""
+        self.store.refresh_rows(rows)
+        if self.order and self.store.columns:
+            self.dataChanged.emit(self.index(0, 0), self.index(len(self.order) - 1, len(self.store.columns) - 1))
+
+    def splice(self, row: int, removed: int, inserted: int):
+        """条目增删后重新筛选和排序"""
+        self.beginResetModel()
+        self.store.splice(row, removed, inserted)
+        self._rebuild_order()
+        self.endResetModel()
+
+
+class LorebookTableWidget(QWidget):
+    """世界书表格视图"""
+
+    # 把 values 写入各条目的同一字段: (字段路径, 条目行号列表, 值列表)
+    column_assigned = Signal(object, list, list)
+    # 双击一行，参数为条目行号
+    entry_activated = Signal(int)
+
+    def __init__(self, parent: Optional[QWidget] = None):
+        super().__init__(parent)
+        self._entries: List[Dict[str, Any]] = []
+        # 条目在表格不可见时被替换，下次显示时再载入
+        self._stale = False
+        self._pending_rows: Set[int] = set()
+        self.setup_ui()
+
+    def setup_ui(self):
+        """设置UI"""
+        layout = QVBoxLayout(self)
+        layout.setContentsMargins(0, 0, 0, 0)
+
+        self.filter_edit = QLineEdit()
+        self.filter_edit.setPlaceholderText("筛选: 文本（注释和关键字），或 depth>=4 enabled=true group~名称")
+        self.filter_edit.setClearButtonEnabled(True)
+        self.filter_edit.returnPressed.connect(self.apply_filter)
+        self.filter_edit.textChanged.connect(lambda: self.filter_edit.setStyleSheet(""))
+        layout.addWidget(self.filter_edit)
+
+        self.model = LorebookTableModel(self)
+        self.model.cell_edited.connect(self.on_cell_edited)
+        self.table = QTableView()
+        self.table.setModel(self.model)
+        self.table.setSortingEnabled(True)
+        self.table.setSelectionBehavior(QAbstractItemView.SelectionBehavior.SelectRows)
+        self.table.setSelectionMode(QAbstractItemView.SelectionMode.ExtendedSelection)
+        self.table.setEditTriggers(QAbstractItemView.EditTrigger.DoubleClicked
+                                   | QAbstractItemView.EditTrigger.EditKeyPressed)
+        self.table.verticalHeader().setDefaultSectionSize(self.table.fontMetrics().height() + 6)
+        self.table.doubleClicked.connect(self.on_double_clicked)
+        self.table.selectionModel().selectionChanged.connect(self.update_status)
+        self.model.modelReset.connect(self.update_status)
+        layout.addWidget(self.table)
+
+        bulk_layout = QHBoxLayout()
+        bulk_layout.addWidget(QLabel("批量修改:"))
+        self.column_combo = QComboBox()
+        bulk_layout.addWidget(self.column_combo)
+        bulk_layout.addWidget(QLabel("="))
+        self.value_edit = QLineEdit()
+        self.value_edit.setPlaceholderText("值（关键字用逗号分隔，布尔值为 true/false）")
+        self.value_edit.returnPressed.connect(self.apply_bulk)
+        bulk_layout.addWidget(self.value_edit)
+        self.apply_button = QPushButton("应用到选中的条目")
+        self.apply_button.clicked.connect(self.apply_bulk)
+        bulk_layout.addWidget(self.apply_button)
+        layout.addLayout(bulk_layout)
+
+        self.status_label = QLabel()
+        layout.addWidget(self.status_label)
+
+        # 多个条目的修改在一次事件循环后合并刷新
+        self.refresh_timer = QTimer(self)
+        self.refresh_timer.setSingleShot(True)
+        self.refresh_timer.setInterval(0)
+        self.refresh_timer.timeout.connect(self._flush_refresh)
+
+    def set_entries(self, entries: List[Dict[str, Any]]):
+        """显示另一组条目（表格不可见时推迟到显示时载入）"""
+        self._entries = entries
+        self._pending_rows.clear()
+        if self.isVisible():
+            self.reload()
+        else:
+            self._stale = True
+
+    def reload(self):
+        """重新载入条目和列"""
+        self._stale = False
+        self.model.set_entries(self._entries)
+        self.table.horizontalHeader().setSortIndicator(-1, Qt.SortOrder.AscendingOrder)
+        self.column_combo.clear()
+        for column in self.model.store.columns:
+            if column.editable:
+                self.column_combo.addItem(f"{column.title} ({column.key})", column.key)
+
+    def showEvent(self, event):
+        if self._stale:
+            self.reload()
+        super().showEvent(event)
+
+    def refresh_row(self, row: int):
+        """条目被修改（包括撤销/重做），稍后统一刷新"""
+        if not self._stale:
+            self._pending_rows.add(row)
+            self.refresh_timer.start()
+
+    def _flush_refresh(self):
+        rows, self._pending_rows = self._pending_rows, set()
+        self.model.refresh_rows(rows)
+
+    def splice_entries(self, row: int, removed: List[Any], inserted: List[Any]):
+        """条目增删"""
+        if self._stale:
+            return
+        if not self.isVisible():
+            self._stale = True
+            return
+        self._flush_refresh()
+        self.model.splice(row, len(removed), len(inserted))
+
+    def selected_table_rows(self) -> List[int]:
+        """选中的表格行（按选区范围计算，不逐个单元格检查）"""
+        rows: Set[int] = set()
+        for selection_range in self.table.selectionModel().selection():
+            rows.update(range(selection_range.top(), selection_range.bottom() + 1))
+        return sorted(rows)
+
+    def selected_entry_rows(self) -> List[int]:
+        """选中的条目行号（按表格顺序）"""
+        order = self.model.order
+        return [order[row] for row in self.selected_table_rows()]
+
+    def update_status(self, *args):
+        selected = len(self.selected_table_rows())
+        self.status_label.setText(f"共 {len(self.model.store)} 个条目，显示 {len(self.model.order)} 个，选中 {selected} 个")
+        self.apply_button.setEnabled(selected > 0)
+
+    def apply_filter(self):
+        """应用筛选表达式"""
+        try:
+            self.model.set_filter(self.filter_edit.text())
+        except ValueError as e:
+            self.filter_edit.setStyleSheet(f"QLineEdit {{ border: 1px solid {ERROR_COLOR}; }}")
+            self.filter_edit.setToolTip(str(e))
+            return
+        self.filter_edit.setToolTip("")
+
+    def apply_bulk(self):
+        """把输入的值写入所有选中条目的所选列"""
+        key = self.column_combo.currentData()
+        rows = self.selected_entry_rows()
+        if key is None or not rows:
+            return
+        column = self.model.store.by_key[key]
+        try:
+            value = parse_value(column, self.value_edit.text())
+        except ValueError as e:
+            QMessageBox.warning(self, "警告", str(e))
+            return
+        self.assign(column, rows, value)
+
+    def on_cell_edited(self, table_row: int, column_index: int, value: Any):
+        """编辑一个单元格：该行在多选范围内时写入所有选中的条目"""
+        row = self.model.order[table_row]
+        rows = self.selected_entry_rows()
+        if row not in rows:
+            rows = [row]
+        self.assign(self.model.column(column_index), rows, value)
+
+    def assign(self, column: Column, rows: List[int], value: Any):
+        array = self.model.store.array(column.key)
+        # 跳过值已经相同的条目
+        rows = [row for row in rows if array[row] != value]
+        if rows:
+            self.column_assigned.emit(column.path, rows, [value] * len(rows))
+            self._flush_refresh()
+
+    def on_double_clicked(self, index: QModelIndex):
+        # 不可编辑的单元格（ID、内容）双击时打开条目编辑器
+        if not self.model.flags(index) & (Qt.ItemFlag.ItemIsEditable | Qt.ItemFlag.ItemIsUserCheckable):
+            self.entry_activated.emit(self.model.order[index.row()])
@@ -0,0 +1,204 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+MemoryPanel.py
+开发者使用的内存统计面板：按子系统列出内存占用及与上一次快照相比的变化，检查内存预算并导出报告。
+统计方式见 memory_accounting.py；tracemalloc 只在面板中开启跟踪后才运行，关闭面板时停止。
+"""
+
+import json
+import tracemalloc
+from typing import Optional
+
+from PySide6.QtCore import Qt, Signal
+from PySide6.QtGui import QColor
+from PySide6.QtWidgets import (
+    QDialog, QVBoxLayout, QHBoxLayout, QLabel, QPushButton, QTreeWidget, QTreeWidgetItem,
+    QSplitter, QMessageBox, QFileDialog, QInputDialog, QWidget
+)
+
+from memory_accounting import (
+    MB, TRACE_FRAMES, MemoryAccountant, MemorySnapshot, format_bytes, format_report, report_dict,
+    save_budgets, top_allocations
+)
+from ui_widgets import ERROR_COLOR
+
+BUDGET_COLUMN = 6
+
+
+class MemoryPanel(QDialog):
+    """内存统计面板"""
+
+    # 快照中超出预算的子系统说明
+    budget_exceeded = Signal(list)
+
+    def __init__(self, accountant: MemoryAccountant, budgets_path: str, parent: Optional[QWidget] = None):
+        super().__init__(parent)
+        self.setWindowTitle("内存统计")
+        self.setMinimumSize(820, 560)
+        self.accountant = accountant
+        self.budgets_path = budgets_path
+        self.previous: Optional[MemorySnapshot] = None
+        self.current: Optional[MemorySnapshot] = None
+        self.setup_ui()
+
+    def setup_ui(self):
+        """设置UI"""
+        layout = QVBoxLayout(self)
+
+        buttons = QHBoxLayout()
+        self.trace_button = QPushButton("跟踪分配")
+        self.trace_button.setCheckable(True)
+        self.trace_button.setChecked(tracemalloc.is_tracing())
+        self.trace_button.setToolTip("开启 tracemalloc，按分配位置统计内存；开启期间编辑会明显变慢")
+        self.trace_button.toggled.connect(self.set_tracing)
+        buttons.addWidget(self.trace_button)
+        snapshot_button = QPushButton("拍摄快照")
+        snapshot_button.clicked.connect(self.take_snapshot)
+        buttons.addWidget(snapshot_button)
+        buttons.addStretch()
+        self.export_button = QPushButton("导出报告...")
+        self.export_button.setEnabled(False)
+        self.export_button.clicked.connect(self.export_report)
+        buttons.addWidget(self.export_button)
+        close_button = QPushButton("关闭")
+        close_button.clicked.connect(self.close)
+        buttons.addWidget(close_button)
+        layout.addLayout(buttons)
+
+        self.summary_label = QLabel("尚未拍摄快照")
+        layout.addWidget(self.summary_label)
+        self.budget_label = QLabel()
+        self.budget_label.setStyleSheet(f"color: {ERROR_COLOR};")
+        self.budget_label.setWordWrap(True)
+        self.budget_label.hide()
+        layout.addWidget(self.budget_label)
+
+        splitter = QSplitter(Qt.Orientation.Vertical)
+        self.subsystem_tree = QTreeWidget()
+        self.subsystem_tree.setRootIsDecorated(False)
+        self.subsystem_tree.setHeaderLabels(["子系统", "Python 对象", "对象数", "Qt 估算", "合计", "变化", "预算"])
+        self.subsystem_tree.setToolTip("共享的对象计在靠前的子系统中；双击预算列设置预算")
+        self.subsystem_tree.itemDoubleClicked.connect(self.edit_budget)
+        splitter.addWidget(self.subsystem_tree)
+        self.allocation_tree = QTreeWidget()
+        self.allocation_tree.setHeaderLabels(["分配位置", "大小", "个数", "变化"])
+        splitter.addWidget(self.allocation_tree)
+        layout.addWidget(splitter)
+
+    def set_tracing(self, enabled: bool):
+        """开启或停止 tracemalloc"""
+        if enabled and not tracemalloc.is_tracing():
+            tracemalloc.start(TRACE_FRAMES)
+        elif not enabled and tracemalloc.is_tracing():
+            tracemalloc.stop()
+
+    def take_snapshot(self):
+        """拍摄快照并与上一次比较"""
+        snapshot = self.accountant.snapshot()
+        self.previous, self.current = self.current, snapshot
+        self.export_button.setEnabled(True)
+        self.show_snapshot()
+        violations = self.accountant.over_budget(snapshot)
+        self.budget_label.setText("超出预算: " + "；".join(violations))
+        self.budget_label.setVisible(bool(violations))
+        if violations:
+            self.budget_exceeded.emit(violations)
+
+    def show_snapshot(self):
+        """把当前快照填入列表"""
+        snapshot, previous = self.current, self.previous
+        summary = [f"快照 {snapshot.label}"]
+        if previous is not None:
+            summary.append(f"对比 {previous.label}")
+        if snapshot.rss is not None:
+            summary.append(f"进程常驻内存 {format_bytes(snapshot.rss)}")
+        if snapshot.traced is not None:
+            summary.append(f"tracemalloc 当前 {format_bytes(snapshot.traced[0])}，峰值 {format_bytes(snapshot.traced[1])}")
+        self.summary_label.setText("  |  ".join(summary))
+
+        self.subsystem_tree.clear()
+        for key, usage in snapshot.usage.items():
+            budget = self.accountant.budgets.get(key, 0)
+            delta = ""
+            if previous is not None and key in previous.usage:
+                delta = format_bytes(usage.total - previous.usage[key].total)
+            item = QTreeWidgetItem([
+                snapshot.titles.get(key, key), format_bytes(usage.python_bytes), str(usage.objects),
+                format_bytes(usage.native_bytes) if usage.native_bytes else "", format_bytes(usage.total),
+                delta, format_bytes(budget) if budget else "",
+            ])
+            item.setData(0, Qt.ItemDataRole.UserRole, key)
+            for column in range(1, item.columnCount()):
+                item.setTextAlignment(column, Qt.AlignmentFlag.AlignRight | Qt.AlignmentFlag.AlignVCenter)
+            if budget and usage.total > budget:
+                for column in range(item.columnCount()):
+                    item.setForeground(column, QColor(ERROR_COLOR))
+            self.subsystem_tree.addTopLevelItem(item)
+        for column in range(self.subsystem_tree.columnCount()):
+            self.subsystem_tree.resizeColumnToContents(column)
+
+        self.allocation_tree.clear()
+        if snapshot.allocations is None:
+            self.allocation_tree.addTopLevelItem(QTreeWidgetItem(["未开启跟踪分配"]))
+            return
+        by_subsystem = QTreeWidgetItem(["按子系统归类"])
+        for key, size in sorted(self.accountant.allocations_by_subsystem(snapshot).items(), key=lambda item: -item[1]):
+            by_subsystem.addChild(QTreeWidgetItem([snapshot.titles.get(key, key) or "其他", format_bytes(size)]))
+        sites = QTreeWidgetItem(["分配位置"])
+        for stat in top_allocations(snapshot, previous):
+            sites.addChild(QTreeWidgetItem([
+                stat.where, format_bytes(stat.size), str(stat.count),
+                format_bytes(stat.size_diff) if stat.size_diff else "",
+            ]))
+        self.allocation_tree.addTopLevelItem(by_subsystem)
+        self.allocation_tree.addTopLevelItem(sites)
+        by_subsystem.setExpanded(True)
+        sites.setExpanded(True)
+        self.allocation_tree.resizeColumnToContents(0)
+
+    def edit_budget(self, item: QTreeWidgetItem, column: int):
+        """设置子系统的内存预算（MB，0 表示不限制）"""
+        if column != BUDGET_COLUMN:
+            return
+        key = item.data(0, Qt.ItemDataRole.UserRole)
+        current = self.accountant.budgets.get(key, 0) / MB
+        value, ok = QInputDialog.getDouble(self, "内存预算", f"{item.text(0)} 的预算 (MB，0 表示不限制):",
+                                           current, 0, 1024 * 1024, 1)
+        if not ok:
+            return
+        if value > 0:
+            self.accountant.budgets[key] = int(value * MB)
+        else:
+            self.accountant.budgets.pop(key, None)
+        try:
+            save_budgets(self.budgets_path, self.accountant.budgets)
+        except OSError as e:
+            QMessageBox.warning(self, "警告", f"无法保存预算:\n{str(e)}")
+        if self.current is not None:
+            self.show_snapshot()
+
+    def export_report(self):
+        """把当前快照导出为文本或 JSON 报告"""
+        if self.current is None:
+            return
+        file_path, _ = QFileDialog.getSaveFileName(
+            self, "导出内存报告", "memory_report.txt", "文本文件 (*.txt);;JSON 文件 (*.json)")
+        if not file_path:
+            return
+        report = report_dict(self.current, self.previous, self.accountant.budgets,
+                             self.accountant.allocations_by_subsystem(self.current))
+        try:
+            with open(file_path, 'w', encoding='utf-8') as f:
+                if file_path.lower().endswith(".json"):
+                    json.dump(report, f, ensure_ascii=False, indent=2)
+                else:
+                    f.write(format_report(report))
+        except OSError as e:
+            QMessageBox.critical(self, "错误", f"导出失败:\n{str(e)}")
+
+    def closeEvent(self, event):
+        """关闭面板时停止跟踪"""
+        self.trace_button.setChecked(False)
+        super().closeEvent(event)
@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+PlainTextEditor.py
+面向大段文本的纯文本编辑器，用于角色描述、示例对话、世界书条目内容等字段。
+
+基于 QPlainTextEdit（按文本块布局，不做富文本排版），并在 Python 侧维护一份与文档同步的
+文本：每次修改只按 Qt 报告的区间拼接这份文本，同时发出带区间的 text_edited 信号，
+toPlainText() 直接返回这份文本，收集数据时不再从文档整体复制。
+
+Markdown 和宏的高亮由 QSyntaxHighlighter 按文本块增量完成：修改只重新高亮受影响的块，
+跨行的代码块通过块状态向后传递。
+"""
+
+import re
+from bisect import bisect_left
+from typing import List, Optional
+
+from PySide6.QtCore import Signal
+from PySide6.QtGui import QColor, QFont, QSyntaxHighlighter, QTextCharFormat, QTextCursor, QTextDocument
+from PySide6.QtWidgets import QPlainTextEdit, QWidget
+
+# 超出 BMP 的字符（emoji 等）在 Qt 中占两个 UTF-16 单位，在 Python 字符串中只占一个
+_ASTRAL = re.compile("[\U00010000-\U0010FFFF]")
+
+# 文本块状态
+STATE_NORMAL = 0
+STATE_CODE = 1
+
+_FENCE = re.compile(r"^\s*(```|~~~)")
+_HEADING = re.compile(r"^#{1,6}\s")
+_QUOTE = re.compile(r"^\s*>")
+_LIST_MARKER = re.compile(r"^\s*(?:[-*+]|\d+[.)])\s")
+_BOLD = re.compile(r"(\*\*|__)(?=\S)(.+?)(?<=\S)\1")
+_ITALIC = re.compile(r"(?<![*\w])\*(?=[^\s*])(.+?)(?<=[^\s*])\*(?![*\w])")
+_INLINE_CODE = re.compile(r"`[^`]+`")
+# 宏（语法见 macros.py），允许一层嵌套，如 {{random:{{user}},{{char}}}}
+_MACRO = re.compile(r"\{\{(?:[^{}]|\{\{[^{}]*\}\})*\}\}|<(?:user|bot|char)>", re.IGNORECASE)
+_MACRO_COMMENT = re.compile(r"\{\{//.*?\}\}", re.DOTALL)
+# 示例对话的分段标记
+_START = re.compile(r"^\s*<START>\s*$", re.IGNORECASE)
+
+
+def _format(color: str, bold: bool = False, italic: bool = False, background: str = "") -> QTextCharFormat:
+    fmt = QTextCharFormat()
+    fmt.setForeground(QColor(color))
+    if bold:
+        fmt.setFontWeight(QFont.Weight.Bold)
+    if italic:
+        fmt.setFontItalic(True)
+    if background:
+        fmt.setBackground(QColor(background))
+    return fmt
+
+
+class MarkdownHighlighter(QSyntaxHighlighter):
+    """Markdown 与宏的语法高亮，每次只处理一个文本块"""
+
+    def __init__(self, document: QTextDocument):
+        super().__init__(document)
+        self.formats = {
+            "heading": _format("#1f5fa8", bold=True),
+            "quote": _format("#6a737d", italic=True),
+            "list": _format("#b35900", bold=True),
+            "bold": _format("#24292e", bold=True),
+            "italic": _format("#24292e", italic=True),
+            "code": _format("#8f2c8f", background="#f3f3f3"),
+            "macro": _format("#00796b", bold=True),
+            "comment": _format("#9e9e9e", italic=True),
+            "start": _format("#c62828", bold=True),
+        }
+
+    def highlightBlock(self, text: str):
+        # Python 字符串下标与 Qt 的 UTF-16 位置只在块中含 emoji 等字符时不一致
+        wide = _ASTRAL.search(text) is not None
+
+        def apply(start: int, end: int, name: str):
+            if wide:
+                start += len(_ASTRAL.findall(text, 0, start))
+                end += len(_ASTRAL.findall(text, 0, end))
+            self.setFormat(start, end - start, self.formats[name])
+
+        # 围栏代码块：块状态把“在代码块内”传给下一块，修改围栏时 Qt 会继续向后重新高亮
+        if self.previousBlockState() == STATE_CODE:
+            apply(0, len(text), "code")
+            self.setCurrentBlockState(STATE_NORMAL if _FENCE.match(text) else STATE_CODE)
+            return
+        if _FENCE.match(text):
+            apply(0, len(text), "code")
+            self.setCurrentBlockState(STATE_CODE)
+            return
+        self.setCurrentBlockState(STATE_NORMAL)
+
+        if _START.match(text):
+            apply(0, len(text), "start")
+            return
+        if _HEADING.match(text):
+            apply(0, len(text), "heading")
+        elif _QUOTE.match(text):
+            apply(0, len(text), "quote")
+        else:
+            marker = _LIST_MARKER.match(text)
+            if marker:
+                apply(0, marker.end(), "list")
+
+        for pattern, name in ((_ITALIC, "italic"), (_BOLD, "bold"), (_INLINE_CODE, "code")):
+            for match in pattern.finditer(text):
+                apply(match.start(), match.end(), name)
+        # 宏最后处理，覆盖其他格式
+        for match in _MACRO.finditer(text):
+            name = "comment" if _MACRO_COMMENT.fullmatch(match.group()) else "macro"
+            apply(match.start(), match.end(), name)
+
+
+class PlainTextEditor(QPlainTextEdit):
+    """大文本编辑器：增量维护文本，按区间通知修改"""
+
+    # 文本修改: (位置, 删除的文本, 插入的文本)，位置为 Python 字符串下标
+    text_edited = Signal(int, str, str)
+
+    def __init__(self, placeholder_text: str = "", highlight: bool = True, parent: Optional[QWidget] = None):
+        super().__init__(parent)
+        self.setPlaceholderText(placeholder_text)
+        self._text = ""
+        # 超出 BMP 的字符在 self._text 中的下标（升序），用于在两种位置之间换算
+        self._astral: List[int] = []
+        # 先于高亮器连接，保证收到修改时影子文本已是最新
+        self.document().contentsChange.connect(self._on_contents_change)
+        self.highlighter = MarkdownHighlighter(self.document()) if highlight else None
+
+    def toPlainText(self) -> str:
+        """当前文本（不从文档复制）"""
+        return self._text
+
+    def setPlainText(self, text: str):
+        """设置文本；内容相同时不重新布局和高亮"""
+        if text != self._text:
+            super().setPlainText(text)
+
+    def splice(self, position: int, count: int, text: str):
+        """把 [position, position + count) 替换为 text，位置为 Python 字符串下标"""
+        cursor = QTextCursor(self.document())
+        cursor.setPosition(self._to_units(position))
+        cursor.setPosition(self._to_units(position + count), QTextCursor.MoveMode.KeepAnchor)
+        cursor.insertText(text)
+        self.setTextCursor(cursor)
+
+    def _to_units(self, index: int) -> int:
+        """Python 字符串下标 -> 文档位置"""
+        return index + bisect_left(self._astral, index)
+
+    def _from_units(self, position: int) -> int:
+        """文档位置 -> Python 字符串下标（按修改前的文本换算）"""
+        # 第 i 个宽字符在文档中的位置是 self._astral[i] + i，二分查找位于 position 之前的个数
+        lo, hi = 0, len(self._astral)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._astral[mid] + mid < position:
+                lo = mid + 1
+            else:
+                hi = mid
+        return position - lo
+
+    def _on_contents_change(self, position: int, chars_removed: int, chars_added: int):
+        document = self.document()
+        length = document.characterCount() - 1  # 去掉文档末尾隐含的段落分隔符
+        inserted = ""
+        if chars_added:
+            cursor = QTextCursor(document)
+            cursor.setPosition(min(position, length))
+            cursor.setPosition(min(position + chars_added, length), QTextCursor.MoveMode.KeepAnchor)
+            inserted = cursor.selection().toPlainText()
+        start = min(self._from_units(position), len(self._text))
+        end = min(self._from_units(position + chars_removed), len(self._text))
+        removed = self._text[start:end]
+        if removed == inserted:
+            # 只有格式变化（高亮器重新着色时也会报告）
+            return
+        text = self._text[:start] + inserted + self._text[end:]
+        # 宽字符下标：区间内的换成新插入的，之后的整体平移
+        first = bisect_left(self._astral, start)
+        last = bisect_left(self._astral, end)
+        shift = len(inserted) - (end - start)
+        astral = self._astral[:first] + [start + match.start() for match in _ASTRAL.finditer(inserted)] + \
+            [index + shift for index in self._astral[last:]]
+        if len(text) + len(astral) != length:
+            # Qt 报告的区间与影子文本对不上，退回整体读取
+            text = super().toPlainText()
+            start, removed, inserted = 0, self._text, text
+            astral = [match.start() for match in _ASTRAL.finditer(text)]
+        self._text = text
+        self._astral = astral
+        self.text_edited.emit(start, removed, inserted)
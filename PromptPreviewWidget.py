@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+PromptPreviewWidget.py
+最终提示词预览：用一段示例聊天激活世界书，显示模型实际收到的提示词
+"""
+
+import time
+from typing import Any, Dict, Optional
+
+from PySide6.QtWidgets import QWidget, QVBoxLayout, QHBoxLayout, QLabel, QLineEdit, QCheckBox, QPlainTextEdit
+from PySide6.QtCore import Signal
+from PySide6.QtGui import QFont
+
+from macros import MacroContext, card_context
+from prompt_assembly import PromptAssembler, format_prompt, parse_sample_chat
+
+DEFAULT_SAMPLE_CHAT = "user: 你好"
+DEFAULT_USER_NAME = "User"
+
+
+class PromptPreviewWidget(QWidget):
+    """提示词预览界面"""
+
+    # 示例聊天或预览选项被修改
+    sample_changed = Signal()
+
+    def __init__(self, parent: Optional[QWidget] = None):
+        super().__init__(parent)
+        self.assembler = PromptAssembler()
+        self.setup_ui()
+
+    def setup_ui(self):
+        """设置UI"""
+        layout = QVBoxLayout(self)
+
+        options_layout = QHBoxLayout()
+        options_layout.addWidget(QLabel("用户名:"))
+        self.user_name_edit = QLineEdit(DEFAULT_USER_NAME)
+        self.user_name_edit.textChanged.connect(self.sample_changed)
+        options_layout.addWidget(self.user_name_edit)
+        self.expand_macros_check = QCheckBox("展开宏 ({{char}}、{{user}} 等)")
+        self.expand_macros_check.setChecked(True)
+        self.expand_macros_check.toggled.connect(self.sample_changed)
+        options_layout.addWidget(self.expand_macros_check)
+        layout.addLayout(options_layout)
+
+        layout.addWidget(QLabel("示例聊天 (每行以 user: / char: 开头):"))
+        self.sample_chat_edit = QPlainTextEdit()
+        self.sample_chat_edit.setPlainText(DEFAULT_SAMPLE_CHAT)
+        self.sample_chat_edit.setMaximumHeight(100)
+        self.sample_chat_edit.textChanged.connect(self.sample_changed)
+        layout.addWidget(self.sample_chat_edit)
+
+        self.stats_label = QLabel()
+        layout.addWidget(self.stats_label)
+
+        self.prompt_view = QPlainTextEdit()
+        self.prompt_view.setReadOnly(True)
+        self.prompt_view.setFont(QFont("Consolas", 10))
+        layout.addWidget(self.prompt_view)
+
+    def macro_context(self, data: Dict[str, Any]) -> MacroContext:
+        """当前角色卡与用户名对应的宏上下文"""
+        return card_context(data, self.user_name_edit.text() or DEFAULT_USER_NAME)
+
+    def update_prompt(self, data: Dict[str, Any]):
+        """按角色卡的 data 对象重新拼装提示词"""
+        start = time.perf_counter()
+        self.assembler.context = self.macro_context(data) if self.expand_macros_check.isChecked() else None
+        messages = parse_sample_chat(self.sample_chat_edit.toPlainText())
+        segments = self.assembler.assemble(data, messages)
+        if self.assembler.rebuilt:
+            text = format_prompt(segments)
+            scroll = self.prompt_view.verticalScrollBar().value()
+            self.prompt_view.setPlainText(text)
+            self.prompt_view.verticalScrollBar().setValue(scroll)
+        elapsed = (time.perf_counter() - start) * 1000
+        self.stats_label.setText(
+            f"激活条目 {len(self.assembler.activated)} 个，共 {len(segments)} 段，"
+            f"重建 {len(self.assembler.rebuilt)} 段，用时 {elapsed:.0f} ms"
+        )
@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+TriggerGraphDialog.py
+条目触发关系对话框：显示当前条目能触发和被哪些条目触发、相互触发的条目组、最长的触发链与无法激活的条目
+"""
+
+from typing import List, Optional
+
+from PySide6.QtWidgets import (
+    QDialog, QVBoxLayout, QHBoxLayout, QLabel, QPushButton, QTreeWidget, QTreeWidgetItem, QWidget
+)
+from PySide6.QtCore import Qt, Signal
+
+from chat_replay import entry_title
+from lorebook_activation import MAX_RECURSION_STEPS
+from lorebook_graph import GraphReport, TriggerGraph
+
+# 每个分组中最多显示的条目数
+MAX_GROUP_ITEMS = 500
+
+
+class TriggerGraphDialog(QDialog):
+    """条目触发关系"""
+
+    # 点击结果中的条目，参数为行号
+    entry_requested = Signal(int)
+    # 请求按当前条目重新分析
+    refresh_requested = Signal()
+
+    def __init__(self, parent: Optional[QWidget] = None):
+        super().__init__(parent)
+        self.setWindowTitle("条目触发关系")
+        self.setMinimumSize(600, 500)
+        self.graph: Optional[TriggerGraph] = None
+        self.current_row = -1
+        self.setup_ui()
+
+    def setup_ui(self):
+        """设置UI"""
+        layout = QVBoxLayout(self)
+
+        self.summary_label = QLabel()
+        self.summary_label.setWordWrap(True)
+        layout.addWidget(self.summary_label)
+
+        self.tree = QTreeWidget()
+        self.tree.setHeaderHidden(True)
+        self.tree.itemClicked.connect(self.on_item_clicked)
+        layout.addWidget(self.tree)
+        self.current_root = QTreeWidgetItem(["当前条目"])
+        self.cycles_root = QTreeWidgetItem(["相互触发"])
+        self.chains_root = QTreeWidgetItem(["触发链"])
+        self.unreachable_root = QTreeWidgetItem(["无法激活"])
+        for root in (self.current_root, self.cycles_root, self.chains_root, self.unreachable_root):
+            self.tree.addTopLevelItem(root)
+
+        button_layout = QHBoxLayout()
+        button_layout.addStretch()
+        refresh_btn = QPushButton("刷新")
+        refresh_btn.clicked.connect(self.refresh_requested)
+        button_layout.addWidget(refresh_btn)
+        close_btn = QPushButton("关闭")
+        close_btn.clicked.connect(self.close)
+        button_layout.addWidget(close_btn)
+        layout.addLayout(button_layout)
+
+    def _entry_item(self, row: int, prefix: str = "") -> QTreeWidgetItem:
+        entries = self.graph.entries
+        item = QTreeWidgetItem([f"{prefix}[{row + 1}] {entry_title(entries[row], row)}"])
+        item.setData(0, Qt.ItemDataRole.UserRole, row)
+        return item
+
+    def _fill(self, root: QTreeWidgetItem, title: str, children: List[QTreeWidgetItem], total: int):
+        root.takeChildren()
+        root.setText(0, f"{title} ({total})")
+        root.addChildren(children)
+
+    def show_pending(self):
+        """首次分析在后台进行，完成前显示提示"""
+        if self.graph is None:
+            self.summary_label.setText("正在分析触发关系...")
+
+    def show_graph(self, graph: TriggerGraph, report: GraphReport, recursive: bool):
+        """显示分析结果（graph 已同步到当前条目，report 由 graph.report() 得到）"""
+        self.graph = graph
+        entries = graph.entries
+        summary = f"{len(entries)} 个条目，{report.edges} 条触发关系（重新扫描了 {graph.rescanned} 个条目）"
+        if not recursive:
+            summary += "。注意：世界书未开启递归扫描，条目之间不会相互触发"
+        self.summary_label.setText(summary)
+
+        cycle_items = []
+        for rows in report.cycles[:MAX_GROUP_ITEMS]:
+            item = QTreeWidgetItem([f"{len(rows)} 个条目相互触发"])
+            item.addChildren([self._entry_item(row) for row in rows])
+            cycle_items.append(item)
+        self._fill(self.cycles_root, "相互触发", cycle_items, len(report.cycles))
+
+        chain_items = []
+        for chain in report.chains:
+            text = f"{len(chain)} 层: {entry_title(entries[chain[0]], chain[0])} → … → {entry_title(entries[chain[-1]], chain[-1])}"
+            if len(chain) > MAX_RECURSION_STEPS + 1:
+                # 递归扫描的步数有限，链的后半段实际不会被激活
+                text += "（超过递归步数上限）"
+            item = QTreeWidgetItem([text])
+            item.addChildren([self._entry_item(row, f"{depth}. ") for depth, row in enumerate(chain, 1)])
+            chain_items.append(item)
+        self._fill(self.chains_root, "触发链", chain_items, len(report.chains))
+
+        unreachable = [self._entry_item(row) for row in report.unreachable[:MAX_GROUP_ITEMS]]
+        self._fill(self.unreachable_root, "无法激活", unreachable, len(report.unreachable))
+        self.show_current(self.current_row)
+
+    def show_current(self, row: int):
+        """显示某个条目能触发的和能触发它的条目"""
+        self.current_row = row
+        self.current_root.takeChildren()
+        graph = self.graph
+        if graph is None or not 0 <= row < len(graph.entries):
+            self.current_root.setText(0, "当前条目")
+            return
+        self.current_root.setText(0, f"当前条目: [{row + 1}] {entry_title(graph.entries[row], row)}")
+        triggers = graph.triggers(row)
+        triggers_item = QTreeWidgetItem([f"能触发 ({len(triggers)})"])
+        triggers_item.addChildren([self._entry_item(target, f"“{'、'.join(keys)}” → ")
+                                   for target, keys in triggers[:MAX_GROUP_ITEMS]])
+        sources = graph.triggered_by(row)
+        sources_item = QTreeWidgetItem([f"被触发自 ({len(sources)})"])
+        sources_item.addChildren([self._entry_item(source) for source in sources[:MAX_GROUP_ITEMS]])
+        self.current_root.addChildren([triggers_item, sources_item])
+        self.current_root.setExpanded(True)
+        triggers_item.setExpanded(True)
+        sources_item.setExpanded(True)
+
+    def on_item_clicked(self, item: QTreeWidgetItem, column: int):
+        row = item.data(0, Qt.ItemDataRole.UserRole)
+        if row is not None:
+            self.entry_requested.emit(row)
@@ -0,0 +1,212 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+card_cache.py
+最近打开的角色卡的二进制缓存，重新打开大型角色卡时跳过 JSON 解析。
+
+缓存以 (绝对路径, 修改时间, 文件大小) 为键，文件变化后自动失效。每个缓存文件的格式:
+
+    MAGIC | 头部长度 u32 | 头部 (JSON: 键与 Python/marshal 版本)
+    卡片外壳长度 u64 | 卡片外壳 (marshal，世界书 entries 置空)
+    条目数 n u64 | 条目偏移表 (n + 1 个 u64) | 各条目 (marshal)
+
+读取时整体 mmap，条目按偏移表单独解码，可以只取需要的条目。
+marshal 的格式与 Python 版本相关，版本不同时视为未命中。
+"""
+
+import hashlib
+import json
+import marshal
+import mmap
+import os
+import struct
+import sys
+from typing import Any, Dict, List, Optional
+
+from card_project import split_card
+
+MAGIC = b"CCWC\x01"
+# 默认保留的缓存文件数
+MAX_CACHED_CARDS = 8
+
+_U32 = struct.Struct("<I")
+_U64 = struct.Struct("<Q")
+
+
+def _runtime() -> List[int]:
+    return [sys.version_info[0], sys.version_info[1], marshal.version]
+
+
+def file_key(path: str) -> Dict[str, Any]:
+    """文件的缓存键"""
+    stat = os.stat(path)
+    return {"path": os.path.abspath(path), "mtime": stat.st_mtime_ns, "size": stat.st_size}
+
+
+class CachedCard:
+    """映射到内存的缓存角色卡，条目按需解码"""
+
+    def __init__(self, path: str):
+        self._file = open(path, 'rb')
+        try:
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError):
+            self._file.close()
+            raise
+        try:
+            self._parse(self._map)
+        except (ValueError, struct.error):
+            # 截断或损坏的缓存文件
+            self.close()
+            raise ValueError("角色卡缓存文件已损坏")
+
+    def _parse(self, view: mmap.mmap):
+        if view[:len(MAGIC)] != MAGIC:
+            raise ValueError("不是角色卡缓存文件")
+        position = len(MAGIC)
+        (header_length,) = _U32.unpack_from(view, position)
+        position += _U32.size
+        header = json.loads(view[position:position + header_length])
+        if not isinstance(header, dict):
+            raise ValueError("缓存头部格式有误")
+        self.header: Dict[str, Any] = header
+        position += header_length
+        (shell_length,) = _U64.unpack_from(view, position)
+        position += _U64.size
+        self._shell = (position, shell_length)
+        position += shell_length
+        (count,) = _U64.unpack_from(view, position)
+        position += _U64.size
+        self._blobs = position + (count + 1) * _U64.size
+        if self._blobs > len(view):
+            raise ValueError("条目偏移表超出文件范围")
+        self._offsets = struct.unpack_from(f"<{count + 1}Q", view, position)
+        if self._blobs + self._offsets[-1] > len(view):
+            raise ValueError("条目数据超出文件范围")
+
+    def __len__(self) -> int:
+        return len(self._offsets) - 1
+
+    def __enter__(self) -> "CachedCard":
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        self._map.close()
+        self._file.close()
+
+    def shell(self) -> Dict[str, Any]:
+        """不含世界书条目的角色卡"""
+        start, length = self._shell
+        return marshal.loads(self._map[start:start + length])
+
+    def entry(self, row: int) -> Any:
+        """解码单个条目"""
+        start = self._blobs + self._offsets[row]
+        end = self._blobs + self._offsets[row + 1]
+        return marshal.loads(self._map[start:end])
+
+    def card(self) -> Dict[str, Any]:
+        """解码完整的角色卡"""
+        card = self.shell()
+        if self.header.get("has_entries"):
+            card["data"]["character_book"]["entries"] = [self.entry(row) for row in range(len(self))]
+        return card
+
+
+class CardCache:
+    """缓存目录"""
+
+    def __init__(self, directory: str, limit: int = MAX_CACHED_CARDS):
+        self.directory = directory
+        self.limit = limit
+
+    def _cache_path(self, path: str) -> str:
+        digest = hashlib.blake2b(os.path.abspath(path).encode("utf-8"), digest_size=16).hexdigest()
+        return os.path.join(self.directory, digest + ".bin")
+
+    def open(self, path: str) -> Optional[CachedCard]:
+        """返回与文件当前状态一致的缓存，未命中时返回 None"""
+        cache_path = self._cache_path(path)
+        try:
+            key = file_key(path)
+            cached = CachedCard(cache_path)
+        except OSError:
+            return None
+        except ValueError:
+            self._discard(cache_path)
+            return None
+        if cached.header.get("key") != key or cached.header.get("runtime") != _runtime():
+            cached.close()
+            return None
+        try:
+            os.utime(cache_path)  # 记录最近使用时间，供淘汰时参考
+        except OSError:
+            pass
+        return cached
+
+    def load(self, path: str) -> Optional[Dict[str, Any]]:
+        """从缓存读取完整的角色卡，未命中时返回 None"""
+        cached = self.open(path)
+        if cached is None:
+            return None
+        with cached:
+            try:
+                return cached.card()
+            except (ValueError, EOFError, TypeError, struct.error):
+                pass
+        # 解码失败说明缓存已损坏，删除后按未命中处理
+        self._discard(self._cache_path(path))
+        return None
+
+    @staticmethod
+    def _discard(cache_path: str):
+        """删除损坏的缓存文件"""
+        try:
+            os.remove(cache_path)
+        except OSError:
+            pass
+
+    def store(self, path: str, card: Dict[str, Any]):
+        """为刚读取或刚写入的文件保存缓存"""
+        os.makedirs(self.directory, exist_ok=True)
+        shell, entries = split_card(card)
+        blobs = [marshal.dumps(entry) for entry in entries or []]
+        offsets = [0]
+        for blob in blobs:
+            offsets.append(offsets[-1] + len(blob))
+        header = json.dumps({
+            "key": file_key(path), "runtime": _runtime(), "has_entries": entries is not None,
+        }).encode("utf-8")
+        shell_blob = marshal.dumps(shell)
+
+        cache_path = self._cache_path(path)
+        temp_path = cache_path + ".tmp"
+        with open(temp_path, 'wb') as f:
+            f.write(MAGIC)
+            f.write(_U32.pack(len(header)))
+            f.write(header)
+            f.write(_U64.pack(len(shell_blob)))
+            f.write(shell_blob)
+            f.write(_U64.pack(len(blobs)))
+            f.write(struct.pack(f"<{len(offsets)}Q", *offsets))
+            for blob in blobs:
+                f.write(blob)
+        os.replace(temp_path, cache_path)
+        self._evict()
+
+    def _evict(self):
+        """只保留最近使用的若干个缓存文件"""
+        try:
+            names = [name for name in os.listdir(self.directory) if name.endswith(".bin")]
+        except OSError:
+            return
+        paths = sorted((os.path.join(self.directory, name) for name in names), key=os.path.getmtime, reverse=True)
+        for stale in paths[self.limit:]:
+            try:
+                os.remove(stale)
+            except OSError:
+                pass
@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+card_convert.py
+把 V1（字段平铺在顶层）和 V2 角色卡转换为 V3。
+
+V2 的必填字段缺失时补上空值，V3 新增的必填字段（group_only_greetings、条目的 use_regex）
+按规范的默认值补上；没有资源时加入规范规定的默认头像。其余字段原样保留。
+
+命令行用法:
+    python card_convert.py card_v2.json [输出文件]
+"""
+
+import copy
+import json
+import sys
+from typing import Any, Dict, List, Optional
+
+from card_validation import V2_CARD_FIELDS
+
+# 规范规定：没有资源时使用默认头像
+DEFAULT_ASSETS = [{"type": "icon", "uri": "ccdefault:", "name": "main", "ext": "png"}]
+
+_EMPTY = {"string": "", "string[]": [], "object": {}, "array": []}
+
+
+def to_v3(card: Dict[str, Any]) -> Dict[str, Any]:
+    """返回转换后的 V3 角色卡（新对象，原卡不变）"""
+    if not isinstance(card, dict):
+        raise ValueError("角色卡顶层不是对象")
+    if isinstance(card.get("data"), dict):
+        result = copy.deepcopy(card)
+    else:
+        # V1：字段直接在顶层
+        fields = {key: value for key, value in card.items() if key not in ("spec", "spec_version")}
+        result = {"data": copy.deepcopy(fields)}
+    data = result["data"]
+    for name, kind, required in V2_CARD_FIELDS:
+        if required and name not in data:
+            data[name] = copy.deepcopy(_EMPTY.get(kind, ""))
+    data.setdefault("group_only_greetings", [])
+    if not data.get("assets"):
+        data["assets"] = copy.deepcopy(DEFAULT_ASSETS)
+    book = data.get("character_book")
+    if isinstance(book, dict):
+        book.setdefault("extensions", {})
+        entries: List[Any] = book.setdefault("entries", [])
+        for entry in entries:
+            if isinstance(entry, dict):
+                entry.setdefault("extensions", {})
+                # V2 的关键字都是纯文本
+                entry.setdefault("use_regex", False)
+    result["spec"] = "chara_card_v3"
+    result["spec_version"] = "3.0"
+    # spec 放在最前面，与编辑器保存的格式一致
+    return {"spec": result.pop("spec"), "spec_version": result.pop("spec_version"), **result}
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    argv = sys.argv[1:] if argv is None else argv
+    if len(argv) not in (1, 2):
+        print(__doc__.strip().splitlines()[-1].strip())
+        return 2
+    try:
+        with open(argv[0], 'r', encoding='utf-8') as f:
+            card = to_v3(json.load(f))
+    except (OSError, ValueError) as e:
+        print(f"转换失败: {e}", file=sys.stderr)
+        return 1
+    text = json.dumps(card, ensure_ascii=False, indent=2)
+    if len(argv) == 2:
+        with open(argv[1], 'w', encoding='utf-8') as f:
+            f.write(text)
+    else:
+        print(text)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,550 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+card_diff.py
+角色卡与世界书的结构化比较和三方合并。
+
+世界书条目先按 id 配对，id 缺失或对不上的再按 content 哈希配对，
+然后逐字段比较；条目顺序变化通过最长递增子序列识别，只把真正移动的条目报告为 "moved"。
+全部基于哈希表，整体接近线性，一万条目的世界书也能在秒级内完成。
+
+命令行用法（可作为 git 的 merge driver: `python card_diff.py merge %O %A %B -o %A`）:
+    python card_diff.py diff old.json new.json
+    python card_diff.py merge base.json ours.json theirs.json -o merged.json
+"""
+
+import argparse
+import bisect
+import difflib
+import hashlib
+import json
+import sys
+from collections import Counter
+from typing import Any, Callable, Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+Path = Tuple[Any, ...]
+
+# 文本冲突标记
+CONFLICT_START = "<<<<<<< ours\n"
+CONFLICT_SEP = "=======\n"
+CONFLICT_END = ">>>>>>> theirs\n"
+
+_MISSING = object()
+
+
+class Change(NamedTuple):
+    """一处差异"""
+    path: Path
+    kind: str  # added / removed / changed / moved
+    old: Any = None
+    new: Any = None
+
+
+class EntryEdit(NamedTuple):
+    """把一组条目改成另一组的一步操作"""
+    kind: str  # update: 按 entries[0] 更新 row 处条目的字段; splice: 用 entries 替换从 row 开始的 count 个条目
+    row: int
+    count: int
+    entries: List[Dict[str, Any]]
+
+
+class Conflict(NamedTuple):
+    """三方合并中无法自动解决的一处冲突"""
+    path: Path
+    base: Any
+    ours: Any
+    theirs: Any
+
+
+# ---------- 条目配对 ----------
+
+def content_hash(entry: Dict[str, Any]) -> str:
+    """条目 content 的哈希，用于 id 配对失败时的回退匹配"""
+    return hashlib.blake2b(str(entry.get("content", "")).encode("utf-8"), digest_size=16).hexdigest()
+
+
+def entry_label(entry: Dict[str, Any]) -> str:
+    """条目在路径中的显示名"""
+    if "id" in entry:
+        return f"id={entry['id']}"
+    return f"#{content_hash(entry)[:8]}"
+
+
+def match_entries(old: List[Dict[str, Any]], new: List[Dict[str, Any]]) -> List[Tuple[Optional[int], Optional[int]]]:
+    """把两组条目配对，返回 (旧下标, 新下标) 列表；未配对的一侧为 None"""
+    pairs: List[Tuple[Optional[int], Optional[int]]] = []
+    matched_old = set()
+    matched_new = set()
+
+    def unique_ids(entries: List[Dict[str, Any]]) -> Dict[Any, int]:
+        seen: Dict[Any, int] = {}
+        duplicated = set()
+        for i, entry in enumerate(entries):
+            key = entry.get("id")
+            if key is None or isinstance(key, (dict, list)):
+                continue
+            if key in seen:
+                duplicated.add(key)
+            seen[key] = i
+        return {key: i for key, i in seen.items() if key not in duplicated}
+
+    old_ids = unique_ids(old)
+    new_ids = unique_ids(new)
+    old_hashes = [content_hash(entry) for entry in old]
+    new_hashes = [content_hash(entry) for entry in new]
+
+    # 第一轮：id 相同且内容相同
+    for key, i in old_ids.items():
+        j = new_ids.get(key)
+        if j is not None and old_hashes[i] == new_hashes[j]:
+            pairs.append((i, j))
+            matched_old.add(i)
+            matched_new.add(j)
+
+    # 第二轮：content 哈希（处理重新编号、重排后的条目）
+    by_hash: Dict[str, List[int]] = {}
+    for j in range(len(new)):
+        if j not in matched_new:
+            by_hash.setdefault(new_hashes[j], []).append(j)
+    for candidates in by_hash.values():
+        candidates.reverse()
+    for i in range(len(old)):
+        if i in matched_old:
+            continue
+        candidates = by_hash.get(old_hashes[i])
+        if candidates:
+            j = candidates.pop()
+            pairs.append((i, j))
+            matched_old.add(i)
+            matched_new.add(j)
+
+    # 第三轮：剩余的同 id 条目（id 相同但内容已改）
+    for key, i in old_ids.items():
+        j = new_ids.get(key)
+        if j is not None and i not in matched_old and j not in matched_new:
+            pairs.append((i, j))
+            matched_old.add(i)
+            matched_new.add(j)
+
+    pairs.extend((i, None) for i in range(len(old)) if i not in matched_old)
+    pairs.extend((None, j) for j in range(len(new)) if j not in matched_new)
+    return pairs
+
+
+def _moved_pairs(pairs: Iterable[Tuple[Optional[int], Optional[int]]]) -> List[Tuple[int, int]]:
+    """找出顺序发生变化的配对：不在最长递增子序列中的即视为移动"""
+    matched = sorted((i, j) for i, j in pairs if i is not None and j is not None)
+    tails: List[int] = []
+    tail_index: List[int] = []
+    parent = [-1] * len(matched)
+    for k, (_, j) in enumerate(matched):
+        pos = bisect.bisect_left(tails, j)
+        if pos == len(tails):
+            tails.append(j)
+            tail_index.append(k)
+        else:
+            tails[pos] = j
+            tail_index[pos] = k
+        parent[k] = tail_index[pos - 1] if pos else -1
+    keep = set()
+    k = tail_index[-1] if tail_index else -1
+    while k >= 0:
+        keep.add(k)
+        k = parent[k]
+    return [matched[k] for k in range(len(matched)) if k not in keep]
+
+
+# ---------- 比较 ----------
+
+def _surplus(items: List[str], surplus: "Counter[str]", make: Callable[[str], Change]) -> List[Change]:
+    """items 中多出的 surplus 个元素，按出现顺序各生成一条变化"""
+    changes = []
+    for item in items:
+        if surplus[item]:
+            surplus[item] -= 1
+            changes.append(make(item))
+    return changes
+
+
+def diff_values(old: Any, new: Any, path: Path = ()) -> List[Change]:
+    """递归比较两个 JSON 值"""
+    if old is new or old == new:
+        return []
+    if isinstance(old, dict) and isinstance(new, dict):
+        changes: List[Change] = []
+        for key, value in old.items():
+            if key not in new:
+                changes.append(Change(path + (key,), "removed", value, None))
+            else:
+                changes.extend(diff_values(value, new[key], path + (key,)))
+        for key, value in new.items():
+            if key not in old:
+                changes.append(Change(path + (key,), "added", None, value))
+        return changes
+    if isinstance(old, list) and isinstance(new, list) and _is_string_list(old) and _is_string_list(new):
+        old_counts, new_counts = Counter(old), Counter(new)
+        if old_counts == new_counts:
+            # 元素（含重复次数）相同，只是顺序不同
+            return [Change(path, "moved", old, new)]
+        # 按多重集合比较：重复项少了或多了几个就报告几次，按在原列表中出现的顺序
+        changes = _surplus(old, old_counts - new_counts, lambda item: Change(path, "removed", item, None))
+        changes += _surplus(new, new_counts - old_counts, lambda item: Change(path, "added", None, item))
+        return changes
+    return [Change(path, "changed", old, new)]
+
+
+def diff_entries(old: List[Dict[str, Any]], new: List[Dict[str, Any]], path: Path = ("character_book", "entries")) -> List[Change]:
+    """比较两组世界书条目"""
+    pairs = match_entries(old, new)
+    changes: List[Change] = []
+    for i, j in pairs:
+        if j is None:
+            changes.append(Change(path + (entry_label(old[i]),), "removed", old[i], None))
+        elif i is None:
+            changes.append(Change(path + (entry_label(new[j]),), "added", None, new[j]))
+        else:
+            changes.extend(diff_values(old[i], new[j], path + (entry_label(new[j]),)))
+    for i, j in _moved_pairs(pairs):
+        changes.append(Change(path + (entry_label(new[j]),), "moved", i, j))
+    return changes
+
+
+def plan_entry_edits(old: List[Dict[str, Any]], new: List[Dict[str, Any]]) -> List[EntryEdit]:
+    """把 old 改成 new 所需的最少操作：配对且顺序不变的条目只更新字段，其余按行拼接。
+    操作从后往前排列，依次执行时行号始终有效"""
+    new_to_old = {j: i for i, j in match_entries(old, new) if i is not None and j is not None}
+    old_tokens = list(range(len(old)))
+    new_tokens = [new_to_old.get(j, -1 - j) for j in range(len(new))]
+    matcher = difflib.SequenceMatcher(None, old_tokens, new_tokens, autojunk=False)
+    edits: List[EntryEdit] = []
+    for tag, i1, i2, j1, j2 in reversed(matcher.get_opcodes()):
+        if tag != "equal":
+            edits.append(EntryEdit("splice", i1, i2 - i1, new[j1:j2]))
+            continue
+        for k in range(i2 - i1 - 1, -1, -1):
+            if old[i1 + k] != new[j1 + k]:
+                edits.append(EntryEdit("update", i1 + k, 1, [new[j1 + k]]))
+    return edits
+
+
+def diff_cards(old: Dict[str, Any], new: Dict[str, Any]) -> List[Change]:
+    """比较两张角色卡（完整的 V2/V3 JSON），世界书条目按 id/内容配对"""
+    old_data = old.get("data", old)
+    new_data = new.get("data", new)
+    changes: List[Change] = []
+
+    for key in ("spec", "spec_version"):
+        if old.get(key) != new.get(key):
+            changes.append(Change((key,), "changed", old.get(key), new.get(key)))
+
+    for key in _ordered_keys(old_data, new_data):
+        if key == "character_book":
+            continue
+        if key not in new_data:
+            changes.append(Change((key,), "removed", old_data[key], None))
+        elif key not in old_data:
+            changes.append(Change((key,), "added", None, new_data[key]))
+        else:
+            changes.extend(diff_values(old_data[key], new_data[key], (key,)))
+
+    old_book = old_data.get("character_book") or {}
+    new_book = new_data.get("character_book") or {}
+    for key in _ordered_keys(old_book, new_book):
+        if key == "entries":
+            continue
+        changes.extend(diff_values(old_book.get(key), new_book.get(key), ("character_book", key)))
+    changes.extend(diff_entries(old_book.get("entries", []), new_book.get("entries", [])))
+    return changes
+
+
+def format_path(path: Path) -> str:
+    """('character_book', 'entries', 'id=3', 'extensions', 'depth') -> character_book.entries[id=3].extensions.depth"""
+    text = ""
+    for part in path:
+        part = str(part)
+        if part.startswith("id=") or part.startswith("#"):
+            text += f"[{part}]"
+        else:
+            text += f".{part}" if text else part
+    return text
+
+
+def format_diff(changes: List[Change], max_text_lines: int = 40) -> str:
+    """把差异列表格式化为可读文本，长文本字段给出行级 diff 片段"""
+    lines: List[str] = []
+    for change in changes:
+        where = format_path(change.path)
+        if change.kind == "added":
+            lines.append(f"+ {where}: {_short(change.new)}")
+        elif change.kind == "removed":
+            lines.append(f"- {where}: {_short(change.old)}")
+        elif change.kind == "moved":
+            if isinstance(change.old, int):
+                lines.append(f"~ {where}: 位置 {change.old + 1} -> {change.new + 1}")
+            else:
+                lines.append(f"~ {where}: 顺序变化")
+        elif isinstance(change.old, str) and isinstance(change.new, str) and ("\n" in change.old or "\n" in change.new):
+            lines.append(f"* {where}:")
+            text_diff = difflib.unified_diff(
+                change.old.splitlines(), change.new.splitlines(), lineterm="", n=1
+            )
+            for k, line in enumerate(list(text_diff)[2:]):
+                if k >= max_text_lines:
+                    lines.append("    ...")
+                    break
+                lines.append(f"    {line}")
+        else:
+            lines.append(f"* {where}: {_short(change.old)} -> {_short(change.new)}")
+    return "\n".join(lines)
+
+
+def _short(value: Any, limit: int = 80) -> str:
+    text = json.dumps(value, ensure_ascii=False)
+    return text if len(text) <= limit else text[:limit] + "..."
+
+
+def _is_string_list(value: List[Any]) -> bool:
+    return all(isinstance(item, str) for item in value)
+
+
+def _ordered_keys(a: Dict[str, Any], b: Dict[str, Any]) -> List[str]:
+    keys = list(a)
+    keys += [key for key in b if key not in a]
+    return keys
+
+
+# ---------- 三方合并 ----------
+
+def _line_hunks(base: List[str], other: List[str]) -> List[Tuple[int, int, List[str]]]:
+    """base -> other 的修改块: (base 起点, base 终点, 替换为的行)"""
+    matcher = difflib.SequenceMatcher(None, base, other, autojunk=False)
+    return [(i1, i2, other[j1:j2]) for tag, i1, i2, j1, j2 in matcher.get_opcodes() if tag != "equal"]
+
+
+def merge_text(base: str, ours: str, theirs: str) -> Tuple[str, bool]:
+    """按行的三方文本合并，返回 (结果, 是否有冲突)；冲突区域用标记包围"""
+    if ours == theirs or theirs == base:
+        return ours, False
+    if ours == base:
+        return theirs, False
+
+    base_lines = base.splitlines(keepends=True)
+    hunks = [(s, e, lines, 0) for s, e, lines in _line_hunks(base_lines, ours.splitlines(keepends=True))]
+    hunks += [(s, e, lines, 1) for s, e, lines in _line_hunks(base_lines, theirs.splitlines(keepends=True))]
+    hunks.sort(key=lambda h: (h[0], h[1]))
+
+    result: List[str] = []
+    conflict = False
+    pos = 0
+    k = 0
+    while k < len(hunks):
+        # 把相互重叠（或相邻）的修改块归为一组
+        start, end = hunks[k][0], hunks[k][1]
+        group = [hunks[k]]
+        k += 1
+        while k < len(hunks) and hunks[k][0] <= end:
+            end = max(end, hunks[k][1])
+            group.append(hunks[k])
+            k += 1
+        result.extend(base_lines[pos:start])
+        pos = end
+
+        versions = []
+        for side in (0, 1):
+            side_hunks = [h for h in group if h[3] == side]
+            if not side_hunks:
+                versions.append(None)
+                continue
+            lines: List[str] = []
+            cursor = start
+            for s, e, replacement, _ in side_hunks:
+                lines.extend(base_lines[cursor:s])
+                lines.extend(replacement)
+                cursor = e
+            lines.extend(base_lines[cursor:end])
+            versions.append(lines)
+        ours_lines, theirs_lines = versions
+        if ours_lines is None or theirs_lines is None or ours_lines == theirs_lines:
+            result.extend(ours_lines if ours_lines is not None else theirs_lines)
+        else:
+            conflict = True
+            result.append(CONFLICT_START)
+            result.extend(_terminated(ours_lines))
+            result.append(CONFLICT_SEP)
+            result.extend(_terminated(theirs_lines))
+            result.append(CONFLICT_END)
+    result.extend(base_lines[pos:])
+    return "".join(result), conflict
+
+
+def _terminated(lines: List[str]) -> List[str]:
+    if lines and not lines[-1].endswith("\n"):
+        return lines[:-1] + [lines[-1] + "\n"]
+    return lines
+
+
+def merge_string_lists(base: List[str], ours: List[str], theirs: List[str]) -> List[str]:
+    """集合式合并字符串列表：保留我方顺序，追加对方新增，去掉任一方删除的项"""
+    base_set, ours_set, theirs_set = set(base), set(ours), set(theirs)
+    removed = (base_set - ours_set) | (base_set - theirs_set)
+    merged = [item for item in ours if item not in removed]
+    merged_set = set(merged)
+    for item in theirs:
+        if item not in removed and item not in merged_set:
+            merged.append(item)
+            merged_set.add(item)
+    return merged
+
+
+def merge_values(base: Any, ours: Any, theirs: Any, path: Path, conflicts: List[Conflict]) -> Any:
+    """递归三方合并一个 JSON 值；_MISSING 表示该侧不存在此字段"""
+    if ours == theirs:
+        return ours
+    if base == theirs:
+        return ours
+    if base == ours:
+        return theirs
+    if isinstance(ours, dict) and isinstance(theirs, dict):
+        base_dict = base if isinstance(base, dict) else {}
+        merged: Dict[str, Any] = {}
+        for key in _ordered_keys(ours, theirs):
+            value = merge_values(
+                base_dict.get(key, _MISSING), ours.get(key, _MISSING), theirs.get(key, _MISSING),
+                path + (key,), conflicts
+            )
+            if value is not _MISSING:
+                merged[key] = value
+        return merged
+    if (isinstance(ours, list) and isinstance(theirs, list)
+            and _is_string_list(ours) and _is_string_list(theirs)):
+        base_list = base if isinstance(base, list) and _is_string_list(base) else []
+        return merge_string_lists(base_list, ours, theirs)
+    if isinstance(ours, str) and isinstance(theirs, str):
+        text, conflicted = merge_text(base if isinstance(base, str) else "", ours, theirs)
+        if conflicted:
+            conflicts.append(Conflict(path, base, ours, theirs))
+        return text
+    # 无法自动合并：保留我方并记录冲突
+    conflicts.append(Conflict(path, _none(base), _none(ours), _none(theirs)))
+    return ours if ours is not _MISSING else theirs
+
+
+def _none(value: Any) -> Any:
+    return None if value is _MISSING else value
+
+
+def merge_entries(base: List[Dict[str, Any]], ours: List[Dict[str, Any]], theirs: List[Dict[str, Any]],
+                  conflicts: List[Conflict], path: Path = ("character_book", "entries")) -> List[Dict[str, Any]]:
+    """三方合并世界书条目，结果顺序以我方为准，对方新增的条目追加在后"""
+    base_to_ours = {i: j for i, j in match_entries(base, ours) if i is not None}
+    base_to_theirs = {i: j for i, j in match_entries(base, theirs) if i is not None}
+    ours_to_theirs = {i: j for i, j in match_entries(ours, theirs) if i is not None and j is not None}
+
+    ours_base = {j: i for i, j in base_to_ours.items() if j is not None}
+    theirs_base = {j: i for i, j in base_to_theirs.items() if j is not None}
+
+    merged: List[Dict[str, Any]] = []
+    used_theirs = set()
+    for j, entry in enumerate(ours):
+        i = ours_base.get(j)
+        if i is None:
+            # 我方新增；若对方也新增了同一条目则合并
+            t = ours_to_theirs.get(j)
+            if t is not None and t not in theirs_base:
+                used_theirs.add(t)
+                merged.append(merge_values({}, entry, theirs[t], path + (entry_label(entry),), conflicts))
+            else:
+                merged.append(entry)
+            continue
+        t = base_to_theirs.get(i)
+        if t is None:
+            # 对方删除了此条目
+            if entry != base[i]:
+                conflicts.append(Conflict(path + (entry_label(entry),), base[i], entry, None))
+                merged.append(entry)
+            continue
+        used_theirs.add(t)
+        merged.append(merge_values(base[i], entry, theirs[t], path + (entry_label(entry),), conflicts))
+
+    for i, j in base_to_ours.items():
+        t = base_to_theirs.get(i)
+        if j is None and t is not None and theirs[t] != base[i]:
+            # 我方删除、对方修改
+            conflicts.append(Conflict(path + (entry_label(theirs[t]),), base[i], None, theirs[t]))
+            merged.append(theirs[t])
+            used_theirs.add(t)
+
+    for t, entry in enumerate(theirs):
+        if t not in used_theirs and t not in theirs_base:
+            merged.append(entry)
+    return merged
+
+
+def merge_cards(base: Dict[str, Any], ours: Dict[str, Any], theirs: Dict[str, Any]) -> Tuple[Dict[str, Any], List[Conflict]]:
+    """三方合并两张角色卡，返回 (合并结果, 冲突列表)"""
+    conflicts: List[Conflict] = []
+
+    def book_entries(card: Dict[str, Any]) -> List[Dict[str, Any]]:
+        return ((card.get("data") or {}).get("character_book") or {}).get("entries", [])
+
+    def strip_entries(card: Dict[str, Any]) -> Dict[str, Any]:
+        card = dict(card)
+        data = dict(card.get("data") or {})
+        if isinstance(data.get("character_book"), dict):
+            data["character_book"] = {k: v for k, v in data["character_book"].items() if k != "entries"}
+        card["data"] = data
+        return card
+
+    merged = merge_values(strip_entries(base), strip_entries(ours), strip_entries(theirs), (), conflicts)
+    entries = merge_entries(book_entries(base), book_entries(ours), book_entries(theirs), conflicts)
+    if entries or any(book_entries(card) for card in (base, ours, theirs)):
+        merged.setdefault("data", {}).setdefault("character_book", {"name": ""})["entries"] = entries
+    return merged, conflicts
+
+
+def format_conflicts(conflicts: List[Conflict]) -> str:
+    """冲突列表的简短说明"""
+    return "\n".join(
+        f"! {format_path(c.path) or '(root)'}: ours={_short(c.ours)} theirs={_short(c.theirs)}"
+        for c in conflicts
+    )
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """命令行入口"""
+    parser = argparse.ArgumentParser(description="角色卡结构化比较与三方合并")
+    sub = parser.add_subparsers(dest="command", required=True)
+    diff_parser = sub.add_parser("diff", help="比较两个角色卡文件")
+    diff_parser.add_argument("old")
+    diff_parser.add_argument("new")
+    merge_parser = sub.add_parser("merge", help="三方合并角色卡文件")
+    merge_parser.add_argument("base")
+    merge_parser.add_argument("ours")
+    merge_parser.add_argument("theirs")
+    merge_parser.add_argument("-o", "--output", help="输出文件，默认输出到标准输出")
+    args = parser.parse_args(argv)
+
+    def load(path: str) -> Dict[str, Any]:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    if args.command == "diff":
+        print(format_diff(diff_cards(load(args.old), load(args.new))))
+        return 0
+
+    merged, conflicts = merge_cards(load(args.base), load(args.ours), load(args.theirs))
+    text = json.dumps(merged, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text)
+    else:
+        print(text)
+    if conflicts:
+        print(format_conflicts(conflicts), file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+card_document.py
+多文档编辑中的单个文档：只保存角色卡数据、文件位置、撤销栈和少量界面状态。
+
+编辑控件（Markdown 编辑器、世界书条目编辑器等）在所有文档之间共用，
+切换文档时把当前控件内容收回到文档，再把目标文档的数据填入同一组控件，
+因此同时打开多张角色卡只多占用各自的数据和编辑历史。
+
+文档还保存最近一次读取或写入磁盘时的内容（marshal 序列化，比对象树紧凑），
+文件在外部被修改时以它为共同祖先，与编辑器中的内容做三方合并。
+"""
+
+import marshal
+import os
+from typing import Any, Dict, Optional
+
+from PySide6.QtGui import QUndoStack
+
+from card_project import CardProject
+from card_watcher import Signature, disk_signature
+
+
+class CardDocument:
+    """一张打开的角色卡"""
+
+    def __init__(self, data: Dict[str, Any], stack: QUndoStack, file_path: Optional[str] = None,
+                 project: Optional[CardProject] = None):
+        self.data = data
+        self.stack = stack
+        self.file_path = file_path
+        # 文件为项目目录时的增量保存器
+        self.project = project
+        # 切换离开时记下的界面位置，切换回来时恢复
+        self.tab_index = 0
+        self.entry_row = -1
+        # 磁盘上的内容及其文件签名
+        self._disk_data = b""
+        self.signature: Optional[Signature] = None
+        # 文件在外部被修改、但文档不在前台，切换回来时再载入
+        self.pending_reload = False
+        if file_path:
+            self.set_disk_state(data)
+
+    @property
+    def modified(self) -> bool:
+        """自上次保存或加载以来是否有未保存的修改"""
+        return not self.stack.isClean()
+
+    @property
+    def is_blank(self) -> bool:
+        """未关联文件且从未编辑过的新文档，打开文件时可以直接替换"""
+        return self.file_path is None and self.stack.count() == 0
+
+    def set_disk_state(self, data: Dict[str, Any]):
+        """记录刚从文件读取或刚写入文件的内容"""
+        self._disk_data = marshal.dumps(data)
+        self.signature = disk_signature(self.file_path) if self.file_path else None
+
+    @property
+    def disk_snapshot(self) -> bytes:
+        """序列化保存的磁盘内容（内存统计使用）"""
+        return self._disk_data
+
+    def disk_data(self) -> Dict[str, Any]:
+        """最近一次读取或写入磁盘时的内容"""
+        return marshal.loads(self._disk_data)
+
+    def disk_changed(self) -> bool:
+        """文件自上次读取或写入以来是否在外部被修改"""
+        return bool(self.file_path) and disk_signature(self.file_path) != self.signature
+
+    def title(self) -> str:
+        """文档标签上显示的名称"""
+        if self.file_path:
+            name = os.path.basename(os.path.normpath(self.file_path))
+        else:
+            name = self.data.get("data", {}).get("name") or "未命名"
+        return name + (" *" if self.modified else "")
+
+    def same_file(self, path: str) -> bool:
+        """是否为同一个文件或项目目录"""
+        return bool(self.file_path) and os.path.normcase(os.path.abspath(self.file_path)) == \
+            os.path.normcase(os.path.abspath(path))
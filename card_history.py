@@ -0,0 +1,412 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+card_history.py
+角色卡的撤销/重做。
+
+基于 QUndoStack 的命令日志：每一步只记录变化的部分——文本字段的拼接区间、
+列表的行拼接、世界书条目的字段差异——而不是整张卡的快照，
+因此每步的内存开销与改动大小成正比。历史长度有上限，超出时丢弃最旧的步骤。
+
+同时打开多个文档时，每个文档有自己的撤销栈，控件共用；切换文档时换用对应的栈，
+命令中的控件位置和条目行号对换回来的同一份内容仍然有效。
+"""
+
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union
+
+from PySide6.QtCore import QObject, QEvent
+from PySide6.QtGui import QKeySequence, QTextCursor, QUndoCommand, QUndoGroup, QUndoStack
+from PySide6.QtWidgets import QLineEdit, QPlainTextEdit, QTextEdit
+
+from PlainTextEditor import PlainTextEditor
+
+# 默认保留的最大步数
+HISTORY_LIMIT = 500
+
+# 连续输入合并时单条命令最多累积的字符数
+MERGE_LIMIT = 200
+
+_TEXT_COMMAND_ID = 1001
+
+
+def common_prefix_length(a: str, b: str) -> int:
+    """两个字符串公共前缀的长度（二分比较切片，避免逐字符的 Python 循环）"""
+    lo, hi = 0, min(len(a), len(b))
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if a[:mid] == b[:mid]:
+            lo = mid
+        else:
+            hi = mid - 1
+    return lo
+
+
+def common_suffix_length(a: str, b: str, limit: int) -> int:
+    """两个字符串公共后缀的长度，不超过 limit"""
+    lo, hi = 0, min(len(a), len(b), limit)
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if a[len(a) - mid:] == b[len(b) - mid:]:
+            lo = mid
+        else:
+            hi = mid - 1
+    return lo
+
+
+def text_delta(old: str, new: str, offset: int = 0) -> Tuple[int, str, str]:
+    """计算 old -> new 的最小拼接: (位置, 删除的文本, 插入的文本)"""
+    start = common_prefix_length(old, new)
+    end = common_suffix_length(old, new, min(len(old), len(new)) - start)
+    return offset + start, old[start:len(old) - end], new[start:len(new) - end]
+
+
+TextWidget = Union[QLineEdit, QTextEdit, QPlainTextEdit]
+
+
+class TextField:
+    """文本控件的绑定：维护一份影子文本，把每次修改转换成拼接区间"""
+
+    def __init__(self, history: "CardHistory", name: str, widget: TextWidget):
+        self.history = history
+        self.name = name
+        self.widget = widget
+        self.shadow = self.current_text()
+
+        if isinstance(widget, QLineEdit):
+            widget.textChanged.connect(self._on_line_changed)
+        elif isinstance(widget, PlainTextEditor):
+            # 编辑器自己维护文本并报告修改区间，影子文本直接引用它
+            widget.text_edited.connect(self._on_text_edited)
+        else:
+            widget.document().contentsChange.connect(self._on_contents_change)
+
+    def current_text(self) -> str:
+        if isinstance(self.widget, QLineEdit):
+            return self.widget.text()
+        return self.widget.toPlainText()
+
+    def resync(self):
+        self.shadow = self.current_text()
+
+    def _on_line_changed(self, text: str):
+        position, removed, inserted = text_delta(self.shadow, text)
+        self.shadow = text
+        self.history.record_text(self, position, removed, inserted)
+
+    def _on_text_edited(self, position: int, removed: str, inserted: str):
+        self.shadow = self.widget.toPlainText()
+        self.history.record_text(self, *text_delta(removed, inserted, position))
+
+    def _on_contents_change(self, position: int, chars_removed: int, chars_added: int):
+        document = self.widget.document()
+        length = document.characterCount() - 1  # 去掉文档末尾隐含的段落分隔符
+        inserted = ""
+        if chars_added:
+            cursor = QTextCursor(document)
+            cursor.setPosition(min(position, length))
+            cursor.setPosition(min(position + chars_added, length), QTextCursor.MoveMode.KeepAnchor)
+            inserted = cursor.selection().toPlainText()
+        removed = self.shadow[position:position + chars_removed]
+        new_shadow = self.shadow[:position] + inserted + self.shadow[position + chars_removed:]
+        if len(new_shadow) != length:
+            # Qt 报告的区间与影子文本对不上（如整体 setPlainText），退回整体比较
+            new_shadow = self.widget.toPlainText()
+            position, removed, inserted = text_delta(self.shadow, new_shadow)
+        else:
+            position, removed, inserted = text_delta(removed, inserted, position)
+        self.shadow = new_shadow
+        self.history.record_text(self, position, removed, inserted)
+
+    def splice(self, position: int, count: int, text: str):
+        """把 [position, position + count) 替换为 text，不整体重设控件内容"""
+        if isinstance(self.widget, QLineEdit):
+            current = self.widget.text()
+            self.widget.setText(current[:position] + text + current[position + count:])
+            self.widget.setCursorPosition(position + len(text))
+        elif isinstance(self.widget, PlainTextEditor):
+            self.widget.splice(position, count, text)
+        else:
+            cursor = QTextCursor(self.widget.document())
+            cursor.setPosition(position)
+            cursor.setPosition(position + count, QTextCursor.MoveMode.KeepAnchor)
+            cursor.insertText(text)
+            self.widget.setTextCursor(cursor)
+        self.widget.setFocus()
+
+
+class TextSpliceCommand(QUndoCommand):
+    """文本字段的一次修改"""
+
+    def __init__(self, field: TextField, position: int, removed: str, inserted: str):
+        super().__init__(f"编辑{field.name}")
+        self.field = field
+        self.position = position
+        self.removed = removed
+        self.inserted = inserted
+        self._pushed = False
+
+    def id(self) -> int:
+        return _TEXT_COMMAND_ID
+
+    def redo(self):
+        # 入栈时修改已经发生在控件上，跳过第一次 redo
+        if not self._pushed:
+            self._pushed = True
+            return
+        self.field.splice(self.position, len(self.removed), self.inserted)
+
+    def undo(self):
+        self.field.splice(self.position, len(self.inserted), self.removed)
+
+    def mergeWith(self, other: QUndoCommand) -> bool:
+        """合并同一字段上的连续输入或连续退格"""
+        if not isinstance(other, TextSpliceCommand) or other.field is not self.field:
+            return False
+        if len(self.inserted) + len(self.removed) >= MERGE_LIMIT:
+            return False
+        if not self.removed and not other.removed and other.position == self.position + len(self.inserted):
+            if "\n" in other.inserted:
+                return False
+            self.inserted += other.inserted
+            return True
+        if not self.inserted and not other.inserted and other.position + len(other.removed) == self.position:
+            self.position = other.position
+            self.removed = other.removed + self.removed
+            return True
+        return False
+
+
+class SpliceCommand(QUndoCommand):
+    """列表类数据的一次行拼接（标签、问候语、资源、世界书条目）"""
+
+    def __init__(self, text: str, splice: Callable[[int, int, List[Any]], None],
+                 row: int, removed: List[Any], inserted: List[Any]):
+        super().__init__(text)
+        self.splice = splice
+        self.row = row
+        self.removed = removed
+        self.inserted = inserted
+        self._pushed = False
+
+    def redo(self):
+        if not self._pushed:
+            self._pushed = True
+            return
+        self.splice(self.row, len(self.removed), self.inserted)
+
+    def undo(self):
+        self.splice(self.row, len(self.inserted), self.removed)
+
+
+class EntryEditCommand(QUndoCommand):
+    """世界书条目的字段级修改，只保存变化字段的新旧值"""
+
+    def __init__(self, book_widget: Any, row: int, changes: Dict[Tuple[str, ...], Tuple[Any, Any]]):
+        super().__init__(f"编辑世界书条目 {row + 1}")
+        self.book_widget = book_widget
+        self.row = row
+        self.changes = changes
+        self._pushed = False
+
+    def redo(self):
+        if not self._pushed:
+            self._pushed = True
+            return
+        self.book_widget.apply_entry_changes(self.row, {path: new for path, (old, new) in self.changes.items()})
+
+    def undo(self):
+        self.book_widget.apply_entry_changes(self.row, {path: old for path, (old, new) in self.changes.items()})
+
+
+class ColumnEditCommand(QUndoCommand):
+    """多个世界书条目同一字段的批量修改，按列保存各行的新旧值"""
+
+    def __init__(self, book_widget: Any, path: Tuple[str, ...], rows: List[int], old: List[Any], new: List[Any]):
+        super().__init__(f"批量修改 {len(rows)} 个条目的 {'.'.join(path)}")
+        self.book_widget = book_widget
+        self.path = path
+        self.rows = rows
+        self.old = old
+        self.new = new
+        self._pushed = False
+
+    def redo(self):
+        if not self._pushed:
+            self._pushed = True
+            return
+        self.book_widget.apply_column_values(self.path, self.rows, self.new)
+
+    def undo(self):
+        self.book_widget.apply_column_values(self.path, self.rows, self.old)
+
+
+class JsonEditCommand(QUndoCommand):
+    """JSON 树中一处值的修改（结构修改时为所在容器修改前后的浅拷贝）"""
+
+    def __init__(self, text: str, model: Any, path: Tuple[Any, ...], old: Any, new: Any):
+        super().__init__(text)
+        self.model = model
+        self.path = path
+        self.old = old
+        self.new = new
+        self._pushed = False
+
+    def redo(self):
+        if not self._pushed:
+            self._pushed = True
+            return
+        self.model.set_path(self.path, self.new)
+
+    def undo(self):
+        self.model.set_path(self.path, self.old)
+
+
+_PAYLOAD_ATTRIBUTES = ("removed", "inserted", "changes", "old", "new")
+
+
+def command_payloads(stack: QUndoStack) -> List[Any]:
+    """撤销栈中各命令保存的文本和数据（内存统计使用），包括复合操作中的子命令"""
+    payloads = []
+    commands = [stack.command(i) for i in range(stack.count())]
+    while commands:
+        command = commands.pop()
+        payloads.extend(getattr(command, name) for name in _PAYLOAD_ATTRIBUTES if hasattr(command, name))
+        commands.extend(command.child(i) for i in range(command.childCount()))
+    return payloads
+
+
+class CardHistory(QObject):
+    """角色卡编辑历史"""
+
+    def __init__(self, parent: Optional[QObject] = None, limit: int = HISTORY_LIMIT):
+        super().__init__(parent)
+        self.limit = limit
+        # 各文档的撤销栈，信号统一从 group 转发当前栈的状态
+        self.group = QUndoGroup(self)
+        self.stack = self.new_stack()
+        self.group.setActiveStack(self.stack)
+        self.text_fields: List[TextField] = []
+        self._flush_hooks: List[Callable[[], None]] = []
+        # >0 时表示正在回放或加载，控件变化不再记录为新命令
+        self._suspended = 0
+
+    @contextmanager
+    def suspended(self):
+        """在此期间的控件变化不进入历史（加载数据、回放命令时使用）"""
+        self._suspended += 1
+        try:
+            yield
+        finally:
+            self._suspended -= 1
+
+    def new_stack(self) -> QUndoStack:
+        """为新打开的文档创建撤销栈"""
+        stack = QUndoStack(self)
+        stack.setUndoLimit(self.limit)
+        self.group.addStack(stack)
+        return stack
+
+    def set_stack(self, stack: QUndoStack):
+        """切换到另一个文档的撤销栈；调用前控件应已填入该文档的内容"""
+        self.stack = stack
+        self.group.setActiveStack(stack)
+        for field in self.text_fields:
+            field.resync()
+
+    def remove_stack(self, stack: QUndoStack):
+        """文档关闭后释放它的撤销栈"""
+        self.group.removeStack(stack)
+        stack.deleteLater()
+
+    def reset(self):
+        """清空历史，并以当前控件内容作为新的基准"""
+        self.stack.clear()
+        for field in self.text_fields:
+            field.resync()
+
+    def watch_text(self, name: str, widget: TextWidget):
+        """记录文本控件的修改"""
+        self.text_fields.append(TextField(self, name, widget))
+        if not isinstance(widget, QLineEdit):
+            # 由全局历史统一负责撤销，关闭文档自带的撤销栈
+            widget.setUndoRedoEnabled(False)
+        widget.installEventFilter(self)
+
+    def watch_list(self, name: str, model: Any):
+        """记录 OrderedSetListModel 的行变更"""
+        model.rows_edited.connect(
+            lambda row, removed, inserted: self._record_splice(f"编辑{name}", model.splice, row, removed, inserted)
+        )
+
+    def watch_assets(self, assets_widget: Any):
+        """记录资源列表的变更"""
+        assets_widget.assets_edited.connect(
+            lambda row, removed, inserted: self._record_splice("编辑资源", assets_widget.splice, row, removed, inserted)
+        )
+
+    def watch_json(self, name: str, model: Any):
+        """记录 JsonTreeModel 中的修改"""
+        model.value_edited.connect(
+            lambda path, old, new: self._push(JsonEditCommand(f"编辑{name}", model, path, old, new))
+        )
+
+    def watch_book(self, book_widget: Any):
+        """记录世界书条目的增删和字段修改"""
+        book_widget.entries_spliced.connect(
+            lambda row, removed, inserted: self._record_splice("编辑世界书条目", book_widget.splice_entries, row, removed, inserted)
+        )
+        book_widget.entry_edited.connect(
+            lambda row, changes: self._push(EntryEditCommand(book_widget, row, changes))
+        )
+        book_widget.column_edited.connect(
+            lambda path, rows, old, new: self._push(ColumnEditCommand(book_widget, path, rows, old, new))
+        )
+        book_widget.batch_started.connect(self.begin_transaction)
+        book_widget.batch_finished.connect(self.end_transaction)
+        # 撤销前先提交编辑器中尚未保存的条目修改
+        self._flush_hooks.append(book_widget.save_current_entry)
+
+    def record_text(self, field: TextField, position: int, removed: str, inserted: str):
+        if removed or inserted:
+            self._push(TextSpliceCommand(field, position, removed, inserted))
+
+    def _record_splice(self, text: str, splice: Callable[[int, int, List[Any]], None],
+                       row: int, removed: List[Any], inserted: List[Any]):
+        self._push(SpliceCommand(text, splice, row, removed, inserted))
+
+    def _push(self, command: QUndoCommand):
+        if not self._suspended:
+            self.stack.push(command)
+
+    def begin_transaction(self, text: str):
+        """开始一个复合操作，之后的修改在撤销时作为一步"""
+        self.stack.beginMacro(text)
+
+    def end_transaction(self):
+        self.stack.endMacro()
+
+    def undo(self):
+        """撤销"""
+        self._flush()
+        with self.suspended():
+            self.stack.undo()
+
+    def redo(self):
+        """重做"""
+        self._flush()
+        with self.suspended():
+            self.stack.redo()
+
+    def _flush(self):
+        for hook in self._flush_hooks:
+            hook()
+
+    def eventFilter(self, watched: QObject, event: QEvent) -> bool:
+        # 文本控件默认会抢占 Ctrl+Z / Ctrl+Y 执行自己的局部撤销，这里让给全局历史
+        if event.type() == QEvent.Type.ShortcutOverride:
+            if event.matches(QKeySequence.StandardKey.Undo) or event.matches(QKeySequence.StandardKey.Redo):
+                event.ignore()
+                return True
+        return super().eventFilter(watched, event)
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+card_png.py
+读取 PNG 角色卡：SillyTavern 把角色卡 JSON 以 base64 写在 PNG 的 tEXt 块中，
+V3 卡片使用关键字 ccv3，V2 卡片使用 chara（两者都有时以 ccv3 为准）。
+
+只解析文本块，不解码图像数据。
+
+命令行用法:
+    python card_png.py card.png
+"""
+
+import base64
+import binascii
+import json
+import struct
+import sys
+import zlib
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+# 按优先级排列的角色卡文本块关键字
+CARD_KEYWORDS = ("ccv3", "chara")
+
+_CHUNK_HEADER = struct.Struct(">I4s")
+
+
+def iter_text_chunks(data: bytes) -> Iterator[Tuple[str, bytes]]:
+    """产出 PNG 中的 (关键字, 文本) ，支持 tEXt 与 zTXt；不是 PNG 时抛出 ValueError"""
+    if not data.startswith(PNG_SIGNATURE):
+        raise ValueError("不是 PNG 文件")
+    position = len(PNG_SIGNATURE)
+    while position + _CHUNK_HEADER.size <= len(data):
+        length, kind = _CHUNK_HEADER.unpack_from(data, position)
+        start = position + _CHUNK_HEADER.size
+        end = start + length
+        if end > len(data):
+            raise ValueError("PNG 文件不完整")
+        if kind == b"IEND":
+            return
+        if kind in (b"tEXt", b"zTXt"):
+            keyword, _, text = data[start:end].partition(b"\0")
+            if kind == b"zTXt":
+                # 第一个字节是压缩方法
+                try:
+                    text = zlib.decompress(text[1:])
+                except zlib.error:
+                    text = b""
+            yield keyword.decode("latin-1"), text
+        position = end + 4  # 跳过 CRC
+
+
+def card_from_png(data: bytes) -> Optional[Dict[str, Any]]:
+    """PNG 中嵌入的角色卡，没有时返回 None；数据损坏时抛出 ValueError"""
+    found: Dict[str, bytes] = {}
+    for keyword, text in iter_text_chunks(data):
+        if keyword in CARD_KEYWORDS and keyword not in found:
+            found[keyword] = text
+    for keyword in CARD_KEYWORDS:
+        if keyword in found:
+            try:
+                card = json.loads(base64.b64decode(found[keyword]).decode("utf-8"))
+            except (binascii.Error, UnicodeDecodeError, ValueError) as e:
+                raise ValueError(f"{keyword} 数据无法解析: {e}") from None
+            if not isinstance(card, dict):
+                raise ValueError(f"{keyword} 数据不是角色卡对象")
+            return card
+    return None
+
+
+def read_png_card(path: str) -> Optional[Dict[str, Any]]:
+    """读取 PNG 文件中的角色卡"""
+    with open(path, 'rb') as f:
+        return card_from_png(f.read())
+
+
+def card_name(card: Dict[str, Any]) -> str:
+    """角色卡的显示名称（V1 卡片的字段在顶层）"""
+    data = card.get("data") if isinstance(card.get("data"), dict) else card
+    name = data.get("name")
+    return name if isinstance(name, str) else ""
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    argv = sys.argv[1:] if argv is None else argv
+    if len(argv) != 1:
+        print(__doc__.strip().splitlines()[-1].strip())
+        return 2
+    try:
+        card = read_png_card(argv[0])
+    except (OSError, ValueError) as e:
+        print(f"读取失败: {e}", file=sys.stderr)
+        return 1
+    if card is None:
+        print("PNG 中没有角色卡数据", file=sys.stderr)
+        return 1
+    print(json.dumps(card, ensure_ascii=False, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,242 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+card_project.py
+角色卡的项目目录格式：把世界书拆成每个条目一个文件，便于增量保存和 git 比较。
+
+目录结构:
+    manifest.json      条目顺序、每个条目的文件名与内容哈希
+    card.json          除世界书条目以外的全部字段（entries 留空）
+    entries/*.json     每个条目一个文件
+
+保存时只写入内容哈希变化的条目文件和 card.json，删除不再使用的条目文件，
+因此一次小修改的磁盘写入量与修改大小相当，而不是整张卡。条目有唯一的整数 id 时以 id 命名，
+重排条目不会改变文件名；读取时按清单顺序拼回，得到与原卡完全相同的 JSON 对象。
+
+命令行用法:
+    python card_project.py split card.json project_dir
+    python card_project.py join project_dir card.json
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import sys
+from collections import Counter
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+MANIFEST_NAME = "manifest.json"
+CARD_NAME = "card.json"
+ENTRIES_DIR = "entries"
+PROJECT_FORMAT = "character-card-project"
+PROJECT_VERSION = 1
+
+
+class SaveStats(NamedTuple):
+    """一次保存的写入统计"""
+    written: int
+    unchanged: int
+    deleted: int
+
+
+def is_project(path: str) -> bool:
+    """path 是否为项目目录"""
+    return os.path.isdir(path) and os.path.isfile(os.path.join(path, MANIFEST_NAME))
+
+
+def _dumps(value: Any) -> str:
+    return json.dumps(value, ensure_ascii=False, indent=2) + "\n"
+
+
+def _hash(text: str) -> str:
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=16).hexdigest()
+
+
+def _write_text(path: str, text: str):
+    """先写临时文件再替换，保存中断时不会留下半个文件"""
+    temp_path = path + ".tmp"
+    with open(temp_path, 'w', encoding='utf-8', newline='\n') as f:
+        f.write(text)
+    os.replace(temp_path, path)
+
+
+def split_card(card: Dict[str, Any]) -> Tuple[Dict[str, Any], Optional[List[Any]]]:
+    """拆出世界书条目；返回 (去掉条目的卡片, 条目列表或 None)"""
+    data = card.get("data")
+    book = data.get("character_book") if isinstance(data, dict) else None
+    if not isinstance(book, dict) or not isinstance(book.get("entries"), list):
+        return card, None
+    # 只复制到 entries 所在的层级，保持各层的键顺序
+    shell = dict(card)
+    shell["data"] = dict(data)
+    shell["data"]["character_book"] = dict(book, entries=[])
+    return shell, book["entries"]
+
+
+class CardProject:
+    """项目目录的读写，记住上次保存的清单以便增量保存"""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        # 清单中的条目记录: [{"file": 文件名, "hash": 内容哈希}]
+        self.records: List[Dict[str, str]] = []
+        self.card_hash = ""
+        self.has_entries = False
+
+    def _path(self, *parts: str) -> str:
+        return os.path.join(self.directory, *parts)
+
+    def load(self) -> Dict[str, Any]:
+        """读取项目目录，拼回完整的角色卡"""
+        with open(self._path(MANIFEST_NAME), 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+        if not isinstance(manifest, dict) or manifest.get("format") != PROJECT_FORMAT:
+            raise ValueError("不是角色卡项目目录（manifest.json 格式不符）")
+        with open(self._path(CARD_NAME), 'r', encoding='utf-8') as f:
+            card_text = f.read()
+        card = json.loads(card_text)
+        self.card_hash = _hash(card_text)
+        self.records = []
+        self.has_entries = isinstance(manifest.get("entries"), list)
+        if not self.has_entries:
+            return card
+
+        entries = []
+        for record in manifest["entries"]:
+            with open(self._path(ENTRIES_DIR, record["file"]), 'r', encoding='utf-8') as f:
+                text = f.read()
+            entries.append(json.loads(text))
+            # 以文件的实际内容为准（可能在项目外被手动修改过）
+            self.records.append({"file": record["file"], "hash": _hash(text)})
+        card["data"]["character_book"]["entries"] = entries
+        return card
+
+    def _assign_files(self, entries: List[Any], hashes: List[str]) -> List[str]:
+        """为每个条目分配文件名：唯一的整数 id 用 id 命名，其余优先沿用内容相同的旧文件"""
+        ids = [entry.get("id") if isinstance(entry, dict) else None for entry in entries]
+        id_counts = Counter(entry_id for entry_id in ids
+                            if isinstance(entry_id, int) and not isinstance(entry_id, bool))
+        names: List[Optional[str]] = []
+        for entry_id in ids:
+            unique = isinstance(entry_id, int) and not isinstance(entry_id, bool) and id_counts[entry_id] == 1
+            names.append(f"id-{entry_id}.json" if unique else None)
+
+        taken = {name for name in names if name}
+        by_hash: Dict[str, List[str]] = {}
+        for record in self.records:
+            if record["file"] not in taken and not record["file"].startswith("id-"):
+                by_hash.setdefault(record["hash"], []).append(record["file"])
+        leftovers = [record["file"] for record in self.records
+                     if not record["file"].startswith("id-")]
+        used = set(taken)
+        for row, name in enumerate(names):
+            if name is None:
+                candidates = by_hash.get(hashes[row])
+                while candidates and candidates[-1] in used:
+                    candidates.pop()
+                if candidates:
+                    names[row] = candidates.pop()
+                    used.add(names[row])
+        # 内容变化的无 id 条目沿用尚未被占用的旧文件名，减少文件的删除和新建
+        leftovers = [name for name in leftovers if name not in used]
+        counter = 0
+        for row, name in enumerate(names):
+            if name is not None:
+                continue
+            if leftovers:
+                name = leftovers.pop(0)
+            else:
+                while True:
+                    counter += 1
+                    name = f"entry-{counter}.json"
+                    if name not in used:
+                        break
+            names[row] = name
+            used.add(name)
+        return names  # type: ignore[return-value]
+
+    def save(self, card: Dict[str, Any]) -> SaveStats:
+        """增量保存：只写入变化的文件"""
+        os.makedirs(self._path(ENTRIES_DIR), exist_ok=True)
+        shell, entries = split_card(card)
+
+        written = unchanged = deleted = 0
+        card_text = _dumps(shell)
+        card_hash = _hash(card_text)
+        if card_hash != self.card_hash or not os.path.exists(self._path(CARD_NAME)):
+            _write_text(self._path(CARD_NAME), card_text)
+            self.card_hash = card_hash
+            written += 1
+        else:
+            unchanged += 1
+
+        records: List[Dict[str, str]] = []
+        if entries is not None:
+            texts = [_dumps(entry) for entry in entries]
+            hashes = [_hash(text) for text in texts]
+            names = self._assign_files(entries, hashes)
+            previous = {record["file"]: record["hash"] for record in self.records}
+            for name, text, entry_hash in zip(names, texts, hashes):
+                path = self._path(ENTRIES_DIR, name)
+                if previous.get(name) == entry_hash and os.path.exists(path):
+                    unchanged += 1
+                else:
+                    _write_text(path, text)
+                    written += 1
+                records.append({"file": name, "hash": entry_hash})
+
+        live = {record["file"] for record in records}
+        for record in self.records:
+            if record["file"] not in live:
+                try:
+                    os.remove(self._path(ENTRIES_DIR, record["file"]))
+                    deleted += 1
+                except FileNotFoundError:
+                    pass
+
+        if records != self.records or self.has_entries != (entries is not None) \
+                or not os.path.exists(self._path(MANIFEST_NAME)):
+            manifest = {
+                "format": PROJECT_FORMAT,
+                "version": PROJECT_VERSION,
+                "entries": records if entries is not None else None,
+            }
+            _write_text(self._path(MANIFEST_NAME), json.dumps(manifest, ensure_ascii=False, indent=1) + "\n")
+            written += 1
+        self.records = records
+        self.has_entries = entries is not None
+        return SaveStats(written, unchanged, deleted)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """命令行入口"""
+    parser = argparse.ArgumentParser(description="角色卡与项目目录（每个世界书条目一个文件）互相转换")
+    sub = parser.add_subparsers(dest="command", required=True)
+    split_parser = sub.add_parser("split", help="把角色卡 JSON 拆成项目目录（已存在时增量更新）")
+    split_parser.add_argument("card")
+    split_parser.add_argument("directory")
+    join_parser = sub.add_parser("join", help="把项目目录合并为单个角色卡 JSON")
+    join_parser.add_argument("directory")
+    join_parser.add_argument("card")
+    args = parser.parse_args(argv)
+
+    if args.command == "split":
+        with open(args.card, 'r', encoding='utf-8') as f:
+            card = json.load(f)
+        project = CardProject(args.directory)
+        if is_project(args.directory):
+            project.load()
+        stats = project.save(card)
+        print(f"写入 {stats.written} 个文件，未变化 {stats.unchanged} 个，删除 {stats.deleted} 个")
+        return 0
+
+    card = CardProject(args.directory).load()
+    with open(args.card, 'w', encoding='utf-8') as f:
+        json.dump(card, f, ensure_ascii=False, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
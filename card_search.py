@@ -0,0 +1,323 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+card_search.py
+角色卡的查找与替换：覆盖所有文本字段、列表项和世界书条目（内容、备注、关键字），
+支持普通文本和正则表达式两种模式。
+
+模式只编译一次（按参数缓存）；整个角色卡库的查找/替换通过进程池并行处理，
+每个工作进程在启动时编译一次模式，之后逐个文件读取、匹配、按需写回。
+
+命令行用法:
+    python card_search.py 旧名字 cards/ [--replace 新名字] [--regex] [--ignore-case] [--word] [-j 8]
+"""
+
+import argparse
+import functools
+import json
+import multiprocessing
+import os
+import re
+import sys
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Any, Callable, Dict, Iterable, Iterator, List, NamedTuple, Optional, Pattern, Tuple
+
+from card_validation import Path, format_path
+
+# 角色卡中参与查找的字段
+TEXT_FIELDS = (
+    "name", "nickname", "creator", "character_version", "description", "personality", "scenario",
+    "first_mes", "mes_example", "system_prompt", "post_history_instructions", "creator_notes",
+)
+LIST_FIELDS = ("tags", "source", "alternate_greetings", "group_only_greetings")
+ENTRY_TEXT_FIELDS = ("content", "comment")
+ENTRY_LIST_FIELDS = ("keys", "secondary_keys")
+
+BOOK_PATH = ("data", "character_book")
+
+# 匹配上下文两侧各保留的字符数
+CONTEXT_CHARS = 30
+# 整库查找时每个文件最多带回的匹配数（用于预览）
+MAX_FILE_MATCHES = 200
+# 文件数不超过此值时不启动进程池
+POOL_THRESHOLD = 4
+
+
+class SearchOptions(NamedTuple):
+    """查找参数"""
+    pattern: str
+    replacement: str = ""
+    regex: bool = False
+    case_sensitive: bool = True
+    whole_word: bool = False
+
+
+class Match(NamedTuple):
+    """一处匹配"""
+    path: Path
+    start: int
+    end: int
+    context: str
+    replacement: str
+
+
+class FileResult(NamedTuple):
+    """整库查找中单个文件的结果"""
+    path: str
+    count: int
+    matches: List[Match]
+    replaced: int = 0
+    error: str = ""
+
+
+@functools.lru_cache(maxsize=64)
+def _compile(pattern: str, regex: bool, case_sensitive: bool, whole_word: bool) -> Pattern[str]:
+    source = pattern if regex else re.escape(pattern)
+    if whole_word:
+        source = rf"\b(?:{source})\b"
+    return re.compile(source, 0 if case_sensitive else re.IGNORECASE)
+
+
+def compile_pattern(options: SearchOptions) -> Pattern[str]:
+    """编译查找模式；正则语法错误时抛出 re.error"""
+    if not options.pattern:
+        raise ValueError("查找内容为空")
+    return _compile(options.pattern, options.regex, options.case_sensitive, options.whole_word)
+
+
+def replacement_template(options: SearchOptions) -> str:
+    """re.sub 使用的替换模板：正则模式下支持 \\1、\\g<name> 引用，普通模式下按字面替换"""
+    return options.replacement if options.regex else options.replacement.replace("\\", "\\\\")
+
+
+def iter_targets(card: Dict[str, Any]) -> Iterator[Tuple[Path, str]]:
+    """产出角色卡中参与查找的 (路径, 文本)"""
+    data = card.get("data")
+    if not isinstance(data, dict):
+        return
+    for field in TEXT_FIELDS:
+        if isinstance(data.get(field), str):
+            yield ("data", field), data[field]
+    for field in LIST_FIELDS:
+        if isinstance(data.get(field), list):
+            for index, item in enumerate(data[field]):
+                if isinstance(item, str):
+                    yield ("data", field, index), item
+    book = data.get("character_book")
+    if not isinstance(book, dict):
+        return
+    if isinstance(book.get("name"), str):
+        yield BOOK_PATH + ("name",), book["name"]
+    entries = book.get("entries")
+    if not isinstance(entries, list):
+        return
+    for row, entry in enumerate(entries):
+        if not isinstance(entry, dict):
+            continue
+        for field in ENTRY_TEXT_FIELDS:
+            if isinstance(entry.get(field), str):
+                yield BOOK_PATH + ("entries", row, field), entry[field]
+        for field in ENTRY_LIST_FIELDS:
+            if isinstance(entry.get(field), list):
+                for index, item in enumerate(entry[field]):
+                    if isinstance(item, str):
+                        yield BOOK_PATH + ("entries", row, field, index), item
+
+
+def _context(text: str, start: int, end: int) -> str:
+    left = max(start - CONTEXT_CHARS, 0)
+    right = min(end + CONTEXT_CHARS, len(text))
+    snippet = text[left:start] + "【" + text[start:end] + "】" + text[end:right]
+    snippet = snippet.replace("\r", " ").replace("\n", " ")
+    return ("..." if left else "") + snippet + ("..." if right < len(text) else "")
+
+
+def find_matches(card: Dict[str, Any], options: SearchOptions, limit: int = 0) -> Tuple[int, List[Match]]:
+    """查找所有匹配，返回 (匹配总数, 匹配列表)；limit > 0 时列表最多保留 limit 项"""
+    pattern = compile_pattern(options)
+    template = replacement_template(options)
+    count = 0
+    matches: List[Match] = []
+    for path, text in iter_targets(card):
+        if limit and len(matches) >= limit:
+            # 列表已满，只计数（findall 在 C 中完成，不逐个创建匹配对象）
+            count += len(pattern.findall(text))
+            continue
+        for match in pattern.finditer(text):
+            count += 1
+            if not limit or len(matches) < limit:
+                matches.append(Match(path, match.start(), match.end(),
+                                     _context(text, match.start(), match.end()), match.expand(template)))
+    return count, matches
+
+
+def plan_replacements(card: Dict[str, Any], options: SearchOptions) -> List[Tuple[Path, str, str]]:
+    """计算全部替换，返回有变化的 (路径, 原文本, 新文本)，不修改角色卡"""
+    pattern = compile_pattern(options)
+    template = replacement_template(options)
+    changes = []
+    for path, text in iter_targets(card):
+        new_text = pattern.sub(template, text)
+        if new_text != text:
+            changes.append((path, text, new_text))
+    return changes
+
+
+def set_value(card: Dict[str, Any], path: Path, value: Any):
+    """按路径写入值"""
+    target: Any = card
+    for key in path[:-1]:
+        target = target[key]
+    target[path[-1]] = value
+
+
+def unique_items(items: Iterable[Any]) -> List[Any]:
+    """列表字段的集合规则：文本项去掉首尾空白，丢弃空项，重复项只保留第一个"""
+    result: List[Any] = []
+    seen = set()
+    for item in items:
+        if isinstance(item, str):
+            item = item.strip()
+            if not item or item in seen:
+                continue
+            seen.add(item)
+        result.append(item)
+    return result
+
+
+def replace_in_card(card: Dict[str, Any], options: SearchOptions) -> int:
+    """在角色卡中就地执行全部替换，返回修改的字段数"""
+    changes = plan_replacements(card, options)
+    lists: Dict[Path, None] = {}
+    for path, _, new_text in changes:
+        set_value(card, path, new_text)
+        if isinstance(path[-1], int):
+            lists[path[:-1]] = None
+    # 改动过的列表按集合规则整理：替换成空的项被删除，重复项合并
+    for path in lists:
+        items: Any = card
+        for key in path:
+            items = items[key]
+        items[:] = unique_items(items)
+    return len(changes)
+
+
+# ---------- 整个角色卡库 ----------
+
+def iter_card_files(paths: List[str]) -> Iterator[str]:
+    """展开文件和目录，产出其中的 .json 文件"""
+    for path in paths:
+        if os.path.isdir(path):
+            for root, _, names in os.walk(path):
+                for name in sorted(names):
+                    if name.lower().endswith(".json"):
+                        yield os.path.join(root, name)
+        else:
+            yield path
+
+
+_worker_options: Optional[SearchOptions] = None
+_worker_replace = False
+
+
+def _init_worker(options: SearchOptions, replace: bool):
+    """工作进程初始化：编译一次模式"""
+    global _worker_options, _worker_replace
+    compile_pattern(options)
+    _worker_options = options
+    _worker_replace = replace
+
+
+def _process_file(path: str) -> FileResult:
+    options = _worker_options
+    assert options is not None
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            card = json.load(f)
+        if not isinstance(card, dict) or not isinstance(card.get("data"), dict):
+            return FileResult(path, 0, [], error="不是 V2/V3 角色卡")
+        count, matches = find_matches(card, options, MAX_FILE_MATCHES)
+        replaced = 0
+        if _worker_replace and count:
+            replaced = replace_in_card(card, options)
+            temp_path = path + ".tmp"
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                json.dump(card, f, ensure_ascii=False, indent=2)
+            os.replace(temp_path, path)
+        return FileResult(path, count, matches, replaced)
+    except (OSError, ValueError, re.error) as e:
+        return FileResult(path, 0, [], error=str(e))
+
+
+def search_library(paths: List[str], options: SearchOptions, replace: bool = False,
+                   workers: Optional[int] = None,
+                   on_result: Optional[Callable[[FileResult], None]] = None,
+                   should_stop: Optional[Callable[[], bool]] = None) -> List[FileResult]:
+    """在多个角色卡文件中查找（replace 为 True 时同时替换并写回），结果按完成顺序返回"""
+    compile_pattern(options)  # 模式有误时在启动进程之前报错
+    files = list(iter_card_files(paths))
+    results: List[FileResult] = []
+
+    def collect(result: FileResult) -> bool:
+        results.append(result)
+        if on_result is not None:
+            on_result(result)
+        return should_stop is not None and should_stop()
+
+    if len(files) <= POOL_THRESHOLD or workers == 1:
+        _init_worker(options, replace)
+        for path in files:
+            if collect(_process_file(path)):
+                break
+        return results
+
+    # 编辑器中有其他线程在运行，用 spawn 启动工作进程比 fork 安全
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"),
+                             initializer=_init_worker, initargs=(options, replace)) as executor:
+        futures = [executor.submit(_process_file, path) for path in files]
+        for future in as_completed(futures):
+            if collect(future.result()):
+                for pending in futures:
+                    pending.cancel()
+                break
+    return results
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """命令行入口"""
+    parser = argparse.ArgumentParser(description="在角色卡的文本字段、列表和世界书条目中查找/替换")
+    parser.add_argument("pattern", help="查找内容")
+    parser.add_argument("paths", nargs="+", help="角色卡 JSON 文件或目录")
+    parser.add_argument("--replace", metavar="TEXT", help="替换为 TEXT 并写回文件")
+    parser.add_argument("-r", "--regex", action="store_true", help="按正则表达式查找")
+    parser.add_argument("-i", "--ignore-case", action="store_true", help="不区分大小写")
+    parser.add_argument("-w", "--word", action="store_true", help="全词匹配")
+    parser.add_argument("-j", "--jobs", type=int, default=None, help="工作进程数（默认为 CPU 数）")
+    args = parser.parse_args(argv)
+
+    options = SearchOptions(args.pattern, args.replace or "", args.regex, not args.ignore_case, args.word)
+    try:
+        results = search_library(args.paths, options, args.replace is not None, args.jobs)
+    except (re.error, ValueError) as e:
+        print(f"查找模式无效: {e}", file=sys.stderr)
+        return 2
+
+    total = 0
+    for result in sorted(results, key=lambda result: result.path):
+        if result.error:
+            print(f"{result.path}: 跳过（{result.error}）", file=sys.stderr)
+            continue
+        if not result.count:
+            continue
+        total += result.count
+        suffix = f"，替换了 {result.replaced} 个字段" if result.replaced else ""
+        print(f"{result.path}: {result.count} 处匹配{suffix}")
+        for match in result.matches:
+            print(f"  {format_path(match.path)}: {match.context}")
+    print(f"共 {total} 处匹配，涉及 {sum(1 for result in results if result.count)} 个文件")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
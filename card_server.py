@@ -0,0 +1,443 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+card_server.py
+无界面的本地角色卡服务（asyncio），供机器人、CI 检查等工具调用编辑器中的同一套逻辑:
+解析、校验、V2→V3 转换、世界书激活和 token 统计。
+
+角色卡只在第一次被请求时读取，解析结果、增量校验缓存和关键字匹配索引保存在按最近使用淘汰的缓存中；
+每次请求前比较文件签名，文件被修改时重新读取，并只让变化的条目重新校验和重新编入索引。
+
+协议为按行分隔的 JSON：每行一个请求 {"id": ..., "method": ..., "params": {...}}，
+每个请求返回一行 {"id": ..., "result": ...} 或 {"id": ..., "error": {"message": ...}}。
+同一连接上的请求并发处理，响应按完成顺序返回，用 id 对应。
+
+方法:
+    load      {"path"}                                  读取（或确认已缓存）角色卡
+    validate  {"path"} 或 {"card"}                      校验，返回诊断列表
+    convert   {"path"} 或 {"card"}                      转换为 V3
+    activate  {"path", "messages", "user", "macros"}    计算被激活的世界书条目
+    tokens    {"path"} 或 {"text"}                      估算各字段和各条目的 token 数
+    stats     {}                                        缓存状态
+    evict     {"path"}                                  从缓存中移除（不给 path 时清空）
+
+命令行用法:
+    python card_server.py serve [--host 127.0.0.1] [--port 8765] [--unix 路径] [--cache-size 16]
+    python card_server.py call 方法 ['{"path": "card.json"}'] [--port 8765 | --unix 路径]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Set
+
+from card_convert import to_v3
+from card_project import CardProject, is_project
+from card_validation import ERROR, CardValidator, Diagnostic, format_path, validate_card
+from card_watcher import Signature, disk_signature
+from chat_replay import estimate_tokens
+from lorebook_activation import LorebookActivator, Message
+from macros import card_context
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+# 缓存的角色卡数
+DEFAULT_CACHE_SIZE = 16
+# 单个请求（一行）的最大长度，请求中可以直接带整张角色卡
+MAX_REQUEST_BYTES = 64 * 1024 * 1024
+
+# 统计 token 的卡片字段
+TOKEN_FIELDS = (
+    "description", "personality", "scenario", "first_mes", "mes_example",
+    "system_prompt", "post_history_instructions",
+)
+
+
+def read_card(path: str) -> Dict[str, Any]:
+    """读取角色卡文件或项目目录"""
+    if is_project(path):
+        card = CardProject(path).load()
+    else:
+        with open(path, 'r', encoding='utf-8') as f:
+            card = json.load(f)
+    if not isinstance(card, dict) or not isinstance(card.get("data"), dict):
+        raise ValueError("不是 V2/V3 角色卡（缺少 data 对象）")
+    return card
+
+
+def diagnostic_dict(diagnostic: Diagnostic) -> Dict[str, str]:
+    return {"path": format_path(diagnostic.path), "severity": diagnostic.severity, "message": diagnostic.message}
+
+
+def validation_result(diagnostics: List[Diagnostic]) -> Dict[str, Any]:
+    errors = sum(1 for diagnostic in diagnostics if diagnostic.severity == ERROR)
+    return {
+        "diagnostics": [diagnostic_dict(diagnostic) for diagnostic in diagnostics],
+        "errors": errors, "warnings": len(diagnostics) - errors,
+    }
+
+
+def card_entries(card: Dict[str, Any]) -> List[Dict[str, Any]]:
+    book = (card.get("data") or {}).get("character_book")
+    entries = book.get("entries") if isinstance(book, dict) else None
+    return entries if isinstance(entries, list) else []
+
+
+class CardState:
+    """一张已读取的角色卡及其常驻的校验缓存、激活索引和 token 缓存"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.signature: Optional[Signature] = None
+        self.card: Dict[str, Any] = {}
+        self.validator = CardValidator()
+        self.activator = LorebookActivator()
+        # 文本 → token 数
+        self._tokens: Dict[str, int] = {}
+        self.loads = 0
+        self.lock = asyncio.Lock()
+
+    @property
+    def data(self) -> Dict[str, Any]:
+        return self.card.get("data") or {}
+
+    @property
+    def book(self) -> Dict[str, Any]:
+        book = self.data.get("character_book")
+        return book if isinstance(book, dict) else {}
+
+    @property
+    def entries(self) -> List[Dict[str, Any]]:
+        entries = self.book.get("entries")
+        return entries if isinstance(entries, list) else []
+
+    def replace(self, card: Dict[str, Any], signature: Optional[Signature]):
+        """换成重新读取的内容，校验缓存和激活索引只处理变化的条目"""
+        if self.loads:
+            old, new = self.entries, card_entries(card)
+            # 去掉首尾相同的条目，中间部分按行比较（条数不同时整段拼接）
+            start = 0
+            while start < min(len(old), len(new)) and old[start] == new[start]:
+                start += 1
+            end = 0
+            while end < min(len(old), len(new)) - start and old[-1 - end] == new[-1 - end]:
+                end += 1
+            # 未变化的条目沿用原对象，激活索引按对象标识登记，这些条目不必重新登记
+            for offset in range(start):
+                new[offset] = old[offset]
+            for offset in range(1, end + 1):
+                new[-offset] = old[-offset]
+            if len(old) == len(new):
+                for row in range(start, len(old) - end):
+                    if old[row] == new[row]:
+                        new[row] = old[row]
+                    else:
+                        self.validator.invalidate_entry(row)
+            else:
+                self.validator.splice_entries(start, len(old) - end - start, len(new) - end - start)
+        self.card = card
+        self.signature = signature
+        self.loads += 1
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "path": self.path, "name": self.data.get("name", ""), "spec": self.card.get("spec", ""),
+            "entries": len(self.entries), "loads": self.loads,
+        }
+
+    def validate(self) -> Dict[str, Any]:
+        return validation_result(self.validator.validate(self.card))
+
+    def activate(self, messages: List[Message], user: str, macros: bool) -> Dict[str, Any]:
+        context = card_context(self.data, user) if macros else None
+        entries = self.entries
+        activated = self.activator.activate(self.book, messages, context)
+        return {"entries": [
+            dict(entry._asdict(), comment=str(entries[entry.row].get("comment") or ""))
+            for entry in activated
+        ]}
+
+    def count(self, text: str) -> int:
+        tokens = self._tokens.get(text)
+        if tokens is None:
+            tokens = self._tokens[text] = estimate_tokens(text)
+        return tokens
+
+    def tokens(self) -> Dict[str, Any]:
+        data = self.data
+        fields = {name: self.count(data[name]) for name in TOKEN_FIELDS if isinstance(data.get(name), str)}
+        entries = [self.count(str(entry.get("content") or "")) for entry in self.entries]
+        constant = sum(tokens for entry, tokens in zip(self.entries, entries)
+                       if entry.get("constant") and entry.get("enabled") is not False)
+        # 只保留当前内容的计数，文件反复修改时缓存不会无限增长
+        current = {text for text in (*(data[name] for name in fields),
+                                     *(str(entry.get("content") or "") for entry in self.entries))}
+        if len(self._tokens) > len(current):
+            self._tokens = {text: tokens for text, tokens in self._tokens.items() if text in current}
+        return {
+            "fields": fields, "entries": entries, "constant_entries": constant,
+            "total": sum(fields.values()) + sum(entries),
+        }
+
+
+class CardRegistry:
+    """按最近使用淘汰的角色卡缓存；取用时检查文件签名，文件变化后重新读取"""
+
+    def __init__(self, capacity: int = DEFAULT_CACHE_SIZE):
+        self.capacity = max(1, capacity)
+        self._states: "OrderedDict[str, CardState]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.reloads = 0
+
+    @asynccontextmanager
+    async def use(self, path: str) -> AsyncIterator[CardState]:
+        """取得最新的角色卡状态并独占它直到退出（同一张卡上的请求依次执行）"""
+        path = os.path.realpath(path)
+        state = self._states.get(path)
+        if state is None:
+            state = self._states[path] = CardState(path)
+            while len(self._states) > self.capacity:
+                self._states.popitem(last=False)
+        self._states.move_to_end(path)
+        async with state.lock:
+            signature = await asyncio.to_thread(disk_signature, path)
+            if signature is None:
+                self._states.pop(path, None)
+                raise ValueError(f"文件不存在: {path}")
+            if signature == state.signature:
+                self.hits += 1
+            else:
+                if state.loads:
+                    self.reloads += 1
+                else:
+                    self.misses += 1
+                try:
+                    card = await asyncio.to_thread(read_card, path)
+                except (OSError, ValueError) as e:
+                    self._states.pop(path, None)
+                    raise ValueError(f"读取失败: {e}") from None
+                state.replace(card, signature)
+            yield state
+
+    def evict(self, path: Optional[str] = None) -> int:
+        """移除一张卡（不给路径时全部移除），返回移除的数量"""
+        if path is None:
+            count = len(self._states)
+            self._states.clear()
+            return count
+        return 1 if self._states.pop(os.path.realpath(path), None) is not None else 0
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "capacity": self.capacity, "hits": self.hits, "misses": self.misses, "reloads": self.reloads,
+            "cards": [state.summary() for state in reversed(self._states.values())],
+        }
+
+
+def _parse_messages(value: Any) -> List[Message]:
+    if not isinstance(value, list):
+        raise ValueError("messages 应为 [{\"role\", \"content\"}] 列表")
+    messages = []
+    for item in value:
+        if isinstance(item, str):
+            messages.append(Message("user", item))
+        elif isinstance(item, dict):
+            messages.append(Message(str(item.get("role") or "user"), str(item.get("content") or "")))
+        else:
+            raise ValueError("messages 中的每一项应为对象或字符串")
+    return messages
+
+
+class CardServer:
+    """按行分隔的 JSON 请求分发"""
+
+    def __init__(self, registry: Optional[CardRegistry] = None):
+        self.registry = registry or CardRegistry()
+        self.methods: Dict[str, Callable[[Dict[str, Any]], Awaitable[Any]]] = {
+            "load": self.load, "validate": self.validate, "convert": self.convert,
+            "activate": self.activate, "tokens": self.tokens, "stats": self.stats, "evict": self.evict,
+        }
+
+    @staticmethod
+    def _path(params: Dict[str, Any]) -> str:
+        path = params.get("path")
+        if not isinstance(path, str) or not path:
+            raise ValueError("缺少 path 参数")
+        return path
+
+    async def load(self, params: Dict[str, Any]) -> Any:
+        async with self.registry.use(self._path(params)) as state:
+            return state.summary()
+
+    async def validate(self, params: Dict[str, Any]) -> Any:
+        if "card" in params:
+            return validation_result(await asyncio.to_thread(validate_card, params["card"]))
+        async with self.registry.use(self._path(params)) as state:
+            return await asyncio.to_thread(state.validate)
+
+    async def convert(self, params: Dict[str, Any]) -> Any:
+        if "card" in params:
+            return {"card": await asyncio.to_thread(to_v3, params["card"])}
+        async with self.registry.use(self._path(params)) as state:
+            return {"card": await asyncio.to_thread(to_v3, state.card)}
+
+    async def activate(self, params: Dict[str, Any]) -> Any:
+        messages = _parse_messages(params.get("messages", []))
+        user = str(params.get("user") or "User")
+        macros = params.get("macros", True) is not False
+        async with self.registry.use(self._path(params)) as state:
+            return await asyncio.to_thread(state.activate, messages, user, macros)
+
+    async def tokens(self, params: Dict[str, Any]) -> Any:
+        if "text" in params:
+            return {"total": estimate_tokens(str(params["text"]))}
+        async with self.registry.use(self._path(params)) as state:
+            return await asyncio.to_thread(state.tokens)
+
+    async def stats(self, params: Dict[str, Any]) -> Any:
+        return self.registry.stats()
+
+    async def evict(self, params: Dict[str, Any]) -> Any:
+        return {"evicted": self.registry.evict(params.get("path"))}
+
+    async def dispatch(self, request: Any) -> Dict[str, Any]:
+        """处理一个请求对象，返回响应对象"""
+        request_id = request.get("id") if isinstance(request, dict) else None
+        try:
+            if not isinstance(request, dict):
+                raise ValueError("请求应为 JSON 对象")
+            method = self.methods.get(request.get("method"))
+            if method is None:
+                raise ValueError(f"未知的方法: {request.get('method')}")
+            params = request.get("params") or {}
+            if not isinstance(params, dict):
+                raise ValueError("params 应为对象")
+            return {"id": request_id, "result": await method(params)}
+        except Exception as e:
+            return {"id": request_id, "error": {"message": str(e) or type(e).__name__}}
+
+    async def handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """一个连接：逐行读取请求，每个请求一个任务，响应写回时互斥"""
+        write_lock = asyncio.Lock()
+        tasks: Set[asyncio.Task] = set()
+
+        async def write(response: Dict[str, Any]):
+            payload = json.dumps(response, ensure_ascii=False).encode("utf-8") + b"\n"
+            async with write_lock:
+                writer.write(payload)
+                await writer.drain()
+
+        async def respond(line: bytes):
+            try:
+                request = json.loads(line)
+            except ValueError as e:
+                response = {"id": None, "error": {"message": f"无效的 JSON: {e}"}}
+            else:
+                response = await self.dispatch(request)
+            await write(response)
+
+        try:
+            while True:
+                try:
+                    line = await reader.readline()
+                except ValueError:
+                    # 超过 MAX_REQUEST_BYTES，无法再找到下一行的开头，只能断开
+                    await write({"id": None, "error": {"message": "请求过大"}})
+                    break
+                if not line:
+                    break
+                if line.strip():
+                    task = asyncio.create_task(respond(line))
+                    tasks.add(task)
+                    task.add_done_callback(tasks.discard)
+            if tasks:
+                await asyncio.gather(*tasks, return_exceptions=True)
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def start(self, host: str = DEFAULT_HOST, port: int = DEFAULT_PORT,
+                    unix: Optional[str] = None) -> asyncio.AbstractServer:
+        if unix:
+            return await asyncio.start_unix_server(self.handle_connection, unix, limit=MAX_REQUEST_BYTES)
+        return await asyncio.start_server(self.handle_connection, host, port, limit=MAX_REQUEST_BYTES)
+
+
+async def call(method: str, params: Optional[Dict[str, Any]] = None, host: str = DEFAULT_HOST,
+               port: int = DEFAULT_PORT, unix: Optional[str] = None) -> Dict[str, Any]:
+    """向服务发送一个请求并返回响应对象"""
+    if unix:
+        reader, writer = await asyncio.open_unix_connection(unix, limit=MAX_REQUEST_BYTES)
+    else:
+        reader, writer = await asyncio.open_connection(host, port, limit=MAX_REQUEST_BYTES)
+    try:
+        request = {"id": 1, "method": method, "params": params or {}}
+        writer.write(json.dumps(request, ensure_ascii=False).encode("utf-8") + b"\n")
+        await writer.drain()
+        return json.loads(await reader.readline())
+    finally:
+        writer.close()
+
+
+async def serve(host: str, port: int, unix: Optional[str], cache_size: int):
+    server = await CardServer(CardRegistry(cache_size)).start(host, port, unix)
+    print(f"角色卡服务已启动: {unix or f'{host}:{port}'}", flush=True)
+    async with server:
+        await server.serve_forever()
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """命令行入口"""
+    parser = argparse.ArgumentParser(description="本地角色卡服务")
+    commands = parser.add_subparsers(dest="command", required=True)
+    for name, help_text in (("serve", "启动服务"), ("call", "向服务发送一个请求")):
+        command = commands.add_parser(name, help=help_text)
+        command.add_argument("--host", default=DEFAULT_HOST, help="监听或连接的地址（默认只监听本机）")
+        command.add_argument("--port", type=int, default=DEFAULT_PORT, help="端口")
+        command.add_argument("--unix", help="改用 Unix 套接字路径")
+        if name == "serve":
+            command.add_argument("--cache-size", type=int, default=DEFAULT_CACHE_SIZE, help="缓存的角色卡数")
+        else:
+            command.add_argument("method", help="方法名")
+            command.add_argument("params", nargs="?", default="{}", help="JSON 格式的参数")
+    args = parser.parse_args(argv)
+
+    if args.unix and not hasattr(asyncio, "start_unix_server"):
+        print("当前平台不支持 Unix 套接字", file=sys.stderr)
+        return 2
+    if args.command == "serve":
+        try:
+            asyncio.run(serve(args.host, args.port, args.unix, args.cache_size))
+        except KeyboardInterrupt:
+            pass
+        except OSError as e:
+            print(f"启动失败: {e}", file=sys.stderr)
+            return 1
+        return 0
+
+    try:
+        params = json.loads(args.params)
+    except ValueError as e:
+        print(f"参数不是有效的 JSON: {e}", file=sys.stderr)
+        return 2
+    try:
+        response = asyncio.run(call(args.method, params, args.host, args.port, args.unix))
+    except OSError as e:
+        print(f"无法连接服务: {e}", file=sys.stderr)
+        return 1
+    if "error" in response:
+        print(response["error"].get("message", ""), file=sys.stderr)
+        return 1
+    print(json.dumps(response.get("result"), ensure_ascii=False, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,228 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+card_thumbnails.py
+角色卡库的缩略图：PNG 角色卡的头像缩小后保存在磁盘缓存中，按文件内容的哈希命名，
+内容相同的文件（复制、改名、移动）共用一张缩略图。
+
+- 哈希、读取名称和解码缩放都在工作进程中完成（make_thumbnail 可直接交给进程池）；
+- 索引 index.json 记录 (路径, 修改时间, 大小) → (哈希, 名称)，文件未变化时不必重新读取和哈希；
+- 缓存总大小有上限，超出时按最近使用时间删除最旧的缩略图（读取缩略图时会更新其修改时间）。
+"""
+
+import hashlib
+import json
+import os
+from typing import Any, Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+from PySide6.QtCore import QBuffer, QByteArray, QIODevice, QSize, Qt
+from PySide6.QtGui import QImage, QImageReader
+
+from card_png import card_from_png, card_name
+
+# 缩略图边长（像素）
+THUMBNAIL_SIZE = 128
+# 缩略图缓存的默认大小上限
+DEFAULT_CACHE_BYTES = 256 * 1024 * 1024
+# 超出上限时删到上限的这一比例，避免每次写入都触发清理
+EVICT_TARGET = 0.9
+# 角色卡库中显示的文件类型
+CARD_EXTENSIONS = (".png", ".json")
+
+INDEX_NAME = "index.json"
+INDEX_VERSION = 1
+
+
+class LibraryFile(NamedTuple):
+    """角色卡库中的一个文件"""
+    path: str
+    mtime: int
+    size: int
+
+
+class ThumbnailResult(NamedTuple):
+    """工作进程处理一个文件的结果"""
+    file: LibraryFile
+    digest: str
+    name: str
+    thumbnail: str      # 缩略图文件路径，没有头像时为空
+    thumbnail_bytes: int
+    error: str = ""
+
+
+def scan_library(directory: str) -> List[LibraryFile]:
+    """列出目录（含子目录）中的角色卡文件，按路径排序"""
+    files = []
+    pending = [directory]
+    while pending:
+        try:
+            with os.scandir(pending.pop()) as entries:
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=False):
+                        pending.append(entry.path)
+                    elif entry.name.lower().endswith(CARD_EXTENSIONS):
+                        try:
+                            stat = entry.stat()
+                        except OSError:
+                            continue
+                        files.append(LibraryFile(entry.path, stat.st_mtime_ns, stat.st_size))
+        except OSError:
+            continue
+    files.sort(key=lambda file: file.path.casefold())
+    return files
+
+
+def thumbnail_path(cache_dir: str, digest: str) -> str:
+    # 按哈希前两位分子目录，单个目录中的文件数不会过多
+    return os.path.join(cache_dir, digest[:2], digest + ".png")
+
+
+def scale_image(data: bytes, size: int) -> QImage:
+    """解码图像并等比缩小到不超过 size × size；解码器支持时在读取过程中直接缩放"""
+    buffer = QBuffer()
+    buffer.setData(QByteArray(data))
+    buffer.open(QIODevice.OpenModeFlag.ReadOnly)
+    reader = QImageReader(buffer)
+    original = reader.size()
+    if original.isValid() and (original.width() > size or original.height() > size):
+        reader.setScaledSize(original.scaled(QSize(size, size), Qt.AspectRatioMode.KeepAspectRatio))
+    image = reader.read()
+    if image.isNull():
+        raise ValueError(reader.errorString())
+    if image.width() > size or image.height() > size:
+        image = image.scaled(size, size, Qt.AspectRatioMode.KeepAspectRatio,
+                             Qt.TransformationMode.SmoothTransformation)
+    return image
+
+
+def make_thumbnail(file: LibraryFile, cache_dir: str, size: int = THUMBNAIL_SIZE) -> ThumbnailResult:
+    """读取一个角色卡文件：计算哈希、取出名称，PNG 卡片生成缩略图写入缓存（在工作进程中运行）"""
+    try:
+        with open(file.path, 'rb') as f:
+            data = f.read()
+    except OSError as e:
+        return ThumbnailResult(file, "", "", "", 0, str(e))
+    digest = hashlib.blake2b(data, digest_size=16).hexdigest()
+    name = ""
+    error = ""
+    try:
+        if file.path.lower().endswith(".png"):
+            card = card_from_png(data)
+        else:
+            card = json.loads(data.decode("utf-8"))
+        if isinstance(card, dict):
+            name = card_name(card)
+    except (ValueError, UnicodeDecodeError) as e:
+        error = str(e)
+    if not file.path.lower().endswith(".png"):
+        return ThumbnailResult(file, digest, name, "", 0, error)
+
+    target = thumbnail_path(cache_dir, digest)
+    if not os.path.exists(target):
+        try:
+            image = scale_image(data, size)
+        except ValueError as e:
+            return ThumbnailResult(file, digest, name, "", 0, error or f"无法解码图像: {e}")
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        temp_path = f"{target}.{os.getpid()}.tmp"
+        if not image.save(temp_path, "PNG"):
+            return ThumbnailResult(file, digest, name, "", 0, "无法写入缩略图缓存")
+        os.replace(temp_path, target)
+    try:
+        thumbnail_bytes = os.path.getsize(target)
+    except OSError:
+        thumbnail_bytes = 0
+    return ThumbnailResult(file, digest, name, target, thumbnail_bytes, error)
+
+
+def iter_thumbnails(cache_dir: str) -> Iterator[Tuple[str, int, float]]:
+    """缓存中的缩略图 (路径, 大小, 修改时间)"""
+    try:
+        subdirs = [entry.path for entry in os.scandir(cache_dir) if entry.is_dir()]
+    except OSError:
+        return
+    for subdir in subdirs:
+        try:
+            with os.scandir(subdir) as entries:
+                for entry in entries:
+                    if entry.name.endswith(".png"):
+                        stat = entry.stat()
+                        yield entry.path, stat.st_size, stat.st_mtime
+        except OSError:
+            continue
+
+
+def evict_thumbnails(cache_dir: str, max_bytes: int) -> Tuple[int, List[str]]:
+    """总大小超过 max_bytes 时删除最久未使用的缩略图，返回 (剩余大小, 删除的哈希)"""
+    thumbnails = sorted(iter_thumbnails(cache_dir), key=lambda item: item[2])
+    total = sum(size for _, size, _ in thumbnails)
+    removed = []
+    if total <= max_bytes:
+        return total, removed
+    target = int(max_bytes * EVICT_TARGET)
+    for path, size, _ in thumbnails:
+        if total <= target:
+            break
+        try:
+            os.remove(path)
+        except OSError:
+            continue
+        total -= size
+        removed.append(os.path.splitext(os.path.basename(path))[0])
+    return total, removed
+
+
+class ThumbnailIndex:
+    """(路径, 修改时间, 大小) → (哈希, 名称, 是否有缩略图) 的索引，保存在缓存目录中"""
+
+    def __init__(self, cache_dir: str):
+        self.cache_dir = cache_dir
+        self.entries: Dict[str, List[Any]] = {}
+        self.dirty = False
+        self.load()
+
+    @property
+    def index_path(self) -> str:
+        return os.path.join(self.cache_dir, INDEX_NAME)
+
+    def load(self):
+        try:
+            with open(self.index_path, 'r', encoding='utf-8') as f:
+                index = json.load(f)
+        except (OSError, ValueError):
+            return
+        if isinstance(index, dict) and index.get("version") == INDEX_VERSION and isinstance(index.get("files"), dict):
+            self.entries = index["files"]
+
+    def save(self):
+        if not self.dirty:
+            return
+        os.makedirs(self.cache_dir, exist_ok=True)
+        temp_path = self.index_path + ".tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump({"version": INDEX_VERSION, "files": self.entries}, f, ensure_ascii=False)
+        os.replace(temp_path, self.index_path)
+        self.dirty = False
+
+    def lookup(self, file: LibraryFile) -> Optional[Tuple[str, str, bool]]:
+        """文件未变化时返回 (哈希, 名称, 是否有缩略图)"""
+        entry = self.entries.get(file.path)
+        if entry is None or entry[0] != file.mtime or entry[1] != file.size:
+            return None
+        return entry[2], entry[3], entry[4]
+
+    def record(self, result: ThumbnailResult):
+        file = result.file
+        self.entries[file.path] = [file.mtime, file.size, result.digest, result.name, bool(result.thumbnail)]
+        self.dirty = True
+
+    def forget_digests(self, digests: List[str]):
+        """缩略图被清理后，引用它们的文件需要重新生成"""
+        removed = set(digests)
+        for entry in self.entries.values():
+            if entry[2] in removed:
+                entry[4] = False
+                # 修改时间置零，下次查找时视为未命中
+                entry[0] = 0
+        self.dirty = bool(removed) or self.dirty
@@ -0,0 +1,607 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+card_validation.py
+按 V2/V3 规范校验角色卡，给出带字段路径的诊断信息。
+
+校验规则在模块加载时由下面的字段表编译一次：必填字段、字段类型、spec/spec_version、
+资源 URI 类型、世界书条目字段以及条目内容中的装饰器语法。
+CardValidator 按条目缓存结果，条目未变化时不重复校验；
+BackgroundValidator 把校验放到工作线程中执行，编辑大型世界书时界面不会卡顿。
+
+命令行用法:
+    python card_validation.py card.json
+"""
+
+import copy
+import json
+import re
+import sys
+from typing import Any, Callable, Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+from PySide6.QtCore import QObject, QThread, Signal
+
+ERROR = "error"
+WARNING = "warning"
+
+Path = Tuple[Any, ...]
+
+ENTRIES_PATH: Path = ("data", "character_book", "entries")
+
+
+class Diagnostic(NamedTuple):
+    """一条校验结果"""
+    path: Path      # 字段路径，如 ("data", "character_book", "entries", 3, "content")
+    severity: str   # error / warning
+    message: str
+
+
+# ---------------------------------------------------------------------------
+# 字段表：(字段名, 类型, 是否必填)
+# 类型为下面 _TYPE_CHECKS 中的名称，或由允许值组成的元组（枚举）
+# ---------------------------------------------------------------------------
+
+V2_CARD_FIELDS = [
+    ("name", "string", True),
+    ("description", "string", True),
+    ("personality", "string", True),
+    ("scenario", "string", True),
+    ("first_mes", "string", True),
+    ("mes_example", "string", True),
+    ("creator_notes", "string", True),
+    ("system_prompt", "string", True),
+    ("post_history_instructions", "string", True),
+    ("alternate_greetings", "string[]", True),
+    ("tags", "string[]", True),
+    ("creator", "string", True),
+    ("character_version", "string", True),
+    ("extensions", "object", True),
+    ("character_book", "object", False),
+]
+
+V3_CARD_FIELDS = V2_CARD_FIELDS + [
+    ("group_only_greetings", "string[]", True),
+    ("assets", "array", False),
+    ("nickname", "string", False),
+    ("creator_notes_multilingual", "object", False),
+    ("source", "string[]", False),
+    ("creation_date", "number", False),
+    ("modification_date", "number", False),
+]
+
+BOOK_FIELDS = [
+    ("name", "string", False),
+    ("description", "string", False),
+    ("scan_depth", "number", False),
+    ("token_budget", "number", False),
+    ("recursive_scanning", "boolean", False),
+    ("extensions", "object", True),
+    ("entries", "array", True),
+]
+
+V2_ENTRY_FIELDS = [
+    ("keys", "string[]", True),
+    ("content", "string", True),
+    ("extensions", "object", True),
+    ("enabled", "boolean", True),
+    ("insertion_order", "number", True),
+    ("case_sensitive", "boolean", False),
+    ("name", "string", False),
+    ("priority", "number", False),
+    ("id", "id", False),
+    ("comment", "string", False),
+    ("selective", "boolean", False),
+    ("secondary_keys", "string[]", False),
+    ("constant", "boolean", False),
+    ("position", ("before_char", "after_char"), False),
+]
+
+V3_ENTRY_FIELDS = V2_ENTRY_FIELDS + [
+    ("use_regex", "boolean", True),
+]
+
+ASSET_FIELDS = [
+    ("type", "string", True),
+    ("uri", "string", True),
+    ("name", "string", True),
+    ("ext", "string", True),
+]
+
+# 规范定义的资源 URI 类型
+ASSET_URI_PREFIXES = ("embeded://", "ccdefault:", "https://", "http://", "data:")
+
+# 装饰器及其取值类型：None 表示无值，元组表示枚举
+DECORATORS: Dict[str, Any] = {
+    "activate_only_after": "number",
+    "activate_only_every": "number",
+    "keep_activate_after_match": None,
+    "dont_activate_after_match": None,
+    "depth": "number",
+    "instruct_depth": "number",
+    "reverse_depth": "number",
+    "reverse_instruct_depth": "number",
+    "role": ("assistant", "system", "user"),
+    "scan_depth": "number",
+    "instruct_scan_depth": "number",
+    "is_greeting": "number",
+    "position": "string",
+    "ignore_on_max_context": None,
+    "additional_keys": "list",
+    "exclude_keys": "list",
+    "is_user_icon": "string",
+    "dont_activate": None,
+    "activate": None,
+    "disable_ui_prompt": "string",
+}
+
+_DECORATOR_LINE = re.compile(r"(@{2,3})(\S*)(?:[ \t]+(.*))?")
+_DECORATOR_NAME = re.compile(r"[a-z_][a-z0-9_]*")
+_NUMBER = re.compile(r"-?\d+(?:\.\d+)?")
+_DATA_URI = re.compile(r"data:[\w.+-]+/[\w.+-]+(?:;[\w.+-]+=[\w.+-]+)*;base64,", re.ASCII)
+_EXT = re.compile(r"[a-z0-9]+")
+
+_TYPE_NAMES = {
+    "string": "字符串", "number": "数字", "boolean": "布尔值", "object": "对象",
+    "array": "数组", "string[]": "字符串数组", "id": "数字或字符串",
+}
+
+
+def _is_number(value: Any) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+_TYPE_CHECKS: Dict[str, Callable[[Any], bool]] = {
+    "string": lambda value: isinstance(value, str),
+    "number": _is_number,
+    "boolean": lambda value: isinstance(value, bool),
+    "object": lambda value: isinstance(value, dict),
+    "array": lambda value: isinstance(value, list),
+    "string[]": lambda value: isinstance(value, list) and all(isinstance(item, str) for item in value),
+    "id": lambda value: isinstance(value, str) or _is_number(value),
+}
+
+
+class FieldRule(NamedTuple):
+    key: str
+    check: Callable[[Any], bool]
+    required: bool
+    expected: str
+
+
+def compile_fields(fields: List[Tuple[str, Any, bool]]) -> Tuple[FieldRule, ...]:
+    """把字段表编译为规则元组"""
+    rules = []
+    for key, kind, required in fields:
+        if isinstance(kind, tuple):
+            allowed = frozenset(kind)
+            rules.append(FieldRule(key, lambda value, allowed=allowed: value in allowed, required,
+                                   " / ".join(kind)))
+        else:
+            rules.append(FieldRule(key, _TYPE_CHECKS[kind], required, _TYPE_NAMES[kind]))
+    return tuple(rules)
+
+
+def check_fields(obj: Dict[str, Any], rules: Tuple[FieldRule, ...], path: Path) -> Iterator[Diagnostic]:
+    """按规则检查一个对象的字段"""
+    for rule in rules:
+        if rule.key not in obj:
+            if rule.required:
+                yield Diagnostic(path + (rule.key,), ERROR, f"缺少必填字段 {rule.key}")
+            continue
+        value = obj[rule.key]
+        # 不少应用会把未定义的可选字段写成 null，按未定义处理
+        if value is None and not rule.required:
+            continue
+        if not rule.check(value):
+            yield Diagnostic(path + (rule.key,), ERROR, f"{rule.key} 应为{rule.expected}")
+
+
+_RULES = {
+    "chara_card_v2": (compile_fields(V2_CARD_FIELDS), compile_fields(V2_ENTRY_FIELDS)),
+    "chara_card_v3": (compile_fields(V3_CARD_FIELDS), compile_fields(V3_ENTRY_FIELDS)),
+}
+_SPEC_VERSIONS = {"chara_card_v2": 2.0, "chara_card_v3": 3.0}
+_BOOK_RULES = compile_fields(BOOK_FIELDS)
+_ASSET_RULES = compile_fields(ASSET_FIELDS)
+
+
+def card_spec(card: Any) -> str:
+    """卡片使用的规范；无法识别时按 V3 校验"""
+    spec = card.get("spec") if isinstance(card, dict) else None
+    return spec if spec in _RULES else "chara_card_v3"
+
+
+def validate_header(card: Any) -> List[Diagnostic]:
+    """检查 spec、spec_version 与 data 包装"""
+    if not isinstance(card, dict):
+        return [Diagnostic((), ERROR, "角色卡应为 JSON 对象")]
+    diagnostics = []
+    spec = card.get("spec")
+    if spec not in _RULES:
+        diagnostics.append(Diagnostic(("spec",), ERROR, f"未知的 spec: {spec!r}，应为 chara_card_v3 或 chara_card_v2"))
+    else:
+        expected = _SPEC_VERSIONS[spec]
+        version = card.get("spec_version")
+        try:
+            number = float(version)
+        except (TypeError, ValueError):
+            diagnostics.append(Diagnostic(("spec_version",), ERROR, f"spec_version 应为 \"{expected:.1f}\""))
+        else:
+            if not isinstance(version, str):
+                diagnostics.append(Diagnostic(("spec_version",), WARNING, "spec_version 应为字符串"))
+            if number > expected:
+                diagnostics.append(Diagnostic(("spec_version",), WARNING, f"spec_version {version} 比本编辑器支持的版本新"))
+            elif number < expected:
+                diagnostics.append(Diagnostic(("spec_version",), WARNING, f"spec_version {version} 低于 {expected:.1f}"))
+    if not isinstance(card.get("data"), dict):
+        diagnostics.append(Diagnostic(("data",), ERROR, "缺少 data 对象"))
+    return diagnostics
+
+
+def validate_assets(assets: List[Any], path: Path) -> List[Diagnostic]:
+    """检查资源列表：字段、URI 类型、扩展名与 main 资源的唯一性"""
+    diagnostics = []
+    main_counts: Dict[str, int] = {}
+    type_counts: Dict[str, int] = {}
+    for index, asset in enumerate(assets):
+        asset_path = path + (index,)
+        if not isinstance(asset, dict):
+            diagnostics.append(Diagnostic(asset_path, ERROR, "资源应为对象"))
+            continue
+        diagnostics.extend(check_fields(asset, _ASSET_RULES, asset_path))
+        asset_type, uri, ext = asset.get("type"), asset.get("uri"), asset.get("ext")
+        if isinstance(asset_type, str):
+            type_counts[asset_type] = type_counts.get(asset_type, 0) + 1
+            if asset.get("name") == "main":
+                main_counts[asset_type] = main_counts.get(asset_type, 0) + 1
+        if isinstance(uri, str):
+            if uri.startswith("embedded://"):
+                diagnostics.append(Diagnostic(asset_path + ("uri",), ERROR, "内嵌资源应使用 embeded://（规范拼写）"))
+            elif not uri.startswith(ASSET_URI_PREFIXES):
+                diagnostics.append(Diagnostic(asset_path + ("uri",), WARNING, f"不支持的 URI 类型: {uri[:40]}"))
+            elif uri.startswith("data:") and not _DATA_URI.match(uri):
+                diagnostics.append(Diagnostic(asset_path + ("uri",), ERROR, "data URI 应为 base64 编码"))
+            elif uri.startswith("http://"):
+                diagnostics.append(Diagnostic(asset_path + ("uri",), WARNING, "http 资源可能被应用忽略，建议使用 https"))
+            if isinstance(ext, str) and uri != "ccdefault:" and ext != "unknown" and not _EXT.fullmatch(ext):
+                diagnostics.append(Diagnostic(asset_path + ("ext",), ERROR, "ext 应为不带点的小写扩展名"))
+    if type_counts.get("icon", 0) > 1 and main_counts.get("icon", 0) != 1:
+        diagnostics.append(Diagnostic(path, ERROR, "有多个 icon 资源时必须恰好有一个 name 为 main"))
+    if main_counts.get("background", 0) > 1:
+        diagnostics.append(Diagnostic(path, ERROR, "name 为 main 的 background 资源不能多于一个"))
+    return diagnostics
+
+
+def validate_decorators(content: str, path: Path) -> List[Diagnostic]:
+    """检查条目内容中的装饰器（以 @@ 开头的行）"""
+    diagnostics = []
+    previous_is_decorator = False
+    for line_number, line in enumerate(content.splitlines(), 1):
+        if not line.startswith("@@"):
+            previous_is_decorator = False
+            continue
+        where = f"第 {line_number} 行"
+        match = _DECORATOR_LINE.fullmatch(line.rstrip())
+        if match is None or not match.group(2):
+            diagnostics.append(Diagnostic(path, ERROR, f"{where}: 装饰器缺少名称"))
+            previous_is_decorator = False
+            continue
+        marker, name, value = match.groups()
+        if marker == "@@@" and not previous_is_decorator:
+            diagnostics.append(Diagnostic(path, WARNING, f"{where}: 后备装饰器 @@@{name} 应紧跟在另一个装饰器之后"))
+        previous_is_decorator = True
+        if not _DECORATOR_NAME.fullmatch(name):
+            diagnostics.append(Diagnostic(path, ERROR, f"{where}: 装饰器名称 {name} 只能使用小写字母、数字和下划线"))
+            continue
+        if name not in DECORATORS:
+            diagnostics.append(Diagnostic(path, WARNING, f"{where}: 未识别的装饰器 @@{name}"))
+            continue
+        kind = DECORATORS[name]
+        value = (value or "").strip()
+        if kind is None:
+            if value:
+                diagnostics.append(Diagnostic(path, WARNING, f"{where}: @@{name} 不接受取值"))
+        elif not value:
+            diagnostics.append(Diagnostic(path, ERROR, f"{where}: @@{name} 缺少取值"))
+        elif kind == "number" and not _NUMBER.fullmatch(value):
+            diagnostics.append(Diagnostic(path, ERROR, f"{where}: @@{name} 的取值应为数字"))
+        elif isinstance(kind, tuple) and value not in kind:
+            diagnostics.append(Diagnostic(path, ERROR, f"{where}: @@{name} 的取值应为 {' / '.join(kind)}"))
+    return diagnostics
+
+
+def _regex_key_pattern(key: str) -> Tuple[str, int]:
+    """SillyTavern 风格的 /pattern/flags 关键字拆成正则与标志"""
+    if len(key) > 2 and key.startswith("/") and key.rfind("/") > 0:
+        end = key.rfind("/")
+        flags = 0
+        for flag in key[end + 1:]:
+            flags |= {"i": re.IGNORECASE, "m": re.MULTILINE, "s": re.DOTALL}.get(flag, 0)
+        return key[1:end], flags
+    return key, 0
+
+
+def validate_entry(entry: Any, row: int, spec: str = "chara_card_v3") -> List[Diagnostic]:
+    """校验单个世界书条目"""
+    path = ENTRIES_PATH + (row,)
+    if not isinstance(entry, dict):
+        return [Diagnostic(path, ERROR, "条目应为对象")]
+    diagnostics = list(check_fields(entry, _RULES[spec][1], path))
+    keys = entry.get("keys")
+    if isinstance(keys, list) and not keys and not entry.get("constant"):
+        diagnostics.append(Diagnostic(path + ("keys",), WARNING, "没有关键字的非常驻条目不会被触发"))
+    if entry.get("use_regex") is True and isinstance(keys, list):
+        for key in keys:
+            if not isinstance(key, str):
+                continue
+            try:
+                re.compile(*_regex_key_pattern(key))
+            except re.error as e:
+                diagnostics.append(Diagnostic(path + ("keys",), ERROR, f"无效的正则表达式 {key!r}: {e}"))
+    content = entry.get("content")
+    if isinstance(content, str) and "@@" in content:
+        diagnostics.extend(validate_decorators(content, path + ("content",)))
+    return diagnostics
+
+
+def validate_card_fields(card: Any) -> List[Diagnostic]:
+    """校验除世界书条目以外的所有内容"""
+    diagnostics = validate_header(card)
+    if not isinstance(card, dict) or not isinstance(card.get("data"), dict):
+        return diagnostics
+    spec = card_spec(card)
+    data = card["data"]
+    diagnostics.extend(check_fields(data, _RULES[spec][0], ("data",)))
+
+    for key in ("creation_date", "modification_date"):
+        value = data.get(key)
+        if _is_number(value) and value > 1e11:
+            diagnostics.append(Diagnostic(("data", key), WARNING, f"{key} 应为以秒为单位的 Unix 时间戳"))
+    multilingual = data.get("creator_notes_multilingual")
+    if isinstance(multilingual, dict):
+        for language, note in multilingual.items():
+            if not isinstance(note, str):
+                diagnostics.append(Diagnostic(("data", "creator_notes_multilingual", language), ERROR, "多语言注释应为字符串"))
+    assets = data.get("assets")
+    if isinstance(assets, list):
+        diagnostics.extend(validate_assets(assets, ("data", "assets")))
+
+    book = data.get("character_book")
+    if isinstance(book, dict):
+        diagnostics.extend(check_fields(book, _BOOK_RULES, ("data", "character_book")))
+    return diagnostics
+
+
+def validate_card(card: Any) -> List[Diagnostic]:
+    """完整校验一张角色卡"""
+    diagnostics = validate_card_fields(card)
+    spec = card_spec(card)
+    for row, entry in enumerate(_card_entries(card)):
+        diagnostics.extend(validate_entry(entry, row, spec))
+    return diagnostics
+
+
+def _card_entries(card: Any) -> List[Any]:
+    try:
+        entries = card["data"]["character_book"]["entries"]
+    except (KeyError, TypeError):
+        return []
+    return entries if isinstance(entries, list) else []
+
+
+def format_path(path: Path) -> str:
+    """data.character_book.entries[3].content 形式的路径"""
+    text = ""
+    for part in path:
+        text += f"[{part}]" if isinstance(part, int) else (f".{part}" if text else str(part))
+    return text or "(根)"
+
+
+def entry_row(path: Path) -> Optional[int]:
+    """诊断所属的世界书条目行号，不属于条目时返回 None"""
+    path = tuple(path)
+    if len(path) > len(ENTRIES_PATH) and path[:len(ENTRIES_PATH)] == ENTRIES_PATH:
+        return path[len(ENTRIES_PATH)]
+    return None
+
+
+class CardValidator:
+    """增量校验器
+
+    卡片级字段每次都重新检查（数量固定且很快）；条目的结果按行缓存，
+    只有通过 invalidate_entry / splice_entries 标记为变化的条目才会重新校验。
+    """
+
+    def __init__(self):
+        self._entry_results: List[Optional[List[Diagnostic]]] = []
+        self._card_results: List[Diagnostic] = []
+        self.spec = "chara_card_v3"
+
+    def reset(self, entry_count: int = 0):
+        """丢弃全部缓存（加载新卡片后调用）"""
+        self._entry_results = [None] * entry_count
+
+    def invalidate_entry(self, row: int):
+        if 0 <= row < len(self._entry_results):
+            self._entry_results[row] = None
+
+    def splice_entries(self, row: int, removed: int, inserted: int):
+        """条目增删后平移缓存，新插入的条目标记为待校验"""
+        self._entry_results[row:row + removed] = [None] * inserted
+
+    def prepare(self, card: Any) -> Tuple[List[Any], str, List[int]]:
+        """返回 (条目列表, 规范, 需要重新校验的条目行号)"""
+        entries = _card_entries(card)
+        spec = card_spec(card)
+        if spec != self.spec or len(self._entry_results) != len(entries):
+            # 规范变化或与条目列表对不上（外部直接修改了列表），全部重新校验
+            self.spec = spec
+            self.reset(len(entries))
+        return entries, spec, [row for row, result in enumerate(self._entry_results) if result is None]
+
+    def store(self, card_results: List[Diagnostic], entry_results: Dict[int, List[Diagnostic]]):
+        self._card_results = card_results
+        for row, results in entry_results.items():
+            if 0 <= row < len(self._entry_results):
+                self._entry_results[row] = results
+
+    def validate(self, card: Any) -> List[Diagnostic]:
+        """在当前线程中增量校验并返回全部诊断"""
+        entries, spec, dirty = self.prepare(card)
+        results = {row: validate_entry(entries[row], row, spec) for row in dirty}
+        self.store(validate_card_fields(card), results)
+        return self.diagnostics()
+
+    def diagnostics(self) -> List[Diagnostic]:
+        results = list(self._card_results)
+        for row_results in self._entry_results:
+            if row_results:
+                results.extend(row_results)
+        return results
+
+
+class ValidationJob(NamedTuple):
+    generation: int
+    card: Dict[str, Any]                 # 不含条目的卡片副本
+    entries: Dict[int, Any]              # 需要重新校验的条目（浅拷贝）
+    spec: str
+
+
+class _ValidationWorker(QObject):
+    """在工作线程中执行校验"""
+
+    finished = Signal(object, object, object)  # (job, 卡片诊断, {行号: 条目诊断})
+    failed = Signal(object, str)               # (job, 错误信息)
+
+    def run(self, job: ValidationJob):
+        try:
+            card_results = validate_card_fields(job.card)
+            entry_results = {row: validate_entry(entry, row, job.spec) for row, entry in job.entries.items()}
+        except Exception as e:
+            # 无论如何都要回报界面线程，否则 BackgroundValidator 会一直停在忙碌状态
+            self.failed.emit(job, f"{type(e).__name__}: {e}")
+            return
+        self.finished.emit(job, card_results, entry_results)
+
+
+class BackgroundValidator(QObject):
+    """在后台线程中增量校验角色卡
+
+    submit() 在界面线程中只复制卡片级字段和变化过的条目，然后交给工作线程；
+    校验期间条目若再次变化，对应的结果会被丢弃并在下一轮重新校验。
+    """
+
+    # 全部诊断（卡片级 + 所有条目）
+    diagnostics_ready = Signal(list)
+    # 校验过程出错，参数为错误信息
+    validation_failed = Signal(str)
+    _request = Signal(object)
+
+    def __init__(self, parent: Optional[QObject] = None):
+        super().__init__(parent)
+        self.validator = CardValidator()
+        # 每次条目增删或整体重置时递增，用来识别过期的结果
+        self._generation = 0
+        # 校验期间被修改的条目
+        self._touched: set = set()
+        self._busy = False
+        self._pending: Optional[Dict[str, Any]] = None
+
+        self._thread = QThread(self)
+        self._worker = _ValidationWorker()
+        self._worker.moveToThread(self._thread)
+        self._request.connect(self._worker.run)
+        self._worker.finished.connect(self._on_finished)
+        self._worker.failed.connect(self._on_failed)
+        self._thread.start()
+
+    def shutdown(self):
+        """停止工作线程（窗口关闭时调用）"""
+        self._thread.quit()
+        self._thread.wait()
+
+    def reset(self, entry_count: int = 0):
+        self._generation += 1
+        self.validator.reset(entry_count)
+
+    def invalidate_entry(self, row: int):
+        self.validator.invalidate_entry(row)
+        self._touched.add(row)
+
+    def splice_entries(self, row: int, removed: List[Any], inserted: List[Any]):
+        self._generation += 1
+        self.validator.splice_entries(row, len(removed), len(inserted))
+
+    def diagnostics(self) -> List[Diagnostic]:
+        return self.validator.diagnostics()
+
+    def submit(self, card: Dict[str, Any]):
+        """提交当前卡片；上一轮尚未结束时只保留最新的一次请求"""
+        if self._busy:
+            self._pending = card
+            return
+        entries, spec, dirty = self.validator.prepare(card)
+        job = ValidationJob(
+            self._generation,
+            _copy_without_entries(card),
+            # 条目做深拷贝：JSON 树和表格的批量修改会原地修改 extensions 等嵌套值
+            {row: copy.deepcopy(entries[row]) for row in dirty},
+            spec,
+        )
+        self._touched.clear()
+        self._busy = True
+        self._request.emit(job)
+
+    def _on_finished(self, job: ValidationJob, card_results: List[Diagnostic],
+                     entry_results: Dict[int, List[Diagnostic]]):
+        self._busy = False
+        if job.generation != self._generation:
+            # 条目已增删，行号不再可靠，只保留卡片级结果
+            entry_results = {}
+        else:
+            entry_results = {row: results for row, results in entry_results.items() if row not in self._touched}
+        self.validator.store(card_results, entry_results)
+        self.diagnostics_ready.emit(self.validator.diagnostics())
+        self._submit_pending()
+
+    def _on_failed(self, job: ValidationJob, message: str):
+        # 不保存结果，这一轮的条目仍标记为待校验，下次提交时重试
+        self._busy = False
+        self.validation_failed.emit(message)
+        self._submit_pending()
+
+    def _submit_pending(self):
+        if self._pending is not None:
+            card, self._pending = self._pending, None
+            self.submit(card)
+
+
+def _copy_without_entries(card: Any) -> Any:
+    """深拷贝卡片，但不复制世界书条目"""
+    if not isinstance(card, dict) or not isinstance(card.get("data"), dict):
+        return copy.deepcopy(card)
+    data = dict(card["data"])
+    book = data.get("character_book")
+    if isinstance(book, dict) and isinstance(book.get("entries"), list):
+        data["character_book"] = dict(book, entries=[])
+    return copy.deepcopy(dict(card, data=data))
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    argv = sys.argv[1:] if argv is None else argv
+    if len(argv) != 1:
+        print(__doc__.strip().splitlines()[-1].strip())
+        return 2
+    with open(argv[0], 'r', encoding='utf-8') as f:
+        card = json.load(f)
+    diagnostics = validate_card(card)
+    for diagnostic in diagnostics:
+        print(f"{diagnostic.severity}: {format_path(diagnostic.path)}: {diagnostic.message}")
+    errors = sum(1 for diagnostic in diagnostics if diagnostic.severity == ERROR)
+    print(f"{errors} 个错误，{len(diagnostics) - errors} 个警告")
+    return 1 if errors else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+card_watcher.py
+监视打开的角色卡文件和项目目录在编辑器之外的修改（脚本、git 切换分支等）。
+
+文件系统事件先合并：同一文件或项目在 DEBOUNCE_MS 内的多次事件只报告一次，
+报告时以文件签名（修改时间和大小）判断内容是否真的变化，编辑器自己保存引起的事件因此会被忽略。
+原子替换（写临时文件再改名）会使被监视的文件失效，报告时重新加入监视。
+"""
+
+import os
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from PySide6.QtCore import QFileSystemWatcher, QObject, QTimer, Signal
+
+from card_project import CARD_NAME, ENTRIES_DIR, MANIFEST_NAME, is_project
+
+# 事件合并的等待时间（毫秒）
+DEBOUNCE_MS = 500
+# 项目目录中单独监视的条目文件数上限，超出时只监视目录（仍能发现增删和改名写入）
+MAX_WATCHED_ENTRY_FILES = 4096
+
+Signature = Tuple[Tuple[str, int, int], ...]
+
+
+def _stat(path: str) -> Optional[Tuple[str, int, int]]:
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return path, stat.st_mtime_ns, stat.st_size
+
+
+def disk_signature(path: str) -> Optional[Signature]:
+    """文件或项目目录当前的签名，不存在时返回 None"""
+    if not is_project(path):
+        stat = _stat(path)
+        return (stat,) if stat else None
+    stats = [_stat(os.path.join(path, MANIFEST_NAME)), _stat(os.path.join(path, CARD_NAME))]
+    try:
+        with os.scandir(os.path.join(path, ENTRIES_DIR)) as entries:
+            for entry in entries:
+                if entry.is_file():
+                    stat = entry.stat()
+                    stats.append((entry.name, stat.st_mtime_ns, stat.st_size))
+    except OSError:
+        pass
+    return tuple(sorted(stat for stat in stats if stat))
+
+
+class CardWatcher(QObject):
+    """监视一组角色卡文件/项目目录，合并事件后发出 changed(路径)"""
+
+    changed = Signal(str)
+
+    def __init__(self, parent: Optional[QObject] = None):
+        super().__init__(parent)
+        self.watcher = QFileSystemWatcher(self)
+        self.watcher.fileChanged.connect(self._on_event)
+        self.watcher.directoryChanged.connect(self._on_event)
+        # 被监视的路径 -> 所属的文件或项目目录
+        self._roots: Dict[str, str] = {}
+        self._pending: Set[str] = set()
+        self.timer = QTimer(self)
+        self.timer.setSingleShot(True)
+        self.timer.setInterval(DEBOUNCE_MS)
+        self.timer.timeout.connect(self._flush)
+
+    def set_paths(self, paths: Iterable[str]):
+        """把监视范围设为这些文件和项目目录"""
+        roots: Dict[str, str] = {}
+        for root in {os.path.abspath(path) for path in paths}:
+            for target in self._targets(root):
+                roots[target] = root
+        stale = [path for path in self._roots if path not in roots]
+        if stale:
+            self.watcher.removePaths(stale)
+        self._roots = roots
+        self._pending &= set(roots.values())
+        self._rewatch()
+
+    def _targets(self, root: str) -> List[str]:
+        if not is_project(root):
+            return [root]
+        entries_dir = os.path.join(root, ENTRIES_DIR)
+        targets = [root, os.path.join(root, MANIFEST_NAME), os.path.join(root, CARD_NAME), entries_dir]
+        try:
+            names = sorted(os.listdir(entries_dir))
+        except OSError:
+            names = []
+        if len(names) <= MAX_WATCHED_ENTRY_FILES:
+            targets += [os.path.join(entries_dir, name) for name in names]
+        return targets
+
+    def _rewatch(self):
+        """把失效或新建的路径重新加入监视"""
+        watched = set(self.watcher.files()) | set(self.watcher.directories())
+        missing = [path for path in self._roots if path not in watched and os.path.exists(path)]
+        if missing:
+            self.watcher.addPaths(missing)
+
+    def _on_event(self, path: str):
+        root = self._roots.get(path)
+        if root is not None:
+            self._pending.add(root)
+            self.timer.start()
+
+    def _flush(self):
+        roots, self._pending = self._pending, set()
+        # 项目目录中可能新增了条目文件，按当前内容刷新监视范围
+        self.set_paths(set(self._roots.values()))
+        for root in sorted(roots):
+            self.changed.emit(root)
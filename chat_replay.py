@@ -0,0 +1,255 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+chat_replay.py
+用真实的 SillyTavern 聊天记录 (.jsonl) 检验世界书：逐条回放消息，统计每个条目何时被激活、
+共激活多少次、占用多少 token。
+
+聊天文件逐行流式读取，不整体载入内存。窗口只保留最大扫描深度那么多条消息，
+每条消息在进入窗口时扫描一次并缓存命中结果，各扫描深度的命中由窗口内消息的结果合并得到，
+因此每轮的开销与单条消息的长度相当，与聊天总长度和条目数无关。
+
+命令行用法:
+    python chat_replay.py card.json chat.jsonl [--turns]
+"""
+
+import argparse
+import json
+import math
+import re
+import sys
+import time
+from collections import deque
+from typing import Any, BinaryIO, Callable, Deque, Dict, Iterator, List, NamedTuple, Optional, Set, Tuple
+
+from lorebook_activation import LorebookActivator, Message
+from macros import MacroContext, card_context, expand_macros
+
+# 非中日韩文字按约 4 个字符一个 token 估算
+CHARS_PER_TOKEN = 4
+
+_CJK = re.compile(r"[぀-ヿ㐀-䶿一-鿿가-힯]")
+
+Hits = Dict[int, Tuple[Set[int], Set[int]]]
+
+
+def estimate_tokens(text: str) -> int:
+    """粗略估算 token 数：中日韩文字每字一个，其余按字符数折算"""
+    cjk = len(_CJK.findall(text))
+    return cjk + math.ceil((len(text) - cjk) / CHARS_PER_TOKEN)
+
+
+class ChatHeader(NamedTuple):
+    """聊天文件第一行的元数据"""
+    user_name: str
+    character_name: str
+
+
+def iter_chat(stream: BinaryIO) -> Iterator[Tuple[int, Any]]:
+    """逐行读取 .jsonl 聊天文件，产出 (已读取的字节数, 解析后的对象或 None)
+
+    以二进制方式读取以便报告进度；无法解析的行产出 None。
+    """
+    position = 0
+    for line in stream:
+        position += len(line)
+        if not line.strip():
+            continue
+        try:
+            yield position, json.loads(line)
+        except ValueError:
+            yield position, None
+
+
+def chat_message(record: Any) -> Optional[Message]:
+    """把聊天记录中的一行转换为消息；元数据行、隐藏的系统消息返回 None"""
+    if not isinstance(record, dict) or not isinstance(record.get("mes"), str):
+        return None
+    if record.get("is_system"):
+        return None
+    return Message("user" if record.get("is_user") else "assistant", record["mes"])
+
+
+class EntryStats:
+    """单个条目的回放统计"""
+
+    __slots__ = ("fires", "first_turn", "last_turn", "tokens")
+
+    def __init__(self, turn: int):
+        self.fires = 0
+        self.first_turn = turn
+        self.last_turn = turn
+        self.tokens = 0
+
+
+class TurnResult(NamedTuple):
+    """一轮的激活结果"""
+    turn: int
+    role: str
+    rows: Tuple[int, ...]
+    tokens: int
+
+
+class ReplayReport:
+    """回放结果汇总"""
+
+    def __init__(self):
+        self.header: Optional[ChatHeader] = None
+        self.turns = 0
+        self.skipped = 0
+        self.tokens = 0
+        self.elapsed = 0.0
+        self.stats: Dict[int, EntryStats] = {}
+        self.cancelled = False
+
+    def sorted_stats(self) -> List[Tuple[int, EntryStats]]:
+        """按激活次数从多到少排列"""
+        return sorted(self.stats.items(), key=lambda item: (-item[1].fires, item[0]))
+
+
+class ChatReplay:
+    """把消息逐条送入激活器，维护滑动扫描窗口并累计统计"""
+
+    def __init__(self, book: Dict[str, Any], context: Optional[MacroContext] = None,
+                 activator: Optional[LorebookActivator] = None):
+        self.book = book
+        self.context = context
+        self.activator = activator or LorebookActivator()
+        self.activator.prepare(book, context)
+        self.window: Deque[Tuple[Message, Hits]] = deque(maxlen=max(self.activator.max_scan_depth, 1))
+        self.report = ReplayReport()
+        self._entry_tokens: Dict[int, int] = {}
+
+    def _scan(self, depth: int) -> Hits:
+        """合并窗口中最近 depth 条消息的命中结果"""
+        if depth <= 0:
+            return {}
+        recent = list(self.window)[-depth:]
+        if len(recent) == 1:
+            return recent[0][1]
+        merged: Hits = {}
+        for _, hits in recent:
+            for row, (primary, secondary) in hits.items():
+                target = merged.get(row)
+                if target is None:
+                    merged[row] = (set(primary), set(secondary))
+                else:
+                    target[0].update(primary)
+                    target[1].update(secondary)
+        return merged
+
+    def feed(self, message: Message) -> TurnResult:
+        """加入一条消息并计算这一轮的激活结果"""
+        if self.context is not None:
+            message = Message(message.role, expand_macros(message.content, self.context))
+        self.window.append((message, self.activator.index.scan(message.content)))
+        activated = self.activator.activate_window(
+            [item[0] for item in self.window], self.context, self._scan)
+
+        report = self.report
+        report.turns += 1
+        turn = report.turns
+        tokens = 0
+        for item in activated:
+            entry_tokens = self._entry_tokens.get(item.row)
+            if entry_tokens is None:
+                entry_tokens = self._entry_tokens[item.row] = estimate_tokens(item.content)
+            stats = report.stats.get(item.row)
+            if stats is None:
+                stats = report.stats[item.row] = EntryStats(turn)
+            stats.fires += 1
+            stats.last_turn = turn
+            stats.tokens += entry_tokens
+            tokens += entry_tokens
+        report.tokens += tokens
+        return TurnResult(turn, message.role, tuple(item.row for item in activated), tokens)
+
+    def run(self, stream: BinaryIO, on_turn: Optional[Callable[[TurnResult], None]] = None,
+            on_progress: Optional[Callable[[int], None]] = None,
+            should_stop: Optional[Callable[[], bool]] = None) -> ReplayReport:
+        """回放整个聊天文件；on_progress 收到已读取的字节数"""
+        report = self.report
+        start = time.perf_counter()
+        for position, record in iter_chat(stream):
+            if record is None:
+                report.skipped += 1
+                continue
+            if report.header is None and isinstance(record, dict) and "mes" not in record:
+                report.header = ChatHeader(str(record.get("user_name") or ""),
+                                           str(record.get("character_name") or ""))
+                if self.context is not None and report.header.user_name:
+                    self.context = self.context._replace(user=report.header.user_name)
+                    self.activator.prepare(self.book, self.context)
+                continue
+            message = chat_message(record)
+            if message is None:
+                continue
+            result = self.feed(message)
+            if on_turn is not None:
+                on_turn(result)
+            if on_progress is not None and report.turns % 256 == 0:
+                on_progress(position)
+                if should_stop is not None and should_stop():
+                    report.cancelled = True
+                    break
+        report.elapsed = time.perf_counter() - start
+        return report
+
+
+def entry_title(entry: Dict[str, Any], row: int) -> str:
+    """条目在报告中的显示名称"""
+    return entry.get("comment") or ", ".join(entry.get("keys") or []) or f"条目 {row + 1}"
+
+
+def format_report(report: ReplayReport, entries: List[Dict[str, Any]]) -> str:
+    """把回放结果格式化为文本表格"""
+    rate = report.turns / report.elapsed if report.elapsed else 0.0
+    lines = [
+        f"回放 {report.turns} 条消息，用时 {report.elapsed:.2f} 秒（{rate:.0f} 条/秒），"
+        f"世界书共占用约 {report.tokens} token",
+    ]
+    if report.skipped:
+        lines.append(f"跳过 {report.skipped} 行无法解析的记录")
+    fired = report.sorted_stats()
+    lines.append(f"被激活的条目 {len(fired)} / {len(entries)} 个:")
+    lines.append(f"{'次数':>6} {'首次':>6} {'末次':>6} {'token':>8}  条目")
+    for row, stats in fired:
+        lines.append(f"{stats.fires:>6} {stats.first_turn:>6} {stats.last_turn:>6} {stats.tokens:>8}  "
+                     f"[{row + 1}] {entry_title(entries[row], row)}")
+    never = [row for row in range(len(entries)) if row not in report.stats]
+    if never:
+        lines.append(f"从未激活的条目 {len(never)} 个:")
+        lines.extend(f"  [{row + 1}] {entry_title(entries[row], row)}" for row in never)
+    return "\n".join(lines)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """命令行入口"""
+    parser = argparse.ArgumentParser(description="用 SillyTavern 聊天记录回放世界书激活")
+    parser.add_argument("card", help="角色卡 JSON 文件")
+    parser.add_argument("chat", help="SillyTavern 聊天记录 (.jsonl)")
+    parser.add_argument("--turns", action="store_true", help="逐轮输出被激活的条目")
+    parser.add_argument("--no-macros", action="store_true", help="不展开消息和关键字中的宏")
+    args = parser.parse_args(argv)
+
+    with open(args.card, 'r', encoding='utf-8') as f:
+        card = json.load(f)
+    data = card.get("data", card) if isinstance(card, dict) else {}
+    book = data.get("character_book") or {}
+    entries = book.get("entries") or []
+    replay = ChatReplay(book, None if args.no_macros else card_context(data))
+
+    def print_turn(result: TurnResult):
+        if result.rows:
+            rows = ", ".join(str(row + 1) for row in result.rows)
+            print(f"#{result.turn} ({result.role}) {result.tokens} token: {rows}")
+
+    with open(args.chat, 'rb') as f:
+        report = replay.run(f, print_turn if args.turns else None)
+    print(format_report(report, entries))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+field_binding.py
+表单控件与数据字段的绑定。
+
+每个绑定把一个字段路径（如 ("extensions", "depth")）连接到一个控件:
+- 加载数据时只写入显示的值与新值不同的控件，写入期间屏蔽控件的信号；
+- 用户修改控件时把绑定标为已修改，提交时只读取这些控件，并只报告值确实变化的字段。
+因此在条目之间切换的开销与两个条目之间不同的字段数成正比，而不是与表单的控件数成正比。
+"""
+
+from contextlib import nullcontext
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from PySide6.QtCore import QObject, QSignalBlocker, SignalInstance
+
+# 字段差异中表示"该字段原本不存在"
+MISSING = object()
+
+# 控件显示的值未知（尚未加载，或已被用户修改）
+_UNKNOWN = object()
+
+Path = Tuple[str, ...]
+
+
+def get_path(data: Dict[str, Any], path: Path) -> Any:
+    """按路径取值，不存在时返回 MISSING"""
+    target: Any = data
+    for key in path:
+        if not isinstance(target, dict) or key not in target:
+            return MISSING
+        target = target[key]
+    return target
+
+
+def set_path(data: Dict[str, Any], path: Path, value: Any):
+    """按路径赋值，缺少的中间对象自动建立"""
+    target = data
+    for key in path[:-1]:
+        if not isinstance(target.get(key), dict):
+            target[key] = {}
+        target = target[key]
+    target[path[-1]] = value
+
+
+class FieldBinding:
+    """一个字段与一个控件的绑定"""
+
+    def __init__(self, path: Path, getter: Callable[[], Any], setter: Callable[[Any], None],
+                 edited: SignalInstance, default: Any, blocker: Optional[QObject] = None):
+        """edited 为只在用户修改时发出的信号；blocker 为加载时需要屏蔽信号的对象"""
+        self.path = path
+        self.getter = getter
+        self.setter = setter
+        self.default = default
+        self.blocker = blocker
+        self.dirty = False
+        self.shown: Any = _UNKNOWN
+        edited.connect(self._mark_dirty)
+
+    def _mark_dirty(self, *args):
+        self.dirty = True
+
+    def value_in(self, data: Dict[str, Any]) -> Any:
+        """数据中该字段要显示的值（缺失或为 null 时使用默认值）"""
+        value = get_path(data, self.path)
+        return self.default if value is MISSING or value is None else value
+
+    def load(self, data: Dict[str, Any]) -> bool:
+        """显示 data 中的值，控件已显示相同的值时不做任何事；返回是否写入了控件"""
+        value = self.value_in(data)
+        if not self.dirty and self.shown is not _UNKNOWN and self.shown == value:
+            return False
+        with QSignalBlocker(self.blocker) if self.blocker is not None else nullcontext():
+            self.setter(value)
+        self.shown = value.copy() if isinstance(value, list) else value
+        self.dirty = False
+        return True
+
+
+class BindingGroup:
+    """绑定到同一份数据的一组字段"""
+
+    def __init__(self):
+        self.bindings: List[FieldBinding] = []
+        self.data: Dict[str, Any] = {}
+
+    def bind(self, path: Path, getter: Callable[[], Any], setter: Callable[[Any], None],
+             edited: SignalInstance, default: Any, blocker: Optional[QObject] = None) -> FieldBinding:
+        """添加一个绑定"""
+        binding = FieldBinding(path, getter, setter, edited, default, blocker)
+        self.bindings.append(binding)
+        return binding
+
+    def load(self, data: Dict[str, Any]) -> int:
+        """把各控件切换到 data，未提交的修改被丢弃；返回写入的控件数"""
+        self.data = data
+        return sum(binding.load(data) for binding in self.bindings)
+
+    def commit(self) -> Dict[Path, Tuple[Any, Any]]:
+        """把用户修改过的字段写回数据，返回 {字段路径: (旧值, 新值)}，只包括值确实变化的字段"""
+        changes: Dict[Path, Tuple[Any, Any]] = {}
+        for binding in self.bindings:
+            if not binding.dirty:
+                continue
+            binding.dirty = False
+            value = binding.getter()
+            binding.shown = value.copy() if isinstance(value, list) else value
+            # 改回原来显示的值（包括缺失字段的默认值）不算修改
+            if not self.data or value == binding.value_in(self.data):
+                continue
+            old = get_path(self.data, binding.path)
+            set_path(self.data, binding.path, value)
+            changes[binding.path] = (old, value)
+        return changes
@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+keyword_matcher.py
+基于字典树的多模式关键字匹配（Aho-Corasick）。
+
+一次扫描文本即可找出所有出现的关键字，耗时与文本长度加匹配数成正比，
+与关键字数量无关；世界书的关键字重叠分析和激活扫描都基于它。
+"""
+
+from collections import deque
+from typing import Dict, Iterable, Iterator, List, Tuple
+
+
+class KeywordAutomaton:
+    """Aho-Corasick 多模式匹配自动机"""
+
+    def __init__(self, patterns: Iterable[str] = ()):
+        self.patterns: List[str] = []
+        self._index: Dict[str, int] = {}
+        # 字典树：每个节点的子节点表、失败指针、以该节点结尾的模式、输出链接
+        self._children: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._ends: List[List[int]] = [[]]
+        self._output_link: List[int] = [0]
+        self._built = True
+        for pattern in patterns:
+            self.add(pattern)
+
+    def __len__(self) -> int:
+        return len(self.patterns)
+
+    def __contains__(self, pattern: str) -> bool:
+        return pattern in self._index
+
+    def add(self, pattern: str) -> int:
+        """加入一个模式，返回其编号；重复加入返回已有编号"""
+        existing = self._index.get(pattern)
+        if existing is not None:
+            return existing
+        node = 0
+        for char in pattern:
+            child = self._children[node].get(char)
+            if child is None:
+                child = len(self._children)
+                self._children[node][char] = child
+                self._children.append({})
+                self._fail.append(0)
+                self._ends.append([])
+                self._output_link.append(0)
+            node = child
+        index = len(self.patterns)
+        self.patterns.append(pattern)
+        self._index[pattern] = index
+        self._ends[node].append(index)
+        self._built = False
+        return index
+
+    def build(self):
+        """计算失败指针（广度优先）"""
+        queue = deque()
+        for child in self._children[0].values():
+            self._fail[child] = 0
+            self._output_link[child] = 0
+            queue.append(child)
+        while queue:
+            node = queue.popleft()
+            for char, child in self._children[node].items():
+                fail = self._fail[node]
+                while fail and char not in self._children[fail]:
+                    fail = self._fail[fail]
+                target = self._children[fail].get(char, 0)
+                self._fail[child] = target if target != child else 0
+                # 输出链接指向最近的、本身有模式结尾的失败祖先
+                fail_node = self._fail[child]
+                self._output_link[child] = fail_node if self._ends[fail_node] else self._output_link[fail_node]
+                queue.append(child)
+        self._built = True
+
+    def iter_matches(self, text: str) -> Iterator[Tuple[int, int]]:
+        """扫描文本，依次产出 (结束位置, 模式编号)；结束位置为最后一个字符之后的下标"""
+        if not self._built:
+            self.build()
+        children = self._children
+        fail = self._fail
+        ends = self._ends
+        output_link = self._output_link
+        node = 0
+        for position, char in enumerate(text, 1):
+            while node and char not in children[node]:
+                node = fail[node]
+            node = children[node].get(char, 0)
+            if not node:
+                continue
+            out = node
+            while out:
+                for index in ends[out]:
+                    yield position, index
+                out = output_link[out]
+
+    def find_all(self, text: str) -> List[int]:
+        """文本中出现过的模式编号（去重，按首次出现顺序）"""
+        seen: Dict[int, None] = {}
+        for _, index in self.iter_matches(text):
+            seen.setdefault(index, None)
+        return list(seen)
+
+    def prefixes_of(self, text: str) -> List[int]:
+        """是 text 前缀的所有模式编号（只沿字典树向下走，不用失败指针）"""
+        found: List[int] = []
+        node = 0
+        for char in text:
+            node = self._children[node].get(char, 0)
+            if not node:
+                break
+            found.extend(self._ends[node])
+        return found
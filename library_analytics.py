@@ -0,0 +1,610 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+library_analytics.py
+角色卡库统计：把目录中每张角色卡和每个世界书条目的指标提取为按列存储的整数数组，
+在整个角色卡库上做分布、直方图、标签频率和超限筛选。
+
+- 提取在进程池中并行进行（每个文件只解析一次 JSON 或 PNG 文本块）；
+- 结果以列文件保存，再次统计时只重新提取修改时间或大小变化了的文件；
+- 查询在列上整体计算：安装了 numpy 时直接在数组缓冲区上向量化运算（不复制），否则退回纯 Python。
+
+列文件格式（字节序与本机相同）:
+
+    MAGIC | 头部长度 u32 | 头部 (JSON: 路径、名称、标签表、无法读取的文件、各列的类型与长度)
+    各列的原始数据，按头部中的顺序依次排列
+
+命令行用法:
+    python library_analytics.py 目录 [--hist 列名] [--top 列名] [--over 列名=上限] [--tags N]
+"""
+
+import argparse
+import hashlib
+import json
+import math
+import multiprocessing
+import os
+import struct
+import sys
+from array import array
+from bisect import bisect_right
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable, Dict, Iterable, List, NamedTuple, Optional, Sequence, Tuple
+
+from card_png import card_from_png, card_name
+from card_thumbnails import LibraryFile, scan_library
+from chat_replay import estimate_tokens
+
+try:
+    import numpy
+except ImportError:  # numpy 是可选依赖
+    numpy = None
+
+MAGIC = b"CCLA\x01"
+# 提取规则变化时递增，旧版本的列文件整体重新提取
+STORE_VERSION = 2
+# 命令行默认把列文件保存在角色卡目录中（扫描时不会把它当作角色卡）
+STORE_NAME = ".card_analytics"
+# 文件数不超过这个值时不启动进程池
+POOL_THRESHOLD = 16
+# 每次交给工作进程的文件数
+CHUNK_SIZE = 8
+
+# 统计 token 的角色卡字段
+TOKEN_FIELDS = (
+    "description", "personality", "scenario", "first_mes", "mes_example",
+    "system_prompt", "post_history_instructions", "creator_notes",
+)
+# 每次对话都会发送的字段（creator_notes 不进入提示词）
+PROMPT_FIELDS = TOKEN_FIELDS[:-1]
+GREETING_FIELDS = ("alternate_greetings", "group_only_greetings")
+
+# 每张角色卡一行的列，均为 64 位整数
+CARD_COLUMNS = (
+    "mtime", "size",
+    *TOKEN_FIELDS,
+    "greetings", "greeting_tokens_max",
+    "entries", "enabled_entries", "keys", "book_tokens", "constant_tokens", "token_budget",
+    "total_tokens",
+)
+# 每个世界书条目一行的列，均为 32 位整数；card 为所属角色卡的行号
+ENTRY_COLUMNS = ("card", "keys", "secondary_keys", "tokens", "constant", "enabled")
+
+COLUMN_TITLES = {
+    "mtime": "修改时间", "size": "文件大小",
+    "description": "描述 token", "personality": "性格 token", "scenario": "场景 token",
+    "first_mes": "开场白 token", "mes_example": "示例对话 token", "system_prompt": "系统提示词 token",
+    "post_history_instructions": "历史后指令 token", "creator_notes": "作者备注 token",
+    "greetings": "备选开场白数", "greeting_tokens_max": "最长开场白 token",
+    "entries": "条目数", "enabled_entries": "启用的条目数", "keys": "关键字数",
+    "book_tokens": "世界书 token", "constant_tokens": "常驻条目 token", "token_budget": "世界书 token 预算",
+    "total_tokens": "常驻提示词 token",
+    "entry.keys": "条目关键字数", "entry.secondary_keys": "条目次要关键字数", "entry.tokens": "条目 token",
+}
+
+_CARD_TYPE = "q"
+_ENTRY_TYPE = "i"
+_U32 = struct.Struct("<I")
+_EMPTY_METRICS: Tuple[int, ...] = (0,) * (len(CARD_COLUMNS) - 2)
+
+
+class CardMetrics(NamedTuple):
+    """工作进程提取的一张角色卡的指标"""
+    file: LibraryFile
+    name: str
+    values: Tuple[int, ...]                 # 与 CARD_COLUMNS[2:] 对应
+    tags: List[str]
+    entries: List[Tuple[int, ...]]          # 与 ENTRY_COLUMNS[1:] 对应
+    error: str = ""
+
+
+class UpdateStats(NamedTuple):
+    """一次增量统计的文件数"""
+    extracted: int
+    reused: int
+    removed: int
+    errors: int
+    cancelled: bool = False
+
+
+class Bin(NamedTuple):
+    low: float
+    high: float
+    count: int
+
+
+def _count(items: Any) -> int:
+    return len(items) if isinstance(items, list) else 0
+
+
+def _tokens(value: Any) -> int:
+    return estimate_tokens(value) if isinstance(value, str) and value else 0
+
+
+def card_metrics(file: LibraryFile, card: Dict[str, Any]) -> CardMetrics:
+    """从已解析的角色卡中提取指标"""
+    data = card.get("data") if isinstance(card.get("data"), dict) else card
+    fields = {name: _tokens(data.get(name)) for name in TOKEN_FIELDS}
+    greetings = [fields["first_mes"]]
+    for name in GREETING_FIELDS:
+        items = data.get(name)
+        if isinstance(items, list):
+            greetings.extend(_tokens(item) for item in items)
+
+    book = data.get("character_book") if isinstance(data.get("character_book"), dict) else {}
+    raw_entries = book.get("entries") if isinstance(book.get("entries"), list) else []
+    entries = []
+    book_tokens = constant_tokens = enabled_count = key_count = 0
+    for entry in raw_entries:
+        if not isinstance(entry, dict):
+            continue
+        keys = _count(entry.get("keys"))
+        tokens = _tokens(entry.get("content"))
+        constant = bool(entry.get("constant"))
+        enabled = entry.get("enabled") is not False
+        entries.append((keys, _count(entry.get("secondary_keys")), tokens, int(constant), int(enabled)))
+        key_count += keys
+        if enabled:
+            enabled_count += 1
+            book_tokens += tokens
+            if constant:
+                constant_tokens += tokens
+    budget = book.get("token_budget")
+    budget = budget if isinstance(budget, int) and not isinstance(budget, bool) else 0
+
+    values = (
+        *(fields[name] for name in TOKEN_FIELDS),
+        len(greetings) - 1, max(greetings),
+        len(entries), enabled_count, key_count, book_tokens, constant_tokens, budget,
+        sum(fields[name] for name in PROMPT_FIELDS) + constant_tokens,
+    )
+    # 同一标签在一张卡中重复列出时只算一次
+    tags = list(dict.fromkeys(tag for tag in data.get("tags") or [] if isinstance(tag, str) and tag)) \
+        if isinstance(data.get("tags"), list) else []
+    return CardMetrics(file, card_name(card), values, tags, entries)
+
+
+def extract_card(file: LibraryFile) -> CardMetrics:
+    """读取一个角色卡文件并提取指标（在工作进程中运行）"""
+    try:
+        with open(file.path, 'rb') as f:
+            raw = f.read()
+        if file.path.lower().endswith(".png"):
+            card = card_from_png(raw)
+        else:
+            card = json.loads(raw.decode("utf-8"))
+        if not isinstance(card, dict):
+            raise ValueError("不是角色卡")
+        return card_metrics(file, card)
+    except (OSError, ValueError, UnicodeDecodeError) as e:
+        return CardMetrics(file, "", _EMPTY_METRICS, [], [], str(e) or type(e).__name__)
+
+
+def _extract_chunk(files: List[LibraryFile]) -> List[CardMetrics]:
+    return [extract_card(file) for file in files]
+
+
+def _vector(column: array) -> Any:
+    """numpy 可用时把列包装为共享缓冲区的 ndarray"""
+    return numpy.frombuffer(column, dtype=column.typecode) if numpy is not None else column
+
+
+class LibraryAnalytics:
+    """角色卡库的按列指标"""
+
+    def __init__(self, directory: str = ""):
+        self.directory = directory
+        self.paths: List[str] = []
+        self.names: List[str] = []
+        self.cards: Dict[str, array] = {name: array(_CARD_TYPE) for name in CARD_COLUMNS}
+        self.entries: Dict[str, array] = {name: array(_ENTRY_TYPE) for name in ENTRY_COLUMNS}
+        # 第 i 张卡的条目在 entries 中的区间为 entry_offsets[i]:entry_offsets[i + 1]，标签同理
+        self.entry_offsets = array("q", [0])
+        self.tag_ids = array("i")
+        self.tag_offsets = array("q", [0])
+        self.vocabulary: List[str] = []
+        # 无法读取的文件: 路径 -> [修改时间, 大小, 原因]，文件不变时不再重试
+        self.errors: Dict[str, List[Any]] = {}
+
+    def __len__(self) -> int:
+        return len(self.paths)
+
+    # ------------------------------------------------------------------
+    # 列文件
+    # ------------------------------------------------------------------
+
+    def _columns(self) -> List[Tuple[str, array]]:
+        return [
+            *((f"card.{name}", column) for name, column in self.cards.items()),
+            *((f"entry.{name}", column) for name, column in self.entries.items()),
+            ("entry_offsets", self.entry_offsets), ("tag_ids", self.tag_ids), ("tag_offsets", self.tag_offsets),
+        ]
+
+    def save(self, path: str):
+        columns = self._columns()
+        header = json.dumps({
+            "version": STORE_VERSION, "byteorder": sys.byteorder, "directory": self.directory,
+            "paths": self.paths, "names": self.names, "vocabulary": self.vocabulary, "errors": self.errors,
+            "columns": [[key, column.typecode, len(column)] for key, column in columns],
+        }, ensure_ascii=False).encode("utf-8")
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        temp_path = path + ".tmp"
+        with open(temp_path, 'wb') as f:
+            f.write(MAGIC)
+            f.write(_U32.pack(len(header)))
+            f.write(header)
+            for _, column in columns:
+                column.tofile(f)
+        os.replace(temp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> "LibraryAnalytics":
+        """读取列文件；格式或版本不符时抛出 ValueError"""
+        with open(path, 'rb') as f:
+            raw = f.read()
+        if raw[:len(MAGIC)] != MAGIC:
+            raise ValueError("不是角色卡库统计文件")
+        position = len(MAGIC)
+        (header_length,) = _U32.unpack_from(raw, position)
+        position += _U32.size
+        header = json.loads(raw[position:position + header_length])
+        position += header_length
+        if header.get("version") != STORE_VERSION or header.get("byteorder") != sys.byteorder:
+            raise ValueError("统计文件版本不同")
+        analytics = cls(header["directory"])
+        analytics.paths = header["paths"]
+        analytics.names = header["names"]
+        analytics.vocabulary = header["vocabulary"]
+        analytics.errors = header["errors"]
+        columns = {}
+        for key, typecode, length in header["columns"]:
+            column = array(typecode)
+            size = length * column.itemsize
+            column.frombytes(raw[position:position + size])
+            if len(column) != length:
+                raise ValueError("统计文件不完整")
+            columns[key] = column
+            position += size
+        try:
+            for name in CARD_COLUMNS:
+                analytics.cards[name] = columns[f"card.{name}"]
+            for name in ENTRY_COLUMNS:
+                analytics.entries[name] = columns[f"entry.{name}"]
+            analytics.entry_offsets = columns["entry_offsets"]
+            analytics.tag_ids = columns["tag_ids"]
+            analytics.tag_offsets = columns["tag_offsets"]
+        except KeyError as e:
+            raise ValueError(f"统计文件缺少列 {e}") from None
+        return analytics
+
+    # ------------------------------------------------------------------
+    # 增量提取
+    # ------------------------------------------------------------------
+
+    def update(self, directory: Optional[str] = None, workers: Optional[int] = None,
+               on_progress: Optional[Callable[[int, int], None]] = None,
+               should_stop: Optional[Callable[[], bool]] = None) -> UpdateStats:
+        """扫描目录，只重新提取新增和修改过的文件；中途停止时保留已有结果"""
+        directory = os.path.abspath(directory or self.directory)
+        if directory != self.directory:
+            # 换了目录，原有的行全部作废
+            self.__init__(directory)
+        files = scan_library(directory)
+        rows = {path: row for row, path in enumerate(self.paths)}
+        mtimes, sizes = self.cards["mtime"], self.cards["size"]
+        changed = []
+        for file in files:
+            row = rows.get(file.path)
+            if row is not None and mtimes[row] == file.mtime and sizes[row] == file.size:
+                continue
+            error = self.errors.get(file.path)
+            if error is not None and error[0] == file.mtime and error[1] == file.size:
+                continue
+            changed.append(file)
+
+        extracted: Dict[str, CardMetrics] = {}
+        total = len(changed)
+        cancelled = False
+        for metrics in self._extract(changed, workers, should_stop):
+            if metrics is None:
+                cancelled = True
+                break
+            extracted[metrics.file.path] = metrics
+            if on_progress is not None:
+                on_progress(len(extracted), total)
+        if cancelled:
+            # 未处理的文件保留旧的结果（若有），下次统计时再提取
+            files = [file for file in files if file.path in extracted or file.path in rows or file.path in self.errors]
+        removed = len(rows) - sum(1 for file in files if file.path in rows)
+        self._rebuild(files, rows, extracted)
+        errors = sum(1 for metrics in extracted.values() if metrics.error)
+        return UpdateStats(len(extracted), len(self.paths) - (len(extracted) - errors), removed, errors, cancelled)
+
+    def _extract(self, files: List[LibraryFile], workers: Optional[int],
+                 should_stop: Optional[Callable[[], bool]]) -> Iterable[Optional[CardMetrics]]:
+        """按完成顺序产出各文件的指标，被要求停止时产出 None"""
+        if len(files) <= POOL_THRESHOLD or workers == 1:
+            for file in files:
+                if should_stop is not None and should_stop():
+                    yield None
+                    return
+                yield extract_card(file)
+            return
+        chunks = [files[start:start + CHUNK_SIZE] for start in range(0, len(files), CHUNK_SIZE)]
+        # 编辑器中有其他线程在运行，用 spawn 启动工作进程比 fork 安全
+        executor = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+        try:
+            for results in executor.map(_extract_chunk, chunks):
+                yield from results
+                if should_stop is not None and should_stop():
+                    yield None
+                    return
+        finally:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+    def _rebuild(self, files: List[LibraryFile], rows: Dict[str, int], extracted: Dict[str, CardMetrics]):
+        """按扫描顺序重建各列：未变化的卡片整段复制旧列，变化的卡片写入新提取的值"""
+        old_cards, old_entries = self.cards, self.entries
+        old_entry_offsets, old_tag_ids, old_tag_offsets = self.entry_offsets, self.tag_ids, self.tag_offsets
+        old_vocabulary, old_names = self.vocabulary, self.names
+        cards = {name: array(_CARD_TYPE) for name in CARD_COLUMNS}
+        entries = {name: array(_ENTRY_TYPE) for name in ENTRY_COLUMNS}
+        entry_offsets, tag_ids, tag_offsets = array("q", [0]), array("i"), array("q", [0])
+        paths: List[str] = []
+        names: List[str] = []
+        vocabulary: Dict[str, int] = {}
+        # 旧标签编号 -> 新标签编号，按需建立
+        tag_map: Dict[int, int] = {}
+        entry_names = ENTRY_COLUMNS[1:]
+        card_column = entries["card"]
+        errors = {}
+
+        for file in files:
+            metrics = extracted.get(file.path)
+            row = len(paths)
+            if metrics is None:
+                old = rows.get(file.path)
+                if old is None:
+                    error = self.errors.get(file.path)
+                    if error is not None:
+                        errors[file.path] = error
+                    continue
+                for name in CARD_COLUMNS:
+                    cards[name].append(old_cards[name][old])
+                start, end = old_entry_offsets[old], old_entry_offsets[old + 1]
+                for name in entry_names:
+                    entries[name].extend(old_entries[name][start:end])
+                card_column.extend(array(_ENTRY_TYPE, [row]) * (end - start))
+                for old_id in old_tag_ids[old_tag_offsets[old]:old_tag_offsets[old + 1]]:
+                    new_id = tag_map.get(old_id)
+                    if new_id is None:
+                        new_id = tag_map[old_id] = vocabulary.setdefault(old_vocabulary[old_id], len(vocabulary))
+                    tag_ids.append(new_id)
+                names.append(old_names[old])
+            elif metrics.error:
+                errors[file.path] = [file.mtime, file.size, metrics.error]
+                continue
+            else:
+                cards["mtime"].append(file.mtime)
+                cards["size"].append(file.size)
+                for name, value in zip(CARD_COLUMNS[2:], metrics.values):
+                    cards[name].append(value)
+                for name, values in zip(entry_names, zip(*metrics.entries)):
+                    entries[name].extend(values)
+                card_column.extend(array(_ENTRY_TYPE, [row]) * len(metrics.entries))
+                for tag in metrics.tags:
+                    tag_ids.append(vocabulary.setdefault(tag, len(vocabulary)))
+                names.append(metrics.name)
+            paths.append(file.path)
+            entry_offsets.append(len(card_column))
+            tag_offsets.append(len(tag_ids))
+
+        self.cards, self.entries = cards, entries
+        self.entry_offsets, self.tag_ids, self.tag_offsets = entry_offsets, tag_ids, tag_offsets
+        self.paths, self.names, self.vocabulary, self.errors = paths, names, list(vocabulary), errors
+
+    # ------------------------------------------------------------------
+    # 查询
+    # ------------------------------------------------------------------
+
+    def column(self, key: str) -> Any:
+        """按名称取列（条目列以 entry. 开头）；numpy 可用时返回共享缓冲区的 ndarray"""
+        if key.startswith("entry."):
+            return _vector(self.entries[key[len("entry."):]])
+        return _vector(self.cards[key])
+
+    def quantiles(self, key: str, points: Sequence[float] = (0.5, 0.9, 0.99)) -> List[float]:
+        """分位数（线性插值，与 numpy.quantile 的默认方法一致）"""
+        values = self.column(key)
+        if not len(values):
+            return [0.0] * len(points)
+        if numpy is not None:
+            return [float(value) for value in numpy.quantile(values, points)]
+        ordered = sorted(values)
+        result = []
+        for point in points:
+            position = point * (len(ordered) - 1)
+            low = math.floor(position)
+            high = min(low + 1, len(ordered) - 1)
+            result.append(ordered[low] + (ordered[high] - ordered[low]) * (position - low))
+        return result
+
+    def histogram(self, key: str, bins: int = 10) -> List[Bin]:
+        """等宽直方图，最后一个区间包含最大值"""
+        values = self.column(key)
+        if not len(values):
+            return []
+        if numpy is not None:
+            counts, edges = numpy.histogram(values, bins=bins)
+            return [Bin(float(edges[i]), float(edges[i + 1]), int(count)) for i, count in enumerate(counts)]
+        low, high = min(values), max(values)
+        if low == high:
+            low, high = low - 0.5, high + 0.5
+        width = (high - low) / bins
+        edges = [low + width * i for i in range(bins)] + [high]
+        counts = [0] * bins
+        for value in values:
+            counts[min(bisect_right(edges, value) - 1, bins - 1)] += 1
+        return [Bin(edges[i], edges[i + 1], counts[i]) for i in range(bins)]
+
+    def over(self, key: str, limit: int) -> List[int]:
+        """指定列超过 limit 的角色卡行号，按值从大到小排列（条目列返回条目所属的角色卡）"""
+        values = self.column(key)
+        if numpy is not None:
+            rows = numpy.flatnonzero(values > limit)
+            rows = rows[numpy.argsort(-values[rows], kind="stable")]
+            if key.startswith("entry."):
+                rows = _vector(self.entries["card"])[rows]
+                _, first = numpy.unique(rows, return_index=True)
+                rows = rows[numpy.sort(first)]
+            return [int(row) for row in rows]
+        rows = sorted((row for row, value in enumerate(values) if value > limit), key=lambda row: -values[row])
+        if key.startswith("entry."):
+            cards = self.entries["card"]
+            rows = list(dict.fromkeys(cards[row] for row in rows))
+        return rows
+
+    def per_card(self, key: str) -> Any:
+        """条目列按角色卡求和，长度与角色卡数相同"""
+        values = self.column(key)
+        if numpy is not None:
+            return numpy.bincount(_vector(self.entries["card"]), weights=values, minlength=len(self)).astype("q")
+        totals = array(_CARD_TYPE, bytes(len(self) * array(_CARD_TYPE).itemsize))
+        for card, value in zip(self.entries["card"], values):
+            totals[card] += value
+        return totals
+
+    def tag_frequencies(self, limit: int = 0) -> List[Tuple[str, int]]:
+        """各标签出现在多少张角色卡中，按次数从多到少"""
+        if numpy is not None and len(self.tag_ids):
+            counts = numpy.bincount(_vector(self.tag_ids), minlength=len(self.vocabulary))
+            order = numpy.argsort(-counts, kind="stable")
+            if limit:
+                order = order[:limit]
+            return [(self.vocabulary[i], int(counts[i])) for i in order if counts[i]]
+        counts = Counter(self.tag_ids).most_common(limit or None)
+        return [(self.vocabulary[i], count) for i, count in counts]
+
+    def summary(self) -> Dict[str, Any]:
+        """整体统计：卡片与条目数以及主要列的总和和分位数"""
+        result: Dict[str, Any] = {
+            "directory": self.directory, "cards": len(self), "entries": len(self.entries["card"]),
+            "tags": len(self.vocabulary), "errors": len(self.errors), "columns": {},
+        }
+        for key in ("total_tokens", "book_tokens", "constant_tokens", "greeting_tokens_max", "entries", "entry.tokens"):
+            values = self.column(key)
+            median, p90, p99 = self.quantiles(key)
+            result["columns"][key] = {
+                "sum": int(sum(values) if numpy is None else values.sum()),
+                "max": int(max(values) if numpy is None else values.max()) if len(values) else 0,
+                "median": median, "p90": p90, "p99": p99,
+            }
+        return result
+
+
+def store_path(cache_dir: str, directory: str) -> str:
+    """编辑器为每个目录保存统计文件的位置"""
+    digest = hashlib.blake2b(os.path.abspath(directory).encode("utf-8"), digest_size=8).hexdigest()
+    return os.path.join(cache_dir, f"{digest}.bin")
+
+
+def open_analytics(path: str, directory: str) -> LibraryAnalytics:
+    """读取统计文件，不存在或无法使用时从空白开始"""
+    try:
+        analytics = LibraryAnalytics.load(path)
+    except (OSError, ValueError, KeyError, TypeError):
+        return LibraryAnalytics(os.path.abspath(directory))
+    return analytics
+
+
+def column_title(key: str) -> str:
+    return COLUMN_TITLES.get(key, key)
+
+
+def format_histogram(bins: List[Bin], width: int = 40) -> List[str]:
+    peak = max((item.count for item in bins), default=0)
+    lines = []
+    for item in bins:
+        bar = "█" * (round(item.count / peak * width) if peak else 0)
+        lines.append(f"{item.low:>10.0f} - {item.high:<10.0f} {item.count:>7} {bar}")
+    return lines
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """命令行入口"""
+    parser = argparse.ArgumentParser(description="统计角色卡库中各角色卡和世界书条目的指标")
+    parser.add_argument("directory", help="角色卡目录（含子目录中的 JSON 与 PNG 角色卡）")
+    parser.add_argument("--store", help=f"统计文件路径（默认为目录中的 {STORE_NAME}）")
+    parser.add_argument("--hist", metavar="列名", action="append", default=[],
+                        help="输出该列的直方图，条目列以 entry. 开头，可多次指定")
+    parser.add_argument("--bins", type=int, default=10, help="直方图区间数")
+    parser.add_argument("--top", metavar="列名", action="append", default=[], help="列出该列最大的 20 张角色卡")
+    parser.add_argument("--over", metavar="列名=上限", action="append", default=[],
+                        help="列出该列超过上限的角色卡，如 greeting_tokens_max=1500")
+    parser.add_argument("--tags", type=int, default=0, metavar="N", help="列出最常见的 N 个标签")
+    parser.add_argument("--json", action="store_true", help="以 JSON 输出整体统计")
+    parser.add_argument("-j", "--jobs", type=int, default=None, help="工作进程数（默认为 CPU 数）")
+    args = parser.parse_args(argv)
+
+    if not os.path.isdir(args.directory):
+        print(f"目录不存在: {args.directory}", file=sys.stderr)
+        return 2
+    columns = set(CARD_COLUMNS) | {f"entry.{name}" for name in ENTRY_COLUMNS[1:]}
+    over = []
+    for item in args.over:
+        key, _, limit = item.partition("=")
+        if not limit.lstrip("-").isdigit():
+            print(f"--over 需要 列名=整数: {item}", file=sys.stderr)
+            return 2
+        over.append((key, int(limit)))
+    for key in (*args.hist, *args.top, *(key for key, _ in over)):
+        if key not in columns:
+            print(f"未知的列: {key}（可用: {', '.join(sorted(columns))}）", file=sys.stderr)
+            return 2
+
+    path = args.store or os.path.join(args.directory, STORE_NAME)
+    analytics = open_analytics(path, args.directory)
+    stats = analytics.update(args.directory, args.jobs)
+    try:
+        analytics.save(path)
+    except OSError as e:
+        print(f"无法保存统计文件: {e}", file=sys.stderr)
+
+    summary = analytics.summary()
+    if args.json:
+        print(json.dumps(summary, ensure_ascii=False, indent=2))
+    else:
+        print(f"{summary['cards']} 张角色卡，{summary['entries']} 个世界书条目，{summary['tags']} 个标签"
+              f"（重新提取 {stats.extracted} 个文件，沿用 {stats.reused}，移除 {stats.removed}）")
+        for key, values in summary["columns"].items():
+            print(f"  {column_title(key)}: 合计 {values['sum']}，中位数 {values['median']:.0f}，"
+                  f"P90 {values['p90']:.0f}，P99 {values['p99']:.0f}，最大 {values['max']}")
+    for path, (_, _, reason) in sorted(analytics.errors.items()):
+        print(f"{path}: 跳过（{reason}）", file=sys.stderr)
+
+    for key in args.hist:
+        print(f"\n{column_title(key)}:")
+        print("\n".join(format_histogram(analytics.histogram(key, args.bins))))
+    for key in args.top:
+        print(f"\n{column_title(key)} 最大的角色卡:")
+        values = analytics.per_card(key) if key.startswith("entry.") else analytics.column(key)
+        for row in sorted(range(len(analytics)), key=lambda row: -values[row])[:20]:
+            print(f"  {values[row]:>8}  {analytics.names[row] or analytics.paths[row]}")
+    for key, limit in over:
+        rows = analytics.over(key, limit)
+        print(f"\n{column_title(key)} 超过 {limit} 的角色卡 ({len(rows)}):")
+        for row in rows:
+            print(f"  {analytics.paths[row]}")
+    if args.tags:
+        print("\n标签:")
+        for tag, count in analytics.tag_frequencies(args.tags):
+            print(f"  {count:>6}  {tag}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
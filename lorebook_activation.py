@@ -0,0 +1,511 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+lorebook_activation.py
+世界书条目的激活扫描：根据最近的聊天消息判断哪些条目会被触发，以及触发后插入的位置。
+
+所有条目的普通关键字编入 Aho-Corasick 自动机（keyword_matcher），扫描一遍文本
+即可得到全部命中的条目；只有真正含正则语法的关键字才逐条匹配。
+关键字不变时索引不重建，条目内容中的装饰器解析结果按内容缓存。
+给出宏上下文时，扫描的消息、递归扫描的条目内容以及含宏的关键字先经 macros 展开。
+extensions.vectorized 的条目还会由 lorebook_retrieval 按与最近消息的相似度激活。
+"""
+
+import re
+from functools import lru_cache
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Set, Tuple
+
+from keyword_matcher import KeywordAutomaton
+from lorebook_retrieval import DEFAULT_TOP_K, RetrievalIndex
+from macros import MacroContext, expand_macros, has_macros
+
+# 世界书未指定 scan_depth 时扫描的最近消息数
+DEFAULT_SCAN_DEPTH = 2
+# 递归扫描的最大轮数
+MAX_RECURSION_STEPS = 3
+
+# SillyTavern 的数值位置 (extensions.position)
+POSITION_NAMES = {
+    0: "before_char", 1: "after_char", 2: "an_top", 3: "an_bottom",
+    4: "depth", 5: "em_top", 6: "em_bottom",
+}
+ROLE_NAMES = {0: "system", 1: "user", 2: "assistant"}
+
+# 次要关键字逻辑 (extensions.selectiveLogic)
+AND_ANY, NOT_ALL, NOT_ANY, AND_ALL = range(4)
+
+# 本模块会处理的装饰器，其余的按规范视为未识别（可以回退到 @@@ 后备装饰器）
+SUPPORTED_DECORATORS = frozenset({
+    "activate", "dont_activate", "depth", "role", "scan_depth", "position",
+})
+
+_WORD_CHAR = re.compile(r"\w")
+# 正则表达式中有特殊含义的字符；开启 use_regex 时不含这些字符的关键字仍按普通文本匹配
+_REGEX_META = re.compile(r"[.^$*+?{}\[\]|()\\]")
+
+
+class Message(NamedTuple):
+    role: str      # user / assistant / system
+    content: str
+
+
+class ActivatedEntry(NamedTuple):
+    """一个被激活的条目及其插入位置"""
+    row: int
+    content: str    # 去掉装饰器后的内容
+    position: str   # before_char / after_char / depth / an_top / ... / before_desc / after_desc / personality / scenario
+    depth: int
+    role: str
+    order: int
+
+
+@lru_cache(maxsize=65536)
+def parse_decorators(content: str) -> Tuple[Tuple[Tuple[str, str], ...], str]:
+    """解析内容中的装饰器，返回 ((名称, 取值), ...) 与去掉装饰器行后的内容
+
+    同名装饰器只取第一个；未识别的装饰器会回退到紧随其后的 @@@ 后备装饰器。
+    """
+    if "@@" not in content:
+        return (), content
+    decorators: Dict[str, str] = {}
+    kept: List[str] = []
+    chain_resolved = True
+    for line in content.split("\n"):
+        if not line.startswith("@@"):
+            kept.append(line)
+            continue
+        is_fallback = line.startswith("@@@")
+        name, _, value = line[3 if is_fallback else 2:].partition(" ")
+        name = name.strip()
+        if not is_fallback:
+            chain_resolved = False
+        elif chain_resolved:
+            continue
+        if name in SUPPORTED_DECORATORS:
+            chain_resolved = True
+            decorators.setdefault(name, value.strip())
+    return tuple(decorators.items()), "\n".join(kept).strip("\n")
+
+
+def _is_regex_key(key: str) -> bool:
+    return len(key) > 2 and key.startswith("/") and key.rfind("/") > 0
+
+
+def needs_regex(key: str, use_regex: bool) -> bool:
+    """关键字是否需要按正则逐条匹配：/.../ 形式的关键字，或开启 use_regex 且含有正则元字符的关键字。
+
+    含空格、连字符等普通标点的关键字作为正则和作为文本的匹配结果相同，交给关键字自动机一次扫描。
+    """
+    return _is_regex_key(key) or (use_regex and _REGEX_META.search(key) is not None)
+
+
+def _compile_key(key: str, use_regex: bool, case_sensitive: bool) -> Optional[re.Pattern]:
+    """需要逐条匹配的正则关键字编译为 Pattern；普通关键字返回 None"""
+    flags = 0 if case_sensitive else re.IGNORECASE
+    if _is_regex_key(key):
+        end = key.rfind("/")
+        for flag in key[end + 1:]:
+            flags |= {"i": re.IGNORECASE, "m": re.MULTILINE, "s": re.DOTALL}.get(flag, 0)
+        pattern = key[1:end]
+    elif needs_regex(key, use_regex):
+        pattern = key
+    else:
+        return None
+    try:
+        return re.compile(pattern, flags)
+    except re.error:
+        # 规范要求：无效的正则关键字视为不匹配
+        return re.compile(r"(?!)")
+
+
+def _ext(entry: Dict[str, Any]) -> Dict[str, Any]:
+    ext = entry.get("extensions")
+    return ext if isinstance(ext, dict) else {}
+
+
+def _number(value: Any, default: int) -> int:
+    try:
+        return int(float(value))
+    except (TypeError, ValueError):
+        return default
+
+
+class _KeyRef(NamedTuple):
+    entry_id: int
+    secondary: bool
+    key_no: int
+    whole_words: bool
+
+
+class ActivationIndex:
+    """所有条目关键字的匹配索引
+
+    按条目增量维护：只有关键字相关字段变化的条目才会重新登记，
+    条目增删不会让其余条目重新登记（引用以条目对象为键，扫描时再换算成行号）。
+    """
+
+    def __init__(self):
+        self._automata: Dict[bool, KeywordAutomaton] = {False: KeywordAutomaton(), True: KeywordAutomaton()}
+        # 自动机模式编号 -> 引用该关键字的条目
+        self._refs: Dict[bool, List[List[_KeyRef]]] = {False: [], True: []}
+        self._regex_refs: Dict[int, List[Tuple[_KeyRef, re.Pattern]]] = {}
+        # id(条目) -> (关键字快照, 登记过的 (是否区分大小写, 模式编号))
+        self._entries: Dict[int, Tuple[Tuple[Any, ...], List[Tuple[bool, int]]]] = {}
+        self._rows: Dict[int, int] = {}
+        self.rebuilds = 0
+
+    def _entry_snapshot(self, entry: Dict[str, Any], context: Optional[MacroContext]) -> Tuple[Any, ...]:
+        ext = _ext(entry)
+
+        def keys(name: str) -> Tuple[Any, ...]:
+            values = tuple(entry.get(name) or ())
+            if context is None:
+                return values
+            return tuple(expand_macros(key, context) if isinstance(key, str) and has_macros(key) else key
+                         for key in values)
+
+        return (
+            keys("keys"), keys("secondary_keys"),
+            bool(entry.get("use_regex")), entry.get("case_sensitive"), ext.get("case_sensitive"),
+            ext.get("match_whole_words"),
+        )
+
+    def update(self, entries: List[Dict[str, Any]], context: Optional[MacroContext] = None) -> bool:
+        """同步到当前条目列表，返回是否有条目重新登记；context 用于展开关键字中的宏"""
+        self._rows = {id(entry): row for row, entry in enumerate(entries)}
+        changed = False
+        for entry_id in [entry_id for entry_id in self._entries if entry_id not in self._rows]:
+            self._unregister(entry_id)
+            changed = True
+        for entry in entries:
+            snapshot = self._entry_snapshot(entry, context)
+            registered = self._entries.get(id(entry))
+            if registered is not None and registered[0] == snapshot:
+                continue
+            if registered is not None:
+                self._unregister(id(entry))
+            self._register(entry, snapshot)
+            changed = True
+        if changed:
+            self._compact()
+            for automaton in self._automata.values():
+                automaton.build()
+        return changed
+
+    def _register(self, entry: Dict[str, Any], snapshot: Tuple[Any, ...]):
+        ext = _ext(entry)
+        case_sensitive = bool(ext.get("case_sensitive") if ext.get("case_sensitive") is not None
+                              else entry.get("case_sensitive"))
+        whole_words = bool(ext.get("match_whole_words"))
+        use_regex = bool(entry.get("use_regex"))
+        patterns: List[Tuple[bool, int]] = []
+        # 快照中的关键字已经展开过宏
+        for secondary, keys in ((False, snapshot[0]), (True, snapshot[1])):
+            for key_no, key in enumerate(keys):
+                if not isinstance(key, str) or not key.strip():
+                    continue
+                key = key.strip()
+                ref = _KeyRef(id(entry), secondary, key_no, whole_words)
+                pattern = _compile_key(key, use_regex, case_sensitive)
+                if pattern is not None:
+                    self._regex_refs.setdefault(id(entry), []).append((ref, pattern))
+                    continue
+                index = self._automata[case_sensitive].add(key if case_sensitive else key.lower())
+                refs = self._refs[case_sensitive]
+                if index == len(refs):
+                    refs.append([])
+                refs[index].append(ref)
+                patterns.append((case_sensitive, index))
+        self._entries[id(entry)] = (snapshot, patterns)
+
+    def _unregister(self, entry_id: int):
+        _, patterns = self._entries.pop(entry_id)
+        self._regex_refs.pop(entry_id, None)
+        for case_sensitive, index in patterns:
+            refs = self._refs[case_sensitive]
+            refs[index] = [ref for ref in refs[index] if ref.entry_id != entry_id]
+
+    def _compact(self):
+        """自动机只能追加模式；无人引用的模式过多时整体重建"""
+        for case_sensitive, automaton in self._automata.items():
+            refs = self._refs[case_sensitive]
+            unused = sum(1 for index_refs in refs if not index_refs)
+            if unused <= max(len(refs) // 2, 64):
+                continue
+            live = [(automaton.patterns[index], index_refs) for index, index_refs in enumerate(refs) if index_refs]
+            automaton = KeywordAutomaton(pattern for pattern, _ in live)
+            self._automata[case_sensitive] = automaton
+            self._refs[case_sensitive] = [index_refs for _, index_refs in live]
+            remap = {}
+            for new_index, (_, index_refs) in enumerate(live):
+                for ref in index_refs:
+                    remap.setdefault(ref.entry_id, []).append((case_sensitive, new_index))
+            for entry_id, (snapshot, patterns) in self._entries.items():
+                kept = [item for item in patterns if item[0] != case_sensitive]
+                self._entries[entry_id] = (snapshot, kept + remap.get(entry_id, []))
+            self.rebuilds += 1
+
+    def scan(self, text: str) -> Dict[int, Tuple[Set[int], Set[int]]]:
+        """扫描文本，返回 {行号: (命中的主关键字序号, 命中的次要关键字序号)}"""
+        hits: Dict[int, Tuple[Set[int], Set[int]]] = {}
+
+        rows = self._rows
+
+        def record(ref: _KeyRef):
+            primary, secondary = hits.setdefault(rows[ref.entry_id], (set(), set()))
+            (secondary if ref.secondary else primary).add(ref.key_no)
+
+        for case_sensitive, automaton in self._automata.items():
+            if not len(automaton):
+                continue
+            haystack = text if case_sensitive else text.lower()
+            refs = self._refs[case_sensitive]
+            # 同一关键字只需判断一次是否命中（以及是否存在整词命中）
+            seen: Dict[int, bool] = {}
+            for end, index in automaton.iter_matches(haystack):
+                if seen.get(index):
+                    continue
+                start = end - len(automaton.patterns[index])
+                seen[index] = ((start == 0 or not _WORD_CHAR.match(haystack[start - 1]))
+                               and (end == len(haystack) or not _WORD_CHAR.match(haystack[end])))
+            for index, whole in seen.items():
+                for ref in refs[index]:
+                    if whole or not ref.whole_words:
+                        record(ref)
+        for regex_refs in self._regex_refs.values():
+            for ref, pattern in regex_refs:
+                if pattern.search(text):
+                    record(ref)
+        return hits
+
+
+def _secondary_passes(entry: Dict[str, Any], secondary_hits: Set[int], secondary_count: int) -> bool:
+    logic = _number(_ext(entry).get("selectiveLogic"), AND_ANY)
+    if logic == NOT_ALL:
+        return len(secondary_hits) < secondary_count
+    if logic == NOT_ANY:
+        return not secondary_hits
+    if logic == AND_ALL:
+        return len(secondary_hits) == secondary_count
+    return bool(secondary_hits)
+
+
+def secondary_key_count(entry: Dict[str, Any]) -> int:
+    """参与判断的次要关键字数，非选择性条目为 0"""
+    if not entry.get("selective"):
+        return 0
+    return sum(1 for key in entry.get("secondary_keys") or () if isinstance(key, str) and key.strip())
+
+
+def hit_matches(entry: Dict[str, Any], hit: Optional[Tuple[Set[int], Set[int]]], secondary_count: int) -> bool:
+    """扫描命中 (主关键字序号, 次要关键字序号) 是否足以激活条目"""
+    if not hit or not hit[0]:
+        return False
+    if secondary_count:
+        return _secondary_passes(entry, hit[1], secondary_count)
+    return True
+
+
+def _placement(entry: Dict[str, Any], decorators: Dict[str, str]) -> Tuple[str, int, str]:
+    """条目的插入位置: (位置, 深度, 角色)"""
+    ext = _ext(entry)
+    role = ROLE_NAMES.get(_number(ext.get("role"), 0), "system")
+    if decorators.get("role") in ("system", "user", "assistant"):
+        role = decorators["role"]
+    if "depth" in decorators:
+        return "depth", _number(decorators["depth"], 0), role
+    if decorators.get("position") in ("after_desc", "before_desc", "personality", "scenario"):
+        return decorators["position"], 0, role
+    if "position" in ext:
+        position = POSITION_NAMES.get(_number(ext.get("position"), 0), "before_char")
+    else:
+        position = entry.get("position") if entry.get("position") in ("before_char", "after_char") else "before_char"
+    return position, _number(ext.get("depth"), 4), role
+
+
+# 影响激活与插入位置的条目字段（关键字之外）
+_ENTRY_FIELDS = ("content", "enabled", "constant", "selective", "insertion_order", "position")
+_EXT_FIELDS = (
+    "position", "depth", "role", "selectiveLogic", "scan_depth",
+    "prevent_recursion", "exclude_recursion", "delay_until_recursion", "vectorized",
+)
+
+
+def _activation_snapshot(entry: Dict[str, Any]) -> Tuple[Any, ...]:
+    ext = _ext(entry)
+    return tuple(map(entry.get, _ENTRY_FIELDS)) + tuple(map(ext.get, _EXT_FIELDS))
+
+
+class _Plan(NamedTuple):
+    """与消息无关的激活准备：条目解析结果与按扫描深度分组的待扫描条目"""
+    entries: List[Dict[str, Any]]
+    parsed: Dict[int, Tuple[Dict[str, str], str]]
+    always: List[int]
+    scan_rows: Dict[int, Set[int]]
+    default_depth: int
+    recursive: bool
+    # 按需填充：行号 -> 插入位置与顺序 / 有效的次要关键字数
+    placements: Dict[int, Tuple[str, int, str, int]]
+    secondary_counts: Dict[int, int]
+
+
+class LorebookActivator:
+    """根据聊天消息计算被激活的世界书条目
+
+    索引按关键字增量维护，条目解析结果在条目变化前一直复用；
+    每轮只需扫描消息并处理命中的条目，同一组消息重复查询时直接返回上次的结果。
+    """
+
+    def __init__(self):
+        self.index = ActivationIndex()
+        self.retrieval = RetrievalIndex(lambda entry: parse_decorators(str(entry.get("content") or ""))[1])
+        # 每次最多由相似度检索激活的 vectorized 条目数
+        self.vector_top_k = DEFAULT_TOP_K
+        self._plan: Optional[_Plan] = None
+        self._plan_key: Optional[Tuple[Any, ...]] = None
+        self._cache_key: Optional[Tuple[Message, ...]] = None
+        self._cache: List[ActivatedEntry] = []
+
+    @property
+    def max_scan_depth(self) -> int:
+        """当前世界书中最大的扫描深度（需先调用 prepare）"""
+        if self._plan is None:
+            return DEFAULT_SCAN_DEPTH
+        return max([self._plan.default_depth, *self._plan.scan_rows])
+
+    def activate(self, book: Dict[str, Any], messages: List[Message],
+                 context: Optional[MacroContext] = None) -> List[ActivatedEntry]:
+        """返回按 insertion_order 排序的激活条目；给出 context 时先展开宏再扫描
+
+        返回的条目内容不展开宏，由调用方决定如何展示。
+        """
+        self.prepare(book, context)
+        if context is not None:
+            messages = [Message(message.role, expand_macros(message.content, context)) for message in messages]
+        cache_key = tuple(messages)
+        if cache_key != self._cache_key:
+            self._cache_key = cache_key
+            self._cache = self.activate_window(messages, context)
+        return self._cache
+
+    def prepare(self, book: Dict[str, Any], context: Optional[MacroContext] = None) -> bool:
+        """同步索引并按需重建激活计划，返回计划是否重建"""
+        entries = book.get("entries") or []
+        changed = self.index.update(entries, context)
+        changed = self.retrieval.update(entries) or changed
+        if context is not None:
+            # 其他字段和时间只影响递归扫描中极少见的宏，不为它们让缓存失效
+            context = context._replace(fields=None, now=None)
+        plan_key = (
+            context, self.vector_top_k, book.get("scan_depth"), book.get("recursive_scanning"),
+            tuple(_activation_snapshot(entry) for entry in entries),
+        )
+        if not changed and plan_key == self._plan_key:
+            return False
+        self._plan_key = plan_key
+        self._plan = self._build_plan(entries, book)
+        self._cache_key = None
+        return True
+
+    def _build_plan(self, entries: List[Dict[str, Any]], book: Dict[str, Any]) -> _Plan:
+        default_depth = _number(book.get("scan_depth"), DEFAULT_SCAN_DEPTH)
+        parsed: Dict[int, Tuple[Dict[str, str], str]] = {}
+        always: List[int] = []
+        scan_rows: Dict[int, Set[int]] = {}
+        for row, entry in enumerate(entries):
+            if entry.get("enabled") is False:
+                continue
+            decorator_items, content = parse_decorators(str(entry.get("content") or ""))
+            decorators = dict(decorator_items)
+            parsed[row] = (decorators, content)
+            if "activate" in decorators:
+                always.append(row)
+            elif "dont_activate" in decorators or _ext(entry).get("delay_until_recursion"):
+                continue
+            elif entry.get("constant"):
+                always.append(row)
+            else:
+                depth = _number(decorators.get("scan_depth", _ext(entry).get("scan_depth")), default_depth)
+                scan_rows.setdefault(depth, set()).add(row)
+        return _Plan(entries, parsed, always, scan_rows, default_depth, bool(book.get("recursive_scanning")), {}, {})
+
+    def activate_window(self, messages: List[Message], context: Optional[MacroContext] = None,
+                        scan: Optional[Callable[[int], Dict[int, Tuple[Set[int], Set[int]]]]] = None
+                        ) -> List[ActivatedEntry]:
+        """按已准备好的计划计算一个消息窗口的激活结果
+
+        消息中的宏应已展开；context 只用于递归扫描时展开条目内容。需先调用 prepare。
+        scan(深度) 可返回最近若干条消息的命中结果（如逐条缓存后合并），默认直接扫描拼接的文本。
+        """
+        plan = self._plan
+        if plan is None:
+            return []
+        entries, parsed = plan.entries, plan.parsed
+
+        def window(depth: int) -> str:
+            recent = messages[-depth:] if depth > 0 else []
+            return "\n".join(message.content for message in recent)
+
+        active: Dict[int, None] = dict.fromkeys(plan.always)
+        # 不同条目可能有不同的扫描深度，每种深度只扫描一次
+        for depth, rows in plan.scan_rows.items():
+            hits = scan(depth) if scan is not None else self.index.scan(window(depth))
+            for row, hit in hits.items():
+                if row in rows and self._matches(row, hit):
+                    active[row] = None
+
+        if len(self.retrieval) and self.vector_top_k > 0:
+            for hit in self.retrieval.search(window(plan.default_depth), self.vector_top_k):
+                if hit.row not in parsed or "dont_activate" in parsed[hit.row][0]:
+                    continue
+                if not _ext(entries[hit.row]).get("delay_until_recursion"):
+                    active.setdefault(hit.row, None)
+
+        if plan.recursive:
+            self._recurse(entries, parsed, active, context)
+
+        result = []
+        placements = plan.placements
+        for row in active:
+            decorators, content = parsed[row]
+            if not content:
+                continue
+            placement = placements.get(row)
+            if placement is None:
+                placement = placements[row] = _placement(entries[row], decorators) + (
+                    _number(entries[row].get("insertion_order"), 100),)
+            result.append(ActivatedEntry(row, content, *placement))
+        result.sort(key=lambda item: (item.order, item.row))
+        return result
+
+    def _matches(self, row: int, hit: Optional[Tuple[Set[int], Set[int]]]) -> bool:
+        if not hit or not hit[0]:
+            return False
+        entry = self._plan.entries[row]
+        counts = self._plan.secondary_counts
+        count = counts.get(row)
+        if count is None:
+            count = counts[row] = secondary_key_count(entry)
+        return hit_matches(entry, hit, count)
+
+    def _recurse(self, entries: List[Dict[str, Any]], parsed: Dict[int, Tuple[Dict[str, str], str]],
+                 active: Dict[int, None], context: Optional[MacroContext]):
+        """用已激活条目的内容继续触发其他条目"""
+        pending = [row for row in active if not _ext(entries[row]).get("prevent_recursion")]
+        for _ in range(MAX_RECURSION_STEPS):
+            if not pending:
+                break
+            text = "\n".join(parsed[row][1] for row in pending)
+            hits = self.index.scan(expand_macros(text, context) if context is not None else text)
+            pending = []
+            for row, hit in hits.items():
+                if row in active or row not in parsed:
+                    continue
+                entry = entries[row]
+                if "dont_activate" in parsed[row][0] or _ext(entry).get("exclude_recursion"):
+                    continue
+                if self._matches(row, hit):
+                    active[row] = None
+                    if not _ext(entry).get("prevent_recursion"):
+                        pending.append(row)
@@ -0,0 +1,322 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+lorebook_analysis.py
+世界书条目的冗余分析：近似重复的内容与相互遮蔽的关键字。
+
+- 近似重复：对 content 做字符 n-gram，用单次排列 MinHash（One Permutation Hashing）
+  生成签名，再用 LSH 分桶只比较同桶的候选，避免 O(n²) 两两比较。
+  签名按条目缓存，内容未变的条目不会重新计算。
+- 关键字重叠：关键字存放在字典树中，找出"是另一条目关键字的子串/前缀"的关键字；
+  条目的关键字变化时只移除、插入该条目的关键字。
+"""
+
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+from keyword_matcher import KeywordAutomaton
+from lorebook_activation import needs_regex
+
+# 字符 n-gram 长度（对中文和英文都适用）
+SHINGLE_SIZE = 4
+# 签名长度与 LSH 分带：BANDS * ROWS == SIGNATURE_SIZE
+SIGNATURE_SIZE = 64
+BANDS = 16
+ROWS = SIGNATURE_SIZE // BANDS
+# 估计的 Jaccard 相似度达到该值才算近似重复
+DUPLICATE_THRESHOLD = 0.7
+
+_BIN_BITS = SIGNATURE_SIZE.bit_length() - 1
+_BIN_MASK = SIGNATURE_SIZE - 1
+
+
+def content_signature(text: str) -> Optional[Tuple[int, ...]]:
+    """计算文本的 MinHash 签名；文本短于一个 n-gram 时返回 None"""
+    text = " ".join(text.lower().split())
+    if len(text) < SHINGLE_SIZE:
+        return None
+    shingles = {text[i:i + SHINGLE_SIZE] for i in range(len(text) - SHINGLE_SIZE + 1)}
+    hashes = sorted(map(hash, shingles), reverse=True)
+    # 单次排列：按低位分桶，降序写入后每个桶里留下的是最小值
+    bins = {h & _BIN_MASK: h >> _BIN_BITS for h in hashes}
+    signature: List[int] = [0] * SIGNATURE_SIZE
+    filled = sorted(bins)
+    for b in filled:
+        signature[b] = bins[b]
+    if len(filled) < SIGNATURE_SIZE:
+        # 轮转补全空桶：取右侧最近的非空桶，并加上距离偏移
+        for b in range(SIGNATURE_SIZE):
+            if b in bins:
+                continue
+            distance = 1
+            while (b + distance) % SIGNATURE_SIZE not in bins:
+                distance += 1
+            signature[b] = bins[(b + distance) % SIGNATURE_SIZE] + (distance << 58)
+    return tuple(signature)
+
+
+def estimate_similarity(a: Tuple[int, ...], b: Tuple[int, ...]) -> float:
+    """用签名估计 Jaccard 相似度"""
+    return sum(1 for x, y in zip(a, b) if x == y) / SIGNATURE_SIZE
+
+
+class DuplicateIndex:
+    """近似重复内容的增量索引
+
+    以条目对象本身为键缓存签名和 LSH 桶；update() 只为内容变化的条目重新计算。
+    """
+
+    def __init__(self, threshold: float = DUPLICATE_THRESHOLD):
+        self.threshold = threshold
+        # id(entry) -> (entry, content, signature)
+        self._cache: Dict[int, Tuple[Dict[str, Any], str, Optional[Tuple[int, ...]]]] = {}
+        # (band, band_hash) -> {id(entry)}
+        self._buckets: Dict[Tuple[int, int], Dict[int, None]] = {}
+
+    def _band_keys(self, signature: Tuple[int, ...]) -> List[Tuple[int, int]]:
+        return [(band, hash(signature[band * ROWS:(band + 1) * ROWS])) for band in range(BANDS)]
+
+    def _drop(self, key: int):
+        _, _, signature = self._cache.pop(key)
+        if signature is None:
+            return
+        for band_key in self._band_keys(signature):
+            bucket = self._buckets.get(band_key)
+            if bucket is not None:
+                bucket.pop(key, None)
+                if not bucket:
+                    del self._buckets[band_key]
+
+    def update(self, entries: List[Dict[str, Any]]) -> int:
+        """同步到当前条目列表，返回重新计算签名的条目数"""
+        current = {id(entry): entry for entry in entries}
+        for key in [key for key in self._cache if key not in current]:
+            self._drop(key)
+
+        recomputed = 0
+        for key, entry in current.items():
+            content = str(entry.get("content", ""))
+            cached = self._cache.get(key)
+            if cached is not None and cached[1] == content:
+                continue
+            if cached is not None:
+                self._drop(key)
+            signature = content_signature(content)
+            self._cache[key] = (entry, content, signature)
+            recomputed += 1
+            if signature is not None:
+                for band_key in self._band_keys(signature):
+                    self._buckets.setdefault(band_key, {})[key] = None
+        return recomputed
+
+    def clusters(self, entries: List[Dict[str, Any]]) -> List[List[int]]:
+        """返回近似重复的条目组（条目下标），每组至少两个条目"""
+        row_of = {id(entry): row for row, entry in enumerate(entries)}
+        parent: Dict[int, int] = {}
+
+        def find(x: int) -> int:
+            root = x
+            while parent.get(root, root) != root:
+                root = parent[root]
+            while x != root:
+                parent[x], x = root, parent[x]
+            return root
+
+        checked = set()
+        for bucket in self._buckets.values():
+            if len(bucket) < 2:
+                continue
+            members = list(bucket)
+            # 同桶的每一对都要比较：两者可能彼此相似，却都不与桶内其他成员相似；
+            # 已在同一组中的对跳过比较，内容完全相同的大桶也很快
+            for position, key in enumerate(members):
+                signature = self._cache[key][2]
+                for other in members[position + 1:]:
+                    pair = (key, other) if key < other else (other, key)
+                    if pair in checked:
+                        continue
+                    checked.add(pair)
+                    root, other_root = find(key), find(other)
+                    if root == other_root:
+                        continue
+                    if estimate_similarity(signature, self._cache[other][2]) >= self.threshold:
+                        parent[other_root] = root
+                        parent.setdefault(root, root)
+
+        groups: Dict[int, List[int]] = {}
+        for key in parent:
+            if key in row_of:
+                groups.setdefault(find(key), []).append(row_of[key])
+        return sorted((sorted(rows) for rows in groups.values() if len(rows) > 1), key=lambda rows: rows[0])
+
+
+class KeyOverlap(NamedTuple):
+    """一对相互遮蔽的关键字"""
+    key: str           # 较短的关键字
+    other_key: str     # 包含它的关键字
+    kind: str          # same / prefix / substring
+    rows: List[int]        # 使用 key 的条目
+    other_rows: List[int]  # 使用 other_key 的条目
+
+
+# 一次新增的关键字较多时，改用由新关键字组成的自动机扫描已有关键字，而不是逐对用 in 检查
+SCAN_PAIR_LIMIT = 200_000
+
+
+def _entry_keys(entry: Dict[str, Any]) -> Tuple[str, ...]:
+    """条目参与重叠分析的关键字（小写、去重；需要按正则匹配的关键字不参与）"""
+    use_regex = bool(entry.get("use_regex"))
+    keys: Dict[str, None] = {}
+    for key in entry.get("keys", []) or []:
+        key = str(key).strip()
+        if key and not needs_regex(key, use_regex):
+            keys[key.lower()] = None
+    return tuple(keys)
+
+
+class KeyOverlapIndex:
+    """关键字重叠的增量索引
+
+    与 DuplicateIndex 一样以条目对象为键缓存各条目的关键字；所有关键字存放在一棵字典树中，
+    包含关系（短关键字 → 包含它的长关键字）逐个关键字维护。update() 只让关键字变化的条目
+    移除旧关键字、插入新关键字，不再重新扫描整本世界书。
+    """
+
+    def __init__(self):
+        # id(entry) -> (entry, keys)
+        self._cache: Dict[int, Tuple[Dict[str, Any], Tuple[str, ...]]] = {}
+        # 关键字 -> 使用它的条目 {id(entry)}
+        self._owners: Dict[str, Dict[int, None]] = {}
+        # 字典树只能追加，不再使用的关键字留在树中，过多时整体重建
+        self._trie = KeywordAutomaton()
+        # 关键字 -> 它包含的较短关键字 / 包含它的较长关键字
+        self._inside: Dict[str, Dict[str, None]] = {}
+        self._around: Dict[str, Dict[str, None]] = {}
+
+    def _release(self, entry_id: int, released: Dict[str, None]):
+        _, keys = self._cache.pop(entry_id)
+        for key in keys:
+            owners = self._owners[key]
+            owners.pop(entry_id, None)
+            if not owners:
+                del self._owners[key]
+                released[key] = None
+
+    def update(self, entries: List[Dict[str, Any]]) -> int:
+        """同步到当前条目列表，返回关键字有变化的条目数"""
+        current = {id(entry): entry for entry in entries}
+        released: Dict[str, None] = {}
+        for entry_id in [entry_id for entry_id in self._cache if entry_id not in current]:
+            self._release(entry_id, released)
+
+        changed = 0
+        for entry_id, entry in current.items():
+            keys = _entry_keys(entry)
+            cached = self._cache.get(entry_id)
+            if cached is not None and cached[1] == keys:
+                continue
+            if cached is not None:
+                self._release(entry_id, released)
+            self._cache[entry_id] = (entry, keys)
+            for key in keys:
+                self._owners.setdefault(key, {})[entry_id] = None
+            changed += 1
+
+        for key in released:
+            if key not in self._owners:
+                self._unlink(key)
+        added = [key for key in self._owners if key not in self._inside]
+        if added:
+            self._link(added)
+        return changed
+
+    def _unlink(self, key: str):
+        for shorter in self._inside.pop(key, {}):
+            self._around[shorter].pop(key, None)
+        for longer in self._around.pop(key, {}):
+            self._inside[longer].pop(key, None)
+
+    def _link(self, added: List[str]):
+        existing = [key for key in self._inside]
+        if len(self._trie) > 2 * (len(self._owners) + 1000):
+            self._trie = KeywordAutomaton(self._owners)
+        else:
+            for key in added:
+                self._trie.add(key)
+        for key in added:
+            self._inside[key] = {}
+            self._around.setdefault(key, {})
+        patterns = self._trie.patterns
+        for key in added:
+            # key 的每个后缀沿字典树向下走，经过的模式都是 key 的子串（新旧关键字都能找到）
+            for start in range(len(key)):
+                for index in self._trie.prefixes_of(key[start:]):
+                    shorter = patterns[index]
+                    if shorter != key and shorter in self._owners:
+                        self._inside[key][shorter] = None
+                        self._around[shorter][key] = None
+        # 包含新关键字的已有关键字
+        if len(added) * len(existing) <= SCAN_PAIR_LIMIT:
+            for key in added:
+                for longer in existing:
+                    if key in longer and key != longer:
+                        self._inside[longer][key] = None
+                        self._around[key][longer] = None
+        else:
+            automaton = KeywordAutomaton(added)
+            for longer in existing:
+                for index in automaton.find_all(longer):
+                    key = automaton.patterns[index]
+                    if key != longer:
+                        self._inside[longer][key] = None
+                        self._around[key][longer] = None
+
+    def overlaps(self, entries: List[Dict[str, Any]]) -> List[KeyOverlap]:
+        """当前的关键字重叠，按关键字首次出现的条目排序；update() 之后调用"""
+        row_of = {id(entry): row for row, entry in enumerate(entries)}
+        rows_by_key = {
+            key: sorted(row_of[entry_id] for entry_id in owners if entry_id in row_of)
+            for key, owners in self._owners.items()
+        }
+        order = sorted((key for key, rows in rows_by_key.items() if rows), key=lambda key: (rows_by_key[key][0], key))
+        overlaps: List[KeyOverlap] = []
+        for key in order:
+            rows = rows_by_key[key]
+            if len(rows) > 1:
+                overlaps.append(KeyOverlap(key, key, "same", rows, rows))
+        for other_key in order:
+            other_rows = rows_by_key[other_key]
+            for key in sorted(self._inside[other_key], key=lambda key: (rows_by_key[key][:1], key)):
+                rows = rows_by_key[key]
+                # 只有分属不同条目时才算遮蔽
+                if not rows or set(rows) == set(other_rows):
+                    continue
+                kind = "prefix" if other_key.startswith(key) else "substring"
+                overlaps.append(KeyOverlap(key, other_key, kind, rows, other_rows))
+        return overlaps
+
+
+def find_key_overlaps(entries: List[Dict[str, Any]]) -> List[KeyOverlap]:
+    """找出跨条目的相同、前缀或子串关键字（需要按正则匹配的关键字不参与）"""
+    index = KeyOverlapIndex()
+    index.update(entries)
+    return index.overlaps(entries)
+
+
+class AnalysisResult(NamedTuple):
+    duplicate_clusters: List[List[int]]
+    key_overlaps: List[KeyOverlap]
+
+
+class LorebookAnalyzer:
+    """世界书分析器：保留各部分的缓存，条目变化后增量更新"""
+
+    def __init__(self, threshold: float = DUPLICATE_THRESHOLD):
+        self.duplicates = DuplicateIndex(threshold)
+        self.key_overlaps = KeyOverlapIndex()
+
+    def analyze(self, entries: List[Dict[str, Any]]) -> AnalysisResult:
+        """分析当前条目列表"""
+        self.duplicates.update(entries)
+        self.key_overlaps.update(entries)
+        return AnalysisResult(self.duplicates.clusters(entries), self.key_overlaps.overlaps(entries))
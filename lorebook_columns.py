@@ -0,0 +1,268 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+lorebook_columns.py
+世界书条目的按列视图：表格视图与批量修改使用。
+
+每一列对应条目的一个字段（包括 extensions 中的键），值按列提取到数组中并缓存，
+筛选、排序都只扫描涉及的列；批量修改一次写入同一字段的多行，返回各行的旧值以便整体撤销。
+
+筛选表达式由空格分隔的条件组成，全部满足才显示:
+    depth>=4  enabled=true  group~战斗  "comment~城 堡"  火焰
+带运算符（= != > >= < <= ~）的条件比较对应的列（~ 为包含），其余的词在注释和关键字中查找。
+"""
+
+import json
+import re
+import shlex
+from typing import Any, Callable, Dict, Iterable, List, NamedTuple, Optional, Sequence, Tuple
+
+from field_binding import MISSING, get_path, set_path
+
+Path = Tuple[str, ...]
+
+BOOL = "bool"
+INT = "int"
+TEXT = "text"
+KEYS = "keys"
+JSON = "json"
+
+# 内容列只显示开头部分
+CONTENT_PREVIEW_LENGTH = 80
+
+
+class Column(NamedTuple):
+    """一列：键（筛选表达式中使用）、标题、字段路径、类型、缺失时的显示值"""
+    key: str
+    title: str
+    path: Path
+    kind: str
+    default: Any = None
+    editable: bool = True
+
+
+# 常用字段；其余在条目中出现过的 extensions 键追加在后面
+COMMON_COLUMNS = (
+    Column("id", "ID", ("id",), INT, editable=False),
+    Column("comment", "注释", ("comment",), TEXT, ""),
+    Column("enabled", "启用", ("enabled",), BOOL, True),
+    Column("constant", "常驻", ("constant",), BOOL, False),
+    Column("selective", "选择性", ("selective",), BOOL, True),
+    Column("position", "位置", ("position",), TEXT, "before_char"),
+    Column("insertion_order", "插入顺序", ("insertion_order",), INT, 100),
+    Column("keys", "关键字", ("keys",), KEYS, []),
+    Column("secondary_keys", "次要关键字", ("secondary_keys",), KEYS, []),
+    Column("use_regex", "正则", ("use_regex",), BOOL, True),
+    Column("depth", "深度", ("extensions", "depth"), INT, 4),
+    Column("probability", "概率", ("extensions", "probability"), INT, 100),
+    Column("useProbability", "使用概率", ("extensions", "useProbability"), BOOL, True),
+    Column("group", "分组", ("extensions", "group"), TEXT, ""),
+    Column("group_weight", "分组权重", ("extensions", "group_weight"), INT, 100),
+    Column("role", "角色", ("extensions", "role"), INT, 0),
+    Column("scan_depth", "扫描深度", ("extensions", "scan_depth"), INT),
+    Column("sticky", "粘滞", ("extensions", "sticky"), INT, 0),
+    Column("cooldown", "冷却", ("extensions", "cooldown"), INT, 0),
+    Column("delay", "延迟", ("extensions", "delay"), INT, 0),
+    Column("exclude_recursion", "排除递归", ("extensions", "exclude_recursion"), BOOL, False),
+    Column("prevent_recursion", "防止递归", ("extensions", "prevent_recursion"), BOOL, False),
+    Column("vectorized", "向量检索", ("extensions", "vectorized"), BOOL, False),
+    Column("content", "内容", ("content",), TEXT, "", editable=False),
+)
+
+_TRUE = {"1", "true", "yes", "on", "是", "真"}
+_FALSE = {"0", "false", "no", "off", "否", "假"}
+_CONDITION = re.compile(r"^([\w.]+)(>=|<=|!=|=|>|<|~)(.*)$", re.DOTALL)
+
+
+def discover_columns(entries: Iterable[Dict[str, Any]]) -> List[Column]:
+    """常用列加上条目中出现过的其他 extensions 键"""
+    columns = list(COMMON_COLUMNS)
+    known = {column.path for column in columns}
+    top_level = {column.key for column in columns if len(column.path) == 1}
+    extra: Dict[str, None] = {}
+    for entry in entries:
+        ext = entry.get("extensions")
+        if isinstance(ext, dict):
+            for key in ext:
+                if ("extensions", key) not in known:
+                    extra[key] = None
+    for key in extra:
+        # 与顶层字段同名的扩展键（如 position）加前缀区分
+        name = f"extensions.{key}" if key in top_level else key
+        columns.append(Column(name, name, ("extensions", key), JSON))
+    return columns
+
+
+def parse_value(column: Column, text: str) -> Any:
+    """把输入的文本转换为该列的值，无法转换时抛出 ValueError"""
+    text = text.strip()
+    if column.kind == BOOL:
+        lowered = text.casefold()
+        if lowered in _TRUE:
+            return True
+        if lowered in _FALSE:
+            return False
+        raise ValueError(f"“{text}”不是布尔值（true/false）")
+    if column.kind == INT:
+        if not text and column.default is None:
+            return None
+        try:
+            return int(text)
+        except ValueError:
+            raise ValueError(f"“{text}”不是整数") from None
+    if column.kind == KEYS:
+        return [key.strip() for key in text.split(",") if key.strip()]
+    if column.kind == JSON:
+        try:
+            return json.loads(text)
+        except ValueError:
+            return text
+    return text
+
+
+def value_text(column: Column, value: Any) -> str:
+    """值的完整文本（筛选、排序使用）"""
+    if value is None:
+        return ""
+    if column.kind == KEYS and isinstance(value, list):
+        return ", ".join(str(key) for key in value)
+    if column.kind == JSON and not isinstance(value, str):
+        return json.dumps(value, ensure_ascii=False)
+    return str(value)
+
+
+def format_value(column: Column, value: Any) -> str:
+    """单元格中显示的文本（内容列只取开头）"""
+    text = value_text(column, value)
+    if column.key == "content" and len(text) > CONTENT_PREVIEW_LENGTH:
+        return text[:CONTENT_PREVIEW_LENGTH].replace("\n", " ") + "…"
+    return text
+
+
+def sort_key(column: Column) -> Callable[[Any], Tuple[Any, ...]]:
+    """该列值的排序键：空值排在最后，数字按数值，其余按不区分大小写的文本"""
+    if column.kind in (INT, BOOL):
+        def key(value: Any) -> Tuple[Any, ...]:
+            if isinstance(value, (int, float)):
+                return (0, value, "")
+            return (1, 0, "" if value is None else str(value))
+        return key
+
+    def text_key(value: Any) -> Tuple[Any, ...]:
+        return (value is None, value_text(column, value).casefold())
+    return text_key
+
+
+def write_column(entries: List[Dict[str, Any]], path: Path, rows: Sequence[int], values: Sequence[Any]) -> List[Any]:
+    """把 values 逐行写入各条目的 path 字段（MISSING 表示删除该字段），返回各行原来的值"""
+    old_values = []
+    for row, value in zip(rows, values):
+        entry = entries[row]
+        old_values.append(get_path(entry, path))
+        if value is MISSING:
+            target = get_path(entry, path[:-1]) if len(path) > 1 else entry
+            if isinstance(target, dict):
+                target.pop(path[-1], None)
+        else:
+            set_path(entry, path, value.copy() if isinstance(value, (list, dict)) else value)
+    return old_values
+
+
+class ColumnStore:
+    """按列缓存的条目字段值；列在首次使用时提取"""
+
+    def __init__(self, entries: Optional[List[Dict[str, Any]]] = None):
+        self.entries: List[Dict[str, Any]] = []
+        self.columns: List[Column] = []
+        self.by_key: Dict[str, Column] = {}
+        self._arrays: Dict[str, List[Any]] = {}
+        self.reset(entries or [])
+
+    def reset(self, entries: List[Dict[str, Any]]):
+        """换用另一组条目，列按条目中的扩展键重新确定"""
+        self.entries = entries
+        self.columns = discover_columns(entries)
+        self.by_key = {column.key: column for column in self.columns}
+        self._arrays = {}
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def _value(self, entry: Dict[str, Any], column: Column) -> Any:
+        value = get_path(entry, column.path)
+        return column.default if value is MISSING or value is None else value
+
+    def array(self, key: str) -> List[Any]:
+        """一列的全部值（按条目顺序）"""
+        array = self._arrays.get(key)
+        if array is None:
+            column = self.by_key[key]
+            array = self._arrays[key] = [self._value(entry, column) for entry in self.entries]
+        return array
+
+    def refresh_rows(self, rows: Iterable[int]):
+        """条目被修改后重新提取已缓存的列中这些行的值"""
+        rows = [row for row in rows if 0 <= row < len(self.entries)]
+        for key, array in self._arrays.items():
+            column = self.by_key[key]
+            for row in rows:
+                array[row] = self._value(self.entries[row], column)
+
+    def splice(self, row: int, removed: int, inserted: int):
+        """条目增删后调整各列"""
+        for key, array in self._arrays.items():
+            column = self.by_key[key]
+            array[row:row + removed] = [self._value(entry, column) for entry in self.entries[row:row + inserted]]
+
+    def filter_rows(self, expression: str) -> List[int]:
+        """满足筛选表达式的行号，表达式无效时抛出 ValueError"""
+        rows = list(range(len(self.entries)))
+        try:
+            terms = shlex.split(expression)
+        except ValueError as e:
+            raise ValueError(f"筛选表达式无效: {e}") from None
+        for term in terms:
+            match = _CONDITION.match(term)
+            if match and match.group(1) in self.by_key:
+                rows = self._filter_condition(rows, *match.groups())
+            elif match:
+                raise ValueError(f"没有名为“{match.group(1)}”的列")
+            else:
+                rows = self._filter_text(rows, term.casefold())
+        return rows
+
+    def _filter_text(self, rows: List[int], needle: str) -> List[int]:
+        comments = self.array("comment")
+        keys = self.array("keys")
+        return [row for row in rows
+                if needle in str(comments[row]).casefold()
+                or any(needle in str(key).casefold() for key in keys[row] or ())]
+
+    def _filter_condition(self, rows: List[int], key: str, operator: str, text: str) -> List[int]:
+        column = self.by_key[key]
+        array = self.array(key)
+        if operator == "~":
+            needle = text.casefold()
+            return [row for row in rows if needle in value_text(column, array[row]).casefold()]
+        target = parse_value(column, text)
+        if operator == "=":
+            return [row for row in rows if array[row] == target]
+        if operator == "!=":
+            return [row for row in rows if array[row] != target]
+        order = sort_key(column)
+        bound = order(target)
+        compare = {
+            ">": lambda value: value > bound, ">=": lambda value: value >= bound,
+            "<": lambda value: value < bound, "<=": lambda value: value <= bound,
+        }[operator]
+        return [row for row in rows if array[row] is not None and compare(order(array[row]))]
+
+    def sort_rows(self, rows: List[int], key: str, descending: bool = False) -> List[int]:
+        """按某一列排序（稳定排序），降序时空值仍排在最后"""
+        array = self.array(key)
+        order = sort_key(self.by_key[key])
+        # 先只按值排序（降序时反转），再按是否为空分组
+        rows = sorted(rows, key=lambda row: order(array[row])[1:], reverse=descending)
+        rows.sort(key=lambda row: order(array[row])[0])
+        return rows
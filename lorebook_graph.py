@@ -0,0 +1,415 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+lorebook_graph.py
+世界书条目之间的触发关系：开启递归扫描时，条目 A 的内容命中条目 B 的关键字，A 被激活后就会带出 B。
+
+所有条目的关键字编入同一个匹配自动机（与激活使用的 ActivationIndex 相同），每个条目的内容只扫描一次，
+不需要两两比较。图按条目增量维护:
+- 条目内容变化时只重新扫描该条目，替换它的出边；
+- 条目关键字变化时先删去它的入边，再只重新扫描内容中含有其新关键字的条目
+  （正则关键字无法预先筛选，此时重新扫描全部条目）。
+
+报告包括相互触发的条目组（强连通分量）、最长的触发链和无法被激活的条目。
+
+命令行用法:
+    python lorebook_graph.py card.json
+"""
+
+import json
+import sys
+from typing import Any, Dict, List, NamedTuple, Optional, Set, Tuple
+
+from chat_replay import entry_title
+from lorebook_activation import (
+    MAX_RECURSION_STEPS, ActivationIndex, hit_matches, needs_regex, parse_decorators, secondary_key_count,
+)
+
+# 报告的触发链至少包含的条目数
+MIN_CHAIN_LENGTH = 3
+# 最多报告的触发链数
+MAX_CHAINS = 50
+# 关键字变化的条目太多时不再筛选，直接重新扫描全部条目
+MAX_CANDIDATE_KEYS = 256
+
+
+def _ext(entry: Dict[str, Any]) -> Dict[str, Any]:
+    ext = entry.get("extensions")
+    return ext if isinstance(ext, dict) else {}
+
+
+def _plain_key(key: Any, use_regex: bool) -> Optional[str]:
+    """可以按子串预先筛选的关键字（小写）；正则关键字返回 None"""
+    key = key.strip()
+    if needs_regex(key, use_regex):
+        return None
+    return key.lower()
+
+
+# 触发关系用到的条目字段与 extensions 字段
+GRAPH_FIELDS = (
+    "keys", "secondary_keys", "content", "comment", "selective", "use_regex", "case_sensitive",
+    "enabled", "constant",
+)
+GRAPH_EXTENSION_FIELDS = (
+    "prevent_recursion", "exclude_recursion", "delay_until_recursion", "selectiveLogic",
+    "case_sensitive", "match_whole_words", "vectorized",
+)
+
+
+def graph_entry(entry: Dict[str, Any]) -> Dict[str, Any]:
+    """条目中触发关系用到的字段的副本（列表也复制一份）"""
+    copy = {name: list(value) if isinstance(value, list) else value
+            for name, value in entry.items() if name in GRAPH_FIELDS}
+    ext = _ext(entry)
+    copy["extensions"] = {name: ext[name] for name in GRAPH_EXTENSION_FIELDS if name in ext}
+    return copy
+
+
+class EntrySnapshots:
+    """在界面线程中为工作线程中的 TriggerGraph 复制条目。
+
+    编辑器会就地修改条目（包括 extensions 中的嵌套值），工作线程只能读取副本。
+    相关字段没有变化的条目沿用上次的副本对象，TriggerGraph 以对象为键，因此仍然只重新扫描变化的条目。
+    """
+
+    def __init__(self):
+        # id(条目) -> (条目, 副本)；保留条目的引用，避免 id 被新对象复用
+        self._copies: Dict[int, Tuple[Dict[str, Any], Dict[str, Any]]] = {}
+
+    def take(self, entries: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        copies = {}
+        result = []
+        for entry in entries:
+            copy = graph_entry(entry)
+            previous = self._copies.get(id(entry))
+            if previous is not None and previous[1] == copy:
+                copy = previous[1]
+            copies[id(entry)] = (entry, copy)
+            result.append(copy)
+        self._copies = copies
+        return result
+
+
+class _Target(NamedTuple):
+    """条目作为被触发方的状态"""
+    snapshot: Tuple[Any, ...]
+    eligible: bool          # 能否被其他条目的内容触发
+    secondary_count: int
+
+
+class GraphReport(NamedTuple):
+    edges: int
+    cycles: List[List[int]]     # 相互触发的条目组，按条目数降序
+    chains: List[List[int]]     # 最长的触发链（行号序列，组内条目只列出行号最小的一个），按长度降序
+    unreachable: List[int]      # 已启用但任何情况下都不会被激活的条目
+
+
+class TriggerGraph:
+    """条目之间的触发关系图，以条目对象为键，增删条目不影响其余条目的边"""
+
+    def __init__(self):
+        self.index = ActivationIndex()
+        self.entries: List[Dict[str, Any]] = []
+        self._rows: Dict[int, int] = {}
+        # id(条目) -> 触发其他条目时参与比较的快照
+        self._sources: Dict[int, Tuple[Any, ...]] = {}
+        # id(条目) -> 去掉装饰器后的内容（不能触发其他条目时为 None）与装饰器
+        self._parsed: Dict[int, Tuple[Optional[str], Dict[str, str]]] = {}
+        self._lowered: Dict[int, str] = {}
+        self._targets: Dict[int, _Target] = {}
+        # 出边 {来源: {目标: 命中的主关键字序号}} 与入边 {目标: {来源}}
+        self._out: Dict[int, Dict[int, Tuple[int, ...]]] = {}
+        self._in: Dict[int, Set[int]] = {}
+        # 上次更新重新扫描的条目数
+        self.rescanned = 0
+
+    def update(self, entries: List[Dict[str, Any]]) -> int:
+        """同步到当前条目列表，返回重新扫描的条目数"""
+        self.entries = entries
+        self._rows = {id(entry): row for row, entry in enumerate(entries)}
+        for entry_id in [entry_id for entry_id in self._sources if entry_id not in self._rows]:
+            self._clear_out(entry_id)
+            self._clear_in(entry_id)
+            for table in (self._sources, self._parsed, self._lowered, self._targets, self._in):
+                table.pop(entry_id, None)
+
+        rescan: Set[int] = set()
+        changed_targets: List[int] = []
+        for entry in entries:
+            entry_id = id(entry)
+            ext = _ext(entry)
+            content = entry.get("content")
+            source = (content, entry.get("enabled"), ext.get("prevent_recursion"))
+            if self._sources.get(entry_id) != source:
+                self._sources[entry_id] = source
+                decorator_items, text = parse_decorators(str(content or ""))
+                decorators = dict(decorator_items)
+                can_trigger = entry.get("enabled") is not False and not ext.get("prevent_recursion") and text
+                self._parsed[entry_id] = (text if can_trigger else None, decorators)
+                self._lowered.pop(entry_id, None)
+                rescan.add(entry_id)
+            decorators = self._parsed[entry_id][1]
+            snapshot = (
+                tuple(entry.get("keys") or ()), tuple(entry.get("secondary_keys") or ()),
+                entry.get("selective"), entry.get("use_regex"), entry.get("case_sensitive"),
+                entry.get("enabled"), entry.get("constant"),
+                ext.get("selectiveLogic"), ext.get("case_sensitive"), ext.get("match_whole_words"),
+                ext.get("exclude_recursion"), "activate" in decorators, "dont_activate" in decorators,
+            )
+            target = self._targets.get(entry_id)
+            if target is None or target.snapshot != snapshot:
+                # 常驻条目总会被激活，不算被触发
+                eligible = (entry.get("enabled") is not False and not entry.get("constant")
+                            and not ext.get("exclude_recursion")
+                            and "activate" not in decorators and "dont_activate" not in decorators)
+                self._targets[entry_id] = _Target(snapshot, eligible, secondary_key_count(entry))
+                changed_targets.append(entry_id)
+
+        self.index.update(entries)
+        if changed_targets:
+            for entry_id in changed_targets:
+                self._clear_in(entry_id)
+            if len(rescan) < len(entries):
+                rescan |= self._candidates(changed_targets)
+        for entry_id in rescan:
+            self._scan(entry_id)
+        self.rescanned = len(rescan)
+        return self.rescanned
+
+    def _clear_out(self, entry_id: int):
+        for target_id in self._out.pop(entry_id, {}):
+            self._in.get(target_id, set()).discard(entry_id)
+
+    def _clear_in(self, entry_id: int):
+        for source_id in self._in.pop(entry_id, set()):
+            self._out.get(source_id, {}).pop(entry_id, None)
+
+    def _candidates(self, target_ids: List[int]) -> Set[int]:
+        """内容中可能含有这些条目主关键字的条目"""
+        sources = [entry_id for entry_id, (text, _) in self._parsed.items() if text]
+        keys: Set[str] = set()
+        for target_id in target_ids:
+            entry = self.entries[self._rows[target_id]]
+            if not self._targets[target_id].eligible:
+                continue
+            for key in entry.get("keys") or ():
+                if not isinstance(key, str) or not key.strip():
+                    continue
+                plain = _plain_key(key, bool(entry.get("use_regex")))
+                if plain is None:
+                    return set(sources)
+                keys.add(plain)
+        if not keys:
+            return set()
+        if len(keys) > MAX_CANDIDATE_KEYS:
+            return set(sources)
+        candidates = set()
+        for entry_id in sources:
+            lowered = self._lowered.get(entry_id)
+            if lowered is None:
+                lowered = self._lowered[entry_id] = self._parsed[entry_id][0].lower()
+            if any(key in lowered for key in keys):
+                candidates.add(entry_id)
+        return candidates
+
+    def _scan(self, source_id: int):
+        """重新计算一个条目的出边"""
+        self._clear_out(source_id)
+        text = self._parsed[source_id][0]
+        if not text:
+            return
+        entries = self.entries
+        edges: Dict[int, Tuple[int, ...]] = {}
+        for row, hit in self.index.scan(text).items():
+            target_id = id(entries[row])
+            target = self._targets[target_id]
+            if target_id == source_id or not target.eligible:
+                continue
+            if hit_matches(entries[row], hit, target.secondary_count):
+                edges[target_id] = tuple(sorted(hit[0]))
+                self._in.setdefault(target_id, set()).add(source_id)
+        if edges:
+            self._out[source_id] = edges
+
+    # ------------------------------------------------------------------
+    # 查询（行号基于最近一次 update 的条目列表）
+    # ------------------------------------------------------------------
+
+    def edge_count(self) -> int:
+        return sum(len(edges) for edges in self._out.values())
+
+    def triggers(self, row: int) -> List[Tuple[int, List[str]]]:
+        """该条目的内容能触发的条目及命中的关键字"""
+        entries = self.entries
+        result = []
+        for target_id, key_nos in self._out.get(id(entries[row]), {}).items():
+            target_row = self._rows[target_id]
+            keys = entries[target_row].get("keys") or []
+            result.append((target_row, [str(keys[number]) for number in key_nos if number < len(keys)]))
+        return sorted(result)
+
+    def triggered_by(self, row: int) -> List[int]:
+        """内容能触发该条目的条目"""
+        return sorted(self._rows[source_id] for source_id in self._in.get(id(self.entries[row]), ()))
+
+    def _adjacency(self) -> List[List[int]]:
+        adjacency: List[List[int]] = [[] for _ in self.entries]
+        rows = self._rows
+        for source_id, edges in self._out.items():
+            adjacency[rows[source_id]] = [rows[target_id] for target_id in edges]
+        return adjacency
+
+    def report(self, min_chain: int = MIN_CHAIN_LENGTH, max_chains: int = MAX_CHAINS) -> GraphReport:
+        """强连通分量、最长触发链与无法激活的条目"""
+        adjacency = self._adjacency()
+        components = strongly_connected(adjacency)
+        component_of = [0] * len(adjacency)
+        for number, rows in enumerate(components):
+            for row in rows:
+                component_of[row] = number
+        cycles = sorted((sorted(rows) for rows in components if len(rows) > 1), key=lambda rows: (-len(rows), rows))
+
+        # 缩点后是有向无环图，strongly_connected 按逆拓扑序返回，因此可以顺序计算从每个分量出发的最长链
+        longest = [1] * len(components)
+        following: List[Optional[int]] = [None] * len(components)
+        has_incoming = [False] * len(components)
+        for number, rows in enumerate(components):
+            for row in rows:
+                for target in adjacency[row]:
+                    other = component_of[target]
+                    if other == number:
+                        continue
+                    has_incoming[other] = True
+                    if longest[other] + 1 > longest[number]:
+                        longest[number] = longest[other] + 1
+                        following[number] = other
+        chains = []
+        for number in range(len(components)):
+            if has_incoming[number] or longest[number] < min_chain:
+                continue
+            chain = []
+            current: Optional[int] = number
+            while current is not None:
+                chain.append(min(components[current]))
+                current = following[current]
+            chains.append(chain)
+        chains.sort(key=lambda chain: (-len(chain), chain))
+
+        return GraphReport(self.edge_count(), cycles, chains[:max_chains], self._unreachable(adjacency))
+
+    def _unreachable(self, adjacency: List[List[int]]) -> List[int]:
+        """从能直接激活的条目出发沿触发关系都到达不了的已启用条目"""
+        entries = self.entries
+        reached = [False] * len(entries)
+        pending = []
+        for row, entry in enumerate(entries):
+            if entry.get("enabled") is False:
+                continue
+            ext = _ext(entry)
+            decorators = self._parsed[id(entry)][1]
+            if "dont_activate" in decorators:
+                continue
+            has_keys = any(isinstance(key, str) and key.strip() for key in entry.get("keys") or ())
+            if (entry.get("constant") or "activate" in decorators or ext.get("vectorized")
+                    or (has_keys and not ext.get("delay_until_recursion"))):
+                reached[row] = True
+                pending.append(row)
+        while pending:
+            row = pending.pop()
+            for target in adjacency[row]:
+                if not reached[target]:
+                    reached[target] = True
+                    pending.append(target)
+        return [row for row, entry in enumerate(entries)
+                if not reached[row] and entry.get("enabled") is not False
+                and "dont_activate" not in self._parsed[id(entry)][1]]
+
+
+def strongly_connected(adjacency: List[List[int]]) -> List[List[int]]:
+    """Tarjan 算法（迭代实现），按逆拓扑序返回各强连通分量"""
+    count = len(adjacency)
+    index = [-1] * count
+    low = [0] * count
+    on_stack = [False] * count
+    stack: List[int] = []
+    components: List[List[int]] = []
+    counter = 0
+    for start in range(count):
+        if index[start] >= 0:
+            continue
+        work = [(start, 0)]
+        while work:
+            node, position = work.pop()
+            if position == 0:
+                index[node] = low[node] = counter
+                counter += 1
+                stack.append(node)
+                on_stack[node] = True
+            targets = adjacency[node]
+            while position < len(targets):
+                target = targets[position]
+                position += 1
+                if index[target] < 0:
+                    work.append((node, position))
+                    work.append((target, 0))
+                    break
+                if on_stack[target]:
+                    low[node] = min(low[node], index[target])
+            else:
+                if low[node] == index[node]:
+                    component = []
+                    while True:
+                        member = stack.pop()
+                        on_stack[member] = False
+                        component.append(member)
+                        if member == node:
+                            break
+                    components.append(component)
+                if work:
+                    parent = work[-1][0]
+                    low[parent] = min(low[parent], low[node])
+    return components
+
+
+def format_report(report: GraphReport, entries: List[Dict[str, Any]]) -> str:
+    """把分析结果格式化为文本"""
+    def title(row: int) -> str:
+        return f"#{row + 1} {entry_title(entries[row], row)}"
+
+    lines = [f"{len(entries)} 个条目，{report.edges} 条触发关系"]
+    lines.append(f"\n相互触发的条目组: {len(report.cycles)}")
+    for rows in report.cycles:
+        lines.append(f"  [{len(rows)}] " + "、".join(title(row) for row in rows))
+    lines.append(f"\n最长的触发链: {len(report.chains)}")
+    for chain in report.chains:
+        # 递归扫描最多进行 MAX_RECURSION_STEPS 步，更长的链后半段不会被激活
+        mark = "（超过递归步数上限）" if len(chain) > MAX_RECURSION_STEPS + 1 else ""
+        lines.append(f"  [{len(chain)}]{mark} " + " → ".join(title(row) for row in chain))
+    lines.append(f"\n无法被激活的条目: {len(report.unreachable)}")
+    for row in report.unreachable:
+        lines.append("  " + title(row))
+    return "\n".join(lines)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    argv = sys.argv[1:] if argv is None else argv
+    if len(argv) != 1:
+        print(__doc__.strip().splitlines()[-1].strip())
+        return 2
+    with open(argv[0], 'r', encoding='utf-8') as f:
+        card = json.load(f)
+    data = card.get("data", card) if isinstance(card, dict) else {}
+    book = data.get("character_book") or {}
+    entries = book.get("entries") or []
+    graph = TriggerGraph()
+    graph.update(entries)
+    if not book.get("recursive_scanning"):
+        print("注意: 该世界书未开启递归扫描，条目之间不会相互触发\n")
+    print(format_report(graph.report(), entries))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+lorebook_retrieval.py
+模拟 extensions.vectorized 条目的相似度检索：不依赖网络、GPU 或 numpy 的本地 TF-IDF。
+
+特征为拉丁文单词和中日韩文字的二元组（没有空格也能切分）。采用 SMART 的 lnc.ltc 方案：
+条目向量只用对数词频并做余弦归一化，IDF 只作用在查询向量上，因此条目向量与其他条目无关，
+增删或修改条目时只需更新该条目的倒排记录。查询时按倒排表累加，
+即稀疏矩阵与查询向量的乘积；多个查询可以合并为一次遍历。
+"""
+
+import argparse
+import json
+import math
+import re
+import sys
+from collections import Counter
+from typing import Any, Callable, Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+# 默认返回的条目数与最低相似度
+DEFAULT_TOP_K = 3
+DEFAULT_THRESHOLD = 0.15
+# 出现在超过该比例条目中的特征对排序几乎没有贡献，查询时跳过
+MAX_DF_RATIO = 0.5
+
+_TOKEN = re.compile(r"[぀-ヿ㐀-䶿一-鿿가-힯]+|[^\W_]+")
+_CJK = re.compile(r"[぀-ヿ㐀-䶿一-鿿가-힯]")
+
+
+class Hit(NamedTuple):
+    """检索结果"""
+    row: int
+    score: float
+
+
+def features(text: str) -> Counter:
+    """文本的特征计数：拉丁文按单词，中日韩文字按相邻二字"""
+    counts: Counter = Counter()
+    for run in _TOKEN.findall(text.lower()):
+        if _CJK.match(run):
+            if len(run) == 1:
+                counts[run] += 1
+            else:
+                counts.update(run[i:i + 2] for i in range(len(run) - 1))
+        else:
+            counts[run] += 1
+    return counts
+
+
+def _log_weights(counts: Counter) -> Dict[str, float]:
+    return {term: 1.0 + math.log(count) for term, count in counts.items()}
+
+
+def _normalize(weights: Dict[str, float]) -> Dict[str, float]:
+    norm = math.sqrt(sum(weight * weight for weight in weights.values()))
+    if not norm:
+        return {}
+    return {term: weight / norm for term, weight in weights.items()}
+
+
+def is_vectorized(entry: Dict[str, Any]) -> bool:
+    ext = entry.get("extensions")
+    return isinstance(ext, dict) and bool(ext.get("vectorized"))
+
+
+def _entry_text(entry: Dict[str, Any]) -> str:
+    return str(entry.get("content") or "")
+
+
+class RetrievalIndex:
+    """vectorized 条目的增量 TF-IDF 索引
+
+    与 ActivationIndex 相同，以条目对象为键登记，只有内容变化的条目会重新计算。
+    """
+
+    def __init__(self, text: Callable[[Dict[str, Any]], str] = _entry_text):
+        self.text = text
+        # 特征 -> {id(条目): 归一化权重}
+        self._postings: Dict[str, Dict[int, float]] = {}
+        # id(条目) -> (登记时的文本, 归一化向量)
+        self._entries: Dict[int, Tuple[str, Dict[str, float]]] = {}
+        self._rows: Dict[int, int] = {}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def update(self, entries: List[Dict[str, Any]]) -> bool:
+        """同步到当前条目列表（只登记 vectorized 条目），返回是否有变化"""
+        self._rows = {id(entry): row for row, entry in enumerate(entries) if is_vectorized(entry)}
+        changed = False
+        for entry_id in [entry_id for entry_id in self._entries if entry_id not in self._rows]:
+            self._unregister(entry_id)
+            changed = True
+        for entry in entries:
+            if id(entry) not in self._rows:
+                continue
+            text = self.text(entry)
+            registered = self._entries.get(id(entry))
+            if registered is not None and registered[0] == text:
+                continue
+            if registered is not None:
+                self._unregister(id(entry))
+            self._register(id(entry), text)
+            changed = True
+        return changed
+
+    def _register(self, entry_id: int, text: str):
+        vector = _normalize(_log_weights(features(text)))
+        for term, weight in vector.items():
+            self._postings.setdefault(term, {})[entry_id] = weight
+        self._entries[entry_id] = (text, vector)
+
+    def _unregister(self, entry_id: int):
+        _, vector = self._entries.pop(entry_id)
+        for term in vector:
+            posting = self._postings[term]
+            del posting[entry_id]
+            if not posting:
+                del self._postings[term]
+
+    def _query_vector(self, text: str) -> Dict[str, float]:
+        total = len(self._entries)
+        weights = {}
+        for term, weight in _log_weights(features(text)).items():
+            posting = self._postings.get(term)
+            if not posting or len(posting) > max(total * MAX_DF_RATIO, 1):
+                continue
+            weights[term] = weight * (math.log((total + 1) / (len(posting) + 1)) + 1.0)
+        return _normalize(weights)
+
+    def search_many(self, queries: Iterable[str], k: int = DEFAULT_TOP_K,
+                    threshold: float = DEFAULT_THRESHOLD) -> List[List[Hit]]:
+        """批量检索：同一特征的倒排表只遍历一次，累加到所有用到它的查询上"""
+        vectors = [self._query_vector(text) for text in queries]
+        by_term: Dict[str, List[Tuple[int, float]]] = {}
+        for query_no, vector in enumerate(vectors):
+            for term, weight in vector.items():
+                by_term.setdefault(term, []).append((query_no, weight))
+        scores: List[Dict[int, float]] = [{} for _ in vectors]
+        for term, users in by_term.items():
+            posting = self._postings[term]
+            for query_no, weight in users:
+                accumulator = scores[query_no]
+                get = accumulator.get
+                for entry_id, entry_weight in posting.items():
+                    accumulator[entry_id] = get(entry_id, 0.0) + weight * entry_weight
+        results = []
+        for accumulator in scores:
+            best = sorted(
+                (item for item in accumulator.items() if item[1] >= threshold),
+                key=lambda item: -item[1],
+            )[:k]
+            results.append([Hit(self._rows[entry_id], score) for entry_id, score in best])
+        return results
+
+    def search(self, text: str, k: int = DEFAULT_TOP_K, threshold: float = DEFAULT_THRESHOLD) -> List[Hit]:
+        """返回与文本最相似的 k 个 vectorized 条目"""
+        return self.search_many([text], k, threshold)[0]
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """命令行：python lorebook_retrieval.py card.json "聊天内容" [-k 5]"""
+    parser = argparse.ArgumentParser(description="对角色卡中 vectorized 的世界书条目做相似度检索")
+    parser.add_argument("card", help="角色卡 JSON 文件")
+    parser.add_argument("query", nargs="+", help="查询文本，可给出多条")
+    parser.add_argument("-k", type=int, default=DEFAULT_TOP_K, help="每条查询返回的条目数")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD, help="最低相似度")
+    parser.add_argument("--all", action="store_true", help="把所有条目都视为 vectorized")
+    args = parser.parse_args(argv)
+
+    with open(args.card, "r", encoding="utf-8") as f:
+        card = json.load(f)
+    data = card.get("data", card) if isinstance(card, dict) else {}
+    book = data.get("character_book") or {}
+    entries = [entry for entry in book.get("entries") or [] if isinstance(entry, dict)]
+    if args.all:
+        entries = [dict(entry, extensions=dict(entry.get("extensions") or {}, vectorized=True)) for entry in entries]
+
+    index = RetrievalIndex()
+    index.update(entries)
+    if not len(index):
+        print("没有 vectorized 条目", file=sys.stderr)
+        return 1
+    for query, hits in zip(args.query, index.search_many(args.query, args.k, args.threshold)):
+        print(f"查询: {query}")
+        for hit in hits:
+            entry = entries[hit.row]
+            title = entry.get("comment") or ", ".join(entry.get("keys") or []) or f"条目 {hit.row + 1}"
+            print(f"  {hit.score:.3f}  [{hit.row + 1}] {title}")
+        if not hits:
+            print("  (无结果)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
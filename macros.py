@@ -0,0 +1,279 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+macros.py
+卡片文本中的宏（CBS）展开：{{char}}、{{user}}、{{random:...}}、{{pick:...}}、{{roll:...}}、
+{{// ...}}、{{reverse:...}} 以及 <char>/<bot>/<user> 等。
+
+每段文本只解析一次，编译为"字面量 + 宏函数"的模板并按内容缓存，
+展开时只需依次拼接，不再对整段文本反复做正则替换。模板同时记录自己依赖的
+上下文值（角色名、用户名、随机种子、时间、其他字段），调用方可据此判断
+上下文变化后结果是否需要重新生成。未识别的宏原样保留。
+"""
+
+import random
+import re
+import zlib
+from datetime import datetime
+from functools import lru_cache
+from typing import Any, Callable, Dict, FrozenSet, List, NamedTuple, Optional, Tuple, Union
+
+# 展开结果依赖整个上下文（嵌套宏的名称要到展开时才知道）
+ALL_DEPENDENCIES = "*"
+
+WEEKDAYS = ("Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday")
+
+# 引用其他字段的宏 -> MacroContext.fields 中的键
+FIELD_MACROS = {
+    "description": "description",
+    "personality": "personality",
+    "scenario": "scenario",
+    "persona": "persona",
+    "mesexamples": "mes_example",
+    "charversion": "character_version",
+    "char_version": "character_version",
+    "system": "system_prompt",
+    "lastmessage": "last_message",
+    "lastusermessage": "last_user_message",
+    "lastcharmessage": "last_char_message",
+}
+
+_TOKEN = re.compile(r"\{\{|\}\}|<(?:user|bot|char)>", re.IGNORECASE)
+_ROLL = re.compile(r"(\d*)d(\d+)|(\d+)", re.IGNORECASE)
+_OPTION_SPLIT = re.compile(r"(?<!\\),")
+
+
+class MacroContext(NamedTuple):
+    """宏展开的上下文"""
+    char: str = ""
+    user: str = "User"
+    seed: int = 0
+    fields: Optional[Dict[str, str]] = None
+    now: Optional[datetime] = None
+
+
+def context_value(context: MacroContext, dependency: str) -> Any:
+    """模板依赖项在上下文中的取值"""
+    if dependency == "now":
+        return context.now or datetime.now()
+    if dependency.startswith("field:"):
+        return (context.fields or {}).get(dependency[6:], "")
+    return getattr(context, dependency)
+
+
+class _Macro(NamedTuple):
+    expand: Callable[[MacroContext, random.Random], str]
+    dependencies: FrozenSet[str]
+
+
+Compiled = Union[str, _Macro]
+
+
+def _options(arg: str) -> List[str]:
+    """{{random::a::b}} 或 {{random:a,b}}（逗号可用 \\, 转义）"""
+    if "::" in arg:
+        return arg.split("::")
+    return [option.replace("\\,", ",") for option in _OPTION_SPLIT.split(arg)]
+
+
+def _roll(arg: str) -> Optional[_Macro]:
+    match = _ROLL.fullmatch(arg.strip())
+    if match is None:
+        return None
+    if match.group(3):
+        count, sides = 1, int(match.group(3))
+    else:
+        count, sides = int(match.group(1) or 1), int(match.group(2))
+    if sides < 1:
+        return None
+    return _Macro(lambda context, rng: str(sum(rng.randint(1, sides) for _ in range(count))), frozenset({"seed"}))
+
+
+def _field(key: str) -> _Macro:
+    return _Macro(lambda context, rng: (context.fields or {}).get(key, ""), frozenset({f"field:{key}"}))
+
+
+@lru_cache(maxsize=4096)
+def compile_macro(body: str) -> Optional[Compiled]:
+    """编译一个宏的内容（不含花括号）；返回常量字符串、宏函数，未识别时返回 None"""
+    stripped = body.strip()
+    if stripped.startswith("//"):
+        return ""
+    name, sep, arg = stripped.partition(":")
+    if arg.startswith(":"):
+        arg = arg[1:]
+    key = name.strip().lower()
+
+    if not sep:
+        if key in ("char", "bot"):
+            return _Macro(lambda context, rng: context.char, frozenset({"char"}))
+        if key == "user":
+            return _Macro(lambda context, rng: context.user, frozenset({"user"}))
+        if key == "newline":
+            return "\n"
+        if key in ("noop", "trim"):
+            return ""
+        if key in FIELD_MACROS:
+            return _field(FIELD_MACROS[key])
+        if key in ("time", "date", "weekday", "isotime", "isodate"):
+            formats = {
+                "time": lambda now: now.strftime("%H:%M"),
+                "date": lambda now: now.strftime("%Y-%m-%d"),
+                "weekday": lambda now: WEEKDAYS[now.weekday()],
+                "isotime": lambda now: now.strftime("%H:%M:%S"),
+                "isodate": lambda now: now.strftime("%Y-%m-%d"),
+            }
+            fmt = formats[key]
+            return _Macro(lambda context, rng: fmt(context_value(context, "now")), frozenset({"now"}))
+        return None
+
+    if key in ("hidden_key", "comment"):
+        return ""
+    if key == "reverse":
+        return arg[::-1]
+    if key == "random":
+        options = _options(arg)
+        return _Macro(lambda context, rng: rng.choice(options), frozenset({"seed"}))
+    if key == "pick":
+        # 同一上下文中相同的 pick 总是得到同一个值
+        options = _options(arg)
+        return _Macro(
+            lambda context, rng: options[random.Random(f"{context.seed}:{arg}").randrange(len(options))],
+            frozenset({"seed"}),
+        )
+    if key == "roll":
+        return _roll(arg)
+    return None
+
+
+class _Node(NamedTuple):
+    """解析阶段的宏节点，body 由字面量和嵌套节点组成"""
+    body: List[Any]
+
+
+def _parse(text: str) -> List[Any]:
+    stack: List[List[Any]] = [[]]
+    position = 0
+    for match in _TOKEN.finditer(text):
+        if match.start() > position:
+            stack[-1].append(text[position:match.start()])
+        token = match.group()
+        position = match.end()
+        if token == "{{":
+            stack.append([])
+        elif token == "}}":
+            if len(stack) > 1:
+                body = stack.pop()
+                stack[-1].append(_Node(body))
+            else:
+                stack[-1].append(token)
+        else:
+            stack[-1].append(_Node(["user" if token.lower() == "<user>" else "char"]))
+    if position < len(text):
+        stack[-1].append(text[position:])
+    # 没有闭合的 {{ 按字面量处理
+    while len(stack) > 1:
+        body = stack.pop()
+        stack[-1].append("{{")
+        stack[-1].extend(body)
+    return stack[0]
+
+
+class Template:
+    """编译后的文本模板"""
+
+    __slots__ = ("text", "parts", "dependencies", "_seed")
+
+    def __init__(self, text: str):
+        self.text = text
+        self._seed = zlib.crc32(text.encode("utf-8"))
+        parts: List[Any] = []
+        dependencies = set()
+        for part in self._compile_parts(_parse(text)):
+            if isinstance(part, _Macro):
+                dependencies |= part.dependencies
+            elif not isinstance(part, str):
+                dependencies.add(ALL_DEPENDENCIES)
+            if isinstance(part, str) and parts and isinstance(parts[-1], str):
+                parts[-1] += part
+            else:
+                parts.append(part)
+        self.parts: Tuple[Any, ...] = tuple(part for part in parts if part != "")
+        self.dependencies: FrozenSet[str] = frozenset(dependencies)
+
+    @staticmethod
+    def _compile_parts(nodes: List[Any]) -> List[Any]:
+        compiled: List[Any] = []
+        for node in nodes:
+            if isinstance(node, str):
+                compiled.append(node)
+            elif all(isinstance(part, str) for part in node.body):
+                body = "".join(node.body)
+                result = compile_macro(body)
+                compiled.append("{{" + body + "}}" if result is None else result)
+            else:
+                # 嵌套宏：先展开内层，展开时再决定外层是什么宏
+                compiled.append(tuple(Template._compile_parts(node.body)))
+        return compiled
+
+    @property
+    def is_static(self) -> bool:
+        return all(isinstance(part, str) for part in self.parts)
+
+    def signature(self, context: MacroContext) -> Tuple[Any, ...]:
+        """展开结果所依赖的上下文取值；两次签名相同则展开结果相同"""
+        if ALL_DEPENDENCIES in self.dependencies:
+            return (context, datetime.now()) if context.now is None else (context,)
+        return tuple(context_value(context, dependency) for dependency in sorted(self.dependencies))
+
+    def expand(self, context: MacroContext) -> str:
+        if self.is_static:
+            return self.parts[0] if self.parts else ""
+        rng = random.Random(self._seed ^ context.seed)
+        return self._render(self.parts, context, rng)
+
+    def _render(self, parts: Tuple[Any, ...], context: MacroContext, rng: random.Random) -> str:
+        out: List[str] = []
+        for part in parts:
+            if isinstance(part, str):
+                out.append(part)
+            elif isinstance(part, _Macro):
+                out.append(part.expand(context, rng))
+            else:
+                body = self._render(part, context, rng)
+                result = compile_macro(body)
+                if result is None:
+                    out.append("{{" + body + "}}")
+                elif isinstance(result, str):
+                    out.append(result)
+                else:
+                    out.append(result.expand(context, rng))
+        return "".join(out)
+
+
+@lru_cache(maxsize=8192)
+def compile_template(text: str) -> Template:
+    """编译文本为模板（按内容缓存）"""
+    return Template(text)
+
+
+def has_macros(text: str) -> bool:
+    return "{{" in text or "<" in text
+
+
+def expand_macros(text: str, context: MacroContext) -> str:
+    """展开文本中的宏"""
+    if not has_macros(text):
+        return text
+    return compile_template(text).expand(context)
+
+
+def card_context(data: Dict[str, Any], user: str = "User", seed: int = 0) -> MacroContext:
+    """由角色卡的 data 对象构造上下文：{{char}} 优先使用 nickname"""
+    fields = {
+        key: data.get(key) for key in
+        ("description", "personality", "scenario", "mes_example", "character_version", "system_prompt")
+        if isinstance(data.get(key), str)
+    }
+    return MacroContext(data.get("nickname") or data.get("name") or "", user, seed, fields)
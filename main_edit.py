@@ -7,23 +7,51 @@ CharacterCardV3 JSON Editor
 
 import json
 import os
+import re
 import sys
 from datetime import datetime
 from pathlib import Path
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, List, Optional, Set
 
-from PySide6.QtCore import Qt, QTimer
-from PySide6.QtGui import QFont, QAction, QTextCursor
+from PySide6.QtCore import Qt, QTimer, QStandardPaths
+from PySide6.QtGui import QColor, QFont, QAction, QKeySequence
 from PySide6.QtWidgets import (
     QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout,
-    QLabel, QLineEdit, QTextEdit, QPushButton, QListWidget, QListWidgetItem,
+    QLabel, QLineEdit, QPlainTextEdit, QPushButton, QListWidget, QListWidgetItem,
     QTabWidget, QScrollArea, QGroupBox, QSpinBox, QMessageBox, QFileDialog,
-    QSplitter, QFrame, QDialog
+    QSplitter, QFrame, QDialog, QTabBar, QInputDialog
 )
 
 # 从共享模块导入UI控件
-from ui_widgets import MarkdownEditorWidget, TagListWidget, MarkdownTagListWidget, AssetsWidget
+from ui_widgets import (
+    MarkdownEditorWidget, TagListWidget, MarkdownTagListWidget, AssetsWidget,
+    ERROR_COLOR, WARNING_COLOR, mark_field
+)
 from CharacterBookWidget import CharacterBookWidget
+from PromptPreviewWidget import PromptPreviewWidget
+from FindReplaceDialog import FindReplaceDialog
+from JsonTreeWidget import JsonTreeWidget
+from MemoryPanel import MemoryPanel
+from LibraryBrowser import LibraryBrowser
+from AnalyticsPanel import AnalyticsPanel
+from PlainTextEditor import PlainTextEditor
+from card_history import CardHistory, command_payloads, text_delta
+from card_cache import CardCache
+from card_png import read_png_card
+from card_document import CardDocument
+from card_diff import Change, diff_cards, format_conflicts, format_diff, merge_cards, plan_entry_edits
+from card_project import CardProject, is_project
+from card_search import LIST_FIELDS, TEXT_FIELDS, SearchOptions, plan_replacements, unique_items
+from card_validation import ERROR, BackgroundValidator, Diagnostic, entry_row, format_path
+from card_watcher import CardWatcher
+from memory_accounting import MemoryAccountant, load_budgets
+
+# 校验结果列表中最多显示的条数
+MAX_DIAGNOSTIC_ITEMS = 500
+# JSON 预览中最多显示的世界书条目数（整卡序列化和显示是打开大文件时最慢的一步）
+PREVIEW_ENTRY_LIMIT = 200
+# 内存统计中每个列表项在 Qt 一侧的估算开销（字节）
+LIST_ITEM_BYTES = 160
 
 
 class CharacterCardEditor(QMainWindow):
@@ -31,12 +59,59 @@ class CharacterCardEditor(QMainWindow):
     
     def __init__(self):
         super().__init__()
-        self.current_file = None
-        self.data = self.get_default_data()
+        # 打开的文档；编辑控件只有一组，绑定在当前文档 self.document 上
+        self.documents: List[CardDocument] = []
+        self.document: Optional[CardDocument] = None
+        # 查找和替换对话框，首次使用时创建
+        self.find_dialog: Optional[FindReplaceDialog] = None
+        # 内存统计面板，首次使用时创建
+        self.memory_panel: Optional[MemoryPanel] = None
+        # 角色卡库浏览器，首次使用时创建
+        self.library_browser: Optional[LibraryBrowser] = None
+        # 角色卡库统计面板，首次使用时创建
+        self.analytics_panel: Optional[AnalyticsPanel] = None
+        # 最近一次保存附加在状态栏中的说明
+        self._save_note = ""
+        # 最近打开的角色卡的二进制缓存，重新打开时跳过 JSON 解析
+        self.card_cache = CardCache(os.path.join(
+            QStandardPaths.writableLocation(QStandardPaths.StandardLocation.CacheLocation), "cards"))
+        # 监视打开的文件和项目目录在外部的修改
+        self.watcher = CardWatcher(self)
+        self.watcher.changed.connect(self.on_file_changed)
         self.setup_ui()
+        self.setup_history()
+        self.setup_validation()
+        self.setup_memory_accounting()
         self.setup_menu()
         self.new_file()  # 启动时创建一个新文件
         
+    @property
+    def data(self) -> Dict[str, Any]:
+        """当前文档的角色卡数据"""
+        return self.document.data
+    
+    @data.setter
+    def data(self, value: Dict[str, Any]):
+        self.document.data = value
+        
+    @property
+    def current_file(self) -> Optional[str]:
+        """当前文档的文件路径或项目目录"""
+        return self.document.file_path if self.document is not None else None
+    
+    @current_file.setter
+    def current_file(self, value: Optional[str]):
+        self.document.file_path = value
+        
+    @property
+    def current_project(self) -> Optional[CardProject]:
+        """当前文件为项目目录时的增量保存器"""
+        return self.document.project
+    
+    @current_project.setter
+    def current_project(self, value: Optional[CardProject]):
+        self.document.project = value
+        
     def get_default_data(self) -> Dict[str, Any]:
         """获取默认的角色卡数据"""
         return {
@@ -65,6 +140,7 @@ class CharacterCardEditor(QMainWindow):
                 "assets": [],
                 "character_book": {
                     "name": "",
+                    "extensions": {},
                     "entries": []
                 }
             }
@@ -110,6 +186,17 @@ class CharacterCardEditor(QMainWindow):
         widget = QWidget()
         layout = QVBoxLayout(widget)
         
+        # 打开的文档，各文档共用下面的编辑控件
+        self.document_bar = QTabBar()
+        self.document_bar.setTabsClosable(True)
+        self.document_bar.setMovable(True)
+        self.document_bar.setExpanding(False)
+        self.document_bar.setDocumentMode(True)
+        self.document_bar.currentChanged.connect(self.switch_document)
+        self.document_bar.tabCloseRequested.connect(self.close_document)
+        self.document_bar.tabMoved.connect(self.on_document_moved)
+        layout.addWidget(self.document_bar)
+        
         # 创建选项卡
         self.tab_widget = QTabWidget()
         layout.addWidget(self.tab_widget)
@@ -178,13 +265,13 @@ class CharacterCardEditor(QMainWindow):
         
         # 描述
         scroll_layout.addWidget(QLabel("角色描述:"))
-        self.description_edit = QTextEdit()
+        self.description_edit = PlainTextEditor()
         self.description_edit.setMaximumHeight(100)
         scroll_layout.addWidget(self.description_edit)
         
         # 个性
         scroll_layout.addWidget(QLabel("个性:"))
-        self.personality_edit = QTextEdit()
+        self.personality_edit = PlainTextEditor()
         self.personality_edit.setMaximumHeight(100)
         scroll_layout.addWidget(self.personality_edit)
         
@@ -213,7 +300,7 @@ class CharacterCardEditor(QMainWindow):
         
         # 场景
         scroll_layout.addWidget(QLabel("场景设定:"))
-        self.scenario_edit = QTextEdit()
+        self.scenario_edit = PlainTextEditor()
         self.scenario_edit.setMaximumHeight(80)
         scroll_layout.addWidget(self.scenario_edit)
         
@@ -253,19 +340,19 @@ class CharacterCardEditor(QMainWindow):
         
         # 系统提示
         scroll_layout.addWidget(QLabel("系统提示:"))
-        self.system_prompt_edit = QTextEdit()
+        self.system_prompt_edit = PlainTextEditor()
         self.system_prompt_edit.setMaximumHeight(80)
         scroll_layout.addWidget(self.system_prompt_edit)
         
         # 历史后指令
         scroll_layout.addWidget(QLabel("历史后指令:"))
-        self.post_history_instructions_edit = QTextEdit()
+        self.post_history_instructions_edit = PlainTextEditor()
         self.post_history_instructions_edit.setMaximumHeight(80)
         scroll_layout.addWidget(self.post_history_instructions_edit)
         
         # 创建者注释
         scroll_layout.addWidget(QLabel("创建者注释:"))
-        self.creator_notes_edit = QTextEdit()
+        self.creator_notes_edit = PlainTextEditor()
         self.creator_notes_edit.setMaximumHeight(80)
         scroll_layout.addWidget(self.creator_notes_edit)
         
@@ -273,6 +360,12 @@ class CharacterCardEditor(QMainWindow):
         self.assets_widget = AssetsWidget()
         scroll_layout.addWidget(self.assets_widget)
         
+        # 扩展数据（depth_prompt、第三方插件数据等），按需展开
+        scroll_layout.addWidget(QLabel("扩展数据 (Extensions):"))
+        self.extensions_tree = JsonTreeWidget()
+        self.extensions_tree.setMinimumHeight(240)
+        scroll_layout.addWidget(self.extensions_tree)
+        
         scroll.setWidget(scroll_widget)
         scroll.setWidgetResizable(True)
         layout.addWidget(scroll)
@@ -280,13 +373,24 @@ class CharacterCardEditor(QMainWindow):
         return widget
         
     def create_preview_widget(self) -> QWidget:
+        """创建右侧预览区域：JSON 预览与提示词预览"""
+        self.preview_tabs = QTabWidget()
+        self.preview_tabs.addTab(self.create_json_preview_widget(), "JSON 预览")
+        
+        self.prompt_preview = PromptPreviewWidget()
+        self.preview_tabs.addTab(self.prompt_preview, "提示词预览")
+        self.preview_tabs.currentChanged.connect(self.refresh_prompt_preview)
+        
+        return self.preview_tabs
+        
+    def create_json_preview_widget(self) -> QWidget:
         """创建JSON预览区域"""
         widget = QWidget()
         layout = QVBoxLayout(widget)
         
         layout.addWidget(QLabel("JSON 预览:"))
         
-        self.json_preview = QTextEdit()
+        self.json_preview = QPlainTextEdit()
         self.json_preview.setReadOnly(True)
         self.json_preview.setFont(QFont("Consolas", 10))
         layout.addWidget(self.json_preview)
@@ -296,8 +400,163 @@ class CharacterCardEditor(QMainWindow):
         update_btn.clicked.connect(self.update_preview)
         layout.addWidget(update_btn)
         
+        # 校验结果
+        self.diagnostics_label = QLabel("校验结果:")
+        layout.addWidget(self.diagnostics_label)
+        self.diagnostics_list = QListWidget()
+        self.diagnostics_list.setMaximumHeight(160)
+        self.diagnostics_list.itemClicked.connect(self.on_diagnostic_clicked)
+        layout.addWidget(self.diagnostics_list)
+        
         return widget
         
+    def setup_history(self):
+        """为所有可编辑控件接入撤销/重做历史"""
+        self.history = CardHistory(self)
+        text_fields = [
+            ("角色名称", self.name_edit),
+            ("创建者", self.creator_edit),
+            ("角色版本", self.character_version_edit),
+            ("昵称", self.nickname_edit),
+            ("角色描述", self.description_edit),
+            ("个性", self.personality_edit),
+            ("场景设定", self.scenario_edit),
+            ("第一条消息", self.first_mes_editor.edit_text),
+            ("示例对话", self.mes_example_editor.edit_text),
+            ("系统提示", self.system_prompt_edit),
+            ("历史后指令", self.post_history_instructions_edit),
+            ("创建者注释", self.creator_notes_edit),
+            ("世界书名称", self.book_tab.name_edit),
+        ]
+        for name, widget in text_fields:
+            self.history.watch_text(name, widget)
+        # 列表字段 -> 列表模型
+        self.list_models = {
+            "tags": self.tags_widget.model,
+            "source": self.source_widget.model,
+            "alternate_greetings": self.alternate_greetings_widget.model,
+            "group_only_greetings": self.group_only_greetings_widget.model,
+        }
+        self.history.watch_list("标签", self.tags_widget.model)
+        self.history.watch_list("来源", self.source_widget.model)
+        self.history.watch_list("备选问候语", self.alternate_greetings_widget.model)
+        self.history.watch_list("群聊专用问候语", self.group_only_greetings_widget.model)
+        self.history.watch_assets(self.assets_widget)
+        self.history.watch_json("扩展数据", self.extensions_tree.model)
+        self.history.watch_book(self.book_tab)
+        
+    def setup_validation(self):
+        """后台校验与提示词预览：编辑后延迟刷新，只重新校验变化过的世界书条目"""
+        self.validator = BackgroundValidator(self)
+        self.validator.diagnostics_ready.connect(self.show_diagnostics)
+        self.validator.validation_failed.connect(
+            lambda message: self.statusBar().showMessage(f"规范校验出错: {message}"))
+        self.book_tab.entry_changed.connect(self.validator.invalidate_entry)
+        self.book_tab.entries_spliced.connect(self.validator.splice_entries)
+        
+        self.edit_timer = QTimer(self)
+        self.edit_timer.setSingleShot(True)
+        self.edit_timer.setInterval(300)
+        self.edit_timer.timeout.connect(self.on_card_edited)
+        self.history.group.indexChanged.connect(self.edit_timer.start)
+        self.prompt_preview.sample_changed.connect(self.edit_timer.start)
+        
+        # 卡片字段到控件的映射，用于在控件上标出问题
+        self.field_widgets = {
+            "name": self.name_edit,
+            "creator": self.creator_edit,
+            "character_version": self.character_version_edit,
+            "nickname": self.nickname_edit,
+            "description": self.description_edit,
+            "personality": self.personality_edit,
+            "scenario": self.scenario_edit,
+            "first_mes": self.first_mes_editor.edit_text,
+            "mes_example": self.mes_example_editor.edit_text,
+            "system_prompt": self.system_prompt_edit,
+            "post_history_instructions": self.post_history_instructions_edit,
+            "creator_notes": self.creator_notes_edit,
+            "tags": self.tags_widget.list_view,
+            "source": self.source_widget.list_view,
+            "alternate_greetings": self.alternate_greetings_widget.list_view,
+            "group_only_greetings": self.group_only_greetings_widget.list_view,
+            "assets": self.assets_widget.assets_list,
+            "extensions": self.extensions_tree.tree,
+            "character_book.name": self.book_tab.name_edit,
+        }
+        
+    def setup_memory_accounting(self):
+        """登记内存统计的子系统；共享的对象计在先登记的子系统中，因此世界书和资源排在整卡之前"""
+        self.memory = MemoryAccountant()
+        
+        def book_entries(document: CardDocument) -> List[Any]:
+            if document is self.document:
+                return self.book_tab.book_data.get("entries") or []
+            book = document.data.get("data", {}).get("character_book") or {}
+            return book.get("entries") or []
+        
+        def assets(document: CardDocument) -> List[Any]:
+            if document is self.document:
+                return self.assets_widget.assets
+            return document.data.get("data", {}).get("assets") or []
+        
+        def list_items(*widgets: QListWidget) -> int:
+            size = 0
+            for widget in widgets:
+                size += widget.count() * LIST_ITEM_BYTES
+                size += sum(len(widget.item(row).text()) for row in range(widget.count())) * 2
+            return size
+        
+        def document_chars(*widgets: QWidget) -> int:
+            # QTextDocument 按 UTF-16 保存文本
+            return sum(widget.document().characterCount() * 2 for widget in widgets)
+        
+        def text_widgets() -> List[QWidget]:
+            return [field.widget for field in self.history.text_fields if not isinstance(field.widget, QLineEdit)]
+        
+        self.memory.register(
+            "lorebook", "世界书", lambda: [book_entries(document) for document in self.documents],
+            lambda: self.book_tab.analysis_tree.topLevelItemCount() * LIST_ITEM_BYTES,
+            modules=("CharacterBookWidget.py", "BookEntryEditorWidget.py", "lorebook_activation.py",
+                     "lorebook_analysis.py", "lorebook_retrieval.py", "keyword_matcher.py", "world_info.py",
+                     "lorebook_graph.py", "TriggerGraphDialog.py", "lorebook_columns.py", "LorebookTableWidget.py",
+                     "field_binding.py", "chat_replay.py", "ChatReplayDialog.py"))
+        self.memory.register(
+            "assets", "资源", lambda: [assets(document) for document in self.documents],
+            lambda: list_items(self.assets_widget.assets_list))
+        self.memory.register(
+            "card", "角色卡数据",
+            lambda: [document.data for document in self.documents] +
+                    [document.disk_snapshot for document in self.documents],
+            modules=("json", "card_document.py", "card_cache.py", "card_project.py", "card_diff.py",
+                     "JsonTreeWidget.py", "card_validation.py", "card_watcher.py", "card_search.py",
+                     "FindReplaceDialog.py"))
+        self.memory.register(
+            "editors", "文本编辑器", lambda: [field.shadow for field in self.history.text_fields],
+            lambda: document_chars(*text_widgets()), modules=("PlainTextEditor.py",))
+        self.memory.register(
+            "history", "撤销历史", lambda: [command_payloads(document.stack) for document in self.documents],
+            modules=("card_history.py",))
+        self.memory.register(
+            "entry_list", "条目列表", native=lambda: list_items(self.book_tab.entry_list))
+        self.memory.register(
+            "json_preview", "JSON 预览", native=lambda: document_chars(self.json_preview))
+        self.memory.register(
+            "library", "角色卡库",
+            modules=("LibraryBrowser.py", "card_thumbnails.py", "card_png.py", "library_analytics.py",
+                     "AnalyticsPanel.py"))
+        self.memory.register(
+            "markdown", "Markdown 预览与宏缓存",
+            native=lambda: document_chars(*(editor.preview_text for editor in self.findChildren(MarkdownEditorWidget))),
+            modules=("macros.py", "markdown", "ui_widgets.py", "prompt_assembly.py", "PromptPreviewWidget.py"))
+        
+        self.memory_budgets_path = os.path.join(
+            QStandardPaths.writableLocation(QStandardPaths.StandardLocation.AppConfigLocation), "memory_budgets.json")
+        if os.path.exists(self.memory_budgets_path):
+            try:
+                self.memory.budgets = load_budgets(self.memory_budgets_path)
+            except (OSError, ValueError) as e:
+                self.statusBar().showMessage(f"无法读取内存预算: {str(e)}")
+        
     def setup_menu(self):
         """设置菜单栏"""
         menubar = self.menuBar()
@@ -325,8 +584,83 @@ class CharacterCardEditor(QMainWindow):
         save_as_action.triggered.connect(self.save_file_as)
         file_menu.addAction(save_as_action)
         
+        file_menu.addSeparator()
+        
+        open_project_action = QAction('打开项目目录...', self)
+        open_project_action.triggered.connect(self.load_project)
+        file_menu.addAction(open_project_action)
+        
+        save_project_action = QAction('另存为项目目录...', self)
+        save_project_action.triggered.connect(self.save_project_as)
+        file_menu.addAction(save_project_action)
+        
+        library_action = QAction('角色卡库...', self)
+        library_action.triggered.connect(self.show_library)
+        file_menu.addAction(library_action)
+        
+        analytics_action = QAction('角色卡库统计...', self)
+        analytics_action.triggered.connect(self.show_analytics)
+        file_menu.addAction(analytics_action)
+        
+        file_menu.addSeparator()
+        
+        compare_action = QAction('与文件比较...', self)
+        compare_action.triggered.connect(self.compare_with_file)
+        file_menu.addAction(compare_action)
+        
+        compare_document_action = QAction('与打开的文档比较...', self)
+        compare_document_action.triggered.connect(self.compare_with_document)
+        file_menu.addAction(compare_document_action)
+        
+        file_menu.addSeparator()
+        
+        close_action = QAction('关闭文档', self)
+        close_action.setShortcut(QKeySequence.StandardKey.Close)
+        close_action.triggered.connect(lambda: self.close_document(self.document_bar.currentIndex()))
+        file_menu.addAction(close_action)
+        
+        # 编辑菜单
+        edit_menu = menubar.addMenu('编辑')
+        
+        undo_action = QAction('撤销', self)
+        undo_action.setShortcut(QKeySequence.StandardKey.Undo)
+        undo_action.setEnabled(False)
+        undo_action.triggered.connect(self.history.undo)
+        self.history.group.canUndoChanged.connect(undo_action.setEnabled)
+        edit_menu.addAction(undo_action)
+        
+        redo_action = QAction('重做', self)
+        redo_action.setShortcut(QKeySequence.StandardKey.Redo)
+        redo_action.setEnabled(False)
+        redo_action.triggered.connect(self.history.redo)
+        self.history.group.canRedoChanged.connect(redo_action.setEnabled)
+        edit_menu.addAction(redo_action)
+        
+        edit_menu.addSeparator()
+        
+        find_action = QAction('查找和替换...', self)
+        find_action.setShortcut(QKeySequence.StandardKey.Replace)
+        find_action.triggered.connect(self.show_find_replace)
+        edit_menu.addAction(find_action)
+        
+        # 开发者菜单
+        developer_menu = menubar.addMenu('开发者')
+        
+        memory_action = QAction('内存统计...', self)
+        memory_action.triggered.connect(self.show_memory_panel)
+        developer_menu.addAction(memory_action)
+        
     def load_data_to_ui(self):
         """将数据加载到UI"""
+        with self.history.suspended():
+            self._populate_ui()
+        self.history.reset()
+        self.validator.reset(len(self.book_tab.book_data.get("entries", [])))
+        self.update_preview()
+        self.on_card_edited()
+        
+    def _populate_ui(self):
+        """把 self.data 填入各个控件"""
         data = self.data.get('data', {})
         
         # 基本信息
@@ -348,27 +682,24 @@ class CharacterCardEditor(QMainWindow):
         self.creator_notes_edit.setPlainText(data.get('creator_notes', ''))
         
         # 列表数据
-        self.tags_widget.items = data.get('tags', []).copy()
-        self.tags_widget.load_items()
+        self.tags_widget.set_items(data.get('tags', []))
         
-        self.source_widget.items = data.get('source', []).copy()
-        self.source_widget.load_items()
+        self.source_widget.set_items(data.get('source', []))
         
-        self.alternate_greetings_widget.items = data.get('alternate_greetings', []).copy()
-        self.alternate_greetings_widget.load_items()
+        self.alternate_greetings_widget.set_items(data.get('alternate_greetings', []))
         
-        self.group_only_greetings_widget.items = data.get('group_only_greetings', []).copy()
-        self.group_only_greetings_widget.load_items()
+        self.group_only_greetings_widget.set_items(data.get('group_only_greetings', []))
         
         # 资源
         self.assets_widget.assets = data.get('assets', []).copy()
         self.assets_widget.load_assets()
+        
+        # 扩展数据：树直接修改卡片中的 extensions
+        self.extensions_tree.set_root(data.setdefault('extensions', {}))
 
         # 世界书
         self.book_tab.load_book(data.get('character_book'))
         
-        self.update_preview()
-        
     def collect_data_from_ui(self) -> Dict[str, Any]:
         """从UI收集数据"""
         data = self.data.copy()
@@ -410,43 +741,435 @@ class CharacterCardEditor(QMainWindow):
         """更新JSON预览"""
         try:
             current_data = self.collect_data_from_ui()
+            book = current_data['data'].get('character_book')
+            entries = book.get('entries') if isinstance(book, dict) else None
+            note = ""
+            if isinstance(entries, list) and len(entries) > PREVIEW_ENTRY_LIMIT:
+                # 只复制到 entries 所在的层级，不影响界面数据
+                current_data = dict(current_data)
+                current_data['data'] = dict(current_data['data'])
+                current_data['data']['character_book'] = dict(book, entries=entries[:PREVIEW_ENTRY_LIMIT])
+                note = f"// 世界书共 {len(entries)} 个条目，预览只显示前 {PREVIEW_ENTRY_LIMIT} 个\n"
             json_str = json.dumps(current_data, ensure_ascii=False, indent=2)
-            self.json_preview.setPlainText(json_str)
+            self.json_preview.setPlainText(note + json_str)
         except Exception as e:
             self.json_preview.setPlainText(f"JSON预览错误: {str(e)}")
             
+    def on_card_edited(self):
+        """编辑停顿后：提交后台校验，并刷新可见的提示词预览"""
+        current_data = self.collect_data_from_ui()
+        self.validator.submit(current_data)
+        # Markdown 预览中的宏展开使用最新的角色名和用户名
+        MarkdownEditorWidget.macro_context = self.prompt_preview.macro_context(current_data.get('data', {}))
+        self.book_tab.macro_context = MarkdownEditorWidget.macro_context
+        if self.preview_tabs.currentWidget() is self.prompt_preview:
+            self.prompt_preview.update_prompt(current_data.get('data', {}))
+        # 未命名文档的标签显示角色名
+        self._update_document_title(self.document)
+            
+    def refresh_prompt_preview(self):
+        """切换到提示词预览时刷新"""
+        if self.preview_tabs.currentWidget() is self.prompt_preview:
+            self.prompt_preview.update_prompt(self.collect_data_from_ui().get('data', {}))
+        
+    def show_diagnostics(self, diagnostics: List[Diagnostic]):
+        """显示校验结果，并在对应控件和世界书条目上标出问题"""
+        errors = sum(1 for d in diagnostics if d.severity == ERROR)
+        self.diagnostics_label.setText(f"校验结果: {errors} 个错误，{len(diagnostics) - errors} 个警告")
+        self.diagnostics_list.clear()
+        for diagnostic in diagnostics[:MAX_DIAGNOSTIC_ITEMS]:
+            item = QListWidgetItem(f"{format_path(diagnostic.path)}: {diagnostic.message}")
+            item.setForeground(QColor(ERROR_COLOR if diagnostic.severity == ERROR else WARNING_COLOR))
+            item.setData(Qt.ItemDataRole.UserRole, diagnostic.path)
+            self.diagnostics_list.addItem(item)
+            
+        # 卡片字段的问题标在对应控件上，条目的问题交给世界书界面
+        field_messages: Dict[str, List[str]] = {}
+        field_errors: Dict[str, bool] = {}
+        entry_diagnostics: Dict[int, List[Diagnostic]] = {}
+        for diagnostic in diagnostics:
+            row = entry_row(diagnostic.path)
+            if row is not None:
+                entry_diagnostics.setdefault(row, []).append(diagnostic)
+            elif len(diagnostic.path) > 1 and diagnostic.path[0] == "data":
+                key = self._field_key(diagnostic.path)
+                field_messages.setdefault(key, []).append(diagnostic.message)
+                field_errors[key] = field_errors.get(key, False) or diagnostic.severity == ERROR
+        for key, widget in self.field_widgets.items():
+            mark_field(widget, field_messages.get(key, []), field_errors.get(key, False))
+        self.book_tab.set_entry_diagnostics(entry_diagnostics)
+        
+    def _field_key(self, path: tuple) -> str:
+        """诊断路径对应的 field_widgets 键"""
+        if tuple(path[1:3]) == ("character_book", "name"):
+            return "character_book.name"
+        return path[1]
+        
+    def on_diagnostic_clicked(self, item: QListWidgetItem):
+        """跳转到诊断对应的字段或世界书条目"""
+        self.show_path(item.data(Qt.ItemDataRole.UserRole))
+        
+    def show_path(self, path: tuple):
+        """切换到字段路径对应的控件或世界书条目"""
+        row = entry_row(path)
+        if row is not None:
+            self.tab_widget.setCurrentWidget(self.book_tab)
+            self.book_tab.select_entry_row(row)
+            return
+        widget = self.field_widgets.get(self._field_key(path)) if len(path) > 1 else None
+        if widget is not None:
+            for index in range(self.tab_widget.count()):
+                if self.tab_widget.widget(index).isAncestorOf(widget):
+                    self.tab_widget.setCurrentIndex(index)
+                    break
+            widget.setFocus()
+            
+    def show_find_replace(self):
+        """打开查找和替换对话框"""
+        if self.find_dialog is None:
+            self.find_dialog = FindReplaceDialog(
+                self.collect_data_from_ui,
+                lambda: [document.file_path for document in self.documents if document.file_path],
+                self)
+            self.find_dialog.replace_requested.connect(self.replace_in_card)
+            self.find_dialog.path_requested.connect(self.show_path)
+        self.find_dialog.show()
+        self.find_dialog.raise_()
+        self.find_dialog.activateWindow()
+        
+    def show_memory_panel(self):
+        """打开内存统计面板"""
+        if self.memory_panel is None:
+            self.memory_panel = MemoryPanel(self.memory, self.memory_budgets_path, self)
+            self.memory_panel.budget_exceeded.connect(
+                lambda messages: self.statusBar().showMessage("内存超出预算: " + "；".join(messages), 10000))
+        self.memory_panel.show()
+        self.memory_panel.raise_()
+        self.memory_panel.activateWindow()
+        
+    def show_library(self):
+        """打开角色卡库浏览器"""
+        if self.library_browser is None:
+            self.library_browser = LibraryBrowser(os.path.join(
+                QStandardPaths.writableLocation(QStandardPaths.StandardLocation.CacheLocation), "thumbnails"),
+                parent=self)
+            self.library_browser.card_requested.connect(self.open_card_file)
+        self.library_browser.show()
+        self.library_browser.raise_()
+        self.library_browser.activateWindow()
+        if not self.library_browser.directory:
+            self.library_browser.choose_directory()
+        
+    def show_analytics(self):
+        """打开角色卡库统计面板"""
+        if self.analytics_panel is None:
+            self.analytics_panel = AnalyticsPanel(os.path.join(
+                QStandardPaths.writableLocation(QStandardPaths.StandardLocation.CacheLocation), "analytics"),
+                self)
+            self.analytics_panel.card_requested.connect(self.open_card_file)
+        self.analytics_panel.show()
+        self.analytics_panel.raise_()
+        self.analytics_panel.activateWindow()
+        if not self.analytics_panel.analytics.directory:
+            self.analytics_panel.choose_directory()
+        
+    def replace_in_card(self, options: SearchOptions) -> int:
+        """在当前角色卡中全部替换，所有修改作为一步撤销，返回修改的字段数"""
+        current_data = self.collect_data_from_ui()
+        try:
+            changes = plan_replacements(current_data, options)
+        except (re.error, ValueError) as e:
+            QMessageBox.warning(self, "错误", f"替换失败: {str(e)}")
+            return 0
+        if not changes:
+            return 0
+        
+        entries = (current_data['data'].get('character_book') or {}).get('entries') or []
+        new_entries: Dict[int, Dict[str, Any]] = {}
+        new_lists: Dict[str, List[str]] = {}
+        entry_lists: Dict[int, Set[str]] = {}
+        # 经由控件和世界书界面修改，撤销历史照常记录每一处变化
+        self.history.begin_transaction(f"替换“{options.pattern}”")
+        try:
+            for path, old_text, new_text in changes:
+                row = entry_row(path)
+                if row is not None:
+                    entry = new_entries.get(row)
+                    if entry is None:
+                        entry = new_entries[row] = {
+                            key: value.copy() if isinstance(value, list) else value
+                            for key, value in entries[row].items()
+                        }
+                    if len(path) > 5:
+                        entry[path[4]][path[5]] = new_text
+                        entry_lists.setdefault(row, set()).add(path[4])
+                    else:
+                        entry[path[4]] = new_text
+                elif len(path) == 3 and path[1] in LIST_FIELDS:
+                    items = new_lists.get(path[1])
+                    if items is None:
+                        items = new_lists[path[1]] = self.list_models[path[1]].get_items()
+                    items[path[2]] = new_text
+                else:
+                    self._replace_widget_text(self.field_widgets[self._field_key(path)], old_text, new_text)
+            # 列表字段按集合规则整体写回：替换成空的项被删除，与已有项重复的项合并
+            for row, fields in entry_lists.items():
+                for field in fields:
+                    new_entries[row][field] = unique_items(new_entries[row][field])
+            for row, entry in new_entries.items():
+                self.book_tab.update_entry(row, entry)
+            for field, items in new_lists.items():
+                self.list_models[field].assign(items)
+        finally:
+            self.history.end_transaction()
+        self.statusBar().showMessage(f"已替换 {len(changes)} 个字段中的“{options.pattern}”")
+        return len(changes)
+        
+    def _replace_widget_text(self, widget: QWidget, old_text: str, new_text: str):
+        """只改写文本控件中变化的区间，保留其余内容和光标"""
+        if isinstance(widget, QLineEdit):
+            widget.setText(new_text)
+            return
+        position, removed, inserted = text_delta(old_text, new_text)
+        widget.splice(position, len(removed), inserted)
+        
     def new_file(self):
-        """新建文件"""
-        self.data = self.get_default_data()
-        self.current_file = None
-        self.load_data_to_ui()
+        """新建文件（在新的文档标签中）"""
+        self.open_document(self.get_default_data())
         self.statusBar().showMessage("已创建新文件")
         
+    def open_document(self, data: Dict[str, Any], file_path: Optional[str] = None,
+                      project: Optional[CardProject] = None):
+        """在新标签中打开角色卡；当前文档是未编辑过的空白文档时直接替换它"""
+        document = self.document
+        if document is not None and document.is_blank:
+            document.data, document.file_path, document.project = data, file_path, project
+            document.set_disk_state(data)
+        else:
+            self._store_document()
+            document = CardDocument(data, self.history.new_stack(), file_path, project)
+            document.stack.cleanChanged.connect(lambda clean, document=document: self._update_document_title(document))
+            self.documents.append(document)
+            self.document = document
+            self.document_bar.blockSignals(True)
+            self.document_bar.setCurrentIndex(self.document_bar.addTab(document.title()))
+            self.document_bar.blockSignals(False)
+            self.history.set_stack(document.stack)
+        self.load_data_to_ui()
+        self._update_document_title(document)
+        self._sync_watches()
+        
+    def _store_document(self):
+        """把控件中的内容和界面位置收回到当前文档"""
+        if self.document is None:
+            return
+        self.document.data = self.collect_data_from_ui()
+        self.document.tab_index = self.tab_widget.currentIndex()
+        self.document.entry_row = self.book_tab.editing_row
+        
+    def switch_document(self, index: int):
+        """切换到另一个打开的文档：把它的数据重新填入共用的编辑控件，并换用它的撤销栈"""
+        if not 0 <= index < len(self.documents) or self.documents[index] is self.document:
+            return
+        self._store_document()
+        document = self.document = self.documents[index]
+        with self.history.suspended():
+            self._populate_ui()
+            self.tab_widget.setCurrentIndex(document.tab_index)
+            if document.entry_row >= 0:
+                self.book_tab.select_entry_row(document.entry_row)
+        self.history.set_stack(document.stack)
+        self.validator.reset(len(self.book_tab.book_data.get("entries", [])))
+        self.update_preview()
+        self.on_card_edited()
+        self.statusBar().showMessage(f"当前文档: {document.file_path or document.title()}")
+        if document.pending_reload:
+            self.reload_external(document)
+        
+    def close_document(self, index: int) -> bool:
+        """关闭文档：有文件的先保存，未命名且修改过的询问是否保存"""
+        if not 0 <= index < len(self.documents):
+            return False
+        document = self.documents[index]
+        if document.file_path:
+            self.check_external_change(document)
+            try:
+                self._save_document(document)
+            except Exception as e:
+                QMessageBox.warning(self, "错误", f"保存文件失败: {str(e)}")
+                return False
+        elif document.modified:
+            self.document_bar.setCurrentIndex(index)
+            reply = QMessageBox.question(
+                self, "确认", f"“{document.title()}”尚未保存，是否保存？",
+                QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No | QMessageBox.StandardButton.Cancel
+            )
+            if reply == QMessageBox.StandardButton.Cancel:
+                return False
+            if reply == QMessageBox.StandardButton.Yes:
+                self.save_file_as()
+                if not document.file_path:
+                    return False
+        
+        # 先移出列表，removeTab 引起的切换按新的下标找到文档
+        self.documents.pop(index)
+        if document is self.document:
+            self.document = None
+        self.document_bar.removeTab(index)
+        self.history.remove_stack(document.stack)
+        if not self.documents:
+            self.new_file()
+        self._sync_watches()
+        return True
+        
+    def on_document_moved(self, source: int, target: int):
+        """拖动文档标签后保持列表顺序一致"""
+        self.documents.insert(target, self.documents.pop(source))
+        
+    def _update_document_title(self, document: Optional[CardDocument]):
+        if document is None or document not in self.documents:
+            return
+        index = self.documents.index(document)
+        self.document_bar.setTabText(index, document.title())
+        self.document_bar.setTabToolTip(index, document.file_path or "")
+        
+    def _activate_open_document(self, path: str) -> bool:
+        """文件已经打开时切换到它的标签"""
+        for index, document in enumerate(self.documents):
+            if document.same_file(path):
+                self.document_bar.setCurrentIndex(index)
+                self.statusBar().showMessage(f"已切换到已打开的文件: {path}")
+                return True
+        return False
+        
     def load_file(self):
         """加载文件"""
         file_path, _ = QFileDialog.getOpenFileName(
-            self, "加载角色卡文件", "", "JSON files (*.json);;All files (*.*)"
+            self, "加载角色卡文件", "", "Character cards (*.json *.png);;JSON files (*.json);;All files (*.*)"
         )
         
         if file_path:
+            self.open_card_file(file_path)
+
+    def open_card_file(self, file_path: str):
+        """打开角色卡文件；PNG 角色卡中嵌入的数据作为未保存的新文档打开"""
+        if self._activate_open_document(file_path):
+            return
+        if file_path.lower().endswith(".png"):
             try:
-                with open(file_path, 'r', encoding='utf-8') as f:
-                    self.data = json.load(f)
-                self.current_file = file_path
-                self.load_data_to_ui()
-                self.statusBar().showMessage(f"已加载: {file_path}")
+                data = read_png_card(file_path)
             except Exception as e:
-                QMessageBox.warning(self, "错误", f"加载文件失败: {str(e)}")
+                QMessageBox.warning(self, "错误", f"读取 PNG 角色卡失败: {str(e)}")
+                return
+            if data is None or not isinstance(data.get('data'), dict):
+                QMessageBox.warning(self, "错误", "PNG 中没有 V2/V3 角色卡数据")
+                return
+            # 编辑器只保存 JSON，不覆盖原 PNG 文件
+            self.open_document(data)
+            self.statusBar().showMessage(f"已从 PNG 导入: {file_path}（保存时请选择 JSON 文件）")
+            return
+        try:
+            data = self.card_cache.load(file_path)
+            cached = data is not None
+            if not cached:
+                with open(file_path, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+            if not isinstance(data, dict) or not isinstance(data.get('data'), dict):
+                QMessageBox.warning(self, "错误", "加载文件失败: 不是 V2/V3 角色卡（缺少 data 对象）")
+                return
+            if not cached:
+                self._store_cache(file_path, data)
+            self.open_document(data, file_path)
+            self.statusBar().showMessage(f"已加载: {file_path}" + ("（缓存）" if cached else ""))
+        except Exception as e:
+            QMessageBox.warning(self, "错误", f"加载文件失败: {str(e)}")
                 
+    def load_project(self):
+        """打开项目目录（每个世界书条目一个文件）"""
+        directory = QFileDialog.getExistingDirectory(self, "打开角色卡项目目录")
+        if not directory or self._activate_open_document(directory):
+            return
+        if not is_project(directory):
+            QMessageBox.warning(self, "错误", "所选目录不是角色卡项目目录（缺少 manifest.json）")
+            return
+        project = CardProject(directory)
+        try:
+            data = project.load()
+        except Exception as e:
+            QMessageBox.warning(self, "错误", f"加载项目失败: {str(e)}")
+            return
+        if not isinstance(data, dict) or not isinstance(data.get('data'), dict):
+            QMessageBox.warning(self, "错误", "加载项目失败: card.json 不是 V2/V3 角色卡（缺少 data 对象）")
+            return
+        self.open_document(data, directory, project)
+        self.statusBar().showMessage(f"已加载项目: {directory}")
+        
+    def save_project_as(self):
+        """另存为项目目录，之后的保存只写入变化的条目文件"""
+        directory = QFileDialog.getExistingDirectory(self, "选择保存角色卡项目的目录")
+        if not directory:
+            return
+        project = CardProject(directory)
+        if is_project(directory):
+            try:
+                project.load()  # 读取旧清单，以便增量写入并清理多余的条目文件
+            except Exception as e:
+                QMessageBox.warning(self, "错误", f"读取已有项目失败: {str(e)}")
+                return
+        elif os.listdir(directory):
+            reply = QMessageBox.question(
+                self, "确认", "所选目录不为空，仍要在其中创建项目吗？",
+                QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No
+            )
+            if reply != QMessageBox.StandardButton.Yes:
+                return
+        self.current_project = project
+        if self._write_to_file(directory):
+            self.statusBar().showMessage(f"已保存项目: {directory}{self._validation_note()}")
+            
+    def _save_to(self, file_path: str) -> str:
+        """将当前UI数据写入文件或项目目录，返回附加在状态栏中的说明"""
+        current_data = self.collect_data_from_ui()
+        note = self._write_card(self.document, current_data, file_path)
+        self.data = current_data
+        self.current_file = file_path
+        self.document.set_disk_state(current_data)
+        self.document.stack.setClean()
+        self._update_document_title(self.document)
+        self._sync_watches()
+        return note
+        
+    def _write_card(self, document: CardDocument, data: Dict[str, Any], file_path: str) -> str:
+        """把角色卡数据写入文件，或增量写入文档的项目目录"""
+        if document.project is not None and document.project.directory == file_path:
+            stats = document.project.save(data)
+            return f"（写入 {stats.written} 个文件）"
+        with open(file_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+        document.project = None
+        self._store_cache(file_path, data)
+        return ""
+        
+    def _save_document(self, document: CardDocument) -> str:
+        """把文档保存到它自己的文件；后台文档直接写出保存着的数据"""
+        if document is self.document:
+            return self._save_to(document.file_path)
+        note = self._write_card(document, document.data, document.file_path)
+        document.set_disk_state(document.data)
+        document.stack.setClean()
+        return note
+        
+    def _store_cache(self, file_path: str, data: Dict[str, Any]):
+        """更新文件的二进制缓存；缓存只是加速手段，失败时忽略"""
+        try:
+            self.card_cache.store(file_path, data)
+        except (OSError, ValueError):
+            pass
+        
     def _write_to_file(self, file_path: str) -> bool:
         """将当前UI数据写入指定文件。"""
         try:
-            current_data = self.collect_data_from_ui()
-            with open(file_path, 'w', encoding='utf-8') as f:
-                json.dump(current_data, f, ensure_ascii=False, indent=2)
-            
-            self.data = current_data
-            self.current_file = file_path
+            self._save_note = self._save_to(file_path)
             return True
         except Exception as e:
             QMessageBox.warning(self, "错误", f"保存文件失败: {str(e)}")
@@ -458,9 +1181,15 @@ class CharacterCardEditor(QMainWindow):
             self.save_file_as()
             return
         
+        self.check_external_change(self.document)
         if self._write_to_file(self.current_file):
-            self.statusBar().showMessage(f"已保存: {self.current_file}")
+            self.statusBar().showMessage(f"已保存: {self.current_file}{self._save_note}{self._validation_note()}")
             
+    def _validation_note(self) -> str:
+        """保存时附在状态栏消息后的校验提示"""
+        errors = sum(1 for d in self.validator.diagnostics() if d.severity == ERROR)
+        return f"（存在 {errors} 个校验错误）" if errors else ""
+        
     def save_file_as(self):
         """另存为"""
         file_path, _ = QFileDialog.getSaveFileName(
@@ -469,25 +1198,236 @@ class CharacterCardEditor(QMainWindow):
         
         if file_path:
             if self._write_to_file(file_path):
-                self.statusBar().showMessage(f"已保存: {file_path}")
+                self.statusBar().showMessage(f"已保存: {file_path}{self._validation_note()}")
                 
     def auto_save(self):
         """自动保存"""
-        if self.current_file:
+        documents = [document for document in self.documents
+                     if document.file_path and (document is self.document or document.modified)]
+        # 文件在外部被修改过的文档留给文件监视处理，不覆盖
+        changed = [document for document in documents if document.disk_changed()]
+        documents = [document for document in documents if document not in changed]
+        if documents or changed:
             try:
-                # 使用一个简化的保存逻辑，避免在自动保存时弹出对话框
-                current_data = self.collect_data_from_ui()
-                with open(self.current_file, 'w', encoding='utf-8') as f:
-                    json.dump(current_data, f, ensure_ascii=False, indent=2)
-                self.data = current_data
-                self.statusBar().showMessage(f"自动保存于 {datetime.now().strftime('%H:%M:%S')}")
+                # 自动保存失败时只在状态栏提示，不弹出对话框
+                for document in documents:
+                    self._save_document(document)
+                note = f"，跳过 {len(changed)} 个在外部修改过的文件" if changed else ""
+                self.statusBar().showMessage(f"自动保存于 {datetime.now().strftime('%H:%M:%S')}{note}")
             except Exception as e:
                 self.statusBar().showMessage(f"自动保存失败: {e}")
                 
+    def _sync_watches(self):
+        """监视所有打开的文档对应的文件和项目目录"""
+        self.watcher.set_paths(document.file_path for document in self.documents if document.file_path)
+        
+    def on_file_changed(self, path: str):
+        """打开的文件在外部被修改：当前文档立即载入，其他文档在切换过去时载入"""
+        for document in self.documents:
+            if not document.same_file(path) or not document.disk_changed():
+                continue
+            if document is self.document:
+                self.reload_external(document)
+            else:
+                document.pending_reload = True
+                self.statusBar().showMessage(f"{document.file_path} 已在外部修改，切换到该文档时载入")
+                
+    def check_external_change(self, document: CardDocument):
+        """写入文件之前确认它没有在外部被修改过；修改过时切换到该文档并先载入修改"""
+        if not document.disk_changed():
+            return
+        if document is not self.document:
+            self.document_bar.setCurrentIndex(self.documents.index(document))
+        self.reload_external(document)
+        
+    def _read_disk(self, document: CardDocument) -> Any:
+        if document.project is not None:
+            return document.project.load()
+        with open(document.file_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+        
+    def reload_external(self, document: CardDocument):
+        """载入当前文档在外部的修改：只更新变化的字段和条目；编辑器中也有未保存的修改时提供合并"""
+        document.pending_reload = False
+        if not document.disk_changed():
+            return
+        try:
+            theirs = self._read_disk(document)
+        except (OSError, ValueError) as e:
+            # 文件被删除或正在写入，等下一次修改事件再读取
+            self.statusBar().showMessage(f"无法读取外部修改: {str(e)}")
+            return
+        if not isinstance(theirs, dict) or not isinstance(theirs.get('data'), dict):
+            self.statusBar().showMessage(f"外部修改后的文件不是 V2/V3 角色卡，未载入: {document.file_path}")
+            return
+        
+        base = document.disk_data()
+        # 修改时间在每次收集时都会更新，不算作编辑器一方的修改
+        ours = self.collect_data_from_ui()
+        ours = dict(ours, data=dict(ours['data']))
+        if 'modification_date' in base.get('data', {}):
+            ours['data']['modification_date'] = base['data']['modification_date']
+        external = diff_cards(base, theirs)
+        # 磁盘上的内容从现在起作为共同祖先；先记录，之后的修改可能引用其中的对象
+        document.set_disk_state(theirs)
+        if document.project is None:
+            self._store_cache(document.file_path, theirs)
+        if not external:
+            return
+        name = os.path.basename(os.path.normpath(document.file_path))
+        local = diff_cards(base, ours) if document.modified else []
+        if not local:
+            self.apply_card_data(theirs, f"载入外部修改: {name}")
+            document.stack.setClean()
+            self.statusBar().showMessage(f"已载入 {name} 在外部的 {len(external)} 处修改")
+            return
+        
+        box = QMessageBox(self)
+        box.setIcon(QMessageBox.Icon.Question)
+        box.setWindowTitle("文件已在外部修改")
+        box.setText(f"“{name}”在编辑器之外有 {len(external)} 处修改，编辑器中也有 {len(local)} 处未保存的修改。")
+        box.setInformativeText("合并会保留双方互不冲突的修改；冲突处保留编辑器中的内容，文本冲突用 <<<<<<< 标记。")
+        box.setDetailedText(format_diff(external))
+        merge_btn = box.addButton("合并", QMessageBox.ButtonRole.AcceptRole)
+        theirs_btn = box.addButton("使用磁盘上的版本", QMessageBox.ButtonRole.DestructiveRole)
+        box.addButton("保留编辑器中的内容", QMessageBox.ButtonRole.RejectRole)
+        box.setDefaultButton(merge_btn)
+        box.exec()
+        
+        if box.clickedButton() is merge_btn:
+            merged, conflicts = merge_cards(base, ours, theirs)
+            self.apply_card_data(merged, f"合并外部修改: {name}")
+            if conflicts:
+                QMessageBox.information(
+                    self, "合并冲突",
+                    f"有 {len(conflicts)} 处冲突，已保留编辑器中的内容:\n\n{format_conflicts(conflicts[:50])}"
+                )
+            self.statusBar().showMessage(f"已合并 {name} 在外部的修改（{len(conflicts)} 处冲突）")
+        elif box.clickedButton() is theirs_btn:
+            self.apply_card_data(theirs, f"载入外部修改: {name}")
+            document.stack.setClean()
+            self.statusBar().showMessage(f"已载入 {name} 在外部的 {len(external)} 处修改")
+        else:
+            # 之后保存时覆盖磁盘上的版本
+            self.statusBar().showMessage(f"已保留编辑器中的内容，保存时将覆盖 {name}")
+            
+    def apply_card_data(self, card: Dict[str, Any], text: str):
+        """把当前文档改成 card：只经由控件更新变化的字段和世界书条目，所有修改作为一步撤销"""
+        current = self.collect_data_from_ui()['data']
+        new_data = card['data']
+        book = self.book_tab.book_data
+        new_book = new_data.get('character_book') if isinstance(new_data.get('character_book'), dict) else {}
+        self.history.begin_transaction(text)
+        try:
+            for key in TEXT_FIELDS:
+                old_text, new_text = str(current.get(key) or ""), str(new_data.get(key) or "")
+                if old_text != new_text:
+                    self._replace_widget_text(self.field_widgets[key], old_text, new_text)
+            for key, model in self.list_models.items():
+                items = [str(item) for item in new_data.get(key) or []]
+                if model.get_items() != items:
+                    model.splice(0, len(model), items)
+            assets = list(new_data.get('assets') or [])
+            if self.assets_widget.assets != assets:
+                self.assets_widget.splice(0, len(self.assets_widget.assets), assets)
+            extensions = new_data.get('extensions')
+            if isinstance(extensions, dict) and current.get('extensions') != extensions:
+                self.extensions_tree.model.replace_path((), extensions)
+            
+            # 世界书：名称经由控件，条目只更新变化的字段或拼接增删的行
+            old_name, new_name = str(book.get('name') or ""), str(new_book.get('name') or "")
+            if old_name != new_name:
+                self._replace_widget_text(self.book_tab.name_edit, old_name, new_name)
+            for edit in plan_entry_edits(book.get('entries', []), new_book.get('entries') or []):
+                if edit.kind == "update":
+                    self.book_tab.update_entry(edit.row, edit.entries[0])
+                else:
+                    self.book_tab.splice_entries(edit.row, edit.count, list(edit.entries))
+        finally:
+            self.history.end_transaction()
+        
+        # 界面上没有控件的字段直接写入
+        for target, source, skip in (
+            (book, new_book, {'name', 'entries'}),
+            (self.data['data'], new_data, set(TEXT_FIELDS) | set(self.list_models) | {'assets', 'extensions', 'character_book'}),
+            (self.data, card, {'data'}),
+        ):
+            for key in set(target) | set(source):
+                if key in skip:
+                    continue
+                if key in source:
+                    target[key] = source[key]
+                else:
+                    target.pop(key, None)
+        
+    def compare_with_file(self):
+        """将当前编辑内容与另一个角色卡文件做结构化比较"""
+        file_path, _ = QFileDialog.getOpenFileName(
+            self, "选择要比较的角色卡文件", "", "JSON files (*.json);;All files (*.*)"
+        )
+        if not file_path:
+            return
+        try:
+            with open(file_path, 'r', encoding='utf-8') as f:
+                other_data = json.load(f)
+            changes = diff_cards(other_data, self.collect_data_from_ui())
+        except Exception as e:
+            QMessageBox.warning(self, "错误", f"比较失败: {str(e)}")
+            return
+        self._show_diff(os.path.basename(file_path), changes)
+        
+    def compare_with_document(self):
+        """将当前编辑内容与另一个打开的文档做结构化比较"""
+        others = [document for document in self.documents if document is not self.document]
+        if not others:
+            QMessageBox.information(self, "提示", "没有其他打开的文档")
+            return
+        titles = [f"{index + 1}. {document.title()}" for index, document in enumerate(others)]
+        title, ok = QInputDialog.getItem(self, "与打开的文档比较", "选择文档:", titles, 0, False)
+        if not ok:
+            return
+        other = others[titles.index(title)]
+        try:
+            changes = diff_cards(other.data, self.collect_data_from_ui())
+        except Exception as e:
+            QMessageBox.warning(self, "错误", f"比较失败: {str(e)}")
+            return
+        self._show_diff(other.title(), changes)
+        
+    def _show_diff(self, source: str, changes: List[Change]):
+        """显示比较结果"""
+        dialog = QDialog(self)
+        dialog.setWindowTitle(f"差异: {source} -> 当前")
+        dialog.setMinimumSize(800, 600)
+        layout = QVBoxLayout(dialog)
+        layout.addWidget(QLabel(f"共 {len(changes)} 处差异"))
+        
+        diff_view = QPlainTextEdit()
+        diff_view.setReadOnly(True)
+        diff_view.setFont(QFont("Consolas", 10))
+        diff_view.setPlainText(format_diff(changes) or "没有差异")
+        layout.addWidget(diff_view)
+        
+        close_btn = QPushButton("关闭")
+        close_btn.clicked.connect(dialog.accept)
+        layout.addWidget(close_btn)
+        dialog.exec()
+        
     def closeEvent(self, event):
-        """关闭事件，确保在关闭前保存"""
-        if self.current_file:
-            self._write_to_file(self.current_file)
+        """关闭事件，确保在关闭前保存所有有文件的文档"""
+        for document in list(self.documents):
+            if document.file_path:
+                self.check_external_change(document)
+                try:
+                    self._save_document(document)
+                except Exception as e:
+                    QMessageBox.warning(self, "错误", f"保存 {document.file_path} 失败: {str(e)}")
+        self.validator.shutdown()
+        self.book_tab.shutdown()
+        if self.library_browser is not None:
+            self.library_browser.shutdown()
+        if self.analytics_panel is not None:
+            self.analytics_panel.close()
         event.accept()
 
 
@@ -0,0 +1,349 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+memory_accounting.py
+按子系统统计编辑器的内存占用，用于定位大型角色卡的内存增长并检查内存预算。
+
+两种互相独立的统计方式:
+- 对象遍历：从每个子系统登记的根对象出发，累计可达的 dict/list/str 等对象的大小。
+  各子系统按登记顺序共用一个"已计数"集合，被多处引用的对象只算在最先登记的子系统中；
+  同一份数据被复制（如 dict.copy() 出的副本）时则会分别计数，因此能直接看出重复。
+  Qt 一侧的内存（文档、列表项）无法遍历，由子系统提供估算值。
+- tracemalloc：开启跟踪后（有明显的性能开销，只在需要时开启），按分配位置所在的模块
+  汇总当前仍存活的内存，再按模块映射到子系统，并给出两次快照之间的变化。
+
+命令行用法（检查角色卡数据本身的内存占用是否超出预算）:
+    python memory_accounting.py card.json [--budget lorebook=300] [--budgets budgets.json] [--json]
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, Iterable, List, NamedTuple, Optional, Set, Tuple
+
+# tracemalloc 保存的调用栈深度
+TRACE_FRAMES = 1
+# 报告中列出的分配位置数
+TOP_ALLOCATIONS = 25
+
+MB = 1024 * 1024
+
+_CONTAINERS = (dict, list, tuple, set, frozenset)
+
+
+class Usage(NamedTuple):
+    """一个子系统的内存占用"""
+    python_bytes: int
+    objects: int
+    native_bytes: int = 0
+
+    @property
+    def total(self) -> int:
+        return self.python_bytes + self.native_bytes
+
+
+class Subsystem(NamedTuple):
+    """登记的子系统：roots 返回要遍历的根对象，native 返回无法遍历部分的估算字节数"""
+    key: str
+    title: str
+    roots: Optional[Callable[[], Iterable[Any]]] = None
+    native: Optional[Callable[[], int]] = None
+
+
+class AllocationStat(NamedTuple):
+    """tracemalloc 中一个分配位置（或模块）的统计"""
+    where: str
+    size: int
+    count: int
+    size_diff: int = 0
+
+
+class MemorySnapshot(NamedTuple):
+    """某一时刻的内存统计"""
+    label: str
+    time: float
+    usage: Dict[str, Usage]
+    titles: Dict[str, str]
+    rss: Optional[int]
+    traced: Optional[Tuple[int, int]]  # tracemalloc 的 (当前, 峰值)
+    allocations: Optional[tracemalloc.Snapshot]
+
+
+def deep_sizeof(roots: Iterable[Any], seen: Optional[Set[int]] = None) -> Tuple[int, int]:
+    """roots 可达的对象总大小（字节）和对象数；只深入 dict/list/tuple/set，seen 中的对象不重复计算"""
+    if seen is None:
+        seen = set()
+    size = count = 0
+    stack = list(roots)
+    while stack:
+        obj = stack.pop()
+        if id(obj) in seen:
+            continue
+        seen.add(id(obj))
+        size += sys.getsizeof(obj)
+        count += 1
+        if isinstance(obj, dict):
+            stack.extend(obj.keys())
+            stack.extend(obj.values())
+        elif isinstance(obj, _CONTAINERS):
+            stack.extend(obj)
+    return size, count
+
+
+def process_rss() -> Optional[int]:
+    """进程当前的常驻内存（字节）；不支持的平台返回 None"""
+    try:
+        with open("/proc/self/statm", 'r') as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError, AttributeError):
+        pass
+    try:
+        import resource
+    except ImportError:
+        return None
+    # 取不到当前值时退回峰值（Linux 以 KB 为单位，macOS 以字节为单位）
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+class MemoryAccountant:
+    """子系统登记与快照"""
+
+    def __init__(self):
+        self.subsystems: List[Subsystem] = []
+        # 模块文件名或包名 -> 子系统键，用于把 tracemalloc 的分配位置归到子系统
+        self.module_map: Dict[str, str] = {}
+        # 子系统键 -> 预算（字节）
+        self.budgets: Dict[str, int] = {}
+
+    def register(self, key: str, title: str, roots: Optional[Callable[[], Iterable[Any]]] = None,
+                 native: Optional[Callable[[], int]] = None, modules: Iterable[str] = ()):
+        """登记子系统；共享的对象计在先登记的子系统中"""
+        self.subsystems.append(Subsystem(key, title, roots, native))
+        for module in modules:
+            self.module_map[module] = key
+
+    def measure(self) -> Dict[str, Usage]:
+        """遍历各子系统，返回 {键: 占用}"""
+        seen: Set[int] = set()
+        usage: Dict[str, Usage] = {}
+        for subsystem in self.subsystems:
+            size, count = deep_sizeof(subsystem.roots(), seen) if subsystem.roots else (0, 0)
+            native = subsystem.native() if subsystem.native else 0
+            usage[subsystem.key] = Usage(size, count, native)
+        return usage
+
+    def snapshot(self, label: str = "") -> MemorySnapshot:
+        """拍摄快照；tracemalloc 正在跟踪时同时保存分配快照"""
+        allocations = traced = None
+        if tracemalloc.is_tracing():
+            # 统计本身的分配不计入结果
+            allocations = tracemalloc.take_snapshot().filter_traces((
+                tracemalloc.Filter(False, tracemalloc.__file__),
+                tracemalloc.Filter(False, __file__),
+            ))
+            traced = tracemalloc.get_traced_memory()
+        titles = {subsystem.key: subsystem.title for subsystem in self.subsystems}
+        return MemorySnapshot(label or time.strftime("%H:%M:%S"), time.time(), self.measure(), titles,
+                              process_rss(), traced, allocations)
+
+    def subsystem_of(self, filename: str) -> Optional[str]:
+        """分配位置所在文件对应的子系统"""
+        parts = os.path.normpath(filename).split(os.sep)
+        for part in reversed(parts):
+            key = self.module_map.get(part)
+            if key is not None:
+                return key
+        return None
+
+    def allocations_by_subsystem(self, snapshot: MemorySnapshot) -> Dict[str, int]:
+        """按模块映射汇总 tracemalloc 中仍存活的内存；无法归类的计入 "" 键"""
+        totals: Dict[str, int] = {}
+        if snapshot.allocations is None:
+            return totals
+        for stat in snapshot.allocations.statistics("filename"):
+            key = self.subsystem_of(stat.traceback[0].filename) or ""
+            totals[key] = totals.get(key, 0) + stat.size
+        return totals
+
+    def over_budget(self, snapshot: MemorySnapshot) -> List[str]:
+        """超出预算的子系统说明"""
+        messages = []
+        for key, budget in self.budgets.items():
+            usage = snapshot.usage.get(key)
+            if usage is not None and budget > 0 and usage.total > budget:
+                title = snapshot.titles.get(key, key)
+                messages.append(f"{title}: {format_bytes(usage.total)}，超出预算 {format_bytes(budget)}")
+        return messages
+
+
+def top_allocations(snapshot: MemorySnapshot, previous: Optional[MemorySnapshot] = None,
+                    limit: int = TOP_ALLOCATIONS) -> List[AllocationStat]:
+    """占用最多的分配位置；有上一次快照时按变化量排序"""
+    if snapshot.allocations is None:
+        return []
+    if previous is not None and previous.allocations is not None:
+        stats = snapshot.allocations.compare_to(previous.allocations, "lineno")
+        return [AllocationStat(_where(stat.traceback), stat.size, stat.count, stat.size_diff)
+                for stat in stats[:limit]]
+    return [AllocationStat(_where(stat.traceback), stat.size, stat.count)
+            for stat in snapshot.allocations.statistics("lineno")[:limit]]
+
+
+def _where(traceback: tracemalloc.Traceback) -> str:
+    frame = traceback[0]
+    return f"{os.path.basename(frame.filename)}:{frame.lineno}"
+
+
+def format_bytes(size: float) -> str:
+    """字节数的可读形式"""
+    sign = "-" if size < 0 else ""
+    size = abs(size)
+    for unit in ("B", "KB", "MB"):
+        if size < 1024:
+            return f"{sign}{size:.0f} {unit}" if unit == "B" else f"{sign}{size:.1f} {unit}"
+        size /= 1024
+    return f"{sign}{size:.2f} GB"
+
+
+def report_dict(snapshot: MemorySnapshot, previous: Optional[MemorySnapshot] = None,
+                budgets: Optional[Dict[str, int]] = None,
+                allocations_by_subsystem: Optional[Dict[str, int]] = None) -> Dict[str, Any]:
+    """可导出为 JSON 的报告"""
+    subsystems = []
+    for key, usage in snapshot.usage.items():
+        item = {
+            "key": key, "title": snapshot.titles.get(key, key), "python_bytes": usage.python_bytes,
+            "objects": usage.objects, "native_bytes": usage.native_bytes, "total_bytes": usage.total,
+        }
+        if previous is not None and key in previous.usage:
+            item["delta_bytes"] = usage.total - previous.usage[key].total
+        if budgets and budgets.get(key):
+            item["budget_bytes"] = budgets[key]
+        subsystems.append(item)
+    report: Dict[str, Any] = {
+        "label": snapshot.label,
+        "time": snapshot.time,
+        "rss_bytes": snapshot.rss,
+        "subsystems": subsystems,
+    }
+    if snapshot.traced is not None:
+        report["traced_bytes"], report["traced_peak_bytes"] = snapshot.traced
+        report["allocations_by_subsystem"] = allocations_by_subsystem or {}
+        report["top_allocations"] = [stat._asdict() for stat in top_allocations(snapshot, previous)]
+    if previous is not None:
+        report["previous_label"] = previous.label
+    return report
+
+
+def format_report(report: Dict[str, Any]) -> str:
+    """把报告格式化为文本"""
+    lines = [f"内存统计: {report['label']}"]
+    if report.get("rss_bytes") is not None:
+        lines.append(f"进程常驻内存: {format_bytes(report['rss_bytes'])}")
+    if "traced_bytes" in report:
+        lines.append(f"tracemalloc: 当前 {format_bytes(report['traced_bytes'])}，"
+                     f"峰值 {format_bytes(report['traced_peak_bytes'])}")
+    if "previous_label" in report:
+        lines.append(f"变化相对于: {report['previous_label']}")
+    lines.append("")
+    lines.append(f"{'子系统':<16}{'Python 对象':>14}{'对象数':>10}{'Qt 估算':>12}{'合计':>12}{'变化':>12}{'预算':>12}")
+    for item in report["subsystems"]:
+        delta = format_bytes(item["delta_bytes"]) if "delta_bytes" in item else ""
+        budget = format_bytes(item["budget_bytes"]) if "budget_bytes" in item else ""
+        mark = " !" if "budget_bytes" in item and item["total_bytes"] > item["budget_bytes"] else ""
+        lines.append(f"{item['title']:<16}{format_bytes(item['python_bytes']):>14}{item['objects']:>10}"
+                     f"{format_bytes(item['native_bytes']):>12}{format_bytes(item['total_bytes']):>12}"
+                     f"{delta:>12}{budget:>12}{mark}")
+    if report.get("allocations_by_subsystem"):
+        lines.append("")
+        lines.append("tracemalloc 按模块归类:")
+        titles = {item["key"]: item["title"] for item in report["subsystems"]}
+        for key, size in sorted(report["allocations_by_subsystem"].items(), key=lambda item: -item[1]):
+            lines.append(f"  {titles.get(key, key) or '其他':<16}{format_bytes(size):>12}")
+    if report.get("top_allocations"):
+        lines.append("")
+        lines.append("tracemalloc 分配位置:")
+        for stat in report["top_allocations"]:
+            diff = f"  ({format_bytes(stat['size_diff'])})" if stat["size_diff"] else ""
+            lines.append(f"  {stat['where']:<40}{format_bytes(stat['size']):>12}{stat['count']:>10} 个{diff}")
+    return "\n".join(lines)
+
+
+def load_budgets(path: str) -> Dict[str, int]:
+    """读取预算文件: {"子系统键": MB}，返回以字节为单位的预算"""
+    with open(path, 'r', encoding='utf-8') as f:
+        raw = json.load(f)
+    if not isinstance(raw, dict):
+        raise ValueError("预算文件应为 {\"子系统键\": MB} 形式的对象")
+    return {str(key): int(float(value) * MB) for key, value in raw.items()}
+
+
+def save_budgets(path: str, budgets: Dict[str, int]):
+    """保存预算文件（以 MB 为单位）"""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump({key: round(value / MB, 3) for key, value in budgets.items()}, f, ensure_ascii=False, indent=2)
+
+
+def card_accountant(card: Dict[str, Any]) -> MemoryAccountant:
+    """只统计角色卡数据本身（命令行使用）：世界书、资源、其余字段"""
+    data = card.get("data") if isinstance(card.get("data"), dict) else {}
+    book = data.get("character_book") if isinstance(data.get("character_book"), dict) else {}
+    accountant = MemoryAccountant()
+    accountant.register("lorebook", "世界书", lambda: [book.get("entries") or []])
+    accountant.register("assets", "资源", lambda: [data.get("assets") or []])
+    accountant.register("card", "角色卡数据", lambda: [card])
+    return accountant
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """命令行入口"""
+    parser = argparse.ArgumentParser(description="统计角色卡数据的内存占用并检查预算")
+    parser.add_argument("card", help="角色卡 JSON 文件")
+    parser.add_argument("--budget", action="append", default=[], metavar="KEY=MB",
+                        help="子系统预算（lorebook / assets / card），可重复")
+    parser.add_argument("--budgets", help="预算文件 {\"子系统键\": MB}，可由编辑器的内存统计面板导出")
+    parser.add_argument("--json", action="store_true", help="输出 JSON 报告")
+    args = parser.parse_args(argv)
+
+    budgets: Dict[str, int] = {}
+    try:
+        if args.budgets:
+            budgets.update(load_budgets(args.budgets))
+        for item in args.budget:
+            key, _, value = item.partition("=")
+            budgets[key.strip()] = int(float(value) * MB)
+    except (OSError, ValueError) as e:
+        print(f"预算无效: {e}", file=sys.stderr)
+        return 2
+
+    tracemalloc.start(TRACE_FRAMES)
+    try:
+        with open(args.card, 'r', encoding='utf-8') as f:
+            card = json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"无法读取角色卡: {e}", file=sys.stderr)
+        return 2
+    if not isinstance(card, dict):
+        print("无法读取角色卡: 顶层不是对象", file=sys.stderr)
+        return 2
+    accountant = card_accountant(card)
+    accountant.budgets = budgets
+    snapshot = accountant.snapshot(os.path.basename(args.card))
+    report = report_dict(snapshot, budgets=budgets)
+    tracemalloc.stop()
+
+    print(json.dumps(report, ensure_ascii=False, indent=2) if args.json else format_report(report))
+    violations = accountant.over_budget(snapshot)
+    for message in violations:
+        print(f"超出预算: {message}", file=sys.stderr)
+    return 1 if violations else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
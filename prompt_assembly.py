@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+prompt_assembly.py
+按 SillyTavern 的默认顺序拼出模型最终收到的提示词，用于预览。
+
+顺序：system_prompt → 世界书(角色前) → description / personality / scenario →
+世界书(角色后) → mes_example → 示例聊天（按深度插入的世界书条目）→ post_history_instructions。
+
+每个片段按其来源缓存：字段文本或激活条目集合不变时直接复用上一次的片段，
+世界书激活由 lorebook_activation 增量计算，因此可以在每次编辑后刷新。
+宏（{{char}}、{{user}} 等）由 macros 展开，片段的来源中包含其模板依赖的上下文取值，
+因此只有真正用到角色名、用户名等的片段才会在它们改变时重建。
+"""
+
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Tuple
+
+from lorebook_activation import ActivatedEntry, LorebookActivator, Message
+from macros import MacroContext, compile_template, expand_macros, has_macros
+
+# 作者注释位置 (an_top / an_bottom) 的条目在聊天中的插入深度
+AUTHORS_NOTE_DEPTH = 4
+
+ROLE_LABELS = {"system": "系统", "user": "用户", "assistant": "角色"}
+
+# 示例聊天中可识别的说话人前缀
+_SPEAKERS = {
+    "user": "user", "用户": "user", "{{user}}": "user",
+    "assistant": "assistant", "char": "assistant", "角色": "assistant", "{{char}}": "assistant",
+    "system": "system", "系统": "system",
+}
+
+
+class Segment(NamedTuple):
+    """提示词中的一段"""
+    title: str
+    role: str
+    text: str
+
+
+def parse_sample_chat(text: str) -> List[Message]:
+    """解析示例聊天：每条消息以 "user:" / "char:" 等前缀开头，其余行续接上一条消息"""
+    messages: List[Message] = []
+    for line in text.splitlines():
+        speaker, sep, content = line.partition(":")
+        if not sep:
+            speaker, sep, content = line.partition("：")
+        role = _SPEAKERS.get(speaker.strip().lower()) if sep else None
+        if role is not None:
+            messages.append(Message(role, content.strip()))
+        elif messages:
+            last = messages[-1]
+            messages[-1] = Message(last.role, f"{last.content}\n{line}")
+        elif line.strip():
+            messages.append(Message("user", line))
+    return messages
+
+
+class PromptAssembler:
+    """提示词拼装器，片段按来源缓存"""
+
+    def __init__(self):
+        self.activator = LorebookActivator()
+        # 片段名 -> (来源, 片段)
+        self._segments: Dict[str, Tuple[Any, List[Segment]]] = {}
+        # 最近一次拼装时重建的片段名与激活的条目
+        self.rebuilt: List[str] = []
+        self.activated: List[ActivatedEntry] = []
+        # 宏展开的上下文；为 None 时不展开
+        self.context: Optional[MacroContext] = MacroContext()
+
+    def expand(self, text: str) -> str:
+        """展开片段文本中的宏"""
+        if self.context is None:
+            return text
+        return expand_macros(text, self.context)
+
+    def _source(self, text: str) -> Any:
+        """片段的缓存来源：文本本身及其宏依赖的上下文取值"""
+        if self.context is None or not has_macros(text):
+            return text
+        return text, compile_template(text).signature(self.context)
+
+    def _cached(self, name: str, source: Any, build: Callable[[], List[Segment]]) -> List[Segment]:
+        cached = self._segments.get(name)
+        if cached is not None and cached[0] == source:
+            return cached[1]
+        segments = build()
+        self._segments[name] = (source, segments)
+        self.rebuilt.append(name)
+        return segments
+
+    def _field(self, name: str, title: str, text: Any, role: str = "system") -> List[Segment]:
+        text = text if isinstance(text, str) else ""
+        return self._cached(name, self._source(text), lambda: [Segment(title, role, self.expand(text))] if text.strip() else [])
+
+    def _lore(self, name: str, title: str, entries: List[ActivatedEntry]) -> List[Segment]:
+        source = tuple((item.row, self._source(item.content)) for item in entries)
+        return self._cached(name, source, lambda: [
+            Segment(title, "system", "\n".join(self.expand(item.content) for item in entries))
+        ] if entries else [])
+
+    def assemble(self, data: Dict[str, Any], messages: List[Message]) -> List[Segment]:
+        """拼装提示词；data 为角色卡的 data 对象"""
+        self.rebuilt = []
+        book = data.get("character_book") or {}
+        activated = self.activator.activate(book, messages, self.context) if isinstance(book, dict) else []
+        self.activated = activated
+        by_position: Dict[str, List[ActivatedEntry]] = {}
+        for item in activated:
+            by_position.setdefault(item.position, []).append(item)
+
+        segments: List[Segment] = []
+        segments += self._field("system_prompt", "系统提示", data.get("system_prompt"))
+        segments += self._lore("before_char", "世界书（角色前）", by_position.get("before_char", []))
+        segments += self._lore("before_desc", "世界书（描述前）", by_position.get("before_desc", []))
+        segments += self._field("description", "角色描述", data.get("description"))
+        segments += self._lore("after_desc", "世界书（描述后）", by_position.get("after_desc", []))
+        segments += self._field("personality", "个性", data.get("personality"))
+        segments += self._lore("personality_lore", "世界书（个性）", by_position.get("personality", []))
+        segments += self._field("scenario", "场景设定", data.get("scenario"))
+        segments += self._lore("scenario_lore", "世界书（场景）", by_position.get("scenario", []))
+        segments += self._lore("after_char", "世界书（角色后）", by_position.get("after_char", []))
+        segments += self._lore("em_top", "世界书（示例前）", by_position.get("em_top", []))
+        segments += self._field("mes_example", "示例对话", data.get("mes_example"))
+        segments += self._lore("em_bottom", "世界书（示例后）", by_position.get("em_bottom", []))
+        segments += self._chat(messages, activated)
+        segments += self._field("post_history_instructions", "历史后指令", data.get("post_history_instructions"))
+        return segments
+
+    def _chat(self, messages: List[Message], activated: List[ActivatedEntry]) -> List[Segment]:
+        """聊天消息，并按深度插入 depth / 作者注释位置的条目"""
+        injections: List[Tuple[int, str, ActivatedEntry]] = []
+        for item in activated:
+            if item.position == "depth":
+                injections.append((max(item.depth, 0), item.role, item))
+            elif item.position in ("an_top", "an_bottom"):
+                injections.append((AUTHORS_NOTE_DEPTH, "system", item))
+        source = (
+            tuple((message.role, self._source(message.content)) for message in messages),
+            tuple((depth, role, item.row, self._source(item.content)) for depth, role, item in injections),
+        )
+
+        def build() -> List[Segment]:
+            # 深度 d 表示插在倒数第 d 条消息之前；同一深度、同一角色的条目合并为一条
+            by_depth: Dict[int, Dict[str, List[str]]] = {}
+            for depth, role, item in injections:
+                by_depth.setdefault(min(depth, len(messages)), {}).setdefault(role, []).append(
+                    self.expand(item.content))
+            result: List[Segment] = []
+            for index in range(len(messages) + 1):
+                depth = len(messages) - index
+                for role, texts in by_depth.get(depth, {}).items():
+                    result.append(Segment(f"世界书（深度 {depth}）", role, "\n".join(texts)))
+                if index < len(messages):
+                    message = messages[index]
+                    result.append(Segment("聊天消息", message.role, self.expand(message.content)))
+            return result
+
+        return self._cached("chat", source, build)
+
+
+def format_prompt(segments: List[Segment]) -> str:
+    """把片段格式化为便于阅读的文本"""
+    return "\n\n".join(
+        f"【{ROLE_LABELS.get(segment.role, segment.role)}】{segment.title}\n{segment.text}" for segment in segments
+    )
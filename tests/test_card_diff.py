@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+"""card_diff：差异与三方合并"""
+
+from card_diff import Change, diff_cards, diff_values, merge_cards, merge_string_lists, merge_text, plan_entry_edits
+
+
+def test_string_list_reorder_is_moved():
+    assert diff_values(["a", "b"], ["b", "a"], ("tags",)) == [Change(("tags",), "moved", ["a", "b"], ["b", "a"])]
+
+
+def test_string_list_duplicate_removed():
+    assert diff_values(["a", "a"], ["a"], ("tags",)) == [Change(("tags",), "removed", "a", None)]
+
+
+def test_string_list_duplicate_added_and_other_removed():
+    changes = diff_values(["a", "b"], ["a", "a"], ("tags",))
+    assert changes == [Change(("tags",), "removed", "b", None), Change(("tags",), "added", None, "a")]
+
+
+def test_nested_dict_changes():
+    changes = diff_values({"x": 1, "y": {"z": 2}}, {"y": {"z": 3}, "w": 4})
+    assert Change(("x",), "removed", 1, None) in changes
+    assert Change(("y", "z"), "changed", 2, 3) in changes
+    assert Change(("w",), "added", None, 4) in changes
+
+
+def test_diff_cards_pairs_entries_by_id():
+    old = {"data": {"name": "a", "character_book": {"entries": [
+        {"id": 1, "keys": ["k"], "content": "one"}, {"id": 2, "keys": ["j"], "content": "two"}]}}}
+    new = {"data": {"name": "a", "character_book": {"entries": [
+        {"id": 2, "keys": ["j"], "content": "two"}, {"id": 1, "keys": ["k"], "content": "uno"}]}}}
+    kinds = sorted(change.kind for change in diff_cards(old, new))
+    assert kinds == ["changed", "moved"]
+
+
+def test_merge_text_clean_and_conflict():
+    base = "a\nb\nc\n"
+    assert merge_text(base, "A\nb\nc\n", "a\nb\nC\n") == ("A\nb\nC\n", False)
+    text, conflict = merge_text(base, "a\nX\nc\n", "a\nY\nc\n")
+    assert conflict
+    assert "X\n" in text and "Y\n" in text
+
+
+def test_merge_string_lists():
+    assert merge_string_lists(["a", "b", "c"], ["a", "c", "d"], ["b", "c", "e"]) == ["c", "d", "e"]
+
+
+def test_merge_cards_combines_both_sides():
+    base = {"data": {"name": "n", "description": "d", "character_book": {"entries": [
+        {"id": 1, "keys": ["k"], "content": "c"}]}}}
+    ours = {"data": {"name": "ours", "description": "d", "character_book": {"entries": [
+        {"id": 1, "keys": ["k"], "content": "c"}, {"id": 2, "keys": ["o"], "content": "mine"}]}}}
+    theirs = {"data": {"name": "n", "description": "theirs", "character_book": {"entries": [
+        {"id": 1, "keys": ["k"], "content": "changed"}, {"id": 3, "keys": ["t"], "content": "yours"}]}}}
+    merged, conflicts = merge_cards(base, ours, theirs)
+    assert conflicts == []
+    assert merged["data"]["name"] == "ours"
+    assert merged["data"]["description"] == "theirs"
+    assert [entry["content"] for entry in merged["data"]["character_book"]["entries"]] == ["changed", "mine", "yours"]
+
+
+def test_merge_cards_reports_conflict():
+    base = {"data": {"creation_date": 1}}
+    merged, conflicts = merge_cards(base, {"data": {"creation_date": 2}}, {"data": {"creation_date": 3}})
+    assert merged["data"]["creation_date"] == 2
+    assert [conflict.path for conflict in conflicts] == [("data", "creation_date")]
+
+
+def test_plan_entry_edits_reproduces_target():
+    old = [{"id": i, "content": f"c{i}"} for i in range(6)]
+    new = [dict(old[0]), {"id": 1, "content": "edited"}, old[3], {"id": 9, "content": "new"}, old[4], old[5]]
+    entries = [dict(entry) for entry in old]
+    for edit in plan_entry_edits(old, new):
+        if edit.kind == "update":
+            entries[edit.row] = edit.entries[0]
+        else:
+            entries[edit.row:edit.row + edit.count] = edit.entries
+    assert entries == new
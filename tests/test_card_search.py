@@ -0,0 +1,47 @@
+# -*- coding: utf-8 -*-
+"""card_search：替换与列表字段的集合规则"""
+
+import json
+
+from card_search import SearchOptions, find_matches, replace_in_card, search_library, unique_items
+
+
+def _card():
+    return {"data": {
+        "name": "Alice", "tags": ["cat", "hat", "x"],
+        "character_book": {"entries": [{"keys": ["at", "cat", "c"], "secondary_keys": ["kat"], "content": "a cat"}]},
+    }}
+
+
+def test_unique_items():
+    assert unique_items([" a", "b", "a ", "", "  ", "b", 3]) == ["a", "b", 3]
+
+
+def test_find_matches_counts_all_fields():
+    count, matches = find_matches(_card(), SearchOptions("at"))
+    assert count == 6
+    assert len(matches) == 6
+
+
+def test_replace_dedupes_and_drops_empty_list_items():
+    card = _card()
+    assert replace_in_card(card, SearchOptions("at", "")) == 6
+    assert card["data"]["tags"] == ["c", "h", "x"]
+    entry = card["data"]["character_book"]["entries"][0]
+    assert entry["keys"] == ["c"]
+    assert entry["secondary_keys"] == ["k"]
+    assert entry["content"] == "a c"
+
+
+def test_regex_replacement_with_groups():
+    card = _card()
+    replace_in_card(card, SearchOptions(r"(A)lice", r"\1nna", regex=True))
+    assert card["data"]["name"] == "Anna"
+
+
+def test_search_library_replaces_in_files(tmp_path):
+    path = tmp_path / "card.json"
+    path.write_text(json.dumps({"data": {"tags": ["x", "y"]}}), encoding="utf-8")
+    [result] = search_library([str(tmp_path)], SearchOptions("x", "y"), replace=True)
+    assert (result.count, result.replaced, result.error) == (1, 1, "")
+    assert json.loads(path.read_text(encoding="utf-8"))["data"]["tags"] == ["y"]
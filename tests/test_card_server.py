@@ -0,0 +1,32 @@
+# -*- coding: utf-8 -*-
+"""card_server：重新读取角色卡时沿用未变化的条目"""
+
+import copy
+
+from card_server import CardState
+
+
+def _card(count):
+    return {"spec": "chara_card_v2", "data": {"name": "x", "character_book": {"entries": [
+        {"keys": [f"key{i}"], "content": f"c{i}", "enabled": True} for i in range(count)]}}}
+
+
+def test_replace_keeps_unchanged_entry_objects():
+    state = CardState("card.json")
+    state.replace(_card(50), None)
+    old = list(state.entries)
+    card = copy.deepcopy(_card(50))
+    card["data"]["character_book"]["entries"][7]["content"] = "edited"
+    state.replace(card, None)
+    same = [row for row in range(50) if state.entries[row] is old[row]]
+    assert same == [row for row in range(50) if row != 7]
+
+
+def test_replace_after_deletion_keeps_surrounding_entries():
+    state = CardState("card.json")
+    state.replace(_card(20), None)
+    old = list(state.entries)
+    card = copy.deepcopy(_card(20))
+    del card["data"]["character_book"]["entries"][3]
+    state.replace(card, None)
+    assert all(new is previous for new, previous in zip(state.entries, old[:3] + old[4:]))
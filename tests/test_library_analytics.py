@@ -0,0 +1,9 @@
+# -*- coding: utf-8 -*-
+"""library_analytics：指标提取"""
+
+from library_analytics import card_metrics
+
+
+def test_tags_counted_once_per_card():
+    card = {"data": {"name": "a", "tags": ["x", "x", "", 3, "y"]}}
+    assert card_metrics(None, card).tags == ["x", "y"]
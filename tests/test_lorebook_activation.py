@@ -0,0 +1,36 @@
+# -*- coding: utf-8 -*-
+"""lorebook_activation：关键字分类与激活索引的增量更新"""
+
+from lorebook_activation import ActivationIndex, LorebookActivator, Message, needs_regex
+
+
+def test_needs_regex():
+    assert needs_regex("/dra.on/i", False)
+    assert needs_regex("dra.on", True)
+    assert not needs_regex("dra.on", False)
+    assert not needs_regex("red dragon", True)
+    assert not needs_regex("well-known", True)
+
+
+def test_index_only_registers_changed_entries():
+    entries = [{"keys": [f"key{i}"], "content": str(i)} for i in range(100)]
+    index = ActivationIndex()
+    assert index.update(entries)
+    assert not index.update(entries)
+    registered = []
+    original = index._register
+    index._register = lambda entry, snapshot: (registered.append(entry), original(entry, snapshot))
+    entries[5] = {"keys": ["other"], "content": "5"}
+    assert index.update(entries)
+    assert registered == [entries[5]]
+
+
+def test_activation_by_keyword():
+    book = {"entries": [
+        {"keys": ["dragon"], "content": "龙的设定", "enabled": True, "insertion_order": 1},
+        {"keys": ["elf"], "content": "精灵的设定", "enabled": True, "insertion_order": 2},
+        {"keys": ["drag.n"], "use_regex": True, "content": "正则", "enabled": True, "insertion_order": 3},
+    ]}
+    activator = LorebookActivator()
+    rows = [entry.row for entry in activator.activate(book, [Message("user", "A Dragon appears")])]
+    assert rows == [0, 2]
@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+"""lorebook_analysis：近似重复聚类与关键字重叠的增量索引"""
+
+import random
+
+from lorebook_analysis import DuplicateIndex, KeyOverlapIndex, LorebookAnalyzer, find_key_overlaps
+
+
+def _overlap_set(overlaps):
+    return sorted((o.key, o.other_key, o.kind, tuple(o.rows), tuple(o.other_rows)) for o in overlaps)
+
+
+def test_duplicates_clustered_and_unique_content_not():
+    text = "巨龙守护着山顶的宝藏，只有勇者才能进入洞穴。" * 3
+    entries = [{"content": text}, {"content": text + "。"}, {"content": "完全不同的另一段内容，讲述海边的小镇。"}]
+    index = DuplicateIndex()
+    index.update(entries)
+    assert index.clusters(entries) == [[0, 1]]
+
+
+def test_pairs_not_similar_to_bucket_head_are_found():
+    # 同一个桶里：1、2 彼此几乎相同，但都与 0 不够相似
+    index = DuplicateIndex(threshold=0.9)
+    entries = [{"content": "a"}, {"content": "b"}, {"content": "c"}]
+    near = tuple(range(64))
+    signatures = {id(entries[0]): near[:32] + tuple(-1 - i for i in range(32)),
+                  id(entries[1]): near, id(entries[2]): near[:-1] + (-99,)}
+    for entry in entries:
+        index._cache[id(entry)] = (entry, entry["content"], signatures[id(entry)])
+    index._buckets = {(0, 0): {id(entry): None for entry in entries}}
+    assert index.clusters(entries) == [[1, 2]]
+
+
+def test_update_only_recomputes_changed_entries():
+    entries = [{"content": f"条目内容 {i} " * 5} for i in range(20)]
+    index = DuplicateIndex()
+    assert index.update(entries) == 20
+    entries[3] = {"content": "新的内容" * 5}
+    assert index.update(entries) == 1
+
+
+def test_key_overlaps():
+    entries = [{"keys": ["dragon"]}, {"keys": ["Dragon King"]}, {"keys": ["dragon"]}, {"keys": ["king"]}]
+    overlaps = _overlap_set(find_key_overlaps(entries))
+    assert ("dragon", "dragon", "same", (0, 2), (0, 2)) in overlaps
+    assert ("dragon", "dragon king", "prefix", (0, 2), (1,)) in overlaps
+    assert ("king", "dragon king", "substring", (3,), (1,)) in overlaps
+
+
+def test_regex_keys_ignored():
+    entries = [{"keys": ["/drag.n/"]}, {"keys": ["drag.n", "dragon"], "use_regex": True}, {"keys": ["dragonfly"]}]
+    overlaps = _overlap_set(find_key_overlaps(entries))
+    assert overlaps == [("dragon", "dragonfly", "prefix", (1,), (2,))]
+
+
+def test_incremental_key_overlaps_match_full_scan():
+    rng = random.Random(7)
+
+    def key():
+        return "".join(rng.choice("abcd") for _ in range(rng.randint(1, 4)))
+
+    entries = [{"keys": [key() for _ in range(rng.randint(0, 3))]} for _ in range(60)]
+    analyzer = LorebookAnalyzer()
+    for _ in range(120):
+        result = analyzer.analyze(entries)
+        assert _overlap_set(result.key_overlaps) == _overlap_set(find_key_overlaps(entries))
+        choice = rng.random()
+        if choice < 0.5:
+            row = rng.randrange(len(entries))
+            entries[row] = dict(entries[row], keys=[key() for _ in range(rng.randint(0, 3))])
+        elif choice < 0.75:
+            entries.insert(rng.randrange(len(entries) + 1), {"keys": [key()]})
+        else:
+            del entries[rng.randrange(len(entries))]
+
+
+def test_key_overlap_update_counts_changed_entries():
+    entries = [{"keys": [f"key{i}"]} for i in range(50)]
+    index = KeyOverlapIndex()
+    assert index.update(entries) == 50
+    assert index.update(entries) == 0
+    entries[10] = {"keys": ["key1"]}
+    assert index.update(entries) == 1
+    assert ("key1", "key10", "prefix") not in {(o.key, o.other_key, o.kind) for o in index.overlaps(entries)}
@@ -0,0 +1,60 @@
+# -*- coding: utf-8 -*-
+"""lorebook_columns：筛选表达式与排序"""
+
+import pytest
+
+from field_binding import MISSING
+from lorebook_columns import ColumnStore, write_column
+
+ENTRIES = [
+    {"comment": "火焰城堡", "keys": ["fire"], "enabled": True, "extensions": {"depth": 2, "group": "战斗"}},
+    {"comment": "冰雪", "keys": ["ice", "snow"], "enabled": False, "extensions": {"depth": 6}},
+    {"comment": "森林", "keys": ["tree"], "content": "x" * 100 + "隐藏的宝藏\n第二行",
+     "extensions": {"depth": 4, "scan_depth": 3}},
+]
+
+
+@pytest.fixture
+def store():
+    return ColumnStore([dict(entry) for entry in ENTRIES])
+
+
+def test_numeric_and_bool_conditions(store):
+    assert store.filter_rows("depth>=4") == [1, 2]
+    assert store.filter_rows("depth>=4 enabled=true") == [2]
+    assert store.filter_rows("depth!=4") == [0, 1]
+
+
+def test_contains_and_plain_terms(store):
+    assert store.filter_rows("group~战") == [0]
+    assert store.filter_rows("snow") == [1]
+    assert store.filter_rows("城堡") == [0]
+
+
+def test_contains_matches_full_content(store):
+    assert store.filter_rows("content~宝藏") == [2]
+    assert store.filter_rows('"content~宝藏\n第二"') == [2]
+
+
+def test_invalid_expressions(store):
+    with pytest.raises(ValueError):
+        store.filter_rows("nosuch=1")
+    with pytest.raises(ValueError):
+        store.filter_rows("depth>=abc")
+    with pytest.raises(ValueError):
+        store.filter_rows('"unterminated')
+
+
+def test_sort_keeps_missing_last(store):
+    assert store.sort_rows([0, 1, 2], "scan_depth") == [2, 0, 1]
+    assert store.sort_rows([0, 1, 2], "scan_depth", descending=True) == [2, 0, 1]
+    assert store.sort_rows([0, 1, 2], "depth", descending=True) == [1, 2, 0]
+
+
+def test_write_column_returns_old_values(store):
+    old = write_column(store.entries, ("extensions", "depth"), [0, 1], [9, MISSING])
+    assert old == [2, 6]
+    assert store.entries[0]["extensions"]["depth"] == 9
+    assert "depth" not in store.entries[1]["extensions"]
+    store.refresh_rows([0, 1])
+    assert store.filter_rows("depth=9") == [0]
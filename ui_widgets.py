@@ -6,19 +6,46 @@ ui_widgets.py
 包含应用中可重用的PySide6 UI控件。
 """
 
-from typing import Any, Dict, List, Optional
+import json
+from typing import Any, Dict, Iterable, List, Optional
 
-from PySide6.QtCore import Qt
+from PySide6.QtCore import Qt, QAbstractListModel, QModelIndex, QObject, Signal
 from PySide6.QtGui import QFont
 from PySide6.QtWidgets import (
     QWidget, QVBoxLayout, QHBoxLayout, QLabel, QLineEdit,
-    QTextEdit, QPushButton, QListWidget, QListWidgetItem,
-    QTabWidget, QGroupBox, QDialog
+    QTextEdit, QPlainTextEdit, QPushButton, QListWidget, QListView,
+    QTabWidget, QGroupBox, QDialog, QFileDialog, QCheckBox, QMessageBox
 )
 
+from card_search import unique_items
+from macros import MacroContext, expand_macros
+from PlainTextEditor import PlainTextEditor
+
+# 校验问题在控件上的标记颜色
+ERROR_COLOR = "#d9534f"
+WARNING_COLOR = "#f0ad4e"
+
+
+def mark_field(widget: QWidget, messages: List[str], is_error: bool = True):
+    """在控件上标出校验问题（彩色边框 + 提示文字），messages 为空时清除标记"""
+    if messages:
+        color = ERROR_COLOR if is_error else WARNING_COLOR
+        style = f"{type(widget).__name__} {{ border: 1px solid {color}; }}"
+        # 重新设置样式表会让控件重新计算样式，标记未变时跳过
+        if widget.styleSheet() != style:
+            widget.setStyleSheet(style)
+        widget.setToolTip("\n".join(messages))
+    elif widget.toolTip():
+        widget.setStyleSheet("")
+        widget.setToolTip("")
+
+
 class MarkdownEditorWidget(QWidget):
     """Markdown编辑器，带有编辑和预览选项卡"""
-    
+
+    # 预览中展开宏时使用的上下文，所有编辑器共用，由主窗口随角色卡更新
+    macro_context = MacroContext()
+
     def __init__(self, placeholder_text: str = ""):
         super().__init__()
         self.placeholder_text = placeholder_text
@@ -33,19 +60,22 @@ class MarkdownEditorWidget(QWidget):
         # 编辑选项卡
         self.edit_tab = QWidget()
         edit_layout = QVBoxLayout(self.edit_tab)
-        self.edit_text = QTextEdit()
-        self.edit_text.setPlaceholderText(self.placeholder_text)
-        self.edit_text.textChanged.connect(self.update_preview)
+        self.edit_text = PlainTextEditor(self.placeholder_text)
         edit_layout.addWidget(self.edit_text)
         self.tab_widget.addTab(self.edit_tab, "编辑")
         
         # 预览选项卡
         self.preview_tab = QWidget()
         preview_layout = QVBoxLayout(self.preview_tab)
+        self.expand_macros_check = QCheckBox("展开宏")
+        self.expand_macros_check.toggled.connect(self.update_preview)
+        preview_layout.addWidget(self.expand_macros_check)
         self.preview_text = QTextEdit()
         self.preview_text.setReadOnly(True)
         preview_layout.addWidget(self.preview_text)
         self.tab_widget.addTab(self.preview_tab, "预览")
+        # 切换到预览时按最新的上下文重新展开
+        self.tab_widget.currentChanged.connect(self.update_preview)
         
         layout.addWidget(self.tab_widget)
         
@@ -59,23 +89,263 @@ class MarkdownEditorWidget(QWidget):
         return self.edit_text.toPlainText()
         
     def update_preview(self):
-        """更新Markdown预览"""
+        """更新Markdown预览（只在预览选项卡可见时渲染，切换过去时再按最新内容渲染）"""
+        if self.tab_widget.currentWidget() is not self.preview_tab:
+            return
         from markdown import markdown
         try:
             md_text = self.edit_text.toPlainText()
+            if self.expand_macros_check.isChecked():
+                md_text = expand_macros(md_text, self.macro_context)
             html = markdown(md_text)
             self.preview_text.setHtml(html)
         except Exception as e:
             self.preview_text.setPlainText(f"渲染错误: {str(e)}")
 
 
+class OrderedSetListModel(QAbstractListModel):
+    """带有序集合索引的字符串列表模型
+
+    成员检查通过计数字典完成 (O(1))，增删改只通知受影响的行，
+    显示文本在视图请求时才按需截断，不再整表重建。
+    每次编辑都会发出 rows_edited(行号, 删除的项, 插入的项)，供撤销历史记录。
+    """
+
+    rows_edited = Signal(int, list, list)
+
+    def __init__(self, items: Optional[List[str]] = None, preview_length: int = 0,
+                 editable: bool = False, parent: Optional[QObject] = None):
+        super().__init__(parent)
+        self.preview_length = preview_length
+        self.editable = editable
+        self._items: List[str] = []
+        self._counts: Dict[str, int] = {}
+        self.set_items(items or [])
+
+    def rowCount(self, parent: QModelIndex = QModelIndex()) -> int:
+        return 0 if parent.isValid() else len(self._items)
+
+    def data(self, index: QModelIndex, role: int = Qt.ItemDataRole.DisplayRole) -> Any:
+        if not index.isValid() or not 0 <= index.row() < len(self._items):
+            return None
+        text = self._items[index.row()]
+        if role == Qt.ItemDataRole.DisplayRole:
+            # 显示前 preview_length 个字符作为预览
+            if self.preview_length and len(text) > self.preview_length:
+                return text[:self.preview_length] + "..."
+            return text
+        if role == Qt.ItemDataRole.EditRole:
+            return text
+        return None
+
+    def flags(self, index: QModelIndex) -> Qt.ItemFlag:
+        flags = super().flags(index)
+        if self.editable and index.isValid():
+            flags |= Qt.ItemFlag.ItemIsEditable
+        return flags
+
+    def setData(self, index: QModelIndex, value: Any, role: int = Qt.ItemDataRole.EditRole) -> bool:
+        if role != Qt.ItemDataRole.EditRole or not index.isValid():
+            return False
+        return self.replace(index.row(), str(value).strip())
+
+    def __contains__(self, text: str) -> bool:
+        return text in self._counts
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def set_items(self, items: List[str]):
+        """整体替换列表内容（加载数据时使用）"""
+        self.beginResetModel()
+        self._items = [str(item) for item in items]
+        self._counts = {}
+        for text in self._items:
+            self._counts[text] = self._counts.get(text, 0) + 1
+        self.endResetModel()
+
+    def get_items(self) -> List[str]:
+        """获取所有项目的副本"""
+        return self._items.copy()
+
+    def item(self, row: int) -> str:
+        return self._items[row]
+
+    def append(self, text: str) -> bool:
+        """追加一项，重复或空文本返回 False"""
+        if not text or text in self._counts:
+            return False
+        row = len(self._items)
+        self.beginInsertRows(QModelIndex(), row, row)
+        self._items.append(text)
+        self._counts[text] = 1
+        self.endInsertRows()
+        self.rows_edited.emit(row, [], [text])
+        return True
+
+    def extend(self, texts: Iterable[str]) -> int:
+        """批量追加，只发出一次插入通知，返回实际添加的数量"""
+        pending: Dict[str, None] = {}
+        for text in texts:
+            text = str(text).strip()
+            if text and text not in self._counts:
+                pending[text] = None
+        if not pending:
+            return 0
+        first = len(self._items)
+        self.beginInsertRows(QModelIndex(), first, first + len(pending) - 1)
+        for text in pending:
+            self._items.append(text)
+            self._counts[text] = 1
+        self.endInsertRows()
+        self.rows_edited.emit(first, [], list(pending))
+        return len(pending)
+
+    def assign(self, texts: Iterable[str]) -> bool:
+        """按集合规则（见 card_search.unique_items）改写整个列表，只替换有变化的区间，返回列表是否改变"""
+        items = unique_items(str(text) for text in texts)
+        old_items = self._items
+        if items == old_items:
+            return False
+        start = 0
+        limit = min(len(items), len(old_items))
+        while start < limit and items[start] == old_items[start]:
+            start += 1
+        end = 0
+        while end < limit - start and items[-1 - end] == old_items[-1 - end]:
+            end += 1
+        self.splice(start, len(old_items) - start - end, items[start:len(items) - end])
+        return True
+
+    def remove_row(self, row: int) -> bool:
+        """按行删除"""
+        if not 0 <= row < len(self._items):
+            return False
+        self.beginRemoveRows(QModelIndex(), row, row)
+        text = self._items.pop(row)
+        self._discard(text)
+        self.endRemoveRows()
+        self.rows_edited.emit(row, [text], [])
+        return True
+
+    def replace(self, row: int, text: str) -> bool:
+        """替换某一行的文本，只刷新该行"""
+        if not 0 <= row < len(self._items):
+            return False
+        old_text = self._items[row]
+        if text == old_text:
+            return True
+        if not text or text in self._counts:
+            return False
+        self._discard(old_text)
+        self._items[row] = text
+        self._counts[text] = 1
+        index = self.index(row)
+        self.dataChanged.emit(index, index)
+        self.rows_edited.emit(row, [old_text], [text])
+        return True
+
+    def splice(self, row: int, count: int, texts: List[str]):
+        """用 texts 替换从 row 开始的 count 行（不做去重，供撤销/重做回放）"""
+        removed = self._items[row:row + count]
+        if count == len(texts) == 1:
+            self._discard(removed[0])
+            self._items[row] = texts[0]
+            self._counts[texts[0]] = self._counts.get(texts[0], 0) + 1
+            index = self.index(row)
+            self.dataChanged.emit(index, index)
+        else:
+            if count:
+                self.beginRemoveRows(QModelIndex(), row, row + count - 1)
+                del self._items[row:row + count]
+                for text in removed:
+                    self._discard(text)
+                self.endRemoveRows()
+            if texts:
+                self.beginInsertRows(QModelIndex(), row, row + len(texts) - 1)
+                self._items[row:row] = texts
+                for text in texts:
+                    self._counts[text] = self._counts.get(text, 0) + 1
+                self.endInsertRows()
+        self.rows_edited.emit(row, removed, list(texts))
+
+    def _discard(self, text: str):
+        count = self._counts.get(text, 0)
+        if count <= 1:
+            self._counts.pop(text, None)
+        else:
+            self._counts[text] = count - 1
+
+
+class BulkImportDialog(QDialog):
+    """批量粘贴/导入对话框"""
+
+    def __init__(self, title: str, hint: str, parent: Optional[QWidget] = None):
+        super().__init__(parent)
+        self.setWindowTitle(title)
+        self.setModal(True)
+        self.setMinimumSize(500, 400)
+
+        layout = QVBoxLayout(self)
+        layout.addWidget(QLabel(hint))
+
+        self.text_edit = QPlainTextEdit()
+        layout.addWidget(self.text_edit)
+
+        button_layout = QHBoxLayout()
+        file_btn = QPushButton("从文件导入")
+        file_btn.clicked.connect(self.load_from_file)
+        ok_btn = QPushButton("确定")
+        ok_btn.clicked.connect(self.accept)
+        cancel_btn = QPushButton("取消")
+        cancel_btn.clicked.connect(self.reject)
+        button_layout.addWidget(file_btn)
+        button_layout.addStretch()
+        button_layout.addWidget(ok_btn)
+        button_layout.addWidget(cancel_btn)
+        layout.addLayout(button_layout)
+
+    def load_from_file(self):
+        """将文件内容读入文本框"""
+        file_path, _ = QFileDialog.getOpenFileName(
+            self, "导入文件", "", "Text/JSON files (*.txt *.json);;All files (*.*)"
+        )
+        if file_path:
+            with open(file_path, 'r', encoding='utf-8') as f:
+                self.text_edit.setPlainText(f.read())
+
+    def get_texts(self, separator: str = "") -> List[str]:
+        """解析输入：JSON 字符串数组原样使用，否则按行（或按分隔行）拆分"""
+        raw = self.text_edit.toPlainText()
+        stripped = raw.strip()
+        if stripped.startswith("["):
+            try:
+                parsed = json.loads(stripped)
+                if isinstance(parsed, list):
+                    return [str(item) for item in parsed]
+            except ValueError:
+                pass
+        if not separator:
+            return raw.splitlines()
+        chunks: List[str] = []
+        current: List[str] = []
+        for line in raw.splitlines():
+            if line.strip() == separator:
+                chunks.append("\n".join(current))
+                current = []
+            else:
+                current.append(line)
+        chunks.append("\n".join(current))
+        return chunks
+
+
 class TagListWidget(QWidget):
     """标签列表编辑器"""
     
     def __init__(self, title: str, items: Optional[List[str]] = None):
         super().__init__()
         self.title = title
-        self.items = items or []
+        self.model = OrderedSetListModel(items, editable=True, parent=self)
         self.setup_ui()
         
     def setup_ui(self):
@@ -93,65 +363,62 @@ class TagListWidget(QWidget):
         add_btn = QPushButton("添加")
         add_btn.clicked.connect(self.add_item)
         self.new_item_edit.returnPressed.connect(self.add_item)
+        bulk_btn = QPushButton("批量添加")
+        bulk_btn.clicked.connect(self.bulk_add_items)
         
         add_layout.addWidget(self.new_item_edit)
         add_layout.addWidget(add_btn)
+        add_layout.addWidget(bulk_btn)
         layout.addLayout(add_layout)
         
-        # 列表
-        self.list_widget = QListWidget()
-        self.list_widget.itemDoubleClicked.connect(self.edit_item)
-        layout.addWidget(self.list_widget)
+        # 列表（双击直接编辑）
+        self.list_view = QListView()
+        self.list_view.setUniformItemSizes(True)
+        self.list_view.setModel(self.model)
+        layout.addWidget(self.list_view)
         
         # 删除按钮
         remove_btn = QPushButton("删除选中项")
         remove_btn.clicked.connect(self.remove_item)
         layout.addWidget(remove_btn)
         
-        # 加载现有项目
-        self.load_items()
-        
-    def load_items(self):
-        """加载现有项目"""
-        self.list_widget.clear()
-        for item in self.items:
-            self.list_widget.addItem(str(item))
+    def set_items(self, items: List[str]):
+        """加载项目"""
+        self.model.set_items(items)
             
     def add_item(self):
         """添加新项目"""
         text = self.new_item_edit.text().strip()
-        if text and text not in self.items:
-            self.items.append(text)
-            self.list_widget.addItem(text)
+        if self.model.append(text):
             self.new_item_edit.clear()
             
+    def bulk_add_items(self):
+        """批量粘贴/导入项目，每行一个"""
+        dialog = BulkImportDialog(f"批量添加{self.title}", "每行一个，或粘贴 JSON 字符串数组:", self)
+        if dialog.exec():
+            self.model.extend(dialog.get_texts())
+            
     def remove_item(self):
         """删除选中项目"""
-        current_item = self.list_widget.currentItem()
-        if current_item:
-            text = current_item.text()
-            if text in self.items:
-                self.items.remove(text)
-            self.list_widget.takeItem(self.list_widget.row(current_item))
-            
-    def edit_item(self, item: QListWidgetItem):
-        """编辑项目"""
-        old_text = item.text()
-        new_text, ok = QLineEdit().text(), True  # 简化的编辑
-        # 这里可以添加更复杂的编辑对话框
+        current = self.list_view.currentIndex()
+        if current.isValid():
+            self.model.remove_row(current.row())
         
     def get_items(self) -> List[str]:
         """获取所有项目"""
-        return self.items.copy()
+        return self.model.get_items()
 
 
 class MarkdownTagListWidget(QWidget):
     """支持Markdown的标签列表编辑器"""
     
+    # 批量导入纯文本时用于分隔各项的独立行
+    BULK_SEPARATOR = "==="
+    
     def __init__(self, title: str, items: Optional[List[str]] = None):
         super().__init__()
         self.title = title
-        self.items = items or []
+        self.model = OrderedSetListModel(items, preview_length=100, parent=self)
         self.setup_ui()
         
     def setup_ui(self):
@@ -169,16 +436,23 @@ class MarkdownTagListWidget(QWidget):
         self.new_item_editor = MarkdownEditorWidget(f"添加新的{self.title}")
         add_layout.addWidget(self.new_item_editor)
         
+        add_button_layout = QHBoxLayout()
         add_btn = QPushButton("添加")
         add_btn.clicked.connect(self.add_item)
-        add_layout.addWidget(add_btn)
+        bulk_btn = QPushButton("批量导入")
+        bulk_btn.clicked.connect(self.bulk_add_items)
+        add_button_layout.addWidget(add_btn)
+        add_button_layout.addWidget(bulk_btn)
+        add_layout.addLayout(add_button_layout)
         
         layout.addWidget(add_group)
         
         # 列表
-        self.list_widget = QListWidget()
-        self.list_widget.itemDoubleClicked.connect(self.edit_item)
-        layout.addWidget(self.list_widget)
+        self.list_view = QListView()
+        self.list_view.setUniformItemSizes(True)
+        self.list_view.setModel(self.model)
+        self.list_view.doubleClicked.connect(self.edit_item)
+        layout.addWidget(self.list_view)
         
         # 编辑/删除按钮区域
         button_layout = QHBoxLayout()
@@ -193,36 +467,36 @@ class MarkdownTagListWidget(QWidget):
         
         layout.addLayout(button_layout)
         
-        # 加载现有项目
-        self.load_items()
-        
-    def load_items(self):
-        """加载现有项目"""
-        self.list_widget.clear()
-        for item in self.items:
-            # 显示前100个字符作为预览
-            preview = item[:100] + "..." if len(item) > 100 else item
-            self.list_widget.addItem(preview)
+    def set_items(self, items: List[str]):
+        """加载项目"""
+        self.model.set_items(items)
             
     def add_item(self):
         """添加新项目"""
         text = self.new_item_editor.toPlainText().strip()
-        if text and text not in self.items:
-            self.items.append(text)
-            self.load_items()
+        if self.model.append(text):
             self.new_item_editor.setPlainText("")
             
+    def bulk_add_items(self):
+        """批量粘贴/导入项目"""
+        dialog = BulkImportDialog(
+            f"批量导入{self.title}",
+            f"粘贴 JSON 字符串数组，或用单独一行 \"{self.BULK_SEPARATOR}\" 分隔各项:",
+            self
+        )
+        if dialog.exec():
+            self.model.extend(dialog.get_texts(self.BULK_SEPARATOR))
+            
     def remove_item(self):
         """删除选中项目"""
-        current_row = self.list_widget.currentRow()
-        if current_row >= 0:
-            del self.items[current_row]
-            self.load_items()
+        current = self.list_view.currentIndex()
+        if current.isValid():
+            self.model.remove_row(current.row())
             
     def edit_selected_item(self):
         """编辑选中项目"""
-        current_row = self.list_widget.currentRow()
-        if current_row >= 0 and current_row < len(self.items):
+        current_row = self.list_view.currentIndex().row()
+        if current_row >= 0 and current_row < len(self.model):
             # 创建编辑对话框
             dialog = QDialog(self)
             dialog.setWindowTitle(f"编辑{self.title}")
@@ -232,7 +506,7 @@ class MarkdownTagListWidget(QWidget):
             layout = QVBoxLayout(dialog)
             
             editor = MarkdownEditorWidget()
-            editor.setPlainText(self.items[current_row])
+            editor.setPlainText(self.model.item(current_row))
             layout.addWidget(editor)
             
             button_layout = QHBoxLayout()
@@ -240,8 +514,14 @@ class MarkdownTagListWidget(QWidget):
             cancel_btn = QPushButton("取消")
             
             def save_changes():
-                self.items[current_row] = editor.toPlainText()
-                self.load_items()
+                text = editor.toPlainText().strip()
+                if not text:
+                    QMessageBox.warning(dialog, "错误", f"{self.title}不能为空")
+                    return
+                if not self.model.replace(current_row, text):
+                    # 与其他项重复时保持对话框打开，修改不会丢失
+                    QMessageBox.warning(dialog, "错误", f"已存在相同的{self.title}")
+                    return
                 dialog.accept()
                 
             save_btn.clicked.connect(save_changes)
@@ -253,18 +533,21 @@ class MarkdownTagListWidget(QWidget):
             
             dialog.exec()
             
-    def edit_item(self, item: QListWidgetItem):
+    def edit_item(self, index: QModelIndex):
         """双击编辑项目"""
         self.edit_selected_item()
         
     def get_items(self) -> List[str]:
         """获取所有项目"""
-        return self.items.copy()
+        return self.model.get_items()
 
 
 class AssetsWidget(QWidget):
     """资源文件编辑器"""
     
+    # 资源列表变更: (行号, 删除的资源, 插入的资源)
+    assets_edited = Signal(int, list, list)
+    
     def __init__(self, assets: Optional[List[Dict[str, str]]] = None):
         super().__init__()
         self.assets = assets or []
@@ -318,8 +601,20 @@ class AssetsWidget(QWidget):
         """加载资源列表"""
         self.assets_list.clear()
         for asset in self.assets:
-            display_text = f"{asset.get('type', '')}: {asset.get('name', '')} ({asset.get('uri', '')})"
-            self.assets_list.addItem(display_text)
+            self.assets_list.addItem(self._display_text(asset))
+            
+    def _display_text(self, asset: Dict[str, str]) -> str:
+        return f"{asset.get('type', '')}: {asset.get('name', '')} ({asset.get('uri', '')})"
+        
+    def splice(self, row: int, count: int, assets: List[Dict[str, str]]):
+        """用 assets 替换从 row 开始的 count 个资源，只更新受影响的行"""
+        removed = self.assets[row:row + count]
+        self.assets[row:row + count] = assets
+        for _ in range(count):
+            self.assets_list.takeItem(row)
+        for offset, asset in enumerate(assets):
+            self.assets_list.insertItem(row + offset, self._display_text(asset))
+        self.assets_edited.emit(row, removed, list(assets))
             
     def add_asset(self):
         """添加资源"""
@@ -335,8 +630,7 @@ class AssetsWidget(QWidget):
                 "name": name,
                 "ext": ext
             }
-            self.assets.append(asset)
-            self.load_assets()
+            self.splice(len(self.assets), 0, [asset])
             
             # 清空输入框
             self.type_edit.clear()
@@ -348,8 +642,7 @@ class AssetsWidget(QWidget):
         """删除资源"""
         current_row = self.assets_list.currentRow()
         if current_row >= 0:
-            del self.assets[current_row]
-            self.load_assets()
+            self.splice(current_row, 1, [])
             
     def get_assets(self) -> List[Dict[str, str]]:
         """获取资源列表"""
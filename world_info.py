@@ -0,0 +1,372 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+world_info.py
+SillyTavern 世界书（World Info）与角色卡 character_book 之间的流式导入/导出。
+
+SillyTavern 的世界书文件是 {"entries": {"<uid>": {key, keysecondary, uid, order, disable, ...}}}，
+与 character_book 的条目结构不同。这里逐条读取、逐条转换、逐条写出，
+不会把整个文件解析成一棵树，数万条目的世界书也只占用单个条目的内存。
+
+命令行用法:
+    python world_info.py to-book world.json -o book.json      # 世界书 -> character_book
+    python world_info.py to-world card_or_book.json -o world.json  # 角色卡/character_book -> 世界书
+"""
+
+import argparse
+import json
+import re
+import sys
+from typing import Any, Dict, Iterator, List, Optional, TextIO, Tuple
+
+# 读取缓冲区大小
+CHUNK_SIZE = 1 << 20
+
+_WHITESPACE = re.compile(r'[ \t\r\n]*')
+
+# (世界书字段, character_book 字段路径, 默认值)
+FIELD_MAP: List[Tuple[str, Tuple[str, ...], Any]] = [
+    ("key", ("keys",), []),
+    ("keysecondary", ("secondary_keys",), []),
+    ("comment", ("comment",), ""),
+    ("content", ("content",), ""),
+    ("constant", ("constant",), False),
+    ("selective", ("selective",), True),
+    ("order", ("insertion_order",), 100),
+    ("position", ("extensions", "position"), 0),
+    ("excludeRecursion", ("extensions", "exclude_recursion"), False),
+    ("displayIndex", ("extensions", "display_index"), 0),
+    ("probability", ("extensions", "probability"), 100),
+    ("useProbability", ("extensions", "useProbability"), True),
+    ("depth", ("extensions", "depth"), 4),
+    ("selectiveLogic", ("extensions", "selectiveLogic"), 0),
+    ("group", ("extensions", "group"), ""),
+    ("groupOverride", ("extensions", "group_override"), False),
+    ("groupWeight", ("extensions", "group_weight"), 100),
+    ("preventRecursion", ("extensions", "prevent_recursion"), False),
+    ("delayUntilRecursion", ("extensions", "delay_until_recursion"), False),
+    ("scanDepth", ("extensions", "scan_depth"), None),
+    ("matchWholeWords", ("extensions", "match_whole_words"), None),
+    ("useGroupScoring", ("extensions", "use_group_scoring"), False),
+    ("caseSensitive", ("extensions", "case_sensitive"), None),
+    ("automationId", ("extensions", "automation_id"), ""),
+    ("role", ("extensions", "role"), 0),
+    ("vectorized", ("extensions", "vectorized"), False),
+    ("sticky", ("extensions", "sticky"), 0),
+    ("cooldown", ("extensions", "cooldown"), 0),
+    ("delay", ("extensions", "delay"), 0),
+    ("matchPersonaDescription", ("extensions", "match_persona_description"), False),
+    ("matchCharacterDescription", ("extensions", "match_character_description"), False),
+    ("matchCharacterPersonality", ("extensions", "match_character_personality"), False),
+    ("matchCharacterDepthPrompt", ("extensions", "match_character_depth_prompt"), False),
+    ("matchScenario", ("extensions", "match_scenario"), False),
+    ("matchCreatorNotes", ("extensions", "match_creator_notes"), False),
+    ("triggers", ("extensions", "triggers"), []),
+    ("ignoreBudget", ("extensions", "ignore_budget"), False),
+]
+
+# 单独处理的世界书字段（addMemo 由 comment 是否为空推出）
+_SPECIAL_WORLD_KEYS = {"uid", "disable", "addMemo", "extensions"}
+_MAPPED_WORLD_KEYS = {world_key for world_key, _, _ in FIELD_MAP} | _SPECIAL_WORLD_KEYS
+_MAPPED_BOOK_EXTENSIONS = {path[1] for _, path, _ in FIELD_MAP if path[0] == "extensions"}
+_MAPPED_BOOK_KEYS = {path[0] for _, path, _ in FIELD_MAP if len(path) == 1} | {
+    "id", "enabled", "position", "use_regex", "extensions"
+}
+
+# 没有对应字段的世界书属性原样保存在条目 extensions 的这个键下，导出时还原
+WORLD_INFO_EXTRA_KEY = "world_info"
+# 反过来，character_book 条目上规范之外的顶层字段保存在世界书条目 extensions 的这个键下
+BOOK_EXTRA_KEY = "character_book"
+
+
+# ---------- 字段映射 ----------
+
+def world_entry_to_book(world_entry: Dict[str, Any], uid: Any = None) -> Dict[str, Any]:
+    """把一个世界书条目转换为 character_book 条目"""
+    extensions: Dict[str, Any] = {}
+    entry: Dict[str, Any] = {
+        "id": world_entry.get("uid", uid),
+        "enabled": not world_entry.get("disable", False),
+        "use_regex": True,
+    }
+    for world_key, path, default in FIELD_MAP:
+        value = world_entry.get(world_key, default)
+        if path[0] == "extensions":
+            extensions[path[1]] = value
+        else:
+            entry[path[0]] = value
+    entry["position"] = "before_char" if extensions["position"] == 0 else "after_char"
+
+    # 世界书条目自带的 extensions（例如第三方插件数据）
+    for key, value in (world_entry.get("extensions") or {}).items():
+        if key == BOOK_EXTRA_KEY and isinstance(value, dict):
+            for book_key, book_value in value.items():
+                entry.setdefault(book_key, book_value)
+        else:
+            extensions.setdefault(key, value)
+    extra = {key: value for key, value in world_entry.items() if key not in _MAPPED_WORLD_KEYS}
+    if extra:
+        extensions[WORLD_INFO_EXTRA_KEY] = extra
+    entry["extensions"] = extensions
+    return entry
+
+
+def book_entry_to_world(entry: Dict[str, Any], index: int = 0) -> Dict[str, Any]:
+    """把一个 character_book 条目转换为世界书条目"""
+    extensions = entry.get("extensions") or {}
+    world_entry: Dict[str, Any] = {"uid": entry.get("id", index)}
+    for world_key, path, default in FIELD_MAP:
+        if path[0] == "extensions":
+            value = extensions.get(path[1], default)
+        else:
+            value = entry.get(path[0], default)
+        world_entry[world_key] = value
+    if "position" not in extensions:
+        world_entry["position"] = 0 if entry.get("position", "before_char") == "before_char" else 1
+    if "display_index" not in extensions:
+        world_entry["displayIndex"] = index
+    world_entry["disable"] = not entry.get("enabled", True)
+    world_entry["addMemo"] = bool(entry.get("comment"))
+
+    extra = extensions.get(WORLD_INFO_EXTRA_KEY)
+    if isinstance(extra, dict):
+        world_entry.update(extra)
+    other_extensions = {
+        key: value for key, value in extensions.items()
+        if key not in _MAPPED_BOOK_EXTENSIONS and key != WORLD_INFO_EXTRA_KEY
+    }
+    # character_book 条目上的其他顶层字段（如 name、priority）也一并保存，避免丢失
+    book_extra = {key: value for key, value in entry.items() if key not in _MAPPED_BOOK_KEYS}
+    if book_extra:
+        other_extensions[BOOK_EXTRA_KEY] = book_extra
+    if other_extensions:
+        world_entry["extensions"] = other_extensions
+    return world_entry
+
+
+# ---------- 流式 JSON 读取 ----------
+
+class _StreamReader:
+    """在文件上按需读取的 JSON 读取器：只解析当前需要的值，其余部分逐块丢弃"""
+
+    def __init__(self, f: TextIO):
+        self.f = f
+        self.buffer = ""
+        self.pos = 0
+        self.eof = False
+        self.decoder = json.JSONDecoder()
+
+    def _fill(self) -> bool:
+        if self.eof:
+            return False
+        chunk = self.f.read(CHUNK_SIZE)
+        if not chunk:
+            self.eof = True
+            return False
+        self.buffer = self.buffer[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def peek(self) -> str:
+        """跳过空白并返回下一个字符（不消费），文件结束返回空串"""
+        while True:
+            self.pos = _WHITESPACE.match(self.buffer, self.pos).end()
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self._fill():
+                return ""
+
+    def expect(self, char: str):
+        if self.peek() != char:
+            raise ValueError(f"JSON 格式错误：期望 '{char}'，位置附近为 {self.buffer[self.pos:self.pos + 20]!r}")
+        self.pos += 1
+
+    def read_value(self) -> Any:
+        """读取一个完整的 JSON 值；缓冲区不足时继续读入后重试"""
+        self.peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.pos)
+            except json.JSONDecodeError:
+                if not self._fill():
+                    raise
+                continue
+            # 数字可能恰好在缓冲区末尾被截断
+            if end == len(self.buffer) and not self.eof and self.buffer[self.pos] not in '{["':
+                if self._fill():
+                    continue
+            self.pos = end
+            return value
+
+    def iter_object(self) -> Iterator[str]:
+        """遍历对象的键；调用方必须在每次迭代中读取或跳过对应的值"""
+        self.expect("{")
+        if self.peek() == "}":
+            self.pos += 1
+            return
+        while True:
+            key = self.read_value()
+            self.expect(":")
+            yield key
+            char = self.peek()
+            self.pos += 1
+            if char == "}":
+                return
+            if char != ",":
+                raise ValueError("JSON 格式错误：对象成员之间缺少逗号")
+
+    def iter_array(self) -> Iterator[None]:
+        """遍历数组元素；调用方必须在每次迭代中读取对应的值"""
+        self.expect("[")
+        if self.peek() == "]":
+            self.pos += 1
+            return
+        while True:
+            yield None
+            char = self.peek()
+            self.pos += 1
+            if char == "]":
+                return
+            if char != ",":
+                raise ValueError("JSON 格式错误：数组元素之间缺少逗号")
+
+
+def iter_world_entries(f: TextIO, meta: Optional[Dict[str, Any]] = None) -> Iterator[Tuple[str, Dict[str, Any]]]:
+    """流式读取世界书文件，逐条产出 (键, 世界书条目)；其余顶层字段写入 meta"""
+    reader = _StreamReader(f)
+    for key in reader.iter_object():
+        if key == "entries" and reader.peek() == "{":
+            for entry_key in reader.iter_object():
+                yield entry_key, reader.read_value()
+        elif key == "entries" and reader.peek() == "[":
+            for index, _ in enumerate(reader.iter_array()):
+                yield str(index), reader.read_value()
+        else:
+            value = reader.read_value()
+            if meta is not None:
+                meta[key] = value
+
+
+def iter_book_entries(f: TextIO, meta: Optional[Dict[str, Any]] = None) -> Iterator[Dict[str, Any]]:
+    """流式读取 character_book 条目；输入可以是完整角色卡、card.data 或 character_book 本身"""
+    reader = _StreamReader(f)
+
+    def walk_book() -> Iterator[Dict[str, Any]]:
+        for key in reader.iter_object():
+            if key == "entries" and reader.peek() == "[":
+                for _ in reader.iter_array():
+                    yield reader.read_value()
+            else:
+                value = reader.read_value()
+                if meta is not None:
+                    meta[key] = value
+
+    def walk(depth: int) -> Iterator[Dict[str, Any]]:
+        for key in reader.iter_object():
+            if key == "entries" and reader.peek() == "[":
+                for _ in reader.iter_array():
+                    yield reader.read_value()
+            elif key == "character_book" and reader.peek() == "{":
+                yield from walk_book()
+            elif key == "data" and depth == 0 and reader.peek() == "{":
+                yield from walk(1)
+            else:
+                reader.read_value()
+
+    yield from walk(0)
+
+
+# ---------- 流式写出 ----------
+
+def write_world(entries: Iterator[Dict[str, Any]], f: TextIO, meta: Optional[Dict[str, Any]] = None) -> int:
+    """把 character_book 条目逐条转换并写成世界书文件，返回写出的条目数"""
+    f.write('{\n  "entries": {')
+    count = 0
+    used_uids = set()
+    for index, entry in enumerate(entries):
+        world_entry = book_entry_to_world(entry, index)
+        uid = world_entry["uid"]
+        if uid in used_uids or not isinstance(uid, int):
+            uid = index
+            while uid in used_uids:
+                uid += 1
+            world_entry["uid"] = uid
+        used_uids.add(uid)
+        f.write("," if count else "")
+        f.write(f'\n    {json.dumps(str(uid))}: ')
+        f.write(json.dumps(world_entry, ensure_ascii=False))
+        count += 1
+    f.write("\n  }")
+    for key, value in (meta or {}).items():
+        if key != "entries":
+            f.write(f",\n  {json.dumps(key)}: {json.dumps(value, ensure_ascii=False)}")
+    f.write("\n}\n")
+    return count
+
+
+def write_book(world_entries: Iterator[Tuple[str, Dict[str, Any]]], f: TextIO, name: str = "") -> int:
+    """把世界书条目逐条转换并写成 character_book JSON，返回写出的条目数"""
+    f.write('{\n  "name": ' + json.dumps(name, ensure_ascii=False) + ',\n  "entries": [')
+    count = 0
+    for key, world_entry in world_entries:
+        f.write("," if count else "")
+        f.write("\n    " + json.dumps(world_entry_to_book(world_entry, _uid(key)), ensure_ascii=False))
+        count += 1
+    f.write("\n  ]\n}\n")
+    return count
+
+
+def _uid(key: str) -> Any:
+    try:
+        return int(key)
+    except (TypeError, ValueError):
+        return key
+
+
+# ---------- 合并 ----------
+
+def merge_world_into_book(book_entries: List[Dict[str, Any]],
+                          world_entries: Iterator[Tuple[str, Dict[str, Any]]]) -> Tuple[List[Tuple[int, Dict[str, Any]]], List[Dict[str, Any]]]:
+    """按 uid 合并：返回 (需要更新的 (行号, 新条目) 列表, 需要追加的新条目列表)"""
+    row_by_id = {entry.get("id"): row for row, entry in enumerate(book_entries) if entry.get("id") is not None}
+    updates: List[Tuple[int, Dict[str, Any]]] = []
+    appended: List[Dict[str, Any]] = []
+    appended_by_id: Dict[Any, int] = {}
+    for key, world_entry in world_entries:
+        entry = world_entry_to_book(world_entry, _uid(key))
+        row = row_by_id.get(entry["id"])
+        if row is not None:
+            updates.append((row, entry))
+        elif entry["id"] in appended_by_id:
+            appended[appended_by_id[entry["id"]]] = entry
+        else:
+            appended_by_id[entry["id"]] = len(appended)
+            appended.append(entry)
+    return updates, appended
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """命令行入口"""
+    parser = argparse.ArgumentParser(description="SillyTavern 世界书与 character_book 互相转换（流式）")
+    sub = parser.add_subparsers(dest="command", required=True)
+    to_book = sub.add_parser("to-book", help="世界书 -> character_book")
+    to_book.add_argument("input")
+    to_book.add_argument("-o", "--output", required=True)
+    to_book.add_argument("--name", default="", help="character_book 名称")
+    to_world = sub.add_parser("to-world", help="角色卡或 character_book -> 世界书")
+    to_world.add_argument("input")
+    to_world.add_argument("-o", "--output", required=True)
+    args = parser.parse_args(argv)
+
+    with open(args.input, 'r', encoding='utf-8') as src, open(args.output, 'w', encoding='utf-8') as dst:
+        if args.command == "to-book":
+            count = write_book(iter_world_entries(src), dst, args.name)
+        else:
+            count = write_world(iter_book_entries(src), dst)
+    print(f"已转换 {count} 个条目", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())